@@ -0,0 +1,344 @@
+"""
+File: SIL_batch_build.py
+
+Description: This file contains the batch build API for SIL modules.
+Many target Python files are built concurrently on a process pool. Each worker
+runs SIL_Operator.build_SIL_code for one module, so CMake configure and build of
+independent modules overlap. Modules in the same SIL folder share its
+CMakeLists.txt and build folder, so they are built one after another in the
+same worker. A CPU-core budget is split between the number of concurrent
+workers and the "cmake --build --parallel" jobs of each module.
+A failed module does not abort the others; a per-module timing summary is
+reported at the end.
+
+Example code to build several modules:
+```
+from helper.SIL.SIL_batch_build import build_SIL_modules, print_build_summary
+
+results = build_SIL_modules(
+    ["sample/matrix/sample_matrix.py", "sample/motor/motor.py"],
+    cpu_budget=8, build_type="Release", incremental=True)
+print_build_summary(results)
+```
+
+Command line interface (run from the workspace root):
+```
+python -m helper.SIL.SIL_batch_build sample/matrix/sample_matrix.py sample/motor/motor.py -j 8
+```
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from helper.SIL.SIL_operator import SIL_Operator, snake_to_camel
+
+DEFAULT_LOG_DIR_NAME = os.path.join("build", "SIL_batch_logs")
+
+
+def split_cpu_budget(
+    module_count: int,
+    cpu_budget: int,
+    max_parallel_modules: int = None
+) -> tuple:
+    """
+    Split cpu_budget cores between concurrently built modules and the
+    parallel compile jobs of each module.
+    Returns (parallel_modules, jobs_per_module).
+    """
+    cpu_budget = max(1, int(cpu_budget))
+    parallel_modules = max(1, min(module_count, cpu_budget))
+    if max_parallel_modules is not None:
+        parallel_modules = max(1, min(parallel_modules, max_parallel_modules))
+
+    jobs_per_module = max(1, cpu_budget // parallel_modules)
+
+    return parallel_modules, jobs_per_module
+
+
+def _build_one_module(
+    python_file_path: str,
+    root_path: str,
+    log_path: str,
+    build_options: dict
+) -> dict:
+    """
+    Build a single SIL module in a worker process.
+    stdout and stderr of the worker (including CMake and compiler output)
+    are redirected to log_path so that parallel builds do not interleave,
+    and restored when the build returns.
+    """
+    start_time = time.perf_counter()
+    module_name = snake_to_camel(
+        os.path.splitext(os.path.basename(python_file_path))[0]) + "SIL"
+
+    result = {
+        "python_file": python_file_path,
+        "module_name": module_name,
+        "status": "ok",
+        "error": "",
+        "elapsed": 0.0,
+        "log_path": log_path,
+        "skipped": False,
+        "compiler_cache": None,
+    }
+
+    os.chdir(root_path)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout = os.dup(1)
+    saved_stderr = os.dup(2)
+
+    try:
+        with open(log_path, "w", encoding="utf-8") as log_file:
+            os.dup2(log_file.fileno(), 1)
+            os.dup2(log_file.fileno(), 2)
+
+            try:
+                operator = SIL_Operator(
+                    os.path.basename(python_file_path),
+                    os.path.dirname(os.path.abspath(python_file_path)))
+                operator.build_SIL_code(**build_options)
+
+                if operator.find_built_module_path() == "":
+                    raise FileNotFoundError(
+                        f"{module_name} module was not produced.")
+
+                build_summary = getattr(operator, "build_summary", {})
+                result["skipped"] = build_summary.get("skipped", False)
+                result["compiler_cache"] = build_summary.get("compiler_cache")
+            except Exception as e:
+                # sys.stderr need not write to fd 2 (e.g. under pytest)
+                traceback.print_exc(file=log_file)
+                result["status"] = "failed"
+                result["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                log_file.flush()
+    finally:
+        os.dup2(saved_stdout, 1)
+        os.dup2(saved_stderr, 2)
+        os.close(saved_stdout)
+        os.close(saved_stderr)
+
+    result["elapsed"] = time.perf_counter() - start_time
+    return result
+
+
+def _build_module_group(
+    python_file_paths: list,
+    log_paths: list,
+    root_path: str,
+    build_options: dict
+) -> list:
+    """
+    Build the SIL modules of one SIL folder one after another in a worker
+    process, as they share the CMakeLists.txt and the build folder.
+    """
+    return [_build_one_module(python_file_path, root_path, log_path,
+                              build_options)
+            for python_file_path, log_path in zip(python_file_paths, log_paths)]
+
+
+def group_by_SIL_folder(python_file_paths: list) -> list:
+    """
+    Return the indices of python_file_paths grouped by their SIL folder, in
+    the order of the first module of each folder.
+    """
+    groups = {}
+    for index, python_file_path in enumerate(python_file_paths):
+        groups.setdefault(os.path.dirname(python_file_path), []).append(index)
+
+    return list(groups.values())
+
+
+def build_SIL_modules(
+    python_file_paths: list,
+    cpu_budget: int = None,
+    max_parallel_modules: int = None,
+    compile_definitions: list = None,
+    build_type: str = "Debug",
+    incremental: bool = False,
+    use_cache: bool = False,
+    dependency_scoped: bool = False,
+    root_path: str = None,
+    log_dir: str = None,
+    **build_SIL_code_options
+) -> list:
+    """
+    Build the SIL modules for many Python files concurrently.
+
+    Args:
+        python_file_paths: Paths of the target Python files. The SIL folder of
+            each module is the directory of its Python file. Modules in the
+            same SIL folder are built serially.
+        cpu_budget: Total number of cores to use. Defaults to os.cpu_count().
+        max_parallel_modules: Upper limit for concurrently built modules
+            (SIL folders).
+        compile_definitions, build_type, incremental, use_cache, dependency_scoped:
+            Passed to SIL_Operator.build_SIL_code for every module.
+        root_path: Workspace root. Defaults to the current directory.
+        log_dir: Directory for the per-module build logs.
+            Defaults to "<root_path>/build/SIL_batch_logs".
+        build_SIL_code_options: Further keyword arguments for
+            SIL_Operator.build_SIL_code (e.g. linker="lld").
+
+    Returns:
+        A list of result dicts (python_file, module_name, status, error,
+        elapsed, log_path) in the order of python_file_paths.
+    """
+    if root_path is None:
+        root_path = os.getcwd()
+    root_path = os.path.abspath(root_path)
+
+    if cpu_budget is None:
+        cpu_budget = os.cpu_count() or 1
+    if log_dir is None:
+        log_dir = os.path.join(root_path, DEFAULT_LOG_DIR_NAME)
+    os.makedirs(log_dir, exist_ok=True)
+
+    python_file_paths = [os.path.abspath(p) for p in python_file_paths]
+    if not python_file_paths:
+        return []
+
+    groups = group_by_SIL_folder(python_file_paths)
+    parallel_modules, jobs_per_module = split_cpu_budget(
+        len(groups), cpu_budget, max_parallel_modules)
+
+    build_options = {
+        "compile_definitions": compile_definitions,
+        "build_type": build_type,
+        "incremental": incremental,
+        "use_cache": use_cache,
+        "dependency_scoped": dependency_scoped,
+        "parallel_jobs": jobs_per_module,
+        "use_daemon": False,
+    }
+    build_options.update(build_SIL_code_options)
+
+    results = [None] * len(python_file_paths)
+
+    with ProcessPoolExecutor(max_workers=parallel_modules) as executor:
+        future_to_group = {}
+        for group in groups:
+            log_paths = [
+                os.path.join(log_dir, os.path.splitext(os.path.basename(
+                    python_file_paths[index]))[0] + f"_{index}.log")
+                for index in group]
+            future = executor.submit(
+                _build_module_group,
+                [python_file_paths[index] for index in group],
+                log_paths,
+                root_path,
+                build_options)
+            future_to_group[future] = group
+
+        for future in as_completed(future_to_group):
+            group = future_to_group[future]
+            try:
+                for index, result in zip(group, future.result()):
+                    results[index] = result
+            except Exception as e:
+                # e.g. the worker process died
+                for index in group:
+                    results[index] = {
+                        "python_file": python_file_paths[index],
+                        "module_name": "",
+                        "status": "failed",
+                        "error": f"{type(e).__name__}: {e}",
+                        "elapsed": 0.0,
+                        "log_path": "",
+                        "skipped": False,
+                        "compiler_cache": None,
+                    }
+
+    for result in results:
+        result["parallel_modules"] = parallel_modules
+        result["jobs_per_module"] = jobs_per_module
+
+    return results
+
+
+def print_build_summary(results: list) -> None:
+    """
+    Print a per-module timing summary of build_SIL_modules results.
+    """
+    if not results:
+        print("No SIL modules built.")
+        return
+
+    print(f"SIL batch build: {results[0]['parallel_modules']} concurrent modules, "
+          f"{results[0]['jobs_per_module']} jobs each")
+
+    name_width = max(len(r["module_name"] or r["python_file"])
+                     for r in results)
+    for r in sorted(results, key=lambda r: r["elapsed"], reverse=True):
+        name = r["module_name"] or r["python_file"]
+        line = f"  {name:<{name_width}}  {r['status']:<6}  {r['elapsed']:8.2f} s"
+        if r["skipped"]:
+            line += "  (up to date)"
+        if r["compiler_cache"] is not None:
+            line += f"  cache hits {r['compiler_cache']['hits']}, misses {r['compiler_cache']['misses']}"
+        if r["status"] != "ok":
+            line += f"  {r['error']}  (log: {r['log_path']})"
+        print(line)
+
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"{len(results) - len(failed)} succeeded, {len(failed)} failed")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Build many SIL modules concurrently.")
+    parser.add_argument("python_files", nargs="+",
+                        help="target Python files")
+    parser.add_argument("-j", "--cpu-budget", type=int, default=None,
+                        help="total number of cores to use (default: all)")
+    parser.add_argument("--max-parallel-modules", type=int, default=None,
+                        help="upper limit for concurrently built modules")
+    parser.add_argument("--build-type", default="Debug",
+                        help="build configuration: Debug, Release, RelWithDebInfo, "
+                             "Native or PGO (default: Debug)")
+    parser.add_argument("--pgo-training-script", default=None,
+                        help="training script of the PGO build type")
+    parser.add_argument("-D", "--define", action="append", default=None,
+                        help="compile definition, may be given multiple times")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse build folders and skip unchanged modules")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="use the shared SIL build cache")
+    parser.add_argument("--dependency-scoped", action="store_true",
+                        help="compile only sources reachable from the SIL C++ file")
+    parser.add_argument("--linker", default=None,
+                        help="linker for -fuse-ld, e.g. lld or mold")
+    parser.add_argument("--lto-mode", default="full",
+                        help="LTO mode of Release, Native and PGO builds: full, thin or off")
+    parser.add_argument("--log-dir", default=None,
+                        help="directory for per-module build logs")
+
+    args = parser.parse_args(argv)
+
+    results = build_SIL_modules(
+        args.python_files,
+        cpu_budget=args.cpu_budget,
+        max_parallel_modules=args.max_parallel_modules,
+        compile_definitions=args.define,
+        build_type=args.build_type,
+        incremental=args.incremental,
+        use_cache=args.use_cache,
+        dependency_scoped=args.dependency_scoped,
+        log_dir=args.log_dir,
+        linker=args.linker,
+        lto_mode=args.lto_mode,
+        pgo_training_script=args.pgo_training_script)
+    print_build_summary(results)
+
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+/********************************************************************************
+@file SIL_buffer_conversion.hpp
+@brief Raw buffer access of PythonNumpy matrix types for SIL wrappers.
+
+The functions copy between a PythonNumpy matrix and a C-contiguous buffer of
+its elements: (M, N) row-major for dense matrices, (M, M) or the diagonal (M,)
+for diagonal matrices, and the dense (M, N) layout or the values in the CSR
+order of the sparsity pattern (NNZ,) for sparse matrices.
+
+They depend neither on pybind11 nor on the Python headers, so they are shared
+by the binding backends (SIL_numpy_conversion.hpp for pybind11,
+SIL_capi_conversion.hpp for the CPython C API) and can be used while the GIL
+is released.
+
+Example:
+  SampleMatrix::DenseMatrix_Type A;
+  SIL_NumpyConversion::dense_from_buffer<3, 3>(data, A);
+  auto result = sm.add(A, B);
+  SIL_NumpyConversion::dense_to_buffer<3, 3>(result, output_data);
+********************************************************************************/
+#ifndef SIL_BUFFER_CONVERSION_HPP_
+#define SIL_BUFFER_CONVERSION_HPP_
+
+#include <cstddef>
+
+namespace SIL_NumpyConversion {
+
+/* Raw buffer access (GIL not required) */
+template <std::size_t M, std::size_t N, typename T, typename Matrix_Type>
+inline void dense_from_buffer(const T *data, Matrix_Type &matrix) {
+  for (std::size_t i = 0; i < M; ++i) {
+    for (std::size_t j = 0; j < N; ++j) {
+      matrix(i, j) = data[i * N + j];
+    }
+  }
+}
+
+template <std::size_t M, typename T, typename Matrix_Type>
+inline void diag_from_buffer(const T *data, Matrix_Type &matrix) {
+  for (std::size_t i = 0; i < M; ++i) {
+    matrix(i) = data[i * M + i];
+  }
+}
+
+template <std::size_t M, typename T, typename Matrix_Type>
+inline void diag_from_compact_buffer(const T *data, Matrix_Type &matrix) {
+  for (std::size_t i = 0; i < M; ++i) {
+    matrix(i) = data[i];
+  }
+}
+
+template <std::size_t M, std::size_t N, typename T, typename Matrix_Type>
+inline void dense_to_buffer(Matrix_Type &matrix, T *data) {
+  for (std::size_t i = 0; i < M; ++i) {
+    for (std::size_t j = 0; j < N; ++j) {
+      data[i * N + j] = matrix(i, j);
+    }
+  }
+}
+
+template <std::size_t M, typename T, typename Matrix_Type>
+inline void diag_to_buffer(Matrix_Type &matrix, T *data) {
+  for (std::size_t i = 0; i < M * M; ++i) {
+    data[i] = static_cast<T>(0);
+  }
+  for (std::size_t i = 0; i < M; ++i) {
+    data[i * M + i] = matrix(i);
+  }
+}
+
+template <std::size_t M, typename T, typename Matrix_Type>
+inline void diag_to_compact_buffer(Matrix_Type &matrix, T *data) {
+  for (std::size_t i = 0; i < M; ++i) {
+    data[i] = matrix(i);
+  }
+}
+
+/* Sparsity pattern of a sparse matrix type in CSR form:
+   the values of row i are at indptr[i] .. indptr[i + 1] - 1, in the columns
+   indices[indptr[i]] .. (ascending) */
+struct SparsePattern {
+  std::size_t rows;
+  std::size_t cols;
+  const std::size_t *indptr;
+  const std::size_t *indices;
+
+  std::size_t nnz() const { return indptr[rows]; }
+
+  /* Value index of (row, col), or nnz() if it is not in the pattern */
+  std::size_t value_index(std::size_t row, std::size_t col) const {
+    for (std::size_t k = indptr[row]; k < indptr[row + 1]; ++k) {
+      if (indices[k] == col) {
+        return k;
+      }
+    }
+    return nnz();
+  }
+};
+
+template <typename T, typename Matrix_Type>
+inline void sparse_from_buffer(const T *values, const SparsePattern &pattern,
+                               Matrix_Type &matrix) {
+  for (std::size_t k = 0; k < pattern.nnz(); ++k) {
+    matrix(k) = values[k];
+  }
+}
+
+/* True if the dense (rows, cols) buffer has no nonzero outside the sparsity
+   pattern. Otherwise row and col are set to the first such element. */
+template <typename T>
+inline bool dense_buffer_fits_pattern(const T *data,
+                                      const SparsePattern &pattern,
+                                      std::size_t &row, std::size_t &col) {
+  for (std::size_t i = 0; i < pattern.rows; ++i) {
+    /* the column indices of a row are in ascending order */
+    std::size_t k = pattern.indptr[i];
+    for (std::size_t j = 0; j < pattern.cols; ++j) {
+      if ((k < pattern.indptr[i + 1]) && (pattern.indices[k] == j)) {
+        ++k;
+      } else if (data[i * pattern.cols + j] != static_cast<T>(0)) {
+        row = i;
+        col = j;
+        return false;
+      }
+    }
+  }
+  return true;
+}
+
+template <typename T, typename Matrix_Type>
+inline void sparse_from_dense_buffer(const T *data,
+                                     const SparsePattern &pattern,
+                                     Matrix_Type &matrix) {
+  for (std::size_t i = 0; i < pattern.rows; ++i) {
+    for (std::size_t k = pattern.indptr[i]; k < pattern.indptr[i + 1]; ++k) {
+      matrix(k) = data[i * pattern.cols + pattern.indices[k]];
+    }
+  }
+}
+
+template <typename T, typename Matrix_Type>
+inline void sparse_to_buffer(Matrix_Type &matrix, const SparsePattern &pattern,
+                             T *data) {
+  for (std::size_t i = 0; i < pattern.rows * pattern.cols; ++i) {
+    data[i] = static_cast<T>(0);
+  }
+  for (std::size_t i = 0; i < pattern.rows; ++i) {
+    for (std::size_t k = pattern.indptr[i]; k < pattern.indptr[i + 1]; ++k) {
+      data[i * pattern.cols + pattern.indices[k]] = matrix(k);
+    }
+  }
+}
+
+template <typename T, typename Matrix_Type>
+inline void sparse_to_compact_buffer(Matrix_Type &matrix,
+                                     const SparsePattern &pattern, T *values) {
+  for (std::size_t k = 0; k < pattern.nnz(); ++k) {
+    values[k] = matrix(k);
+  }
+}
+
+} // namespace SIL_NumpyConversion
+
+#endif // SIL_BUFFER_CONVERSION_HPP_
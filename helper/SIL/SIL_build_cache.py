@@ -0,0 +1,326 @@
+"""
+File: SIL_build_cache.py
+
+Description: This file contains the SIL_BuildCache class, a local on-disk,
+content-addressed cache of built SIL modules (pybind11 ".so" files).
+The cache key is a hash of the generated CMakeLists.txt, the contents of all
+discovered source and header files, the compile definitions, the build type,
+the compiler version and the Python ABI tag. Paths are hashed relative to the
+workspace root, so that different checkouts of the same sources share entries.
+
+The cache directory defaults to "~/.cache/MCAP_SIL" and can be changed with the
+environment variable MCAP_SIL_CACHE_DIR. Its size is bounded by LRU eviction
+(MCAP_SIL_CACHE_MAX_SIZE, in bytes, default 2 GiB).
+
+Example code to use the cache from SIL_Operator:
+```
+generator = SIL_Operator("my_func.py", current_dir)
+generator.build_SIL_code(use_cache=True)
+```
+
+Command line interface to inspect and prune the cache:
+```
+python -m helper.SIL.SIL_build_cache list
+python -m helper.SIL.SIL_build_cache stats
+python -m helper.SIL.SIL_build_cache prune --max-size 500M
+python -m helper.SIL.SIL_build_cache clear
+```
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import sysconfig
+import functools
+import subprocess
+
+from helper.SIL.SIL_operator import hash_file_contents
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "MCAP_SIL")
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+META_FILE_NAME = "meta.json"
+
+
+def parse_size(size_str: str) -> int:
+    """
+    Convert a size string such as "500M", "2G" or "1024" to bytes.
+    """
+    size_str = size_str.strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+    if size_str and size_str[-1] in units:
+        return int(float(size_str[:-1]) * units[size_str[-1]])
+
+    return int(size_str)
+
+
+@functools.lru_cache(maxsize=None)
+def get_compiler_version(compiler: str = None) -> str:
+    """
+    Return the first line of "<compiler> --version".
+    The compiler is taken from the CXX environment variable, or "c++" by default.
+    """
+    if compiler is None:
+        compiler = os.environ.get("CXX", "c++")
+
+    try:
+        result = subprocess.run(
+            [compiler, "--version"], capture_output=True, text=True)
+    except OSError:
+        return "unknown"
+
+    if result.returncode != 0 or not result.stdout:
+        return "unknown"
+
+    return result.stdout.splitlines()[0].strip()
+
+
+def get_python_abi_tag() -> str:
+    """
+    Return a tag that identifies the Python ABI of extension modules,
+    e.g. "cpython-312|.cpython-312-x86_64-linux-gnu.so".
+    """
+    ext_suffix = sysconfig.get_config_var("EXT_SUFFIX") or ""
+    return f"{sys.implementation.cache_tag}|{ext_suffix}"
+
+
+class SIL_BuildCache:
+    def __init__(
+        self,
+        cache_dir: str = None,
+        max_size: int = None
+    ):
+        if cache_dir is None:
+            cache_dir = os.environ.get("MCAP_SIL_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_size is None:
+            max_size = parse_size(os.environ.get(
+                "MCAP_SIL_CACHE_MAX_SIZE", str(DEFAULT_MAX_SIZE)))
+
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+
+    @staticmethod
+    def compute_key(
+        cmake_generator,
+        build_type: str
+    ) -> str:
+        """
+        Compute the cache key for the module described by a CmakeGenerator
+        whose generate_cmake_lists_txt() has already been called.
+        """
+        root = os.path.abspath(cmake_generator.root_path)
+
+        # Absolute paths in CMakeLists.txt must not make the key workspace-specific.
+        cmake_lists_txt = getattr(cmake_generator, "cmake_lists_txt", "")
+        cmake_lists_txt = cmake_lists_txt.replace(root, "<ROOT>")
+
+        extra_items = [
+            cmake_generator.pybind11_module_name,
+            cmake_lists_txt,
+            build_type,
+            get_compiler_version(),
+            get_python_abi_tag(),
+        ]
+        extra_items.extend(cmake_generator.compile_definitions)
+
+        return hash_file_contents(
+            cmake_generator.get_dependency_files(),
+            extra_items=extra_items,
+            relative_to=root)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _read_meta(self, entry_dir: str) -> dict:
+        try:
+            with open(os.path.join(entry_dir, META_FILE_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, entry_dir: str, meta: dict) -> None:
+        meta_path = os.path.join(entry_dir, META_FILE_NAME)
+        tmp_path = meta_path + f".tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    def restore(self, key: str, destination_dir: str) -> str:
+        """
+        Hard-link (or copy, if linking is not possible) the cached module for
+        `key` into destination_dir.
+        Returns the path of the restored module, or an empty string on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+        meta = self._read_meta(entry_dir)
+        file_name = meta.get("file_name", "")
+        cached_path = os.path.join(entry_dir, file_name)
+
+        if file_name == "" or not os.path.isfile(cached_path):
+            return ""
+
+        destination = os.path.join(destination_dir, file_name)
+        # Never write through an existing hard link into the cache.
+        if os.path.lexists(destination):
+            os.remove(destination)
+
+        try:
+            os.link(cached_path, destination)
+        except OSError:
+            shutil.copy2(cached_path, destination)
+
+        meta["last_used"] = time.time()
+        meta["hit_count"] = meta.get("hit_count", 0) + 1
+        self._write_meta(entry_dir, meta)
+
+        return destination
+
+    def store(self, key: str, module_path: str, module_name: str = "") -> str:
+        """
+        Store a built module under `key` and evict old entries if the cache
+        grows beyond max_size. Returns the cached file path.
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        file_name = os.path.basename(module_path)
+        cached_path = os.path.join(entry_dir, file_name)
+
+        tmp_path = cached_path + f".tmp{os.getpid()}"
+        shutil.copy2(module_path, tmp_path)
+        os.replace(tmp_path, cached_path)
+
+        now = time.time()
+        self._write_meta(entry_dir, {
+            "key": key,
+            "module_name": module_name,
+            "file_name": file_name,
+            "size": os.path.getsize(cached_path),
+            "created": now,
+            "last_used": now,
+            "hit_count": 0,
+        })
+
+        self.evict(self.max_size)
+
+        return cached_path
+
+    def list_entries(self) -> list:
+        """
+        Return the meta data of all entries, most recently used first.
+        """
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                meta = self._read_meta(entry_dir)
+                if not meta:
+                    continue
+                meta["path"] = entry_dir
+                entries.append(meta)
+
+        entries.sort(key=lambda e: e.get("last_used", 0), reverse=True)
+        return entries
+
+    def total_size(self) -> int:
+        return sum(e.get("size", 0) for e in self.list_entries())
+
+    def remove_entry(self, key: str) -> None:
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def evict(self, max_size: int, older_than_seconds: float = None) -> list:
+        """
+        Remove least recently used entries until the total size is at most
+        max_size. Entries not used for older_than_seconds are removed as well.
+        Returns the list of removed keys.
+        """
+        removed = []
+        entries = self.list_entries()
+        now = time.time()
+
+        if older_than_seconds is not None:
+            for entry in list(entries):
+                if now - entry.get("last_used", 0) > older_than_seconds:
+                    self.remove_entry(entry["key"])
+                    removed.append(entry["key"])
+                    entries.remove(entry)
+
+        total = sum(e.get("size", 0) for e in entries)
+        while entries and total > max_size:
+            entry = entries.pop()
+            self.remove_entry(entry["key"])
+            removed.append(entry["key"])
+            total -= entry.get("size", 0)
+
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Inspect and prune the SIL build cache.")
+    parser.add_argument("--cache-dir", default=None,
+                        help="cache directory (default: $MCAP_SIL_CACHE_DIR or ~/.cache/MCAP_SIL)")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list cached modules")
+    subparsers.add_parser("stats", help="show cache size and entry count")
+
+    prune_parser = subparsers.add_parser(
+        "prune", help="evict least recently used modules")
+    prune_parser.add_argument("--max-size", default=None,
+                              help="target cache size, e.g. 500M or 2G")
+    prune_parser.add_argument("--older-than-days", type=float, default=None,
+                              help="remove entries not used for this many days")
+
+    subparsers.add_parser("clear", help="remove all cached modules")
+
+    args = parser.parse_args(argv)
+    cache = SIL_BuildCache(cache_dir=args.cache_dir)
+
+    if args.command == "list":
+        for entry in cache.list_entries():
+            last_used = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(entry.get("last_used", 0)))
+            print(f"{entry['key'][:16]}  {entry.get('size', 0):>12}  "
+                  f"{last_used}  hits={entry.get('hit_count', 0):<5} {entry.get('file_name', '')}")
+
+    elif args.command == "stats":
+        entries = cache.list_entries()
+        total = sum(e.get("size", 0) for e in entries)
+        print(f"cache dir : {cache.cache_dir}")
+        print(f"entries   : {len(entries)}")
+        print(f"total size: {total} bytes (max {cache.max_size} bytes)")
+
+    elif args.command == "prune":
+        max_size = cache.max_size
+        if args.max_size is not None:
+            max_size = parse_size(args.max_size)
+        older_than_seconds = None
+        if args.older_than_days is not None:
+            older_than_seconds = args.older_than_days * 24 * 60 * 60
+
+        removed = cache.evict(max_size, older_than_seconds)
+        print(f"removed {len(removed)} entries")
+
+    elif args.command == "clear":
+        cache.clear()
+        print(f"cleared {cache.cache_dir}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+File: SIL_build_daemon.py
+
+Description: This file contains an optional local build server for SIL modules.
+The daemon listens on a Unix socket and runs SIL_Operator.build_SIL_code in one
+long running process, so the workspace index, the include graph and the
+configured CMake build folders (incremental builds) stay warm between requests.
+Concurrent requests for the same module with the same options (e.g. from
+parallel pytest workers) are merged into one build, and every requester gets
+the path of the built module. Builds are run one at a time, because each build
+already uses all cores for "cmake --build".
+
+SIL_Operator.build_SIL_code sends its build to the daemon when one is running
+for the workspace root, and builds in-process otherwise.
+The module is built for the interpreter of the daemon, so every request carries
+the build environment of the client (Python executable, ABI tag and the
+environment variables that CMake and the compiler read). The daemon rejects a
+request whose build environment differs from its own, and the client then
+builds in-process as well.
+
+The socket path is "$MCAP_SIL_DAEMON_SOCKET" if set, otherwise a path in the
+temporary directory derived from the workspace root.
+Requests and responses are single lines of JSON.
+
+Command line interface (run from the workspace root):
+```
+python -m helper.SIL.SIL_build_daemon start     # serve in the foreground
+python -m helper.SIL.SIL_build_daemon status
+python -m helper.SIL.SIL_build_daemon stop
+```
+"""
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import tempfile
+import threading
+import traceback
+import socketserver
+
+DAEMON_SOCKET_ENV = "MCAP_SIL_DAEMON_SOCKET"
+CONNECT_TIMEOUT = 1.0
+
+# environment variables read by CMake and the compiler during a build
+BUILD_ENVIRONMENT_VARIABLES = [
+    "CMAKE_PREFIX_PATH", "CMAKE_GENERATOR", "pybind11_DIR",
+    "CC", "CXX", "CFLAGS", "CXXFLAGS", "LDFLAGS",
+]
+
+
+def get_socket_path(root_path: str) -> str:
+    """
+    Return the Unix socket path of the daemon that serves root_path.
+    """
+    socket_path = os.environ.get(DAEMON_SOCKET_ENV, "")
+    if socket_path != "":
+        return socket_path
+
+    root_hash = hashlib.sha256(
+        os.path.abspath(root_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"MCAP_SIL_daemon_{root_hash}.sock")
+
+
+def send_request(socket_path: str, request: dict) -> dict:
+    """
+    Send one request to the daemon and wait for its response.
+    Raises OSError if the daemon is not reachable.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(socket_path)
+        # builds can take long, wait for the response without timeout
+        client.settimeout(None)
+
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+
+    if not data:
+        raise ConnectionError("SIL build daemon closed the connection.")
+
+    return json.loads(data.decode("utf-8"))
+
+
+def get_build_environment() -> dict:
+    """
+    Return the build environment of this process: the Python executable that
+    the module is built for, its ABI tag and the build environment variables.
+    """
+    from helper.SIL.SIL_build_cache import get_python_abi_tag
+
+    return {
+        "python_executable": sys.executable,
+        "python_abi_tag": get_python_abi_tag(),
+        "environment": {name: os.environ.get(name, "")
+                        for name in BUILD_ENVIRONMENT_VARIABLES},
+    }
+
+
+def is_daemon_running(root_path: str) -> bool:
+    socket_path = get_socket_path(root_path)
+    if not os.path.exists(socket_path):
+        return False
+
+    try:
+        return send_request(socket_path, {"command": "ping"}).get("status") == "ok"
+    except (OSError, ValueError):
+        return False
+
+
+def request_build(
+    root_path: str,
+    python_file_name: str,
+    SIL_folder: str,
+    build_options: dict
+) -> dict:
+    """
+    Ask the daemon to build a SIL module.
+
+    Returns:
+        The daemon response {"status": "ok", "module_path": str,
+        "build_summary": dict, ...}, or None if no daemon is running or the
+        daemon runs in another build environment, in which case the caller
+        builds in-process.
+    Raises:
+        RuntimeError: The daemon failed to build the module.
+    """
+    socket_path = get_socket_path(root_path)
+    if not os.path.exists(socket_path):
+        return None
+
+    request = {
+        "command": "build",
+        "root_path": os.path.abspath(root_path),
+        "python_file_name": python_file_name,
+        "SIL_folder": os.path.abspath(SIL_folder),
+        "build_options": build_options,
+        "build_environment": get_build_environment(),
+    }
+
+    try:
+        response = send_request(socket_path, request)
+    except (OSError, ValueError):
+        return None
+
+    if response.get("status") == "mismatch":
+        return None
+    if response.get("status") != "ok":
+        raise RuntimeError(
+            f"SIL build daemon failed to build {python_file_name}: "
+            f"{response.get('message', 'unknown error')}")
+
+    return response
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        request = None
+        try:
+            request = json.loads(line.decode("utf-8"))
+            response = self.server.daemon.handle_request(request)
+        except Exception as e:
+            response = {"status": "error",
+                        "message": f"{type(e).__name__}: {e}"}
+
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+        # Stop only after the reply is sent: the process exits as soon as
+        # serve_forever returns.
+        if isinstance(request, dict) and request.get("command") == "shutdown":
+            self.server.daemon.shutdown()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SIL_BuildDaemon:
+    def __init__(self, root_path: str, socket_path: str = None):
+        self.root_path = os.path.abspath(root_path)
+        self.build_environment = get_build_environment()
+
+        if socket_path is None:
+            socket_path = get_socket_path(self.root_path)
+        self.socket_path = socket_path
+
+        self._server = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # request key -> {"event": threading.Event, "response": dict}
+        self._in_flight = {}
+
+        self.start_time = time.time()
+        self.build_count = 0
+        self.merged_count = 0
+
+    @staticmethod
+    def _request_key(request: dict) -> str:
+        return json.dumps([
+            request.get("root_path"),
+            request.get("python_file_name"),
+            request.get("SIL_folder"),
+            request.get("build_options", {}),
+            request.get("build_environment", {}),
+        ], sort_keys=True)
+
+    def _run_build(self, request: dict) -> dict:
+        from helper.SIL.SIL_operator import SIL_Operator
+
+        build_options = dict(request.get("build_options", {}))
+        build_options["use_daemon"] = False
+
+        start_time = time.perf_counter()
+        with self._build_lock:
+            try:
+                operator = SIL_Operator(
+                    request["python_file_name"], request["SIL_folder"])
+                operator.root_path = request.get("root_path", self.root_path)
+                operator.build_SIL_code(**build_options)
+
+                module_path = operator.find_built_module_path()
+                if module_path == "":
+                    raise FileNotFoundError(
+                        f"{operator.module_file_name} module was not produced.")
+
+                response = {
+                    "status": "ok",
+                    "module_path": module_path,
+                    "build_summary": getattr(operator, "build_summary", None),
+                }
+            except Exception as e:
+                traceback.print_exc()
+                response = {"status": "error",
+                            "message": f"{type(e).__name__}: {e}"}
+
+        response["elapsed"] = time.perf_counter() - start_time
+        self.build_count += 1
+        return response
+
+    def build(self, request: dict) -> dict:
+        """
+        Build the requested module, or wait for an identical build in flight.
+        A request from another build environment is rejected with the status
+        "mismatch".
+        """
+        if request.get("build_environment") != self.build_environment:
+            return {"status": "mismatch",
+                    "message": "the client build environment differs from "
+                               "the daemon build environment",
+                    "build_environment": self.build_environment}
+
+        key = SIL_BuildDaemon._request_key(request)
+
+        with self._lock:
+            entry = self._in_flight.get(key)
+            is_owner = entry is None
+            if is_owner:
+                entry = {"event": threading.Event(), "response": None}
+                self._in_flight[key] = entry
+            else:
+                self.merged_count += 1
+
+        if not is_owner:
+            entry["event"].wait()
+            return dict(entry["response"], merged=True)
+
+        try:
+            entry["response"] = self._run_build(request)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            entry["event"].set()
+
+        return dict(entry["response"], merged=False)
+
+    def handle_request(self, request: dict) -> dict:
+        command = request.get("command")
+
+        if command == "ping":
+            return {"status": "ok", "pid": os.getpid(), "root_path": self.root_path}
+        elif command == "build":
+            return self.build(request)
+        elif command == "stats":
+            with self._lock:
+                in_flight = len(self._in_flight)
+            return {
+                "status": "ok",
+                "pid": os.getpid(),
+                "root_path": self.root_path,
+                "uptime": time.time() - self.start_time,
+                "builds": self.build_count,
+                "merged_requests": self.merged_count,
+                "in_flight": in_flight,
+            }
+        elif command == "shutdown":
+            # the request handler shuts down after replying
+            return {"status": "ok"}
+
+        raise ValueError(f"Unknown command '{command}'")
+
+    def serve_forever(self) -> None:
+        """
+        Serve requests until a "shutdown" request is received.
+        Raises RuntimeError if another daemon already serves this socket.
+        """
+        if os.path.exists(self.socket_path):
+            try:
+                send_request(self.socket_path, {"command": "ping"})
+                raise RuntimeError(
+                    f"SIL build daemon already running on {self.socket_path}")
+            except (OSError, ValueError):
+                # stale socket of a daemon that did not shut down cleanly
+                os.remove(self.socket_path)
+
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.daemon = self
+        print(f"SIL build daemon serving {self.root_path} on {self.socket_path}",
+              flush=True)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Local build server for SIL modules.")
+    parser.add_argument("command", choices=["start", "status", "stop"])
+    parser.add_argument("--root", default=os.getcwd(),
+                        help="workspace root (default: current directory)")
+    parser.add_argument("--socket", default=None,
+                        help="Unix socket path (default: derived from the root)")
+    args = parser.parse_args(argv)
+
+    socket_path = args.socket if args.socket is not None else \
+        get_socket_path(args.root)
+
+    if args.command == "start":
+        SIL_BuildDaemon(args.root, socket_path).serve_forever()
+        return 0
+
+    try:
+        if args.command == "status":
+            stats = send_request(socket_path, {"command": "stats"})
+            print(f"pid: {stats['pid']}")
+            print(f"root: {stats['root_path']}")
+            print(f"uptime: {stats['uptime']:.0f} s")
+            print(f"builds: {stats['builds']}  "
+                  f"merged requests: {stats['merged_requests']}  "
+                  f"in flight: {stats['in_flight']}")
+        else:
+            send_request(socket_path, {"command": "shutdown"})
+            print("SIL build daemon stopped.")
+    except (OSError, ValueError):
+        print(f"No SIL build daemon running on {socket_path}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""
+File: SIL_build_profile.py
+
+Description: This file contains the SIL_BuildProfiler class, which records where
+the time of a SIL build goes. SIL_Operator.build_SIL_code(profile=True) times
+the build phases (discovery, C++ generation, CMake generation, configure,
+build, module move) and collects:
+  - per translation unit compile and link times from the Ninja log
+    (".ninja_log" in the build folder, Ninja generator only),
+  - per header parse times from Clang "-ftime-trace" files (Clang only).
+    With other compilers, the cost of a header is estimated as the total
+    compile time of the translation units that include it.
+
+The profile is written as JSON and as a Chrome trace file (open it in
+chrome://tracing or https://ui.perfetto.dev) to
+"<root_path>/build/SIL_profile/<module>.json" and "<module>.trace.json",
+and a report of the slowest phases, translation units and headers is printed.
+
+Example code to profile a build:
+```
+generator = SIL_Operator("sample_matrix.py", current_dir)
+generator.build_SIL_code(build_type="Release", profile=True)
+print(generator.build_profile.format_report())
+```
+
+Command line interface to print the report of a saved profile:
+```
+python -m helper.SIL.SIL_build_profile build/SIL_profile/SampleMatrixSIL.json
+```
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import contextlib
+
+PROFILE_FOLDER_NAME = os.path.join("build", "SIL_profile")
+NINJA_LOG_FILE_NAME = ".ninja_log"
+OBJECT_EXTENSIONS = (".o", ".obj")
+REPORT_TOP_COUNT = 10
+
+
+class SIL_BuildProfiler:
+    def __init__(self, module_file_name: str):
+        self.module_file_name = module_file_name
+        self.start_wall_time = time.time()
+        self.start_time = time.perf_counter()
+
+        # {"name", "category", "start", "duration", "lane", "args"},
+        # times in seconds relative to start_time
+        self.events = []
+        # {"object", "source", "kind", "start", "duration"}
+        self.translation_units = []
+        # {"header", "duration", "translation_units", "method"}
+        self.headers = []
+
+    def now(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def add_event(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        duration: float,
+        lane: int = 0,
+        args: dict = None
+    ) -> None:
+        self.events.append({
+            "name": name,
+            "category": category,
+            "start": start,
+            "duration": duration,
+            "lane": lane,
+            "args": args or {},
+        })
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **args):
+        """
+        Time a build phase:
+            with profiler.phase("configure"):
+                ...
+        """
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_event(name, "phase", start, self.now() - start, args=args)
+
+    def get_phase_duration(self, name: str) -> float:
+        return sum(e["duration"] for e in self.events
+                   if e["category"] == "phase" and e["name"] == name)
+
+    @staticmethod
+    def get_ninja_log_size(build_folder: str) -> int:
+        """
+        Return the current size of the Ninja log, so that only the entries
+        appended by the next build are read.
+        """
+        try:
+            return os.path.getsize(os.path.join(build_folder, NINJA_LOG_FILE_NAME))
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _match_source(object_path: str, source_file_list: list) -> str:
+        """
+        Return the source file that an object file was compiled from,
+        or an empty string. CMake names objects "<source path>.o".
+        """
+        for extension in OBJECT_EXTENSIONS:
+            if object_path.endswith(extension):
+                object_path = object_path[:-len(extension)]
+                break
+        object_parts = object_path.replace('\\', '/').split('/')
+
+        best_source = ""
+        best_length = 0
+        for source in source_file_list:
+            source_parts = source.replace('\\', '/').split('/')
+            length = 0
+            while length < min(len(object_parts), len(source_parts)) and \
+                    object_parts[-1 - length] == source_parts[-1 - length]:
+                length += 1
+            if length > best_length:
+                best_source = source
+                best_length = length
+
+        return best_source
+
+    def read_ninja_log(
+        self,
+        build_folder: str,
+        log_offset: int,
+        build_start: float,
+        source_file_list: list
+    ) -> None:
+        """
+        Add the compile and link steps that Ninja logged after log_offset.
+        Ninja logs times in milliseconds since the start of "ninja", which is
+        aligned to build_start (seconds relative to the profiler start).
+        """
+        log_path = os.path.join(build_folder, NINJA_LOG_FILE_NAME)
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                f.seek(log_offset)
+                lines = f.read().splitlines()
+        except OSError:
+            return
+
+        steps = []
+        for line in lines:
+            parts = line.split("\t")
+            if len(parts) < 4 or line.startswith("#"):
+                continue
+            try:
+                step_start = int(parts[0]) / 1000.0
+                step_end = int(parts[1]) / 1000.0
+            except ValueError:
+                continue
+            steps.append((step_start, step_end, parts[3]))
+
+        # assign overlapping steps to lanes, as parallel jobs
+        lane_end_times = []
+        for step_start, step_end, output in sorted(steps):
+            if output.endswith(OBJECT_EXTENSIONS):
+                kind = "compile"
+                source = SIL_BuildProfiler._match_source(
+                    output, source_file_list)
+            elif ".so" in os.path.basename(output) or output.endswith((".pyd", ".dylib")):
+                kind = "link"
+                source = ""
+            else:
+                continue
+
+            lane = 0
+            while lane < len(lane_end_times) and lane_end_times[lane] > step_start:
+                lane += 1
+            if lane == len(lane_end_times):
+                lane_end_times.append(step_end)
+            else:
+                lane_end_times[lane] = step_end
+
+            start = build_start + step_start
+            duration = step_end - step_start
+            name = os.path.basename(source) if source != "" else os.path.basename(output)
+
+            self.add_event(name, kind, start, duration, lane=lane + 1,
+                           args={"output": output, "source": source})
+            self.translation_units.append({
+                "object": output,
+                "source": source,
+                "kind": kind,
+                "start": start,
+                "duration": duration,
+            })
+
+    def read_time_traces(self, build_folder: str, since_wall_time: float) -> bool:
+        """
+        Sum the "Source" (header parse) times of the Clang -ftime-trace files
+        written during this build. Returns False if there are none.
+        """
+        trace_paths = [
+            p for p in glob.glob(os.path.join(build_folder, "CMakeFiles", "**", "*.json"),
+                                 recursive=True)
+            if os.path.getmtime(p) >= since_wall_time]
+
+        header_times = {}
+        header_units = {}
+        for trace_path in trace_paths:
+            try:
+                with open(trace_path, "r", encoding="utf-8") as f:
+                    trace_events = json.load(f).get("traceEvents", [])
+            except (OSError, ValueError, AttributeError):
+                continue
+
+            for event in trace_events:
+                if event.get("name") != "Source":
+                    continue
+                header = event.get("args", {}).get("detail", "")
+                if header == "":
+                    continue
+                header_times[header] = header_times.get(
+                    header, 0.0) + event.get("dur", 0) / 1e6
+                header_units.setdefault(header, set()).add(trace_path)
+
+        if not header_times:
+            return False
+
+        self.headers = [{
+            "header": header,
+            "duration": duration,
+            "translation_units": len(header_units[header]),
+            "method": "time-trace",
+        } for header, duration in header_times.items()]
+        self.headers.sort(key=lambda h: h["duration"], reverse=True)
+
+        return True
+
+    def estimate_header_costs(self, root_path: str, include_dirs: list) -> None:
+        """
+        Estimate the cost of each header as the total compile time of the
+        translation units that reach it (used without -ftime-trace).
+        """
+        from helper.SIL.SIL_include_graph import SIL_IncludeGraph
+
+        graph = SIL_IncludeGraph.for_root(root_path)
+
+        header_times = {}
+        header_units = {}
+        for unit in self.translation_units:
+            if unit["kind"] != "compile" or unit["source"] == "":
+                continue
+            for header in graph.collect_reachable_headers(unit["source"], include_dirs):
+                header_times[header] = header_times.get(
+                    header, 0.0) + unit["duration"]
+                header_units[header] = header_units.get(header, 0) + 1
+        graph.save()
+
+        self.headers = [{
+            "header": header,
+            "duration": duration,
+            "translation_units": header_units[header],
+            "method": "include-graph",
+        } for header, duration in header_times.items()]
+        self.headers.sort(key=lambda h: h["duration"], reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "module_file_name": self.module_file_name,
+            "start_time": self.start_wall_time,
+            "total": max([e["start"] + e["duration"] for e in self.events], default=0.0),
+            "phases": [e for e in self.events if e["category"] == "phase"],
+            "translation_units": self.translation_units,
+            "headers": self.headers,
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Return the profile in the Chrome trace event format.
+        Lane 0 holds the build phases, the other lanes the parallel compile jobs.
+        """
+        trace_events = [{
+            "name": "thread_name", "ph": "M", "pid": 1, "tid": 0,
+            "args": {"name": "SIL build phases"},
+        }]
+        for lane in sorted({e["lane"] for e in self.events if e["lane"] > 0}):
+            trace_events.append({
+                "name": "thread_name", "ph": "M", "pid": 1, "tid": lane,
+                "args": {"name": f"job {lane}"},
+            })
+
+        for event in self.events:
+            trace_events.append({
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": 1,
+                "tid": event["lane"],
+                "args": event["args"],
+            })
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms",
+                "otherData": {"module_file_name": self.module_file_name}}
+
+    @staticmethod
+    def _write_json(path: str, data: dict) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + f".tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def export(self, profile_dir: str) -> tuple:
+        """
+        Write "<module>.json" and "<module>.trace.json" to profile_dir.
+        Returns (json path, Chrome trace path).
+        """
+        json_path = os.path.join(profile_dir, f"{self.module_file_name}.json")
+        trace_path = os.path.join(
+            profile_dir, f"{self.module_file_name}.trace.json")
+
+        SIL_BuildProfiler._write_json(json_path, self.to_dict())
+        SIL_BuildProfiler._write_json(trace_path, self.to_chrome_trace())
+
+        return json_path, trace_path
+
+    def format_report(self, top_count: int = REPORT_TOP_COUNT) -> str:
+        return format_profile_report(self.to_dict(), top_count)
+
+
+def format_profile_report(profile: dict, top_count: int = REPORT_TOP_COUNT) -> str:
+    """
+    Format a profile dict (SIL_BuildProfiler.to_dict or a saved JSON profile)
+    as a text report.
+    """
+    lines = [f"SIL build profile of {profile['module_file_name']}: "
+             f"{profile['total']:.2f} s"]
+
+    # a phase may be entered more than once (e.g. discovery)
+    phase_durations = {}
+    for phase in profile["phases"]:
+        phase_durations[phase["name"]] = phase_durations.get(
+            phase["name"], 0.0) + phase["duration"]
+
+    lines.append("  Phases:")
+    for name, duration in phase_durations.items():
+        lines.append(f"    {name:<20} {duration:8.3f} s")
+
+    units = sorted(profile["translation_units"],
+                   key=lambda u: u["duration"], reverse=True)
+    if units:
+        lines.append(f"  Slowest translation units (top {top_count}):")
+        for unit in units[:top_count]:
+            name = unit["source"] or unit["object"]
+            lines.append(f"    {unit['duration']:8.3f} s  {unit['kind']:<7}  {name}")
+    else:
+        lines.append("  No per translation unit times "
+                     "(available with the Ninja generator).")
+
+    headers = profile["headers"]
+    if headers:
+        if headers[0]["method"] == "time-trace":
+            lines.append(f"  Slowest headers, parse time (top {top_count}):")
+        else:
+            lines.append(f"  Costliest headers, total compile time of the "
+                         f"including translation units (top {top_count}):")
+        for header in headers[:top_count]:
+            lines.append(f"    {header['duration']:8.3f} s  "
+                         f"{header['translation_units']:3d} TU  {header['header']}")
+
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Print the report of a saved SIL build profile.")
+    parser.add_argument("profile", help="profile JSON file")
+    parser.add_argument("--top", type=int, default=REPORT_TOP_COUNT,
+                        help=f"number of entries per list (default: {REPORT_TOP_COUNT})")
+    args = parser.parse_args(argv)
+
+    with open(args.profile, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+
+    print(format_profile_report(profile, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+/********************************************************************************
+@file SIL_call_stats.hpp
+@brief Per-method call statistics of SIL modules, compiled in with the
+SIL_CALL_STATS definition.
+
+Built with build_SIL_code(compile_definitions=["SIL_CALL_STATS"]), every
+generated wrapper counts its calls and times its phases: the conversion of the
+arguments, the C++ method (compute) and the conversion of the result, each as
+the cumulative and the maximum time per call. The conversion helpers count the
+result arrays they allocate (no "out" array given) and the input arrays they
+copy (dtype or memory layout did not match). The module functions get_stats()
+and reset_stats() read and clear the counters.
+
+In the batched and streamed wrappers, the loop over the cases or time steps
+counts as compute, including the conversions from and to the array buffers
+and the callback of a streamed call.
+
+Without SIL_CALL_STATS, the macros expand to nothing and the wrappers compile
+exactly as before; get_stats() raises a RuntimeError and reset_stats() does
+nothing.
+
+The counters are updated with the GIL held (a wrapper records its call when it
+returns), so they need no lock.
+
+Example:
+  SIL_CALL_STATS_METHOD(add_stats, "add");
+
+  py::array_t<double> add(py::handle A_in, py::handle B_in, py::object out) {
+    SIL_CALL_STATS_TIMER(add_stats);
+    SampleMatrix::DenseMatrix_Type A;
+    SIL_NumpyConversion::dense_from_numpy<double, 3, 3>(A_in, A, "A");
+    ...
+    SIL_CALL_STATS_PHASE(COMPUTE);
+    auto result = sm.add(A, B);
+
+    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+    return SIL_NumpyConversion::dense_to_numpy<double, 3, 3>(result, out);
+  }
+********************************************************************************/
+#ifndef SIL_CALL_STATS_HPP_
+#define SIL_CALL_STATS_HPP_
+
+#include <Python.h>
+
+#include <vector>
+
+#ifdef SIL_CALL_STATS
+#include <chrono>
+#include <cstdint>
+#endif
+
+namespace SIL_CallStats {
+
+#ifdef SIL_CALL_STATS
+
+enum Phase { INPUT_CONVERSION, COMPUTE, OUTPUT_CONVERSION, PHASE_COUNT };
+
+using Clock = std::chrono::steady_clock;
+
+/* Cumulative and maximum time per call, in nanoseconds */
+struct Timing {
+  std::int64_t total;
+  std::int64_t max;
+
+  void add(std::int64_t time) {
+    total += time;
+    if (time > max) {
+      max = time;
+    }
+  }
+};
+
+class MethodStats;
+
+/* All MethodStats of the module, in definition order */
+inline std::vector<MethodStats *> &registry() {
+  static std::vector<MethodStats *> stats;
+  return stats;
+}
+
+/* Counters of one wrapper, defined once at namespace scope */
+class MethodStats {
+public:
+  explicit MethodStats(const char *name) : name(name) {
+    reset();
+    registry().push_back(this);
+  }
+
+  MethodStats(const MethodStats &) = delete;
+  MethodStats &operator=(const MethodStats &) = delete;
+
+  void reset() {
+    calls = 0;
+    output_allocations = 0;
+    input_copies = 0;
+    latency = Timing{0, 0};
+    for (int i = 0; i < PHASE_COUNT; ++i) {
+      phases[i] = Timing{0, 0};
+    }
+  }
+
+  const char *name;
+  std::uint64_t calls;
+  std::uint64_t output_allocations;
+  std::uint64_t input_copies;
+  Timing latency;
+  Timing phases[PHASE_COUNT];
+};
+
+/* Times one call of a wrapper, from its construction to its destruction */
+class CallTimer {
+public:
+  explicit CallTimer(MethodStats &stats)
+      : _stats(stats), _phase(INPUT_CONVERSION), _previous(current()) {
+    for (int i = 0; i < PHASE_COUNT; ++i) {
+      _phase_times[i] = 0;
+    }
+    _start = Clock::now();
+    _mark = _start;
+    current() = this;
+  }
+
+  CallTimer(const CallTimer &) = delete;
+  CallTimer &operator=(const CallTimer &) = delete;
+
+  ~CallTimer() {
+    const Clock::time_point now = Clock::now();
+    _phase_times[_phase] += nanoseconds(_mark, now);
+
+    _stats.calls += 1;
+    _stats.latency.add(nanoseconds(_start, now));
+    for (int i = 0; i < PHASE_COUNT; ++i) {
+      _stats.phases[i].add(_phase_times[i]);
+    }
+    current() = _previous;
+  }
+
+  /* The time until the next phase (or the end of the call) goes to phase.
+     GIL not required */
+  void enter(Phase phase) {
+    const Clock::time_point now = Clock::now();
+    _phase_times[_phase] += nanoseconds(_mark, now);
+    _mark = now;
+    _phase = phase;
+  }
+
+  MethodStats &stats() { return _stats; }
+
+  /* Innermost timed call of this thread, nullptr outside of the wrappers */
+  static CallTimer *&current() {
+    static thread_local CallTimer *timer = nullptr;
+    return timer;
+  }
+
+private:
+  static std::int64_t nanoseconds(const Clock::time_point &from,
+                                  const Clock::time_point &to) {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(to - from)
+        .count();
+  }
+
+  MethodStats &_stats;
+  Phase _phase;
+  CallTimer *_previous;
+  Clock::time_point _start;
+  Clock::time_point _mark;
+  std::int64_t _phase_times[PHASE_COUNT];
+};
+
+/* Called by the conversion helpers, with the GIL held */
+inline void count_output_allocation() {
+  if (CallTimer::current() != nullptr) {
+    CallTimer::current()->stats().output_allocations += 1;
+  }
+}
+
+inline void count_input_copy(bool copied) {
+  if (copied && (CallTimer::current() != nullptr)) {
+    CallTimer::current()->stats().input_copies += 1;
+  }
+}
+
+/* Python dict construction, nullptr with a Python exception set on error */
+inline bool set_item(PyObject *dict, const char *key, PyObject *value) {
+  if (value == nullptr) {
+    return false;
+  }
+  const int status = PyDict_SetItemString(dict, key, value);
+  Py_DECREF(value);
+  return status == 0;
+}
+
+inline PyObject *timing_to_dict(const Timing &timing) {
+  PyObject *dict = PyDict_New();
+  if (dict == nullptr) {
+    return nullptr;
+  }
+  if (!set_item(dict, "total",
+                PyFloat_FromDouble(static_cast<double>(timing.total) * 1e-9)) ||
+      !set_item(dict, "max",
+                PyFloat_FromDouble(static_cast<double>(timing.max) * 1e-9))) {
+    Py_DECREF(dict);
+    return nullptr;
+  }
+  return dict;
+}
+
+inline PyObject *method_stats_to_dict(const MethodStats &stats) {
+  PyObject *dict = PyDict_New();
+  if (dict == nullptr) {
+    return nullptr;
+  }
+  if (!set_item(dict, "calls", PyLong_FromUnsignedLongLong(stats.calls)) ||
+      !set_item(dict, "latency", timing_to_dict(stats.latency)) ||
+      !set_item(dict, "input_conversion",
+                timing_to_dict(stats.phases[INPUT_CONVERSION])) ||
+      !set_item(dict, "compute", timing_to_dict(stats.phases[COMPUTE])) ||
+      !set_item(dict, "output_conversion",
+                timing_to_dict(stats.phases[OUTPUT_CONVERSION])) ||
+      !set_item(dict, "output_allocations",
+                PyLong_FromUnsignedLongLong(stats.output_allocations)) ||
+      !set_item(dict, "input_copies",
+                PyLong_FromUnsignedLongLong(stats.input_copies))) {
+    Py_DECREF(dict);
+    return nullptr;
+  }
+  return dict;
+}
+
+#endif // SIL_CALL_STATS
+
+/* {function name: {"calls", "latency", "input_conversion", "compute",
+   "output_conversion", "output_allocations", "input_copies"}}, the times as
+   {"total", "max"} in seconds. New reference, or nullptr with a Python
+   exception set. */
+inline PyObject *get_stats() {
+#ifdef SIL_CALL_STATS
+  PyObject *dict = PyDict_New();
+  if (dict == nullptr) {
+    return nullptr;
+  }
+  const std::vector<MethodStats *> &stats = registry();
+  for (std::size_t i = 0; i < stats.size(); ++i) {
+    if (!set_item(dict, stats[i]->name, method_stats_to_dict(*stats[i]))) {
+      Py_DECREF(dict);
+      return nullptr;
+    }
+  }
+  return dict;
+#else
+  PyErr_SetString(PyExc_RuntimeError,
+                  "The module was built without call statistics, build it "
+                  "with compile_definitions=[\"SIL_CALL_STATS\"].");
+  return nullptr;
+#endif
+}
+
+inline void reset_stats() {
+#ifdef SIL_CALL_STATS
+  const std::vector<MethodStats *> &stats = registry();
+  for (std::size_t i = 0; i < stats.size(); ++i) {
+    stats[i]->reset();
+  }
+#endif
+}
+
+} // namespace SIL_CallStats
+
+/* Macros of the generated wrappers and the conversion helpers. Each is used
+   as a statement (or a declaration at namespace scope) ending with ";". */
+#ifdef SIL_CALL_STATS
+#define SIL_CALL_STATS_METHOD(variable, name)                                  \
+  SIL_CallStats::MethodStats variable(name)
+#define SIL_CALL_STATS_TIMER(stats)                                            \
+  SIL_CallStats::CallTimer SIL_call_timer(stats)
+#define SIL_CALL_STATS_PHASE(phase) SIL_call_timer.enter(SIL_CallStats::phase)
+#define SIL_CALL_STATS_COUNT_OUTPUT_ALLOCATION()                               \
+  SIL_CallStats::count_output_allocation()
+#define SIL_CALL_STATS_COUNT_INPUT_COPY(copied)                                \
+  SIL_CallStats::count_input_copy(copied)
+#else
+#define SIL_CALL_STATS_METHOD(variable, name) static_assert(true, "")
+#define SIL_CALL_STATS_TIMER(stats) ((void)0)
+#define SIL_CALL_STATS_PHASE(phase) ((void)0)
+#define SIL_CALL_STATS_COUNT_OUTPUT_ALLOCATION() ((void)0)
+#define SIL_CALL_STATS_COUNT_INPUT_COPY(copied) ((void)0)
+#endif
+
+#endif // SIL_CALL_STATS_HPP_
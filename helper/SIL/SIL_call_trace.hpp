@@ -0,0 +1,644 @@
+/********************************************************************************
+@file SIL_call_trace.hpp
+@brief Record and replay of the calls of SIL modules, recorded with the
+SIL_CALL_TRACE definition.
+
+Built with build_SIL_code(compile_definitions=["SIL_CALL_TRACE"]), the module
+level wrappers record their calls while a trace is open: start_trace(path) of
+the module opens the trace file, stop_trace() closes it and returns the number
+of recorded calls. A call is recorded after the conversion of its arguments,
+so the trace holds exactly the C++ values that the method received, and the
+C++ result it returned. initialize() calls are recorded as well. The class
+binding, batched and streamed variants are not recorded.
+
+The replay benchmark generated by ReplayCppGenerator (build_SIL_code with
+replay_benchmark=True) is a standalone executable that links the C++ class
+without Python. It decodes the trace, runs all calls in the recorded order on a
+new instance and compares their results with the recorded ones, then times the
+calls of each function (replay_main).
+
+Trace file (native byte order and element types, so a trace is replayed on the
+machine it was recorded on):
+  "SILTRC01"
+  records of  u8 kind, u32 function id, u32 size, size bytes
+    NAME_RECORD: the name of the function, before its first call
+    CALL_RECORD: the arguments in order, then the result, each as its values:
+                 scalars as the C++ type, dense matrices (M, N) row-major,
+                 diagonal matrices as the diagonal (M,), sparse matrices as
+                 the values in the order of the sparsity pattern (NNZ,)
+
+This header depends neither on pybind11 nor on the Python headers. The module
+functions start_trace and stop_trace are defined by SIL_numpy_conversion.hpp
+and SIL_capi_conversion.hpp. Without SIL_CALL_TRACE, the macros expand to
+nothing and start_trace raises a RuntimeError.
+
+The trace is written with the GIL held (the module level wrappers do not
+release it), so it needs no lock.
+
+Example:
+  SIL_CALL_TRACE_FUNCTION(add_trace, "add");
+
+  py::array_t<double> add(py::handle A_in, py::handle B_in, py::object out) {
+    SIL_CALL_TRACE_RECORD(add_trace);
+    ...
+    SIL_CALL_TRACE_VALUE(dense<double, 3, 3>(A));
+    SIL_CALL_TRACE_VALUE(diag<double, 3>(B));
+
+    auto result = sm.add(A, B);
+    SIL_CALL_TRACE_VALUE(dense<double, 3, 3>(result));
+    SIL_CALL_TRACE_COMMIT();
+    ...
+  }
+********************************************************************************/
+#ifndef SIL_CALL_TRACE_HPP_
+#define SIL_CALL_TRACE_HPP_
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstddef>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <limits>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "SIL_buffer_conversion.hpp"
+
+namespace SIL_CallTrace {
+
+using SIL_NumpyConversion::SparsePattern;
+
+constexpr char MAGIC[] = "SILTRC01";
+constexpr std::size_t MAGIC_SIZE = 8;
+/* u8 kind, u32 function id, u32 size */
+constexpr std::size_t RECORD_HEADER_SIZE = 9;
+
+enum RecordKind { NAME_RECORD = 0, CALL_RECORD = 1 };
+
+/* Values of one call, as written to the trace */
+class Encoder {
+public:
+  template <typename T> void scalar(const T &value) {
+    append(&value, sizeof(T));
+  }
+
+  template <typename T, std::size_t M, std::size_t N, typename Matrix_Type>
+  void dense(Matrix_Type &matrix) {
+    T values[M * N];
+    SIL_NumpyConversion::dense_to_buffer<M, N>(matrix, values);
+    append(values, sizeof(values));
+  }
+
+  template <typename T, std::size_t M, typename Matrix_Type>
+  void diag(Matrix_Type &matrix) {
+    T values[M];
+    SIL_NumpyConversion::diag_to_compact_buffer<M>(matrix, values);
+    append(values, sizeof(values));
+  }
+
+  template <typename T, typename Matrix_Type>
+  void sparse(Matrix_Type &matrix, const SparsePattern &pattern) {
+    std::vector<T> values(pattern.nnz());
+    SIL_NumpyConversion::sparse_to_compact_buffer(matrix, pattern,
+                                                  values.data());
+    append(values.data(), values.size() * sizeof(T));
+  }
+
+  const std::vector<char> &bytes() const { return _bytes; }
+
+private:
+  void append(const void *data, std::size_t size) {
+    const char *begin = static_cast<const char *>(data);
+    _bytes.insert(_bytes.end(), begin, begin + size);
+  }
+
+  std::vector<char> _bytes;
+};
+
+/* Reads the values of one call in the order they were encoded */
+class Decoder {
+public:
+  Decoder(const char *data, std::size_t size)
+      : _data(data), _size(size), _offset(0), _ok(true) {}
+
+  template <typename T> void scalar(T &value) { read(&value, sizeof(T)); }
+
+  template <typename T, std::size_t M, std::size_t N, typename Matrix_Type>
+  void dense(Matrix_Type &matrix) {
+    T values[M * N];
+    if (read(values, sizeof(values))) {
+      SIL_NumpyConversion::dense_from_buffer<M, N>(values, matrix);
+    }
+  }
+
+  template <typename T, std::size_t M, typename Matrix_Type>
+  void diag(Matrix_Type &matrix) {
+    T values[M];
+    if (read(values, sizeof(values))) {
+      SIL_NumpyConversion::diag_from_compact_buffer<M>(values, matrix);
+    }
+  }
+
+  template <typename T, typename Matrix_Type>
+  void sparse(Matrix_Type &matrix, const SparsePattern &pattern) {
+    std::vector<T> values(pattern.nnz());
+    if (read(values.data(), values.size() * sizeof(T))) {
+      SIL_NumpyConversion::sparse_from_buffer(values.data(), pattern, matrix);
+    }
+  }
+
+  /* The rest of the call: the encoded result */
+  void rest(std::vector<char> &bytes) {
+    bytes.assign(_data + _offset, _data + _size);
+    _offset = _size;
+  }
+
+  /* True if every value was read and the call has no bytes left */
+  bool finished() const { return _ok && (_offset == _size); }
+
+private:
+  bool read(void *destination, std::size_t size) {
+    if (!_ok || (size > _size - _offset)) {
+      _ok = false;
+      return false;
+    }
+    if (size > 0) {
+      std::memcpy(destination, _data + _offset, size);
+    }
+    _offset += size;
+    return true;
+  }
+
+  const char *_data;
+  std::size_t _size;
+  std::size_t _offset;
+  bool _ok;
+};
+
+/* A recorded function, defined once at namespace scope. It gets its id in a
+   trace with its first recorded call. */
+class Function {
+public:
+  explicit Function(const char *name) : name(name), id(0), trace(0) {}
+
+  Function(const Function &) = delete;
+  Function &operator=(const Function &) = delete;
+
+  const char *name;
+  std::uint32_t id;
+  /* number of the trace the id belongs to */
+  std::uint64_t trace;
+};
+
+/* The open trace file of the module */
+class Writer {
+public:
+  Writer()
+      : _file(nullptr), _trace(0), _next_id(0), _calls(0), _failed(false) {}
+
+  ~Writer() {
+    if (_file != nullptr) {
+      std::fclose(_file);
+    }
+  }
+
+  Writer(const Writer &) = delete;
+  Writer &operator=(const Writer &) = delete;
+
+  /* Closes the current trace and opens a new one */
+  void open(const std::string &path) {
+    close();
+    _file = std::fopen(path.c_str(), "wb");
+    if (_file == nullptr) {
+      throw std::runtime_error("Cannot open the trace file " + path + ".");
+    }
+    _path = path;
+    _trace += 1;
+    _next_id = 0;
+    _calls = 0;
+    _failed = false;
+    write(MAGIC, MAGIC_SIZE);
+  }
+
+  /* Returns the number of recorded calls, 0 if no trace is open */
+  std::uint64_t close() {
+    if (_file == nullptr) {
+      return 0;
+    }
+    const bool failed = (std::fclose(_file) != 0) || _failed;
+    _file = nullptr;
+    if (failed) {
+      throw std::runtime_error("Writing the trace file " + _path +
+                               " failed.");
+    }
+    return _calls;
+  }
+
+  bool is_open() const { return _file != nullptr; }
+
+  void write_call(Function &function, const std::vector<char> &payload) {
+    if (function.trace != _trace) {
+      function.id = _next_id++;
+      function.trace = _trace;
+      write_record(NAME_RECORD, function.id, function.name,
+                   std::strlen(function.name));
+    }
+    write_record(CALL_RECORD, function.id, payload.data(), payload.size());
+    _calls += 1;
+  }
+
+private:
+  void write(const void *data, std::size_t size) {
+    if ((size > 0) && (std::fwrite(data, 1, size, _file) != size)) {
+      _failed = true;
+    }
+  }
+
+  void write_record(RecordKind kind, std::uint32_t id, const void *data,
+                    std::size_t size) {
+    const unsigned char kind_byte = static_cast<unsigned char>(kind);
+    const std::uint32_t size_word = static_cast<std::uint32_t>(size);
+    write(&kind_byte, 1);
+    write(&id, sizeof(id));
+    write(&size_word, sizeof(size_word));
+    write(data, size);
+  }
+
+  std::FILE *_file;
+  std::string _path;
+  std::uint64_t _trace;
+  std::uint32_t _next_id;
+  std::uint64_t _calls;
+  bool _failed;
+};
+
+inline Writer &writer() {
+  static Writer trace_writer;
+  return trace_writer;
+}
+
+/* One call of a wrapper: its values are encoded only while a trace is open,
+   and written by commit() once the method has returned */
+class CallRecord {
+public:
+  explicit CallRecord(Function &function)
+      : _function(function), _active(writer().is_open()) {}
+
+  CallRecord(const CallRecord &) = delete;
+  CallRecord &operator=(const CallRecord &) = delete;
+
+  bool active() const { return _active; }
+
+  Encoder &encoder() { return _encoder; }
+
+  void commit() {
+    if (_active) {
+      writer().write_call(_function, _encoder.bytes());
+    }
+  }
+
+private:
+  Function &_function;
+  bool _active;
+  Encoder _encoder;
+};
+
+/* Module functions start_trace(path) and stop_trace() */
+inline void start_trace(const std::string &path) {
+#ifdef SIL_CALL_TRACE
+  writer().open(path);
+#else
+  (void)path;
+  throw std::runtime_error("The module was built without call tracing, build "
+                           "it with compile_definitions=[\"SIL_CALL_TRACE\"].");
+#endif
+}
+
+inline std::uint64_t stop_trace() { return writer().close(); }
+
+/* Replay benchmark */
+
+/* Keeps the compiler from removing a replayed call whose result is unused */
+template <typename T> inline void do_not_optimize(T &value) {
+#if defined(__GNUC__) || defined(__clang__)
+  asm volatile("" : : "g"(&value) : "memory");
+#else
+  static const void *volatile sink = nullptr;
+  sink = &value;
+#endif
+}
+
+/* Comparison of the replayed results with the recorded ones */
+class Check {
+public:
+  static constexpr std::size_t REPORTED_MISMATCHES = 10;
+
+  explicit Check(double tolerance)
+      : tolerance(tolerance), calls(0), mismatches(0), max_difference(0.0) {}
+
+  /* actual and expected hold values of type T */
+  template <typename T>
+  void compare(const char *name, std::size_t index,
+               const std::vector<char> &actual,
+               const std::vector<char> &expected) {
+    calls += 1;
+    if (actual.size() != expected.size()) {
+      mismatch(name, index,
+               "result of " + std::to_string(actual.size()) +
+                   " bytes, recorded " + std::to_string(expected.size()));
+      return;
+    }
+
+    double difference = 0.0;
+    std::size_t position = 0;
+    for (std::size_t i = 0; (i + 1) * sizeof(T) <= actual.size(); ++i) {
+      T actual_value;
+      T expected_value;
+      std::memcpy(&actual_value, actual.data() + i * sizeof(T), sizeof(T));
+      std::memcpy(&expected_value, expected.data() + i * sizeof(T),
+                  sizeof(T));
+      const double value_difference =
+          difference_of(static_cast<double>(actual_value),
+                        static_cast<double>(expected_value));
+      if (value_difference > difference) {
+        difference = value_difference;
+        position = i;
+      }
+    }
+
+    if (difference > max_difference) {
+      max_difference = difference;
+    }
+    if (difference > tolerance) {
+      char message[64];
+      std::snprintf(message, sizeof(message), "difference %g at value %zu",
+                    difference, position);
+      mismatch(name, index, message);
+    }
+  }
+
+  double tolerance;
+  std::size_t calls;
+  std::size_t mismatches;
+  double max_difference;
+
+private:
+  static double difference_of(double actual, double expected) {
+    if (std::isnan(actual) || std::isnan(expected)) {
+      return (std::isnan(actual) && std::isnan(expected))
+                 ? 0.0
+                 : std::numeric_limits<double>::infinity();
+    }
+    if (actual == expected) {
+      /* also equal infinities */
+      return 0.0;
+    }
+    return std::fabs(actual - expected);
+  }
+
+  void mismatch(const char *name, std::size_t index,
+                const std::string &message) {
+    mismatches += 1;
+    if (mismatches <= REPORTED_MISMATCHES) {
+      std::printf("mismatch: call %zu of %s: %s\n", index, name,
+                  message.c_str());
+    }
+  }
+};
+
+/* One function of the generated replay benchmark */
+struct ReplayFunction {
+  const char *name;
+  /* appends one call, false if the values do not match the signature */
+  bool (*decode)(Decoder &decoder);
+  /* runs a call of the function and compares its result */
+  void (*check)(std::size_t index, Check &check);
+  /* runs all calls of the function, nullptr if it is not timed */
+  void (*run)();
+};
+
+struct ReplayOptions {
+  std::string trace_path;
+  int repeat;
+  std::size_t min_calls;
+  double tolerance;
+};
+
+inline bool parse_replay_options(int argc, char **argv,
+                                 ReplayOptions &options) {
+  options.repeat = 15;
+  options.min_calls = 100000;
+  options.tolerance = 0.0;
+  for (int i = 1; i < argc; ++i) {
+    const std::string argument = argv[i];
+    if ((argument == "--repeat") && (i + 1 < argc)) {
+      options.repeat = std::atoi(argv[++i]);
+    } else if ((argument == "--min-calls") && (i + 1 < argc)) {
+      options.min_calls = std::strtoull(argv[++i], nullptr, 10);
+    } else if ((argument == "--tolerance") && (i + 1 < argc)) {
+      options.tolerance = std::atof(argv[++i]);
+    } else if (options.trace_path.empty() &&
+               (argument.compare(0, 2, "--") != 0)) {
+      options.trace_path = argument;
+    } else {
+      return false;
+    }
+  }
+  return !options.trace_path.empty() && (options.repeat > 0);
+}
+
+inline bool read_file(const std::string &path, std::vector<char> &data) {
+  std::FILE *file = std::fopen(path.c_str(), "rb");
+  if (file == nullptr) {
+    return false;
+  }
+  char buffer[1 << 16];
+  std::size_t size;
+  while ((size = std::fread(buffer, 1, sizeof(buffer), file)) > 0) {
+    data.insert(data.end(), buffer, buffer + size);
+  }
+  const bool ok = (std::ferror(file) == 0);
+  std::fclose(file);
+  return ok;
+}
+
+/* main() of the replay benchmark:
+     <benchmark> TRACE [--repeat N] [--min-calls N] [--tolerance X]
+   Decodes the trace, runs its calls in the recorded order after initialize()
+   and compares the results (absolute difference up to the tolerance, exact by
+   default), then times each function: initialize(), one warm-up pass, and
+   repeat passes over its calls, each repeated up to min-calls calls.
+   Returns 0, 1 on mismatches, or 2 if the trace cannot be replayed. */
+inline int replay_main(int argc, char **argv, const char *module_name,
+                       const ReplayFunction *functions,
+                       std::size_t function_count, void (*initialize)()) {
+  ReplayOptions options;
+  if (!parse_replay_options(argc, argv, options)) {
+    std::fprintf(stderr,
+                 "usage: %s TRACE [--repeat N] [--min-calls N] "
+                 "[--tolerance X]\n",
+                 argv[0]);
+    return 2;
+  }
+
+  std::vector<char> data;
+  if (!read_file(options.trace_path, data)) {
+    std::fprintf(stderr, "Cannot read the trace file %s.\n",
+                 options.trace_path.c_str());
+    return 2;
+  }
+  if ((data.size() < MAGIC_SIZE) ||
+      (std::memcmp(data.data(), MAGIC, MAGIC_SIZE) != 0)) {
+    std::fprintf(stderr, "%s is not a SIL call trace.\n",
+                 options.trace_path.c_str());
+    return 2;
+  }
+
+  /* decode: function ids of the trace to functions of the benchmark */
+  std::vector<std::size_t> function_of_id;
+  std::vector<std::size_t> call_counts(function_count, 0);
+  std::vector<std::pair<std::size_t, std::size_t>> order;
+  std::size_t offset = MAGIC_SIZE;
+  while (offset < data.size()) {
+    if (data.size() - offset < RECORD_HEADER_SIZE) {
+      std::fprintf(stderr, "The trace file is truncated.\n");
+      return 2;
+    }
+    unsigned char kind;
+    std::uint32_t id;
+    std::uint32_t size;
+    std::memcpy(&kind, data.data() + offset, 1);
+    std::memcpy(&id, data.data() + offset + 1, sizeof(id));
+    std::memcpy(&size, data.data() + offset + 5, sizeof(size));
+    offset += RECORD_HEADER_SIZE;
+    if (size > data.size() - offset) {
+      std::fprintf(stderr, "The trace file is truncated.\n");
+      return 2;
+    }
+    const char *payload = data.data() + offset;
+    offset += size;
+
+    if (kind == NAME_RECORD) {
+      const std::string name(payload, size);
+      std::size_t function = 0;
+      while ((function < function_count) &&
+             (name != functions[function].name)) {
+        ++function;
+      }
+      if (function == function_count) {
+        std::fprintf(stderr,
+                     "The trace calls %s, which %s does not have. Build the "
+                     "replay benchmark of the recorded module.\n",
+                     name.c_str(), module_name);
+        return 2;
+      }
+      if (function_of_id.size() <= id) {
+        function_of_id.resize(id + 1, function_count);
+      }
+      function_of_id[id] = function;
+    } else if (kind == CALL_RECORD) {
+      if ((id >= function_of_id.size()) ||
+          (function_of_id[id] == function_count)) {
+        std::fprintf(stderr, "The trace calls an unnamed function %u.\n",
+                     static_cast<unsigned>(id));
+        return 2;
+      }
+      const std::size_t function = function_of_id[id];
+      Decoder decoder(payload, size);
+      if (!functions[function].decode(decoder)) {
+        std::fprintf(stderr,
+                     "Call %zu of %s in the trace does not match its "
+                     "signature in %s.\n",
+                     call_counts[function], functions[function].name,
+                     module_name);
+        return 2;
+      }
+      order.push_back(std::make_pair(function, call_counts[function]));
+      call_counts[function] += 1;
+    } else {
+      std::fprintf(stderr, "Unknown record kind %u in the trace.\n",
+                   static_cast<unsigned>(kind));
+      return 2;
+    }
+  }
+  std::printf("%s: %zu calls in %s\n", module_name, order.size(),
+              options.trace_path.c_str());
+
+  /* check: the calls in the recorded order, on a new instance */
+  Check check(options.tolerance);
+  initialize();
+  for (std::size_t i = 0; i < order.size(); ++i) {
+    functions[order[i].first].check(order[i].second, check);
+  }
+  std::printf("check: %zu results, %zu mismatches (tolerance %g), max "
+              "difference %g\n",
+              check.calls, check.mismatches, check.tolerance,
+              check.max_difference);
+
+  /* timing: ns per call of each function, median and minimum of the passes */
+  typedef std::chrono::steady_clock Clock;
+  std::printf("%-24s %10s %16s %13s\n", "function", "calls",
+              "median [ns/call]", "min [ns/call]");
+  for (std::size_t function = 0; function < function_count; ++function) {
+    const std::size_t count = call_counts[function];
+    if ((functions[function].run == nullptr) || (count == 0)) {
+      continue;
+    }
+    const std::size_t rounds =
+        std::max<std::size_t>(1, (options.min_calls + count - 1) / count);
+
+    initialize();
+    functions[function].run();
+
+    std::vector<double> times;
+    for (int pass = 0; pass < options.repeat; ++pass) {
+      const Clock::time_point start = Clock::now();
+      for (std::size_t round = 0; round < rounds; ++round) {
+        functions[function].run();
+      }
+      const Clock::time_point stop = Clock::now();
+      times.push_back(
+          static_cast<double>(
+              std::chrono::duration_cast<std::chrono::nanoseconds>(stop -
+                                                                   start)
+                  .count()) /
+          static_cast<double>(rounds * count));
+    }
+    std::sort(times.begin(), times.end());
+    std::printf("%-24s %10zu %16.1f %13.1f\n", functions[function].name,
+                count, times[times.size() / 2], times.front());
+  }
+
+  return (check.mismatches == 0) ? 0 : 1;
+}
+
+} // namespace SIL_CallTrace
+
+/* Macros of the generated module level wrappers. Each is used as a statement
+   (or a declaration at namespace scope) ending with ";". SIL_CALL_TRACE_VALUE
+   takes an Encoder call, e.g. SIL_CALL_TRACE_VALUE(dense<double, 3, 3>(A)). */
+#ifdef SIL_CALL_TRACE
+#define SIL_CALL_TRACE_FUNCTION(variable, name)                                \
+  SIL_CallTrace::Function variable(name)
+#define SIL_CALL_TRACE_RECORD(function)                                        \
+  SIL_CallTrace::CallRecord SIL_call_record(function)
+#define SIL_CALL_TRACE_VALUE(...)                                              \
+  do {                                                                         \
+    if (SIL_call_record.active()) {                                            \
+      SIL_call_record.encoder().__VA_ARGS__;                                   \
+    }                                                                          \
+  } while (0)
+#define SIL_CALL_TRACE_COMMIT() SIL_call_record.commit()
+#else
+#define SIL_CALL_TRACE_FUNCTION(variable, name) static_assert(true, "")
+#define SIL_CALL_TRACE_RECORD(function) ((void)0)
+#define SIL_CALL_TRACE_VALUE(...) ((void)0)
+#define SIL_CALL_TRACE_COMMIT() ((void)0)
+#endif
+
+#endif // SIL_CALL_TRACE_HPP_
@@ -0,0 +1,548 @@
+/********************************************************************************
+@file SIL_capi_conversion.hpp
+@brief Conversion helpers between NumPy arrays and PythonNumpy matrix types
+for SIL wrappers written against the CPython C API ("capi" binding backend).
+
+The "capi" backend generates the SIL module without pybind11: every function is
+a METH_FASTCALL | METH_KEYWORDS function, which CPython calls with a plain
+argument vector, and the arrays are read and created with the NumPy C API.
+This removes the pybind11 argument dispatch and the py::array_t wrappers from
+each call, which dominate the latency of small operations.
+
+The helpers follow SIL_numpy_conversion.hpp: an input array that already has
+the target dtype and is C-contiguous is read in place, any other input is
+converted exactly once; diagonal matrices are accepted as (M, M) or (M,),
+sparse matrices as (M, N) or their values in pattern order (NNZ,); outputs are
+allocated once or taken from "out". The error messages are the same.
+(data, indices, indptr) tuples and scipy.sparse matrices are converted by the
+pybind11 backend only.
+
+Errors are reported the CPython way: the functions set a Python exception and
+return false (or nullptr), and the generated wrapper returns nullptr.
+C++ exceptions of the wrapped method are translated as pybind11 does
+(set_error_from_exception).
+
+Include this header first (it includes Python.h) and in one translation unit
+only, and call import_array() in the module initialization function.
+
+Built with SIL_CALL_STATS, the input copies and output allocations are counted
+for the calling wrapper, and get_stats / reset_stats are the module functions
+of SIL_call_stats.hpp. start_trace / stop_trace are the module functions of
+SIL_call_trace.hpp.
+
+Example:
+  PyObject *add(PyObject *, PyObject *const *args, Py_ssize_t nargs,
+                PyObject *kwnames) {
+    static const char *const names[] = {"A", "B", "out"};
+    PyObject *parsed[] = {nullptr, nullptr, Py_None};
+    if (!SIL_CApiConversion::parse_arguments("add", args, nargs, kwnames,
+                                             names, 3, 2, parsed)) {
+      return nullptr;
+    }
+    SampleMatrix::DenseMatrix_Type A;
+    if (!SIL_CApiConversion::dense_from_object<double, 3, 3>(parsed[0], A,
+                                                            "A")) {
+      return nullptr;
+    }
+    ...
+  }
+********************************************************************************/
+#ifndef SIL_CAPI_CONVERSION_HPP_
+#define SIL_CAPI_CONVERSION_HPP_
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#ifndef NPY_NO_DEPRECATED_API
+#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
+#endif
+#include <numpy/arrayobject.h>
+
+#include <cstddef>
+#include <exception>
+#include <limits>
+#include <new>
+#include <stdexcept>
+#include <string>
+#include <type_traits>
+
+#include "SIL_buffer_conversion.hpp"
+#include "SIL_call_stats.hpp"
+#include "SIL_call_trace.hpp"
+
+namespace SIL_CApiConversion {
+
+using SIL_NumpyConversion::SparsePattern;
+
+/* NumPy type number of a matrix element type */
+template <typename T> struct NumpyType;
+
+template <> struct NumpyType<double> {
+  static constexpr int value = NPY_DOUBLE;
+};
+
+template <> struct NumpyType<float> {
+  static constexpr int value = NPY_FLOAT;
+};
+
+/* Owned (strong) reference to a Python object */
+class Reference {
+public:
+  explicit Reference(PyObject *object = nullptr) : _object(object) {}
+
+  explicit Reference(PyArrayObject *array)
+      : _object(reinterpret_cast<PyObject *>(array)) {}
+
+  ~Reference() { Py_XDECREF(_object); }
+
+  Reference(const Reference &) = delete;
+  Reference &operator=(const Reference &) = delete;
+
+  PyObject *get() const { return _object; }
+
+  PyArrayObject *array() const {
+    return reinterpret_cast<PyArrayObject *>(_object);
+  }
+
+  PyObject *release() {
+    PyObject *object = _object;
+    _object = nullptr;
+    return object;
+  }
+
+  explicit operator bool() const { return _object != nullptr; }
+
+private:
+  PyObject *_object;
+};
+
+template <typename T> inline const T *data(const Reference &array) {
+  return static_cast<const T *>(PyArray_DATA(array.array()));
+}
+
+template <typename T> inline T *mutable_data(const Reference &array) {
+  return static_cast<T *>(PyArray_DATA(array.array()));
+}
+
+/* PyMethodDef entry of a METH_FASTCALL | METH_KEYWORDS function */
+inline PyCFunction fastcall(PyObject *(*function)(PyObject *,
+                                                  PyObject *const *,
+                                                  Py_ssize_t, PyObject *)) {
+  return reinterpret_cast<PyCFunction>(
+      reinterpret_cast<void (*)(void)>(function));
+}
+
+/* Arguments of a METH_FASTCALL | METH_KEYWORDS function.
+   parsed[i] receives the argument of names[i] (borrowed), and keeps its
+   initial value (nullptr or a default) when it is not given. The first
+   `required` arguments must be given. */
+inline bool parse_arguments(const char *function_name, PyObject *const *args,
+                            Py_ssize_t nargs, PyObject *kwnames,
+                            const char *const *names, std::size_t count,
+                            std::size_t required, PyObject **parsed) {
+  const std::size_t positional_count = static_cast<std::size_t>(nargs);
+  if (positional_count > count) {
+    PyErr_Format(PyExc_TypeError,
+                 "%s() takes at most %zu arguments (%zd given)", function_name,
+                 count, nargs);
+    return false;
+  }
+  for (std::size_t i = 0; i < positional_count; ++i) {
+    parsed[i] = args[i];
+  }
+
+  const Py_ssize_t keyword_count =
+      (kwnames == nullptr) ? 0 : PyTuple_GET_SIZE(kwnames);
+  for (Py_ssize_t k = 0; k < keyword_count; ++k) {
+    PyObject *keyword = PyTuple_GET_ITEM(kwnames, k);
+
+    std::size_t index = count;
+    for (std::size_t i = 0; i < count; ++i) {
+      if (PyUnicode_CompareWithASCIIString(keyword, names[i]) == 0) {
+        index = i;
+        break;
+      }
+    }
+    if (index == count) {
+      PyErr_Format(PyExc_TypeError,
+                   "%s() got an unexpected keyword argument '%U'",
+                   function_name, keyword);
+      return false;
+    }
+    if (index < positional_count) {
+      PyErr_Format(PyExc_TypeError,
+                   "%s() got multiple values for argument '%s'", function_name,
+                   names[index]);
+      return false;
+    }
+    parsed[index] = args[nargs + k];
+  }
+
+  for (std::size_t i = 0; i < required; ++i) {
+    if (parsed[i] == nullptr) {
+      PyErr_Format(PyExc_TypeError, "%s() missing required argument '%s'",
+                   function_name, names[i]);
+      return false;
+    }
+  }
+  return true;
+}
+
+/* Scalar conversion */
+template <typename T>
+inline typename std::enable_if<std::is_floating_point<T>::value, bool>::type
+scalar_from_object(PyObject *object, T &value) {
+  const double converted = PyFloat_AsDouble(object);
+  if ((converted == -1.0) && PyErr_Occurred()) {
+    return false;
+  }
+  value = static_cast<T>(converted);
+  return true;
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_integral<T>::value &&
+                                   !std::is_same<T, bool>::value,
+                               bool>::type
+scalar_from_object(PyObject *object, T &value) {
+  /* integers and objects with __index__ (e.g. NumPy integers), not floats */
+  Reference index(PyNumber_Index(object));
+  if (!index) {
+    return false;
+  }
+
+  int overflow = 0;
+  if (std::is_signed<T>::value) {
+    const long long converted =
+        PyLong_AsLongLongAndOverflow(index.get(), &overflow);
+    if ((converted == -1) && PyErr_Occurred()) {
+      return false;
+    }
+    if ((overflow != 0) ||
+        (converted < static_cast<long long>(std::numeric_limits<T>::min())) ||
+        (converted > static_cast<long long>(std::numeric_limits<T>::max()))) {
+      PyErr_SetString(PyExc_OverflowError, "integer argument out of range");
+      return false;
+    }
+    value = static_cast<T>(converted);
+  } else {
+    const unsigned long long converted =
+        PyLong_AsUnsignedLongLong(index.get());
+    if ((converted == static_cast<unsigned long long>(-1)) &&
+        PyErr_Occurred()) {
+      return false;
+    }
+    if (converted >
+        static_cast<unsigned long long>(std::numeric_limits<T>::max())) {
+      PyErr_SetString(PyExc_OverflowError, "integer argument out of range");
+      return false;
+    }
+    value = static_cast<T>(converted);
+  }
+  return true;
+}
+
+inline bool scalar_from_object(PyObject *object, bool &value) {
+  if (!PyBool_Check(object) && !PyArray_IsScalar(object, Bool)) {
+    PyErr_Format(PyExc_TypeError, "expected a bool, got %s",
+                 Py_TYPE(object)->tp_name);
+    return false;
+  }
+  value = (PyObject_IsTrue(object) == 1);
+  return true;
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_floating_point<T>::value,
+                               PyObject *>::type
+scalar_to_object(T value) {
+  return PyFloat_FromDouble(static_cast<double>(value));
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_integral<T>::value &&
+                                   !std::is_same<T, bool>::value,
+                               PyObject *>::type
+scalar_to_object(T value) {
+  if (std::is_signed<T>::value) {
+    return PyLong_FromLongLong(static_cast<long long>(value));
+  }
+  return PyLong_FromUnsignedLongLong(static_cast<unsigned long long>(value));
+}
+
+inline PyObject *scalar_to_object(bool value) {
+  return PyBool_FromLong(value ? 1 : 0);
+}
+
+/* Shape check */
+inline std::string shape_to_string(PyArrayObject *array) {
+  std::string text = "(";
+  for (int i = 0; i < PyArray_NDIM(array); ++i) {
+    if (i > 0) {
+      text += ", ";
+    }
+    text += std::to_string(PyArray_DIM(array, i));
+  }
+  text += ")";
+  return text;
+}
+
+inline bool check_shape_2d(PyArrayObject *array, std::size_t rows,
+                           std::size_t cols, const char *name) {
+  if ((PyArray_NDIM(array) != 2) ||
+      (static_cast<std::size_t>(PyArray_DIM(array, 0)) != rows) ||
+      (static_cast<std::size_t>(PyArray_DIM(array, 1)) != cols)) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) + " must have shape (" +
+                     std::to_string(rows) + ", " + std::to_string(cols) +
+                     "), got " + shape_to_string(array) + ".")
+                        .c_str());
+    return false;
+  }
+  return true;
+}
+
+inline bool check_shape_1d(PyArrayObject *array, std::size_t size,
+                           const char *name) {
+  if ((PyArray_NDIM(array) != 1) ||
+      (static_cast<std::size_t>(PyArray_DIM(array, 0)) != size)) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) + " must have shape (" +
+                     std::to_string(size) + ",), got " +
+                     shape_to_string(array) + ".")
+                        .c_str());
+    return false;
+  }
+  return true;
+}
+
+/* Input conversion */
+template <typename T>
+inline PyArrayObject *as_c_array(PyObject *object, const char *name) {
+  /* No copy when dtype and memory layout already match */
+  if (PyArray_Check(object)) {
+    PyArrayObject *array = reinterpret_cast<PyArrayObject *>(object);
+    if ((PyArray_TYPE(array) == NumpyType<T>::value) &&
+        PyArray_ISCARRAY_RO(array) && PyArray_ISNOTSWAPPED(array)) {
+      Py_INCREF(object);
+      return array;
+    }
+  }
+
+  PyObject *converted =
+      PyArray_FROMANY(object, NumpyType<T>::value, 0, 0,
+                      NPY_ARRAY_C_CONTIGUOUS | NPY_ARRAY_ALIGNED |
+                          NPY_ARRAY_FORCECAST);
+  if (converted == nullptr) {
+    PyErr_Clear();
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) +
+                     " cannot be converted to a numeric array.")
+                        .c_str());
+    return nullptr;
+  }
+  SIL_CALL_STATS_COUNT_INPUT_COPY(converted != object);
+  return reinterpret_cast<PyArrayObject *>(converted);
+}
+
+template <typename T, std::size_t M, std::size_t N, typename Matrix_Type>
+inline bool dense_from_object(PyObject *object, Matrix_Type &matrix,
+                              const char *name) {
+  Reference array(as_c_array<T>(object, name));
+  if (!array) {
+    return false;
+  }
+  /* a column vector (M, 1) can also be given as (M,), with the same layout */
+  if ((N == 1) && (PyArray_NDIM(array.array()) == 1)) {
+    if (!check_shape_1d(array.array(), M, name)) {
+      return false;
+    }
+  } else if (!check_shape_2d(array.array(), M, N, name)) {
+    return false;
+  }
+
+  SIL_NumpyConversion::dense_from_buffer<M, N>(data<T>(array), matrix);
+  return true;
+}
+
+template <typename T, std::size_t M, typename Matrix_Type>
+inline bool diag_from_object(PyObject *object, Matrix_Type &matrix,
+                             const char *name) {
+  Reference array(as_c_array<T>(object, name));
+  if (!array) {
+    return false;
+  }
+
+  /* compact: the diagonal only */
+  if (PyArray_NDIM(array.array()) == 1) {
+    if (!check_shape_1d(array.array(), M, name)) {
+      return false;
+    }
+    SIL_NumpyConversion::diag_from_compact_buffer<M>(data<T>(array), matrix);
+    return true;
+  }
+
+  if (!check_shape_2d(array.array(), M, M, name)) {
+    return false;
+  }
+  SIL_NumpyConversion::diag_from_buffer<M>(data<T>(array), matrix);
+  return true;
+}
+
+template <typename T, typename Matrix_Type>
+inline bool sparse_from_object(PyObject *object, const SparsePattern &pattern,
+                               Matrix_Type &matrix, const char *name) {
+  if (PyTuple_Check(object) || PyObject_HasAttrString(object, "tocsr")) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) +
+                     ": (data, indices, indptr) tuples and scipy.sparse "
+                     "matrices need the pybind11 binding backend. Pass the "
+                     "values (" +
+                     std::to_string(pattern.nnz()) + ",) or a dense array.")
+                        .c_str());
+    return false;
+  }
+
+  Reference array(as_c_array<T>(object, name));
+  if (!array) {
+    return false;
+  }
+
+  /* compact: the values in the CSR order of the pattern */
+  if (PyArray_NDIM(array.array()) == 1) {
+    if (!check_shape_1d(array.array(), pattern.nnz(), name)) {
+      return false;
+    }
+    SIL_NumpyConversion::sparse_from_buffer(data<T>(array), pattern, matrix);
+    return true;
+  }
+
+  if (!check_shape_2d(array.array(), pattern.rows, pattern.cols, name)) {
+    return false;
+  }
+  std::size_t row = 0;
+  std::size_t col = 0;
+  if (!SIL_NumpyConversion::dense_buffer_fits_pattern(data<T>(array), pattern,
+                                                      row, col)) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) + " has a nonzero at (" +
+                     std::to_string(row) + ", " + std::to_string(col) +
+                     ") outside the sparsity pattern.")
+                        .c_str());
+    return false;
+  }
+  SIL_NumpyConversion::sparse_from_dense_buffer(data<T>(array), pattern,
+                                                matrix);
+  return true;
+}
+
+/* Output conversion: a new (rows, cols) array, or "out" if it is given */
+template <typename T>
+inline PyArrayObject *prepare_output(PyObject *out, std::size_t rows,
+                                     std::size_t cols, const char *name) {
+  npy_intp shape[2] = {static_cast<npy_intp>(rows),
+                       static_cast<npy_intp>(cols)};
+
+  if (out == Py_None) {
+    SIL_CALL_STATS_COUNT_OUTPUT_ALLOCATION();
+    return reinterpret_cast<PyArrayObject *>(
+        PyArray_SimpleNew(2, shape, NumpyType<T>::value));
+  }
+
+  if (!PyArray_Check(out) ||
+      (PyArray_TYPE(reinterpret_cast<PyArrayObject *>(out)) !=
+       NumpyType<T>::value)) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) +
+                     " must be a NumPy array of the result dtype.")
+                        .c_str());
+    return nullptr;
+  }
+  PyArrayObject *array = reinterpret_cast<PyArrayObject *>(out);
+
+  if ((PyArray_NDIM(array) != 2) || (PyArray_DIM(array, 0) != shape[0]) ||
+      (PyArray_DIM(array, 1) != shape[1])) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) + " has shape " +
+                     shape_to_string(array) +
+                     ", which does not match the result.")
+                        .c_str());
+    return nullptr;
+  }
+  if (!PyArray_IS_C_CONTIGUOUS(array) || !PyArray_ISWRITEABLE(array)) {
+    PyErr_SetString(PyExc_RuntimeError,
+                    (std::string(name) +
+                     " must be a writeable C-contiguous array.")
+                        .c_str());
+    return nullptr;
+  }
+
+  Py_INCREF(out);
+  return array;
+}
+
+/* Module functions of the call statistics (METH_NOARGS) */
+inline PyObject *get_stats(PyObject *, PyObject *) {
+  return SIL_CallStats::get_stats();
+}
+
+inline PyObject *reset_stats(PyObject *, PyObject *) {
+  SIL_CallStats::reset_stats();
+  Py_RETURN_NONE;
+}
+
+/* Translate the C++ exception being handled into a Python exception, with the
+   exception types of pybind11. Call it from a catch (...) block. */
+inline PyObject *set_error_from_exception() {
+  try {
+    throw;
+  } catch (const std::bad_alloc &) {
+    PyErr_NoMemory();
+  } catch (const std::domain_error &error) {
+    PyErr_SetString(PyExc_ValueError, error.what());
+  } catch (const std::invalid_argument &error) {
+    PyErr_SetString(PyExc_ValueError, error.what());
+  } catch (const std::length_error &error) {
+    PyErr_SetString(PyExc_ValueError, error.what());
+  } catch (const std::out_of_range &error) {
+    PyErr_SetString(PyExc_IndexError, error.what());
+  } catch (const std::range_error &error) {
+    PyErr_SetString(PyExc_ValueError, error.what());
+  } catch (const std::overflow_error &error) {
+    PyErr_SetString(PyExc_OverflowError, error.what());
+  } catch (const std::exception &error) {
+    PyErr_SetString(PyExc_RuntimeError, error.what());
+  } catch (...) {
+    PyErr_SetString(PyExc_RuntimeError, "Caught an unknown exception!");
+  }
+  return nullptr;
+}
+
+/* Module functions of the call trace: start_trace (METH_O) and stop_trace
+   (METH_NOARGS) */
+inline PyObject *start_trace(PyObject *, PyObject *path) {
+  PyObject *path_bytes = nullptr;
+  if (!PyUnicode_FSConverter(path, &path_bytes)) {
+    return nullptr;
+  }
+  Reference path_reference(path_bytes);
+  try {
+    SIL_CallTrace::start_trace(std::string(PyBytes_AS_STRING(path_bytes),
+                                           PyBytes_GET_SIZE(path_bytes)));
+  } catch (...) {
+    return set_error_from_exception();
+  }
+  Py_RETURN_NONE;
+}
+
+inline PyObject *stop_trace(PyObject *, PyObject *) {
+  try {
+    return PyLong_FromUnsignedLongLong(SIL_CallTrace::stop_trace());
+  } catch (...) {
+    return set_error_from_exception();
+  }
+}
+
+} // namespace SIL_CApiConversion
+
+#endif // SIL_CAPI_CONVERSION_HPP_
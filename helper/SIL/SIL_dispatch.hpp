@@ -0,0 +1,329 @@
+/********************************************************************************
+@file SIL_dispatch.hpp
+@brief Shape-based dispatch between fixed-size specializations of a SIL module.
+
+A SIL module built with several specializations (e.g. MATRIX_SIZE 3 and 6, or
+FLOAT double and float, see SIL_Operator.build_SIL_code) holds one submodule
+per specialization with the complete bindings of that specialization
+("SampleMatrixSIL.MATRIX_SIZE_6.add"). Each specialization registers its
+functions in a Registry, together with the shapes and element types of their
+array arguments. The module level functions ("SampleMatrixSIL.add") then pick,
+at call time, the first specialization whose shapes and element types match the
+given NumPy arrays, so that they are used without a conversion. If there is
+none, the first specialization whose shapes match is called, and converts the
+arguments.
+
+The shape of an argument is matched as its conversion accepts it: a dense
+matrix as (M, N), a diagonal matrix as (M, M) or (M,), a sparse matrix as
+(M, N), (NNZ,), a (data, indices, indptr) tuple or a scipy.sparse matrix.
+Batched and streamed variants match the shapes after the leading dimension;
+a streamed ".npy" path is opened memory mapped to read its shape.
+
+Example:
+  void register_specialization(py::module_ m,
+                               SIL_Dispatch::Registry &registry) {
+    m.def("add", &add, py::arg("A"), py::arg("B"),
+          py::arg("out") = py::none());
+    registry.add("add", "MATRIX_SIZE_6",
+                 {SIL_Dispatch::dense_shape<double>("A", 0, 6, 6),
+                  SIL_Dispatch::diag_shape<double>("B", 1, 6)},
+                 false, m.attr("add"));
+  }
+********************************************************************************/
+#ifndef SIL_DISPATCH_HPP_
+#define SIL_DISPATCH_HPP_
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+#include <cstddef>
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "SIL_numpy_conversion.hpp"
+
+namespace SIL_Dispatch {
+
+namespace py = pybind11;
+
+enum class Kind { Dense, Diag, Sparse };
+
+/* Expected shape and element type of one array argument at a position of
+   the signature */
+struct ArgumentShape {
+  const char *name;
+  std::size_t position;
+  Kind kind;
+  std::size_t rows;
+  std::size_t cols;
+  std::size_t nnz;
+  py::dtype dtype;
+};
+
+template <typename T>
+inline ArgumentShape dense_shape(const char *name, std::size_t position,
+                                 std::size_t rows, std::size_t cols) {
+  return ArgumentShape{name, position, Kind::Dense,
+                       rows, cols,     0,           py::dtype::of<T>()};
+}
+
+template <typename T>
+inline ArgumentShape diag_shape(const char *name, std::size_t position,
+                                std::size_t size) {
+  return ArgumentShape{name, position, Kind::Diag,
+                       size, size,     0,          py::dtype::of<T>()};
+}
+
+template <typename T>
+inline ArgumentShape
+sparse_shape(const char *name, std::size_t position,
+             const SIL_NumpyConversion::SparsePattern &pattern) {
+  return ArgumentShape{name,         position,     Kind::Sparse,
+                       pattern.rows, pattern.cols, pattern.nnz(),
+                       py::dtype::of<T>()};
+}
+
+inline std::string shape_to_string(const ArgumentShape &shape) {
+  switch (shape.kind) {
+  case Kind::Dense:
+    return "(" + std::to_string(shape.rows) + ", " +
+           std::to_string(shape.cols) + ")";
+  case Kind::Diag:
+    return "(" + std::to_string(shape.rows) + ",)";
+  default:
+    return "(" + std::to_string(shape.rows) + ", " +
+           std::to_string(shape.cols) + ") sparse";
+  }
+}
+
+/* Shape of a given argument, as a list of sizes */
+inline std::vector<std::size_t> object_shape(const py::handle &object) {
+  py::object shape_object;
+  if (py::isinstance<py::array>(object)) {
+    py::array array = py::reinterpret_borrow<py::array>(object);
+    return std::vector<std::size_t>(array.shape(),
+                                    array.shape() + array.ndim());
+  }
+
+  if (py::isinstance<py::str>(object) || py::hasattr(object, "__fspath__")) {
+    shape_object = py::module_::import("numpy")
+                       .attr("load")(object, py::arg("mmap_mode") = "r")
+                       .attr("shape");
+  } else if (py::hasattr(object, "tocsr")) {
+    shape_object = object.attr("shape");
+  } else {
+    py::array array = py::array::ensure(object);
+    if (!array) {
+      return std::vector<std::size_t>();
+    }
+    return std::vector<std::size_t>(array.shape(),
+                                    array.shape() + array.ndim());
+  }
+
+  std::vector<std::size_t> shape;
+  for (py::handle size : shape_object) {
+    shape.push_back(size.cast<std::size_t>());
+  }
+  return shape;
+}
+
+/* True if shape (of ndim sizes) is (leading dimension, *expected) */
+template <typename Size_Type>
+inline bool trailing_shape_is(const Size_Type *shape, std::size_t ndim,
+                              std::size_t leading, std::size_t expected_ndim,
+                              std::size_t first, std::size_t second) {
+  if (ndim != leading + expected_ndim) {
+    return false;
+  }
+  if (static_cast<std::size_t>(shape[leading]) != first) {
+    return false;
+  }
+  return (expected_ndim == 1) ||
+         (static_cast<std::size_t>(shape[leading + 1]) == second);
+}
+
+template <typename Size_Type>
+inline bool sizes_match(const Size_Type *shape, std::size_t ndim,
+                        const ArgumentShape &expected, std::size_t leading) {
+  switch (expected.kind) {
+  case Kind::Dense:
+    /* column vectors can also be given as (rows,) */
+    return trailing_shape_is(shape, ndim, leading, 2, expected.rows,
+                             expected.cols) ||
+           ((expected.cols == 1) &&
+            trailing_shape_is(shape, ndim, leading, 1, expected.rows, 0));
+  case Kind::Diag:
+    return trailing_shape_is(shape, ndim, leading, 2, expected.rows,
+                             expected.rows) ||
+           trailing_shape_is(shape, ndim, leading, 1, expected.rows, 0);
+  default:
+    return trailing_shape_is(shape, ndim, leading, 2, expected.rows,
+                             expected.cols) ||
+           trailing_shape_is(shape, ndim, leading, 1, expected.nnz, 0);
+  }
+}
+
+/* With exact_dtype, only NumPy arrays of the expected element type match */
+inline bool shape_matches(const py::handle &object,
+                          const ArgumentShape &expected,
+                          bool leading_dimension, bool exact_dtype) {
+  const std::size_t leading = leading_dimension ? 1 : 0;
+
+  /* fast path: NumPy arrays */
+  if (py::isinstance<py::array>(object)) {
+    py::array array = py::reinterpret_borrow<py::array>(object);
+    if (exact_dtype && !array.dtype().equal(expected.dtype)) {
+      return false;
+    }
+    return sizes_match(array.shape(), static_cast<std::size_t>(array.ndim()),
+                       expected, leading);
+  }
+  if (exact_dtype) {
+    return false;
+  }
+
+  /* sparse (data, indices, indptr) */
+  if ((expected.kind == Kind::Sparse) && !leading_dimension &&
+      py::isinstance<py::tuple>(object) && (py::len(object) == 3)) {
+    py::tuple csr = py::reinterpret_borrow<py::tuple>(object);
+    const std::vector<std::size_t> indptr_shape = object_shape(csr[2]);
+    return trailing_shape_is(indptr_shape.data(), indptr_shape.size(), 0, 1,
+                             expected.rows + 1, 0);
+  }
+
+  const std::vector<std::size_t> shape = object_shape(object);
+  return sizes_match(shape.data(), shape.size(), expected, leading);
+}
+
+/* One specialization of a function */
+struct Entry {
+  std::string label;
+  std::vector<ArgumentShape> shapes;
+  bool leading_dimension;
+  py::object function;
+};
+
+/* Specializations of one function, in registration order */
+struct Table {
+  std::string name;
+  std::vector<Entry> entries;
+};
+
+inline bool entry_matches(const Entry &entry, const py::args &args,
+                          const py::kwargs &kwargs, bool exact_dtype) {
+  for (std::size_t i = 0; i < entry.shapes.size(); ++i) {
+    const ArgumentShape &expected = entry.shapes[i];
+
+    py::handle object;
+    if (expected.position < args.size()) {
+      object = args[expected.position];
+    } else if (kwargs.contains(expected.name)) {
+      object = kwargs[expected.name];
+    } else {
+      return false;
+    }
+
+    if (!shape_matches(object, expected, entry.leading_dimension,
+                       exact_dtype)) {
+      return false;
+    }
+  }
+  return true;
+}
+
+inline py::object dispatch(const Table &table, const py::args &args,
+                           const py::kwargs &kwargs) {
+  /* first without a conversion of the arrays, then with */
+  for (int pass = 0; pass < 2; ++pass) {
+    const bool exact_dtype = (pass == 0);
+    for (std::size_t i = 0; i < table.entries.size(); ++i) {
+      if (entry_matches(table.entries[i], args, kwargs, exact_dtype)) {
+        /* call with the given args and kwargs, without repacking them */
+        PyObject *result = PyObject_Call(table.entries[i].function.ptr(),
+                                         args.ptr(), kwargs.ptr());
+        if (result == nullptr) {
+          throw py::error_already_set();
+        }
+        return py::reinterpret_steal<py::object>(result);
+      }
+    }
+  }
+
+  std::string available;
+  for (std::size_t i = 0; i < table.entries.size(); ++i) {
+    const Entry &entry = table.entries[i];
+    available += (i == 0) ? "" : "; ";
+    available += entry.label + " (";
+    for (std::size_t j = 0; j < entry.shapes.size(); ++j) {
+      available += (j == 0) ? "" : ", ";
+      const py::handle dtype = entry.shapes[j].dtype;
+      available += std::string(entry.shapes[j].name) + " " +
+                   shape_to_string(entry.shapes[j]) + " " +
+                   py::str(dtype).cast<std::string>();
+    }
+    available += ")";
+  }
+  throw std::runtime_error(table.name +
+                           ": no specialization matches the argument "
+                           "shapes. Available: " +
+                           available + ".");
+}
+
+/* Collects the specializations during module initialization and defines the
+   dispatching module level functions */
+class Registry {
+public:
+  void add(const std::string &name, const std::string &label,
+           const std::vector<ArgumentShape> &shapes, bool leading_dimension,
+           const py::object &function) {
+    std::shared_ptr<Table> table;
+    for (std::size_t i = 0; i < _tables.size(); ++i) {
+      if (_tables[i]->name == name) {
+        table = _tables[i];
+      }
+    }
+    if (!table) {
+      table = std::make_shared<Table>();
+      table->name = name;
+      _tables.push_back(table);
+    }
+    table->entries.push_back(
+        Entry{label, shapes, leading_dimension, function});
+  }
+
+  void add_initializer(const py::object &function) {
+    _initializers.push_back(function);
+  }
+
+  void define(py::module_ &m) const {
+    std::vector<py::object> initializers = _initializers;
+    m.def(
+        "initialize",
+        [initializers]() {
+          for (std::size_t i = 0; i < initializers.size(); ++i) {
+            initializers[i]();
+          }
+        },
+        "Initialize all specializations");
+
+    for (std::size_t i = 0; i < _tables.size(); ++i) {
+      std::shared_ptr<Table> table = _tables[i];
+      m.def(
+          table->name.c_str(),
+          [table](py::args args, py::kwargs kwargs) {
+            return dispatch(*table, args, kwargs);
+          },
+          (table->name + " method, dispatched on the argument shapes").c_str());
+    }
+  }
+
+private:
+  std::vector<std::shared_ptr<Table>> _tables;
+  std::vector<py::object> _initializers;
+};
+
+} // namespace SIL_Dispatch
+
+#endif // SIL_DISPATCH_HPP_
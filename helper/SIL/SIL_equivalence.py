@@ -0,0 +1,577 @@
+"""
+File: SIL_equivalence.py
+
+Description: This file contains the SIL_EquivalenceHarness class, which checks a
+SIL module against the Python class it replaces and measures both.
+The harness builds the module with SIL_Operator, loads the Python class from
+the target Python file, and runs both on the same input sets:
+  - generated inputs (random arrays and scalars with the shapes and dtypes
+    of the method specs derived from the C++ header and Python annotations),
+  - or recorded inputs loaded from a ".npz" file (see save_input_sets).
+For every method it asserts that the outputs match within rtol/atol, and it
+measures per-call latency (p50/p99/mean), throughput and allocations per call
+(blocks and bytes traced by tracemalloc that are still alive after the call,
+e.g. result arrays).
+
+The results are written as JSON (default "<root>/build/SIL_equivalence/
+<module>.json"). Compared with a stored baseline, numerical drift and
+latency or allocation regressions are reported, so CI can fail on them.
+
+Example code to use the harness:
+```
+operator = SIL_Operator("sample_matrix.py", current_dir)
+harness = SIL_EquivalenceHarness(operator, build_options={"build_type": "Release"})
+results = harness.run()
+harness.save_results(results, "build/SIL_equivalence/SampleMatrixSIL.json")
+```
+
+Command line interface (run from the workspace root):
+```
+python -m helper.SIL.SIL_equivalence sample_matrix.py sample/matrix \
+    --build-type Release --baseline sample/matrix/SampleMatrixSIL_baseline.json
+python -m helper.SIL.SIL_equivalence sample_matrix.py sample/matrix \
+    --baseline sample/matrix/SampleMatrixSIL_baseline.json --update-baseline
+```
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import importlib
+import tracemalloc
+import importlib.util
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator, PythonAnalyzer, \
+    CppHeaderAnalyzer, PybindCppGenerator, BUILD_TYPE_FLAGS
+
+RESULT_FOLDER_NAME = os.path.join("build", "SIL_equivalence")
+RESULT_VERSION = 1
+
+DEFAULT_INPUT_COUNT = 8
+DEFAULT_CALL_COUNT = 2000
+DEFAULT_WARMUP_COUNT = 100
+DEFAULT_ALLOCATION_CALL_COUNT = 100
+DEFAULT_LATENCY_TOLERANCE = 0.25
+
+CPP_TO_NUMPY_DTYPES = {
+    "double": np.float64,
+    "float": np.float32,
+    "int": np.int32,
+    "long": np.int64,
+    "bool": np.bool_,
+}
+
+
+def save_input_sets(input_sets: dict, path: str) -> None:
+    """
+    Save input sets {method: [{arg: value}, ...]} to a ".npz" file.
+    """
+    arrays = {}
+    for method_name, kwargs_list in input_sets.items():
+        for index, kwargs in enumerate(kwargs_list):
+            for arg_name, value in kwargs.items():
+                arrays[f"{method_name}/{index}/{arg_name}"] = np.asarray(value)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path, **arrays)
+
+
+def load_input_sets(path: str) -> dict:
+    """
+    Load input sets saved by save_input_sets. 0-d arrays become Python scalars.
+    """
+    input_sets = {}
+    with np.load(path) as data:
+        for key in data.files:
+            method_name, index, arg_name = key.split("/")
+            value = data[key]
+            if value.ndim == 0:
+                value = value.item()
+
+            kwargs_list = input_sets.setdefault(method_name, [])
+            while len(kwargs_list) <= int(index):
+                kwargs_list.append({})
+            kwargs_list[int(index)][arg_name] = value
+
+    return input_sets
+
+
+def measure_latency(function, kwargs: dict, call_count: int, warmup_count: int) -> dict:
+    """
+    Return the per-call latency distribution of function(**kwargs) in ns.
+    """
+    for _ in range(warmup_count):
+        function(**kwargs)
+
+    elapsed = np.empty(call_count, dtype=np.int64)
+    for i in range(call_count):
+        start_time = time.perf_counter_ns()
+        function(**kwargs)
+        elapsed[i] = time.perf_counter_ns() - start_time
+
+    mean_ns = float(np.mean(elapsed))
+    return {
+        "p50_ns": float(np.percentile(elapsed, 50)),
+        "p99_ns": float(np.percentile(elapsed, 99)),
+        "mean_ns": mean_ns,
+        "throughput": 1e9 / mean_ns if mean_ns > 0 else 0.0,
+    }
+
+
+def measure_allocations(function, kwargs: dict, call_count: int) -> dict:
+    """
+    Return the blocks and bytes per call that tracemalloc traces as still
+    allocated after the calls, keeping the results alive.
+    """
+    results = [None] * call_count
+    trace_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(trace_filters)
+        for i in range(call_count):
+            results[i] = function(**kwargs)
+        after = tracemalloc.take_snapshot().filter_traces(trace_filters)
+    finally:
+        tracemalloc.stop()
+
+    blocks = 0
+    size = 0
+    for stat in after.compare_to(before, "filename"):
+        if stat.count_diff > 0:
+            blocks += stat.count_diff
+        if stat.size_diff > 0:
+            size += stat.size_diff
+
+    return {
+        "alloc_blocks_per_call": blocks / call_count,
+        "alloc_bytes_per_call": size / call_count,
+    }
+
+
+class SIL_EquivalenceHarness:
+    def __init__(
+        self,
+        operator: SIL_Operator,
+        python_class=None,
+        sil_module=None,
+        rtol: float = 1e-7,
+        atol: float = 1e-9,
+        seed: int = 0,
+        build_options: dict = None
+    ):
+        """
+        Args:
+            operator: SIL_Operator of the target Python file.
+            python_class: The Python reference class. Loaded from the target
+                Python file if None.
+            sil_module: The SIL module. Built with operator.build_SIL_code
+                (with build_options) and imported if None.
+            rtol, atol: Tolerances of the output comparison.
+            seed: Seed of the generated inputs.
+        """
+        self.operator = operator
+        self.rtol = rtol
+        self.atol = atol
+        self.seed = seed
+
+        self.python_file_path = SIL_Operator.find_file_path(
+            operator.target_python_file_name + ".py", operator.root_path)
+        self.classes = PythonAnalyzer.parse_file(self.python_file_path)
+        self.class_name = next(iter(self.classes))
+
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            self.python_file_path)
+        self.cpp_class = {'aliases': {}, 'constants': {}, 'methods': {}}
+        if cpp_header_name != "":
+            self.cpp_class = CppHeaderAnalyzer.parse_file(os.path.join(
+                os.path.dirname(self.python_file_path), cpp_header_name)).get(
+                    self.class_name, self.cpp_class)
+
+        self.method_specs = PybindCppGenerator.derive_method_specs(
+            self.python_file_path, self.classes)
+
+        if python_class is None:
+            python_class = self._load_python_class()
+        self.python_class = python_class
+
+        if sil_module is None:
+            operator.build_SIL_code(**(build_options or {}))
+            sil_module = self._import_sil_module()
+        self.sil_module = sil_module
+
+    def _load_python_class(self):
+        folder = os.path.dirname(self.python_file_path)
+        if folder not in sys.path:
+            sys.path.append(folder)
+
+        spec = importlib.util.spec_from_file_location(
+            self.operator.target_python_file_name, self.python_file_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        return getattr(module, self.class_name)
+
+    def _import_sil_module(self):
+        folder = os.path.abspath(self.operator.SIL_folder)
+        if folder not in sys.path:
+            sys.path.append(folder)
+
+        return importlib.import_module(self.operator.module_file_name)
+
+    def create_python_instance(self):
+        return self.python_class()
+
+    def create_sil_instance(self):
+        """
+        Return an independent instance of the SIL class binding, or the module
+        itself (after initialize) when the module has no class binding.
+        """
+        sil_class = getattr(self.sil_module, self.class_name, None)
+        if sil_class is not None:
+            return sil_class()
+
+        self.sil_module.initialize()
+        return self.sil_module
+
+    def _evaluate_cpp_expression(self, expression) -> int:
+        """
+        Evaluate a shape given as int or as a constant of the C++ class
+        (e.g. "SampleMatrix::MATRIX_SIZE").
+        """
+        if isinstance(expression, int):
+            return expression
+
+        name = str(expression).strip()
+        visited = set()
+        while True:
+            if re.fullmatch(r'\d+', name):
+                return int(name)
+            name = name.split("::")[-1]
+            if name in visited or name not in self.cpp_class['constants']:
+                raise ValueError(
+                    f"Cannot evaluate shape '{expression}'. Pass recorded input sets instead.")
+            visited.add(name)
+            name = self.cpp_class['constants'][name].strip()
+
+    def _resolve_dtype(self, dtype: str):
+        name = str(dtype).strip()
+        visited = set()
+        while name.split("::")[-1] in self.cpp_class['aliases'] and name not in visited:
+            visited.add(name)
+            name = self.cpp_class['aliases'][name.split("::")[-1]].strip()
+
+        return CPP_TO_NUMPY_DTYPES.get(name, np.float64)
+
+    def _generate_value(self, arg_spec: dict, rng: np.random.Generator):
+        kind = arg_spec['kind']
+        if kind == 'scalar':
+            cpp_type = self._resolve_dtype(arg_spec.get('cpp_type', 'double'))
+            if cpp_type == np.bool_:
+                return bool(rng.integers(0, 2))
+            if np.issubdtype(cpp_type, np.integer):
+                return int(rng.integers(1, 10))
+            return float(rng.standard_normal())
+
+        dtype = self._resolve_dtype(arg_spec.get('dtype', 'double'))
+        shape = [self._evaluate_cpp_expression(s) for s in arg_spec['shape']]
+        if kind == 'diag':
+            return np.diag(rng.standard_normal(shape[0])).astype(dtype)
+        if kind == 'sparse':
+            # dense, nonzero only at the available elements of the pattern
+            value = np.zeros(shape, dtype=dtype)
+            for row, columns in enumerate(arg_spec['pattern']):
+                value[row, list(columns)] = rng.standard_normal(len(columns))
+            return value
+
+        return rng.standard_normal(shape).astype(dtype)
+
+    def generate_input_sets(self, input_count: int = DEFAULT_INPUT_COUNT) -> dict:
+        """
+        Generate input sets {method: [{arg: value}, ...]} for every method
+        with a method spec.
+        """
+        rng = np.random.default_rng(self.seed)
+
+        input_sets = {}
+        for method_name, method_spec in self.method_specs.items():
+            input_sets[method_name] = [
+                {arg_spec['name']: self._generate_value(arg_spec, rng)
+                 for arg_spec in method_spec['args']}
+                for _ in range(input_count)]
+
+        return input_sets
+
+    def check_equivalence(self, input_sets: dict) -> dict:
+        """
+        Call the Python and the SIL method on every input set, in the same
+        order on fresh instances, and compare the outputs.
+        """
+        python_instance = self.create_python_instance()
+        sil_instance = self.create_sil_instance()
+
+        results = {}
+        for method_name, kwargs_list in input_sets.items():
+            max_abs_error = 0.0
+            max_rel_error = 0.0
+            failures = []
+
+            for index, kwargs in enumerate(kwargs_list):
+                expected = getattr(python_instance, method_name)(**kwargs)
+                actual = getattr(sil_instance, method_name)(**kwargs)
+
+                if expected is None or actual is None:
+                    if expected is not actual:
+                        failures.append(f"input {index}: one of the results is None")
+                    continue
+
+                expected = np.asarray(expected, dtype=np.float64)
+                actual = np.asarray(actual, dtype=np.float64)
+                if expected.shape != actual.shape:
+                    failures.append(
+                        f"input {index}: shape {actual.shape} != {expected.shape}")
+                    continue
+
+                abs_error = np.abs(actual - expected)
+                max_abs_error = max(max_abs_error, float(np.max(abs_error, initial=0.0)))
+                max_rel_error = max(max_rel_error, float(np.max(
+                    abs_error / np.maximum(np.abs(expected), np.finfo(np.float64).tiny),
+                    initial=0.0)))
+
+                if not np.allclose(actual, expected, rtol=self.rtol, atol=self.atol):
+                    failures.append(f"input {index}: outputs differ")
+
+            results[method_name] = {
+                "equivalent": not failures,
+                "input_count": len(kwargs_list),
+                "max_abs_error": max_abs_error,
+                "max_rel_error": max_rel_error,
+                "failures": failures,
+            }
+
+        return results
+
+    def measure_performance(
+        self,
+        input_sets: dict,
+        call_count: int = DEFAULT_CALL_COUNT,
+        warmup_count: int = DEFAULT_WARMUP_COUNT,
+        allocation_call_count: int = DEFAULT_ALLOCATION_CALL_COUNT
+    ) -> dict:
+        """
+        Measure latency, throughput and allocations of the Python and the SIL
+        method on the first input set of every method.
+        """
+        implementations = {
+            "python": self.create_python_instance(),
+            "sil": self.create_sil_instance(),
+        }
+
+        results = {}
+        for method_name, kwargs_list in input_sets.items():
+            if not kwargs_list:
+                continue
+            kwargs = kwargs_list[0]
+
+            results[method_name] = {}
+            for implementation_name, instance in implementations.items():
+                function = getattr(instance, method_name)
+                stats = measure_latency(function, kwargs, call_count, warmup_count)
+                stats.update(measure_allocations(
+                    function, kwargs, allocation_call_count))
+                results[method_name][implementation_name] = stats
+
+            results[method_name]["speedup_p50"] = \
+                results[method_name]["python"]["p50_ns"] / \
+                max(results[method_name]["sil"]["p50_ns"], 1.0)
+
+        return results
+
+    def run(
+        self,
+        input_sets: dict = None,
+        input_count: int = DEFAULT_INPUT_COUNT,
+        call_count: int = DEFAULT_CALL_COUNT
+    ) -> dict:
+        """
+        Check equivalence and measure performance. Returns the results dict
+        that save_results writes.
+        """
+        if input_sets is None:
+            input_sets = self.generate_input_sets(input_count)
+
+        equivalence = self.check_equivalence(input_sets)
+        performance = self.measure_performance(input_sets, call_count)
+
+        methods = {}
+        for method_name in input_sets:
+            methods[method_name] = dict(equivalence[method_name])
+            methods[method_name].update(performance.get(method_name, {}))
+
+        return {
+            "version": RESULT_VERSION,
+            "module_file_name": self.operator.module_file_name,
+            "class_name": self.class_name,
+            "timestamp": time.time(),
+            "machine": platform.machine(),
+            "python_version": platform.python_version(),
+            "rtol": self.rtol,
+            "atol": self.atol,
+            "methods": methods,
+        }
+
+    @staticmethod
+    def save_results(results: dict, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + f".tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        os.replace(tmp_path, path)
+
+
+def compare_with_baseline(
+    results: dict,
+    baseline: dict,
+    latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE
+) -> list:
+    """
+    Return a list of problems: methods that are not equivalent, numerical
+    drift (larger max abs error than the baseline by more than atol), and
+    SIL latency (p50/p99) or allocation regressions beyond the tolerance.
+    """
+    problems = []
+    atol = results.get("atol", 0.0)
+
+    for method_name, method in results["methods"].items():
+        if not method["equivalent"]:
+            problems.append(f"{method_name}: SIL output differs from Python "
+                            f"({'; '.join(method['failures'])})")
+
+        base = baseline.get("methods", {}).get(method_name)
+        if base is None:
+            continue
+
+        if method["max_abs_error"] > base["max_abs_error"] + atol:
+            problems.append(
+                f"{method_name}: numerical drift, max abs error "
+                f"{method['max_abs_error']:.3e} (baseline {base['max_abs_error']:.3e})")
+
+        if "sil" not in method or "sil" not in base:
+            continue
+        for key in ("p50_ns", "p99_ns"):
+            if method["sil"][key] > base["sil"][key] * (1.0 + latency_tolerance):
+                problems.append(
+                    f"{method_name}: SIL {key[:3]} latency {method['sil'][key]:.0f} ns "
+                    f"(baseline {base['sil'][key]:.0f} ns, tolerance {latency_tolerance:.0%})")
+        if method["sil"]["alloc_blocks_per_call"] > \
+                base["sil"]["alloc_blocks_per_call"] + 0.5:
+            problems.append(
+                f"{method_name}: SIL allocations {method['sil']['alloc_blocks_per_call']:.1f} "
+                f"blocks/call (baseline {base['sil']['alloc_blocks_per_call']:.1f})")
+
+    for method_name in baseline.get("methods", {}):
+        if method_name not in results["methods"]:
+            problems.append(f"{method_name}: missing from the results")
+
+    return problems
+
+
+def format_results(results: dict) -> str:
+    lines = [f"SIL equivalence of {results['module_file_name']} "
+             f"(rtol {results['rtol']:g}, atol {results['atol']:g}):",
+             f"  {'method':<20} {'equal':<5} {'max abs err':>11}  "
+             f"{'Python p50/p99 [ns]':>21}  {'SIL p50/p99 [ns]':>19}  "
+             f"{'speedup':>7}  {'SIL alloc/call':>14}"]
+
+    for method_name, method in results["methods"].items():
+        line = f"  {method_name:<20} {'yes' if method['equivalent'] else 'NO':<5} " \
+            f"{method['max_abs_error']:11.3e}"
+        if "sil" in method:
+            line += f"  {method['python']['p50_ns']:10.0f}/{method['python']['p99_ns']:<10.0f}" \
+                f"  {method['sil']['p50_ns']:9.0f}/{method['sil']['p99_ns']:<9.0f}" \
+                f"  x{method['speedup_p50']:6.2f}" \
+                f"  {method['sil']['alloc_blocks_per_call']:14.1f}"
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check a SIL module against its Python class and measure both.")
+    parser.add_argument("python_file_name", help="target Python file, e.g. sample_matrix.py")
+    parser.add_argument("SIL_folder", help="folder of the target Python file")
+    parser.add_argument("--build-type", default="Release", choices=list(BUILD_TYPE_FLAGS))
+    parser.add_argument("--pgo-training-script", default=None,
+                        help="training script of the PGO build type")
+    parser.add_argument("--inputs", type=int, default=DEFAULT_INPUT_COUNT,
+                        help="number of generated input sets per method")
+    parser.add_argument("--input-file", default=None,
+                        help="recorded input sets (.npz) instead of generated inputs")
+    parser.add_argument("--save-inputs", default=None,
+                        help="save the input sets used to this .npz file")
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALL_COUNT,
+                        help="number of timed calls per method")
+    parser.add_argument("--rtol", type=float, default=1e-7)
+    parser.add_argument("--atol", type=float, default=1e-9)
+    parser.add_argument("--output", default=None,
+                        help=f"result file (default: {RESULT_FOLDER_NAME}/<module>.json)")
+    parser.add_argument("--baseline", default=None, help="baseline result file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write the results to the baseline file")
+    parser.add_argument("--latency-tolerance", type=float,
+                        default=DEFAULT_LATENCY_TOLERANCE,
+                        help="allowed relative latency increase over the baseline")
+    args = parser.parse_args(argv)
+
+    operator = SIL_Operator(args.python_file_name, args.SIL_folder)
+    harness = SIL_EquivalenceHarness(
+        operator, rtol=args.rtol, atol=args.atol,
+        build_options={"build_type": args.build_type, "incremental": True,
+                       "pgo_training_script": args.pgo_training_script})
+
+    input_sets = None
+    if args.input_file is not None:
+        input_sets = load_input_sets(args.input_file)
+    else:
+        input_sets = harness.generate_input_sets(args.inputs)
+    if args.save_inputs is not None:
+        save_input_sets(input_sets, args.save_inputs)
+
+    results = harness.run(input_sets=input_sets, call_count=args.calls)
+    print(format_results(results))
+
+    output_path = args.output
+    if output_path is None:
+        output_path = os.path.join(
+            operator.root_path, RESULT_FOLDER_NAME, f"{operator.module_file_name}.json")
+    SIL_EquivalenceHarness.save_results(results, output_path)
+    print(f"Results written to {output_path}")
+
+    problems = [f"{name}: SIL output differs from Python"
+                for name, method in results["methods"].items() if not method["equivalent"]]
+
+    if args.baseline is not None:
+        if args.update_baseline:
+            SIL_EquivalenceHarness.save_results(results, args.baseline)
+            print(f"Baseline updated: {args.baseline}")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                problems = compare_with_baseline(
+                    results, json.load(f), args.latency_tolerance)
+        else:
+            print(f"Baseline {args.baseline} not found, use --update-baseline to create it.")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+File: SIL_include_graph.py
+
+Description: This file contains the SIL_IncludeGraph class, which scans the
+"#include" graph starting from a SIL C++ file and selects only the translation
+units and include directories that the SIL module actually depends on.
+
+A source file "foo.cpp" (or "foo.c") is compiled when a header with the same
+stem in the same directory ("foo.hpp", "foo.h") is reachable. The includes of
+selected sources are scanned as well, until no new header is found.
+Includes are resolved relative to the including file for "..." includes and
+then against the discovered include directories. Headers that cannot be
+resolved (standard library, pybind11) are ignored.
+
+The includes of each file are cached by file content hash in
+"<root_path>/build/SIL_include_graph.json". SIL_IncludeGraph.for_root returns
+an instance shared in-process, so a long running process (e.g. the SIL build
+daemon) keeps the graph in memory.
+
+Example code to use the include graph:
+```
+graph = SIL_IncludeGraph.for_root(root_path)
+source_files, include_dirs = graph.scope_sources(
+    sil_cpp_file_path, source_file_list, include_dirs)
+```
+"""
+import os
+import re
+import json
+import hashlib
+
+CACHE_FOLDER_NAME = "build"
+CACHE_FILE_NAME = "SIL_include_graph.json"
+CACHE_VERSION = 1
+
+INCLUDE_PATTERN = re.compile(
+    r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+HEADER_EXTENSIONS = ('.hpp', '.h')
+
+
+class SIL_IncludeGraph:
+    _instances = {}
+
+    def __init__(self, root_path: str, cache_file_path: str = None):
+        self.root_path = os.path.abspath(root_path)
+
+        if cache_file_path is None:
+            cache_file_path = os.path.join(
+                self.root_path, CACHE_FOLDER_NAME, CACHE_FILE_NAME)
+        self.cache_file_path = cache_file_path
+
+        # file path -> [mtime_ns, size, content hash]
+        self.file_hashes = {}
+        # content hash -> [[delimiter, include name], ...]
+        self.includes_by_hash = {}
+        self._dirty = False
+
+        self.load()
+
+    @classmethod
+    def for_root(cls, root_path: str) -> "SIL_IncludeGraph":
+        """
+        Return the shared include graph of root_path, loading it from disk on
+        first use.
+        """
+        root = os.path.abspath(root_path)
+        graph = cls._instances.get(root)
+        if graph is None:
+            graph = cls(root)
+            cls._instances[root] = graph
+
+        return graph
+
+    def load(self) -> None:
+        try:
+            with open(self.cache_file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") != CACHE_VERSION:
+            return
+
+        self.file_hashes = data.get("file_hashes", {})
+        self.includes_by_hash = data.get("includes_by_hash", {})
+
+    def save(self) -> None:
+        """
+        Write the cache to disk if it changed. Errors are ignored.
+        """
+        if not self._dirty:
+            return
+
+        data = {
+            "version": CACHE_VERSION,
+            "file_hashes": self.file_hashes,
+            "includes_by_hash": self.includes_by_hash,
+        }
+        tmp_path = self.cache_file_path + f".tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_file_path)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def get_includes(self, file_path: str) -> list:
+        """
+        Return the [delimiter, include name] pairs of a file.
+        The file is only read when its mtime or size changed, and only parsed
+        when its content hash is unknown.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return []
+
+        cached = self.file_hashes.get(file_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            content_hash = cached[2]
+            if content_hash in self.includes_by_hash:
+                return self.includes_by_hash[content_hash]
+
+        with open(file_path, "rb") as f:
+            content = f.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        self.file_hashes[file_path] = [
+            st.st_mtime_ns, st.st_size, content_hash]
+        self._dirty = True
+
+        if content_hash not in self.includes_by_hash:
+            text = content.decode("utf-8", errors="replace")
+            self.includes_by_hash[content_hash] = [
+                [m.group(1), m.group(2)] for m in INCLUDE_PATTERN.finditer(text)]
+
+        return self.includes_by_hash[content_hash]
+
+    @staticmethod
+    def resolve_include(
+        delimiter: str,
+        include_name: str,
+        including_dir: str,
+        include_dirs: list
+    ) -> tuple:
+        """
+        Resolve an include. Returns (header path, include dir used), where the
+        include dir is '' when the header was found relative to the including
+        file, or ('', '') when the header is not part of the workspace.
+        """
+        if delimiter == '"':
+            candidate = os.path.normpath(
+                os.path.join(including_dir, include_name))
+            if os.path.isfile(candidate):
+                return candidate, ""
+
+        for include_dir in include_dirs:
+            candidate = os.path.normpath(
+                os.path.join(include_dir, include_name))
+            if os.path.isfile(candidate):
+                return candidate, include_dir
+
+        return "", ""
+
+    def collect_reachable_headers(
+        self,
+        entry_file_path: str,
+        include_dirs: list
+    ) -> dict:
+        """
+        Return a dict mapping every workspace header reachable from
+        entry_file_path to the set of files that include it directly.
+        """
+        includers = {}
+        visited = set()
+        pending = [os.path.normpath(entry_file_path)]
+
+        while pending:
+            file_path = pending.pop()
+            if file_path in visited:
+                continue
+            visited.add(file_path)
+
+            including_dir = os.path.dirname(file_path)
+            for delimiter, include_name in self.get_includes(file_path):
+                header_path, _ = SIL_IncludeGraph.resolve_include(
+                    delimiter, include_name, including_dir, include_dirs)
+                if header_path == "":
+                    continue
+
+                includers.setdefault(header_path, set()).add(file_path)
+                pending.append(header_path)
+
+        return includers
+
+    def scope_sources(
+        self,
+        entry_file_path: str,
+        source_file_list: list,
+        include_dirs: list
+    ) -> tuple:
+        """
+        Select the sources and include directories reachable from entry_file_path.
+
+        Args:
+            entry_file_path: Absolute path of the SIL C++ file.
+            source_file_list: Candidate source files (absolute paths).
+            include_dirs: Candidate include directories (absolute paths),
+                in search order.
+
+        Returns:
+            (selected source files, used include dirs), both in the order of
+            the given candidate lists. The directory of the entry file is
+            always part of the used include dirs.
+        """
+        sources_by_stem = {}
+        for source_file in source_file_list:
+            stem = os.path.splitext(os.path.normpath(source_file))[0]
+            sources_by_stem.setdefault(stem, []).append(source_file)
+
+        entry_file_path = os.path.normpath(entry_file_path)
+        visited = set()
+        selected_sources = set()
+        used_include_dirs = {os.path.dirname(entry_file_path)}
+
+        pending = [entry_file_path]
+        while pending:
+            file_path = pending.pop()
+            if file_path in visited:
+                continue
+            visited.add(file_path)
+
+            including_dir = os.path.dirname(file_path)
+            for delimiter, include_name in self.get_includes(file_path):
+                header_path, include_dir = SIL_IncludeGraph.resolve_include(
+                    delimiter, include_name, including_dir, include_dirs)
+                if header_path == "":
+                    continue
+                if include_dir != "":
+                    used_include_dirs.add(os.path.normpath(include_dir))
+                if header_path in visited:
+                    continue
+
+                pending.append(header_path)
+
+                stem, ext = os.path.splitext(header_path)
+                if ext.lower() in HEADER_EXTENSIONS:
+                    for source_file in sources_by_stem.get(stem, []):
+                        if source_file not in selected_sources:
+                            selected_sources.add(source_file)
+                            pending.append(os.path.normpath(source_file))
+
+        self.save()
+
+        scoped_source_list = [
+            s for s in source_file_list if s in selected_sources]
+        scoped_include_dirs = [
+            d for d in include_dirs if os.path.normpath(d) in used_include_dirs]
+
+        return scoped_source_list, scoped_include_dirs
@@ -0,0 +1,239 @@
+"""
+File: SIL_loader.py
+
+Description: This file contains the lazy loader of SIL modules.
+load_SIL_module (also available as SIL_Operator.load) returns a proxy of the
+SIL module. Nothing is built or imported until an attribute of the module is
+first accessed. Then the built module is imported directly if the build state
+recorded by the last incremental build is still current, and the module is
+built (incrementally) first otherwise.
+
+The build state is current when the build options are the same and the
+modification time and size of every dependency file (SIL sources, headers in
+the include directories, CMakeLists.txt) and of the include directories are
+unchanged. This check only reads the build state file and stats the recorded
+files, so it neither rediscovers the workspace nor hashes file contents, and
+it does not import SIL_operator. New source directories outside the recorded
+include directories are not detected by this check; build_SIL_code picks
+them up.
+
+Each build type has its own build state. The state of a build type is only
+current while its module is the one installed in SIL_folder, so loading
+another build type installs that one (from its build folder, without a
+rebuild if its sources are unchanged).
+
+If the environment variable MCAP_SIL_NO_BUILD is set, the installed module is
+imported without any check, and build_SIL_code does not build either. The PGO
+build sets it for its training run.
+
+Example code to load a SIL module:
+```
+from helper.SIL.SIL_operator import SIL_Operator
+
+SampleMatrixSIL = SIL_Operator.load(
+    "sample_matrix.py", current_dir, build_type="Release")
+...
+C = SampleMatrixSIL.add(A, B)   # built (if needed) and imported here
+```
+"""
+import os
+import sys
+import glob
+import json
+import hashlib
+import importlib
+import threading
+
+BUILD_FOLDER_NAME = "build"
+BUILD_STATE_FILE_NAME = "SIL_build_state.json"
+NO_BUILD_ENV = "MCAP_SIL_NO_BUILD"
+
+# Defaults of SIL_Operator.build_SIL_code for the options that change the
+# built module. Keep in sync with build_SIL_code.
+BUILD_OPTION_DEFAULTS = {
+    "compile_definitions": None,
+    "build_type": "Debug",
+    "dependency_scoped": False,
+    "compiler_launcher": "auto",
+    "generator": "auto",
+    "linker": None,
+    "lto_mode": "full",
+    "precompiled_headers": None,
+    "unity_build_batch_size": None,
+    "profile": False,
+    "pgo_training_script": None,
+    "pgo_training_args": None,
+    "specializations": None,
+    "binding_backend": "pybind11",
+    "replay_benchmark": False,
+}
+
+
+def compute_build_options_key(build_options: dict) -> str:
+    """
+    Return a hash of the build options that change the built module.
+    Options that are not given take the defaults of build_SIL_code.
+    """
+    options = {}
+    for name, default in BUILD_OPTION_DEFAULTS.items():
+        value = build_options.get(name, default)
+        if isinstance(value, tuple):
+            value = list(value)
+        if name == "compile_definitions" and not value:
+            # no definitions, whether given as None or as an empty list
+            value = None
+        options[name] = value
+
+    return hashlib.sha256(
+        json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def collect_file_stamps(path_list: list) -> dict:
+    """
+    Return {path: [mtime_ns, size]} of files or directories.
+    Missing paths get None.
+    """
+    stamps = {}
+    for path in path_list:
+        try:
+            st = os.stat(path)
+            stamps[path] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            stamps[path] = None
+
+    return stamps
+
+
+def _get_module_file_name(python_file_name: str) -> str:
+    # same as SIL_Operator.module_file_name, without importing SIL_operator
+    name = os.path.splitext(python_file_name)[0]
+    return "".join(word.title() for word in name.split("_")) + "SIL"
+
+
+def find_module_path(SIL_folder: str, module_file_name: str) -> str:
+    candidates = glob.glob(os.path.join(SIL_folder, f"{module_file_name}.*so"))
+    if not candidates:
+        return ""
+
+    return max(candidates, key=os.path.getmtime)
+
+
+def read_build_state(SIL_folder: str, build_type: str) -> dict:
+    state_path = os.path.join(
+        SIL_folder, BUILD_FOLDER_NAME, build_type, BUILD_STATE_FILE_NAME)
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_build_state_current(SIL_folder: str, python_file_name: str, build_options: dict) -> bool:
+    """
+    Return True if the module in SIL_folder was built from the current files
+    with the same build options, judged by the recorded file stamps.
+    """
+    build_type = build_options.get(
+        "build_type", BUILD_OPTION_DEFAULTS["build_type"])
+    state = read_build_state(SIL_folder, build_type)
+
+    if state.get("python_file_name") != python_file_name or \
+            state.get("build_options_key") != compute_build_options_key(build_options):
+        return False
+
+    file_stamps = state.get("file_stamps")
+    if not file_stamps:
+        return False
+
+    module_path = find_module_path(SIL_folder, state.get("module_file_name", ""))
+    if module_path == "":
+        return False
+
+    # the installed module may be of another build type
+    if collect_file_stamps([module_path])[module_path] != state.get("module_stamp"):
+        return False
+
+    return collect_file_stamps(list(file_stamps)) == file_stamps
+
+
+class SIL_LazyModule:
+    """
+    Proxy of a SIL module that builds (if needed) and imports the module on
+    the first attribute access.
+    """
+
+    def __init__(self, python_file_name: str, SIL_folder: str, build_options: dict):
+        self._python_file_name = python_file_name
+        self._SIL_folder = os.path.abspath(SIL_folder)
+        self._build_options = build_options
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is not None:
+            return self._module
+
+        with self._lock:
+            if self._module is None:
+                self._module = load_SIL_module(
+                    self._python_file_name, self._SIL_folder, lazy=False,
+                    **self._build_options)
+
+        return self._module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self._module is None:
+            return f"<SIL lazy module for '{self._python_file_name}' (not loaded)>"
+        return repr(self._module)
+
+
+def load_SIL_module(
+    python_file_name: str,
+    SIL_folder: str,
+    lazy: bool = True,
+    **build_options
+):
+    """
+    Return the SIL module of python_file_name.
+
+    Args:
+        python_file_name: Target Python file name, e.g. "sample_matrix.py".
+        SIL_folder: Folder of the target Python file.
+        lazy: If True, return a SIL_LazyModule that loads the module on the
+            first attribute access. If False, load it now.
+        build_options: Keyword arguments of SIL_Operator.build_SIL_code, used
+            when the module has to be built. Builds are always incremental.
+    """
+    if lazy:
+        return SIL_LazyModule(python_file_name, SIL_folder, build_options)
+
+    SIL_folder = os.path.abspath(SIL_folder)
+    build_type = build_options.get(
+        "build_type", BUILD_OPTION_DEFAULTS["build_type"])
+
+    no_build = os.environ.get(NO_BUILD_ENV, "") != "" and \
+        find_module_path(SIL_folder, _get_module_file_name(python_file_name)) != ""
+
+    if not no_build and \
+            not is_build_state_current(SIL_folder, python_file_name, build_options):
+        from helper.SIL.SIL_operator import SIL_Operator
+
+        operator = SIL_Operator(python_file_name, SIL_folder)
+        operator.build_SIL_code(**dict(build_options, incremental=True))
+
+    module_file_name = read_build_state(
+        SIL_folder, build_type).get("module_file_name")
+    if not module_file_name:
+        # e.g. restored from the build cache without a build state
+        module_file_name = _get_module_file_name(python_file_name)
+
+    if SIL_folder not in sys.path:
+        sys.path.append(SIL_folder)
+
+    return importlib.import_module(module_file_name)
@@ -0,0 +1,420 @@
+/********************************************************************************
+@file SIL_numpy_conversion.hpp
+@brief Conversion helpers between NumPy arrays and PythonNumpy matrix types
+for SIL (pybind11) wrappers.
+
+Inputs are taken as py::handle. Shape, dtype and C-contiguity are checked once:
+an array that already has the target dtype and is C-contiguous is used in place
+without a copy, any other array is converted exactly once. The elements are then
+read through the raw data pointer, without per-element bounds checks.
+
+Structured operands can be passed in a compact form, chosen by the C++ type:
+a diagonal matrix (DiagMatrix_Type) as its 1-D diagonal (M,) instead of (M, M),
+and a sparse matrix (SparseMatrix_Type) as its values in the CSR order of its
+sparsity pattern (NNZ,), a (data, indices, indptr) CSR tuple, or a
+scipy.sparse matrix. Dense (M, N) arrays are accepted as well. The sparsity
+pattern of the C++ type is passed as a SparsePattern (generated from its
+SparseAvailable by the SIL code generator).
+
+Outputs are allocated once (or taken from a caller supplied "out" array) and
+written straight into the array buffer.
+
+Built with SIL_CALL_STATS, the input copies and output allocations are counted
+for the calling wrapper (see SIL_call_stats.hpp). start_trace / stop_trace
+control the call trace of SIL_CALL_TRACE (see SIL_call_trace.hpp).
+
+The "*_buffer" functions (SIL_buffer_conversion.hpp) work on raw element
+pointers and do not touch Python objects, so they can be used while the GIL is
+released, e.g. in batched wrappers that loop over arrays with a leading batch
+dimension.
+
+Example:
+  py::array_t<SampleMatrix::FLOAT> add(py::handle A_in, py::handle B_in,
+                                       py::object out) {
+    SampleMatrix::DenseMatrix_Type A;
+    SIL_NumpyConversion::dense_from_numpy<SampleMatrix::FLOAT, 3, 3>(A_in, A,
+                                                                     "A");
+    ...
+    auto result = sm.add(A, B);
+    return SIL_NumpyConversion::dense_to_numpy<SampleMatrix::FLOAT, 3, 3>(
+        result, out);
+  }
+********************************************************************************/
+#ifndef SIL_NUMPY_CONVERSION_HPP_
+#define SIL_NUMPY_CONVERSION_HPP_
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+#include <cstddef>
+#include <cstdint>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "SIL_buffer_conversion.hpp"
+#include "SIL_call_stats.hpp"
+#include "SIL_call_trace.hpp"
+
+namespace SIL_NumpyConversion {
+
+namespace py = pybind11;
+
+template <typename T>
+using CArray_Type = py::array_t<T, py::array::c_style | py::array::forcecast>;
+
+/* Shape check */
+inline std::string shape_to_string(const py::array &array) {
+  std::string text = "(";
+  for (py::ssize_t i = 0; i < array.ndim(); ++i) {
+    if (i > 0) {
+      text += ", ";
+    }
+    text += std::to_string(array.shape(i));
+  }
+  text += ")";
+  return text;
+}
+
+inline void check_shape_2d(const py::array &array, std::size_t rows,
+                           std::size_t cols, const char *name) {
+  if ((array.ndim() != 2) ||
+      (static_cast<std::size_t>(array.shape(0)) != rows) ||
+      (static_cast<std::size_t>(array.shape(1)) != cols)) {
+    throw std::runtime_error(std::string(name) + " must have shape (" +
+                             std::to_string(rows) + ", " +
+                             std::to_string(cols) + "), got " +
+                             shape_to_string(array) + ".");
+  }
+}
+
+inline void check_shape_1d(const py::array &array, std::size_t size,
+                           const char *name) {
+  if ((array.ndim() != 1) ||
+      (static_cast<std::size_t>(array.shape(0)) != size)) {
+    throw std::runtime_error(std::string(name) + " must have shape (" +
+                             std::to_string(size) + ",), got " +
+                             shape_to_string(array) + ".");
+  }
+}
+
+inline std::size_t check_batch_shape(const py::array &array, std::size_t rows,
+                                     std::size_t cols, const char *name) {
+  /* column vectors (N, M, 1) can also be given as (N, M) */
+  if ((cols == 1) && (array.ndim() == 2) &&
+      (static_cast<std::size_t>(array.shape(1)) == rows)) {
+    return static_cast<std::size_t>(array.shape(0));
+  }
+  if ((array.ndim() != 3) ||
+      (static_cast<std::size_t>(array.shape(1)) != rows) ||
+      (static_cast<std::size_t>(array.shape(2)) != cols)) {
+    throw std::runtime_error(std::string(name) + " must have shape (N, " +
+                             std::to_string(rows) + ", " +
+                             std::to_string(cols) + "), got " +
+                             shape_to_string(array) + ".");
+  }
+  return static_cast<std::size_t>(array.shape(0));
+}
+
+/* Diagonal batches are (N, M) compact or (N, M, M) dense */
+inline std::size_t check_diag_batch_shape(const py::array &array,
+                                          std::size_t size, const char *name,
+                                          bool &compact) {
+  compact = (array.ndim() == 2);
+  if (compact) {
+    if (static_cast<std::size_t>(array.shape(1)) != size) {
+      throw std::runtime_error(std::string(name) + " must have shape (N, " +
+                               std::to_string(size) + ") or (N, " +
+                               std::to_string(size) + ", " +
+                               std::to_string(size) + "), got " +
+                               shape_to_string(array) + ".");
+    }
+    return static_cast<std::size_t>(array.shape(0));
+  }
+  return check_batch_shape(array, size, size, name);
+}
+
+inline void check_batch_size(std::size_t expected, std::size_t actual,
+                             const char *name) {
+  if (expected != actual) {
+    throw std::runtime_error(std::string(name) + " has batch size " +
+                             std::to_string(actual) + ", expected " +
+                             std::to_string(expected) + ".");
+  }
+}
+
+/* Input conversion */
+template <typename T>
+inline CArray_Type<T> as_c_array(const py::handle &object, const char *name) {
+  /* No copy when dtype and memory layout already match */
+  CArray_Type<T> array = CArray_Type<T>::ensure(object);
+  if (!array) {
+    throw std::runtime_error(std::string(name) +
+                             " cannot be converted to a numeric array.");
+  }
+  SIL_CALL_STATS_COUNT_INPUT_COPY(array.ptr() != object.ptr());
+  return array;
+}
+
+template <typename T, std::size_t M, std::size_t N, typename Matrix_Type>
+inline void dense_from_numpy(const py::handle &object, Matrix_Type &matrix,
+                             const char *name) {
+  CArray_Type<T> array = as_c_array<T>(object, name);
+  /* a column vector (M, 1) can also be given as (M,), with the same layout */
+  if ((N == 1) && (array.ndim() == 1)) {
+    check_shape_1d(array, M, name);
+  } else {
+    check_shape_2d(array, M, N, name);
+  }
+
+  dense_from_buffer<M, N>(array.data(), matrix);
+}
+
+template <typename T, std::size_t M, typename Matrix_Type>
+inline void diag_from_numpy(const py::handle &object, Matrix_Type &matrix,
+                            const char *name) {
+  CArray_Type<T> array = as_c_array<T>(object, name);
+
+  /* compact: the diagonal only */
+  if (array.ndim() == 1) {
+    check_shape_1d(array, M, name);
+    diag_from_compact_buffer<M>(array.data(), matrix);
+    return;
+  }
+
+  check_shape_2d(array, M, M, name);
+  diag_from_buffer<M>(array.data(), matrix);
+}
+
+template <typename T, typename Matrix_Type>
+inline void sparse_from_csr(const py::handle &data_in,
+                            const py::handle &indices_in,
+                            const py::handle &indptr_in,
+                            const SparsePattern &pattern, Matrix_Type &matrix,
+                            const char *name) {
+  CArray_Type<T> data = as_c_array<T>(data_in, name);
+  CArray_Type<std::int64_t> indices =
+      as_c_array<std::int64_t>(indices_in, name);
+  CArray_Type<std::int64_t> indptr = as_c_array<std::int64_t>(indptr_in, name);
+
+  check_shape_1d(indptr, pattern.rows + 1, name);
+  const std::int64_t *indptr_data = indptr.data();
+  if ((indptr_data[0] != 0) || (data.ndim() != 1) || (indices.ndim() != 1) ||
+      (indptr_data[pattern.rows] > data.shape(0)) ||
+      (indptr_data[pattern.rows] > indices.shape(0))) {
+    throw std::runtime_error(std::string(name) +
+                             " is not a valid CSR matrix (data, indices, "
+                             "indptr).");
+  }
+  /* with indptr[0] == 0 and indptr[rows] within data and indices, every row
+     is within them too, checked before any value is read */
+  for (std::size_t i = 0; i < pattern.rows; ++i) {
+    if (indptr_data[i] > indptr_data[i + 1]) {
+      throw std::runtime_error(std::string(name) +
+                               " has a decreasing indptr.");
+    }
+  }
+
+  for (std::size_t k = 0; k < pattern.nnz(); ++k) {
+    matrix(k) = static_cast<T>(0);
+  }
+
+  const T *values = data.data();
+  const std::int64_t *columns = indices.data();
+  for (std::size_t i = 0; i < pattern.rows; ++i) {
+    for (std::int64_t p = indptr_data[i]; p < indptr_data[i + 1]; ++p) {
+      const std::int64_t column = columns[p];
+      if ((column < 0) || (static_cast<std::size_t>(column) >= pattern.cols)) {
+        throw std::runtime_error(std::string(name) + " has column index " +
+                                 std::to_string(column) + " out of range.");
+      }
+
+      const std::size_t k =
+          pattern.value_index(i, static_cast<std::size_t>(column));
+      if (k == pattern.nnz()) {
+        if (values[p] != static_cast<T>(0)) {
+          throw std::runtime_error(
+              std::string(name) + " has a nonzero at (" + std::to_string(i) +
+              ", " + std::to_string(column) +
+              ") outside the sparsity pattern.");
+        }
+        continue;
+      }
+      /* duplicate entries are summed, as in scipy.sparse */
+      matrix(k) += values[p];
+    }
+  }
+}
+
+template <typename T, typename Matrix_Type>
+inline void sparse_from_numpy(const py::handle &object,
+                              const SparsePattern &pattern,
+                              Matrix_Type &matrix, const char *name) {
+  /* scipy.sparse matrix or array */
+  if (py::hasattr(object, "tocsr")) {
+    py::object csr = object.attr("tocsr")();
+    py::tuple shape = csr.attr("shape");
+    if ((shape[0].cast<std::size_t>() != pattern.rows) ||
+        (shape[1].cast<std::size_t>() != pattern.cols)) {
+      throw std::runtime_error(std::string(name) + " must have shape (" +
+                               std::to_string(pattern.rows) + ", " +
+                               std::to_string(pattern.cols) + ").");
+    }
+    sparse_from_csr<T>(csr.attr("data"), csr.attr("indices"),
+                       csr.attr("indptr"), pattern, matrix, name);
+    return;
+  }
+
+  /* (data, indices, indptr) */
+  if (py::isinstance<py::tuple>(object) && (py::len(object) == 3)) {
+    py::tuple csr = py::reinterpret_borrow<py::tuple>(object);
+    sparse_from_csr<T>(csr[0], csr[1], csr[2], pattern, matrix, name);
+    return;
+  }
+
+  CArray_Type<T> array = as_c_array<T>(object, name);
+
+  /* compact: the values in the CSR order of the pattern */
+  if (array.ndim() == 1) {
+    check_shape_1d(array, pattern.nnz(), name);
+    sparse_from_buffer(array.data(), pattern, matrix);
+    return;
+  }
+
+  check_shape_2d(array, pattern.rows, pattern.cols, name);
+  const T *data = array.data();
+  std::size_t row = 0;
+  std::size_t col = 0;
+  if (!dense_buffer_fits_pattern(data, pattern, row, col)) {
+    throw std::runtime_error(std::string(name) + " has a nonzero at (" +
+                             std::to_string(row) + ", " + std::to_string(col) +
+                             ") outside the sparsity pattern.");
+  }
+  sparse_from_dense_buffer(data, pattern, matrix);
+}
+
+/* Output conversion */
+template <typename T>
+inline py::array_t<T> prepare_output_shape(const py::object &out,
+                                           const std::vector<py::ssize_t> &shape,
+                                           const char *name) {
+  if (out.is_none()) {
+    SIL_CALL_STATS_COUNT_OUTPUT_ALLOCATION();
+    return py::array_t<T>(shape);
+  }
+
+  if (!py::isinstance<py::array_t<T>>(out)) {
+    throw std::runtime_error(std::string(name) +
+                             " must be a NumPy array of the result dtype.");
+  }
+  py::array_t<T> array = py::reinterpret_borrow<py::array_t<T>>(out);
+
+  bool shape_matches = (static_cast<std::size_t>(array.ndim()) == shape.size());
+  for (std::size_t i = 0; shape_matches && (i < shape.size()); ++i) {
+    shape_matches = (array.shape(i) == shape[i]);
+  }
+  if (!shape_matches) {
+    throw std::runtime_error(std::string(name) + " has shape " +
+                             shape_to_string(array) +
+                             ", which does not match the result.");
+  }
+  if (!(array.flags() & py::array::c_style) || !array.writeable()) {
+    throw std::runtime_error(std::string(name) +
+                             " must be a writeable C-contiguous array.");
+  }
+  return array;
+}
+
+template <typename T, std::size_t M, std::size_t N>
+inline py::array_t<T> prepare_output(const py::object &out, const char *name) {
+  return prepare_output_shape<T>(
+      out, {static_cast<py::ssize_t>(M), static_cast<py::ssize_t>(N)}, name);
+}
+
+template <typename T, std::size_t M, std::size_t N>
+inline py::array_t<T> prepare_batch_output(const py::object &out,
+                                           std::size_t batch,
+                                           const char *name) {
+  return prepare_output_shape<T>(
+      out,
+      {static_cast<py::ssize_t>(batch), static_cast<py::ssize_t>(M),
+       static_cast<py::ssize_t>(N)},
+      name);
+}
+
+template <typename T>
+inline py::array_t<T> prepare_batch_output_scalar(const py::object &out,
+                                                  std::size_t batch,
+                                                  const char *name) {
+  return prepare_output_shape<T>(out, {static_cast<py::ssize_t>(batch)}, name);
+}
+
+template <typename T, std::size_t M, std::size_t N, typename Matrix_Type>
+inline py::array_t<T> dense_to_numpy(Matrix_Type &matrix,
+                                     const py::object &out = py::none()) {
+  py::array_t<T> output = prepare_output<T, M, N>(out, "out");
+
+  dense_to_buffer<M, N>(matrix, output.mutable_data());
+  return output;
+}
+
+template <typename T, std::size_t M, typename Matrix_Type>
+inline py::array_t<T> diag_to_numpy(Matrix_Type &matrix,
+                                    const py::object &out = py::none()) {
+  py::array_t<T> output = prepare_output<T, M, M>(out, "out");
+
+  diag_to_buffer<M>(matrix, output.mutable_data());
+  return output;
+}
+
+template <typename T, typename Matrix_Type>
+inline py::array_t<T> sparse_to_numpy(Matrix_Type &matrix,
+                                      const SparsePattern &pattern,
+                                      const py::object &out = py::none()) {
+  py::array_t<T> output = prepare_output_shape<T>(
+      out,
+      {static_cast<py::ssize_t>(pattern.rows),
+       static_cast<py::ssize_t>(pattern.cols)},
+      "out");
+
+  sparse_to_buffer(matrix, pattern, output.mutable_data());
+  return output;
+}
+
+/* Module functions get_stats() and reset_stats() of the call statistics
+   (see SIL_call_stats.hpp) */
+inline void define_stats_functions(py::module_ &m) {
+  m.def(
+      "get_stats",
+      []() {
+        PyObject *stats = SIL_CallStats::get_stats();
+        if (stats == nullptr) {
+          throw py::error_already_set();
+        }
+        return py::reinterpret_steal<py::dict>(stats);
+      },
+      "Call statistics of the module functions (built with SIL_CALL_STATS)");
+  m.def("reset_stats", &SIL_CallStats::reset_stats,
+        "Reset the call statistics");
+}
+
+/* Module functions start_trace(path) and stop_trace() of the call trace
+   (see SIL_call_trace.hpp) */
+inline void define_trace_functions(py::module_ &m) {
+  m.def(
+      "start_trace",
+      [](py::object path) {
+        SIL_CallTrace::start_trace(py::module_::import("os")
+                                       .attr("fsdecode")(path)
+                                       .cast<std::string>());
+      },
+      py::arg("path"),
+      "Record the calls of the module functions to a trace file (built with "
+      "SIL_CALL_TRACE)");
+  m.def("stop_trace", &SIL_CallTrace::stop_trace,
+        "Close the trace file and return the number of recorded calls");
+}
+
+} // namespace SIL_NumpyConversion
+
+#endif // SIL_NUMPY_CONVERSION_HPP_
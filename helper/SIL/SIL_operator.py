@@ -19,8 +19,60 @@ MyFuncSIL.initialize()
 ```
 """
 import os
+import sys
+import glob
+import json
+import time
+import shutil
+import contextlib
+import hashlib
 import subprocess
 import ast
+import re
+import math
+
+from helper.SIL.SIL_workspace_index import SIL_WorkspaceIndex
+from helper.SIL.SIL_loader import compute_build_options_key, \
+    collect_file_stamps, NO_BUILD_ENV
+from helper.SIL.SIL_toolchain import resolve_compiler_launcher, \
+    resolve_cmake_generator, check_linker, check_lto_mode, \
+    read_compiler_cache_stats, diff_compiler_cache_stats
+
+# Build types of build_SIL_code and their optimization flags.
+# Each build type is built in its own folder "<SIL_folder>/build/<build_type>".
+BUILD_TYPE_FLAGS = {
+    "Debug": "-g -O0",
+    "Release": "-O2",
+    "RelWithDebInfo": "-O2 -g",
+    "Native": "-O3 -march=native",
+    # two-stage profile-guided optimization, see SIL_Operator._run_pgo_build
+    "PGO": "-O2",
+}
+# Build types that are linked with LTO (lto_mode)
+LTO_BUILD_TYPES = ("Release", "Native", "PGO")
+# Profile data of the PGO build, in its build folder
+PGO_PROFILE_FOLDER_NAME = "pgo_profile"
+# Generated sources of the specializations, in "<SIL_folder>/build"
+SPECIALIZATION_FOLDER_NAME = "specializations"
+# Key of a specialization that compiles the module with SIMD_COMPILE_OPTIONS
+# (e.g. {"FLOAT": "float", "simd": True}). It must be set for all or none of
+# the specializations of a module, as their translation units share inline and
+# template code, of which the linker keeps one copy.
+SPECIALIZATION_SIMD_KEY = "simd"
+SIMD_COMPILE_OPTIONS = ["-O3", "-march=native"]
+# Binding backends of the SIL module: "pybind11", or "capi" for the CPython and
+# NumPy C APIs (see CApiCppGenerator), generated in "<SIL_folder>/build/capi"
+BINDING_BACKENDS = ("pybind11", "capi")
+
+
+def profile_phase(profiler, name: str):
+    """
+    Return a context manager that times a build phase with profiler
+    (see SIL_build_profile.py), or does nothing if profiler is None.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name)
 
 
 def snake_to_camel(snake_str: str) -> str:
@@ -31,7 +83,45 @@ def snake_to_camel(snake_str: str) -> str:
     return ''.join(x.title() for x in components)
 
 
+def hash_file_contents(
+    file_path_list: list,
+    extra_items: list = None,
+    relative_to: str = None
+) -> str:
+    """
+    Return a SHA-256 hex digest over the contents of the given files.
+    The file paths are part of the digest, so renaming or moving a file changes it.
+    When `relative_to` is given, paths are hashed relative to that directory.
+    Missing files are hashed by name only. `extra_items` are additional strings
+    (e.g. compile definitions or build type) folded into the digest.
+    """
+    hasher = hashlib.sha256()
+
+    for item in (extra_items or []):
+        hasher.update(str(item).encode("utf-8"))
+        hasher.update(b"\0")
+
+    for file_path in sorted(set(file_path_list)):
+        name = file_path
+        if relative_to is not None:
+            name = os.path.relpath(file_path, relative_to).replace('\\', '/')
+        hasher.update(name.encode("utf-8"))
+        hasher.update(b"\0")
+        if not os.path.isfile(file_path):
+            continue
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                hasher.update(chunk)
+        hasher.update(b"\0")
+
+    return hasher.hexdigest()
+
+
 class CmakeGenerator:
+    # Limits for automatic selection of precompiled headers
+    AUTO_PCH_MAX_HEADERS = 8
+    AUTO_PCH_LIBRARY_FOLDER = "external_libraries"
+
     def __init__(
         self,
         original_python_file_name: str,
@@ -40,7 +130,19 @@ class CmakeGenerator:
         pybind11_module_name: str,
         SIL_folder: str,
         root_path: str,
-        compile_definitions: list = None
+        compile_definitions: list = None,
+        dependency_scoped: bool = False,
+        compiler_launcher: str = None,
+        linker: str = None,
+        lto_mode: str = "full",
+        precompiled_headers=None,
+        unity_build_batch_size: int = None,
+        time_trace: bool = False,
+        profiler=None,
+        extra_source_files: list = None,
+        binding_backend: str = "pybind11",
+        compile_options: list = None,
+        replay_source_file: str = ""
     ):
         self.original_python_file_name = original_python_file_name
         self.pybind11_module_name = pybind11_module_name
@@ -56,6 +158,53 @@ class CmakeGenerator:
         # Optional list of compile-time definitions (e.g. ["__TEST__", "__DEBUG__"])
         self.compile_definitions = compile_definitions or []
 
+        # If True, compile only the sources reachable from the SIL C++ file
+        # through its #include graph (see SIL_include_graph.py).
+        self.dependency_scoped = dependency_scoped
+
+        # Compiler launcher such as ccache/sccache ("auto" to detect, None for none),
+        # linker for -fuse-ld (e.g. "lld", "mold"), and LTO mode of the
+        # optimized build types ("full", "thin" or "off").
+        self.compiler_launcher = resolve_compiler_launcher(compiler_launcher)
+        check_linker(linker)
+        self.linker = linker or ""
+        check_lto_mode(lto_mode)
+        self.lto_mode = lto_mode
+
+        # Precompiled headers: None (off), "auto" (MCAP library headers picked
+        # from the include graph), or a list of headers. Headers in a list are
+        # either "<name>" system style, or file names resolved against the
+        # include directories.
+        self.precompiled_headers = precompiled_headers
+        # Unity (jumbo) build: number of sources merged per unity file, None for off.
+        self.unity_build_batch_size = unity_build_batch_size
+
+        # If True, Clang writes per header compile times (-ftime-trace).
+        self.time_trace = time_trace
+        # Optional SIL_BuildProfiler that times discovery and CMake generation.
+        self.profiler = profiler
+
+        # Generated sources outside of the workspace discovery (e.g. the
+        # translation units of the specializations in the build folder),
+        # always compiled into the module.
+        self.extra_source_files = list(extra_source_files or [])
+
+        # "pybind11" builds the module with pybind11_add_module, "capi" with
+        # Python_add_library against the CPython and NumPy C APIs.
+        if binding_backend not in BINDING_BACKENDS:
+            raise ValueError(
+                f"binding_backend must be one of {list(BINDING_BACKENDS)}, got '{binding_backend}'")
+        self.binding_backend = binding_backend
+
+        # Compile options of all sources of the module, after those of the
+        # build type (e.g. SIMD_COMPILE_OPTIONS of SIMD specializations).
+        self.compile_options = list(compile_options or [])
+
+        # Generated C++ file of the replay benchmark (see ReplayCppGenerator),
+        # built as the executable "<module>_replay" from it and the class
+        # sources, without Python. Empty for none.
+        self.replay_source_file = replay_source_file or ""
+
     def _check_sample_dir_direct_under_root(self, python_file_dir: str) -> None:
         """
         Check whether the 'sample' folder contained in the specified python_file_dir
@@ -151,6 +300,7 @@ class CmakeGenerator:
         extensions in source_header_extensions, converts backslashes to forward slashes,
         uses '' for the root directory, and preserves discovery order while
         avoiding duplicates.
+        The directories are looked up in the shared SIL_WorkspaceIndex.
         """
         if source_header_extensions is None:
             source_header_extensions = {'.c', '.h', '.cpp', '.hpp'}
@@ -159,27 +309,19 @@ class CmakeGenerator:
 
         seen = set()
 
-        # Normalize root_path
-        root = os.path.abspath(root_path)
+        index = SIL_WorkspaceIndex.for_root(root_path)
 
         # include_dirs
-        for dirpath, dirnames, filenames in os.walk(root):
-            for fn in filenames:
-                _, ext = os.path.splitext(fn)
-                if ext.lower() in source_header_extensions:
-
-                    rel = os.path.relpath(dirpath, root)
-                    rel = rel.replace('\\', '/')
-                    if rel == '.':
-                        rel = ''
-
-                    rel = CmakeGenerator.check_path_is_sample(rel)
-                    rel = CmakeGenerator.check_path_is_build(rel)
-
-                    if (rel not in seen) and (rel != ""):
-                        seen.add(rel)
-                        include_dirs.append(rel)
-                    break
+        for dirpath, rel in index.iter_dirs():
+            if not index.files_in_dir(rel, source_header_extensions):
+                continue
+
+            rel = CmakeGenerator.check_path_is_sample(rel)
+            rel = CmakeGenerator.check_path_is_build(rel)
+
+            if (rel not in seen) and (rel != ""):
+                seen.add(rel)
+                include_dirs.append(rel)
 
         return include_dirs
 
@@ -195,31 +337,50 @@ class CmakeGenerator:
 
         source_file_list = []
 
-        # Normalize root_path
-        root = os.path.abspath(root_path)
-
-        for dirpath, dirnames, filenames in os.walk(root):
-            for fn in filenames:
-                _, ext = os.path.splitext(fn)
-                if ext.lower() in source_extensions:
+        index = SIL_WorkspaceIndex.for_root(root_path)
 
-                    original_rel = os.path.relpath(dirpath, root)
-                    original_rel = original_rel.replace('\\', '/')
+        for dirpath, original_rel in index.iter_dirs():
+            for fn in index.files_in_dir(original_rel, source_extensions):
 
-                    is_root = (original_rel == '.')
-                    rel = '' if is_root else original_rel
+                is_root = (original_rel == '')
+                rel = original_rel
 
-                    rel = CmakeGenerator.check_path_is_sample(rel)
-                    rel = CmakeGenerator.check_path_is_build(rel)
+                rel = CmakeGenerator.check_path_is_sample(rel)
+                rel = CmakeGenerator.check_path_is_build(rel)
 
-                    is_target = CmakeGenerator.check_SIL_cpp_file_name(
-                        fn, SIL_cpp_file_name)
+                is_target = CmakeGenerator.check_SIL_cpp_file_name(
+                    fn, SIL_cpp_file_name)
 
-                    if not (rel == "" and not is_root) and is_target:
-                        source_file_list.append(os.path.join(dirpath, fn))
+                if not (rel == "" and not is_root) and is_target:
+                    source_file_list.append(os.path.join(dirpath, fn))
 
         return source_file_list
 
+    @staticmethod
+    def discover_header_files(
+        root_path: str,
+        include_dirs: list,
+        header_extensions: set = None
+    ) -> list:
+        """
+        List the header files located directly in each of the given include
+        directories (paths relative to root_path, as returned by
+        discover_source_include_dirs). Returns absolute file paths.
+        """
+        if header_extensions is None:
+            header_extensions = {'.h', '.hpp'}
+
+        header_file_list = []
+        root = os.path.abspath(root_path)
+        index = SIL_WorkspaceIndex.for_root(root_path)
+
+        for d in include_dirs:
+            dir_path = os.path.join(root, d)
+            for fn in index.files_in_dir(d, header_extensions):
+                header_file_list.append(os.path.join(dir_path, fn))
+
+        return header_file_list
+
     @staticmethod
     def check_SIL_cpp_file_name(
         file_name: str,
@@ -237,15 +398,49 @@ class CmakeGenerator:
     def generate_cmake_lists_txt(self):
         """
         Generate a CMakeLists.txt file for building the pybind11 module.
+
+        The file is only rewritten when its content changes, so that CMake does
+        not re-run the configure step for an unchanged project.
+        Returns True when the file was (re)written.
         """
-        include_dirs = CmakeGenerator.discover_source_include_dirs(
-            self.root_path)
-        source_file_list = CmakeGenerator.discover_source_files(
-            root_path=self.root_path,
-            SIL_cpp_file_name=self.cpp_file_name)
+        with profile_phase(self.profiler, "discovery"):
+            include_dirs = CmakeGenerator.discover_source_include_dirs(
+                self.root_path)
+            source_file_list = CmakeGenerator.discover_source_files(
+                root_path=self.root_path,
+                SIL_cpp_file_name=self.cpp_file_name)
+
+            if self.dependency_scoped:
+                include_dirs, source_file_list = self.scope_to_dependencies(
+                    include_dirs, source_file_list)
+
+            source_file_list = source_file_list + [
+                f for f in self.extra_source_files if f not in source_file_list]
+
+        self.include_dirs = include_dirs
+        self.source_file_list = source_file_list
+
+        with profile_phase(self.profiler, "cmake_generation"):
+            return self._write_cmake_lists_txt(include_dirs, source_file_list)
+
+    def _write_cmake_lists_txt(
+        self,
+        include_dirs: list,
+        source_file_list: list
+    ) -> bool:
+        precompiled_headers = self.resolve_precompiled_headers(
+            include_dirs, source_file_list)
+        self.selected_precompiled_headers = precompiled_headers
 
         code_text = ""
-        code_text += "cmake_minimum_required(VERSION 3.14)\n"
+        if self.binding_backend == "capi":
+            # Python_add_library and Development.Module need CMake 3.18
+            code_text += "cmake_minimum_required(VERSION 3.18)\n"
+        elif precompiled_headers or self.unity_build_batch_size:
+            # target_precompile_headers and UNITY_BUILD need CMake 3.16
+            code_text += "cmake_minimum_required(VERSION 3.16)\n"
+        else:
+            code_text += "cmake_minimum_required(VERSION 3.14)\n"
         code_text += "cmake_policy(SET CMP0148 NEW)\n\n"
 
         code_text += f"project({self.pybind11_module_name})\n\n"
@@ -256,23 +451,79 @@ class CmakeGenerator:
         code_text += "if(NOT CMAKE_BUILD_TYPE)\n"
         code_text += "  set(CMAKE_BUILD_TYPE Debug CACHE STRING \"Build type\" FORCE)\n"
         code_text += "endif()\n\n"
-        code_text += "set(CMAKE_CXX_FLAGS_DEBUG \"-g -O0 "
-
-        for definition in self.compile_definitions:
-            code_text += f"-D{definition} "
-        code_text += "\")\n"
-
-        code_text += "set(CMAKE_CXX_FLAGS_RELEASE \"-O2 "
-
-        for definition in self.compile_definitions:
-            code_text += f"-D{definition} "
-        code_text += "\")\n"
-
-        code_text += "set(CMAKE_CXX_FLAGS_RELEASE \"${CMAKE_CXX_FLAGS_RELEASE} -flto=auto\")\n\n"
+        for build_type, flags in BUILD_TYPE_FLAGS.items():
+            code_text += f"set(CMAKE_CXX_FLAGS_{build_type.upper()} \"{flags} "
+
+            for definition in self.compile_definitions:
+                code_text += f"-D{definition} "
+            code_text += "\")\n"
+
+        if self.lto_mode == "full":
+            for build_type in LTO_BUILD_TYPES:
+                flags_name = f"CMAKE_CXX_FLAGS_{build_type.upper()}"
+                code_text += f"set({flags_name} \"${{{flags_name}}} -flto=auto\")\n"
+            code_text += "\n"
+        elif self.lto_mode == "thin":
+            code_text += "# ThinLTO on Clang; GCC has no ThinLTO but runs its LTRANS stage in parallel with -flto=auto\n"
+            code_text += "if(CMAKE_CXX_COMPILER_ID MATCHES \"Clang\")\n"
+            code_text += "  set(SIL_LTO_FLAG \"-flto=thin\")\n"
+            code_text += "else()\n"
+            code_text += "  set(SIL_LTO_FLAG \"-flto=auto\")\n"
+            code_text += "endif()\n"
+            for build_type in LTO_BUILD_TYPES:
+                flags_name = f"CMAKE_CXX_FLAGS_{build_type.upper()}"
+                code_text += f"set({flags_name} \"${{{flags_name}}} ${{SIL_LTO_FLAG}}\")\n"
+            code_text += "\n"
+        else:
+            code_text += "\n"
+
+        code_text += "# Two-stage profile-guided optimization (build type PGO): SIL_PGO_STAGE is\n"
+        code_text += "# \"generate\" for the instrumented build and \"use\" for the optimized build\n"
+        code_text += f"set(SIL_PGO_PROFILE_DIR \"${{CMAKE_BINARY_DIR}}/{PGO_PROFILE_FOLDER_NAME}\")\n"
+        code_text += "if(SIL_PGO_STAGE STREQUAL \"generate\")\n"
+        code_text += "  set(CMAKE_CXX_FLAGS_PGO \"${CMAKE_CXX_FLAGS_PGO} -fprofile-generate=${SIL_PGO_PROFILE_DIR}\")\n"
+        code_text += "elseif(SIL_PGO_STAGE STREQUAL \"use\")\n"
+        code_text += "  if(CMAKE_CXX_COMPILER_ID MATCHES \"Clang\")\n"
+        code_text += "    # Clang writes raw profiles, which llvm-profdata merges\n"
+        code_text += "    find_program(SIL_LLVM_PROFDATA NAMES llvm-profdata REQUIRED)\n"
+        code_text += "    file(GLOB SIL_PGO_RAW_PROFILES \"${SIL_PGO_PROFILE_DIR}/*.profraw\")\n"
+        code_text += "    execute_process(COMMAND ${SIL_LLVM_PROFDATA} merge\n"
+        code_text += "      -output=${SIL_PGO_PROFILE_DIR}/default.profdata ${SIL_PGO_RAW_PROFILES}\n"
+        code_text += "      RESULT_VARIABLE SIL_PGO_MERGE_RESULT)\n"
+        code_text += "    if(NOT SIL_PGO_MERGE_RESULT EQUAL 0)\n"
+        code_text += "      message(FATAL_ERROR \"llvm-profdata merge failed\")\n"
+        code_text += "    endif()\n"
+        code_text += "    set(CMAKE_CXX_FLAGS_PGO \"${CMAKE_CXX_FLAGS_PGO} -fprofile-use=${SIL_PGO_PROFILE_DIR}/default.profdata\")\n"
+        code_text += "  else()\n"
+        code_text += "    set(CMAKE_CXX_FLAGS_PGO \"${CMAKE_CXX_FLAGS_PGO} -fprofile-use=${SIL_PGO_PROFILE_DIR} -fprofile-correction -Wno-missing-profile\")\n"
+        code_text += "  endif()\n"
+        code_text += "endif()\n\n"
 
-        code_text += "find_package(pybind11 REQUIRED)\n\n"
+        if self.compiler_launcher != "":
+            launcher = self.compiler_launcher
+            if precompiled_headers and \
+                    os.path.basename(launcher).startswith("ccache"):
+                # ccache only caches compilations that use a PCH with this sloppiness
+                launcher = "${CMAKE_COMMAND};-E;env;" + \
+                    "CCACHE_SLOPPINESS=pch_defines,time_macros,include_file_mtime,include_file_ctime;" + \
+                    launcher
+            code_text += f"set(CMAKE_C_COMPILER_LAUNCHER \"{launcher}\")\n"
+            code_text += f"set(CMAKE_CXX_COMPILER_LAUNCHER \"{launcher}\")\n\n"
+
+        if self.binding_backend == "capi":
+            code_text += "# Extension module on the CPython and NumPy C APIs\n"
+            code_text += "# (Python_EXECUTABLE is the running Python, see SIL_Operator._configure_cmake)\n"
+            code_text += "find_package(Python REQUIRED COMPONENTS Interpreter Development.Module NumPy)\n\n"
+
+            code_text += f"Python_add_library({self.pybind11_module_name} MODULE WITH_SOABI\n"
+        else:
+            code_text += "find_package(pybind11 REQUIRED)\n\n"
 
-        code_text += f"pybind11_add_module({self.pybind11_module_name} \n"
+            code_text += f"pybind11_add_module({self.pybind11_module_name} \n"
+            if self.lto_mode == "thin":
+                code_text += "    THIN_LTO\n"
+            elif self.lto_mode == "off":
+                code_text += "    NO_EXTRAS\n"
         code_text += f"    {self.python_file_dir}/{self.cpp_file_name}\n"
 
         for source_file in source_file_list:
@@ -281,25 +532,208 @@ class CmakeGenerator:
 
         code_text += ")\n\n"
 
+        if self.binding_backend == "capi":
+            code_text += f"target_link_libraries({self.pybind11_module_name} PRIVATE Python::NumPy)\n"
+            code_text += f"set_target_properties({self.pybind11_module_name} PROPERTIES CXX_VISIBILITY_PRESET hidden)\n\n"
+
         code_text += "# Treat warnings as errors only in Release builds to avoid blocking development\n"
         code_text += f"if(CMAKE_BUILD_TYPE STREQUAL \"Release\")\n"
         code_text += f"  target_compile_options({self.pybind11_module_name} PRIVATE -Werror)\n"
         code_text += "endif()\n\n"
 
-        code_text += f"target_include_directories({self.pybind11_module_name} PRIVATE\n"
-
+        if self.time_trace:
+            code_text += "# Per header compile times for SIL build profiling\n"
+            code_text += "if(CMAKE_CXX_COMPILER_ID MATCHES \"Clang\")\n"
+            code_text += f"  target_compile_options({self.pybind11_module_name} PRIVATE -ftime-trace)\n"
+            code_text += "endif()\n\n"
+
+        if self.linker != "":
+            code_text += f"target_link_options({self.pybind11_module_name} PRIVATE -fuse-ld={self.linker})\n\n"
+
+        if precompiled_headers:
+            code_text += f"target_precompile_headers({self.pybind11_module_name} PRIVATE\n"
+            for header in precompiled_headers:
+                if header.startswith("<"):
+                    code_text += f"    {header}\n"
+                else:
+                    code_text += f"    \"{header}\"\n"
+            code_text += ")\n\n"
+
+        if self.unity_build_batch_size:
+            code_text += f"set_target_properties({self.pybind11_module_name} PROPERTIES\n"
+            code_text += "    UNITY_BUILD ON\n"
+            code_text += f"    UNITY_BUILD_BATCH_SIZE {int(self.unity_build_batch_size)}\n"
+            code_text += ")\n\n"
+
+        if self.compile_options:
+            code_text += f"target_compile_options({self.pybind11_module_name} PRIVATE {' '.join(self.compile_options)})\n\n"
+
+        include_dirs_text = ""
         for d in include_dirs:
             if d != "":
                 # absolute_dir
                 path = os.path.abspath(os.path.join(self.root_path, d))
 
-                code_text += "    " + path + "\n"
+                include_dirs_text += "    " + path + "\n"
 
+        code_text += f"target_include_directories({self.pybind11_module_name} PRIVATE\n"
+        code_text += include_dirs_text
         code_text += ")\n\n"
 
-        with open(os.path.join(self.SIL_folder, "CMakeLists.txt"), "w", encoding="utf-8") as f:
+        if self.replay_source_file != "":
+            replay_target = self.pybind11_module_name + ReplayCppGenerator.TARGET_SUFFIX
+            code_text += "# Standalone replay benchmark of recorded calls, without Python\n"
+            code_text += f"add_executable({replay_target}\n"
+            code_text += f"    {self.replay_source_file}\n"
+            for source_file in source_file_list:
+                if source_file != f"{self.python_file_dir}/{self.cpp_file_name}" and \
+                        source_file not in self.extra_source_files:
+                    code_text += f"    {source_file}\n"
+            code_text += ")\n\n"
+
+            if self.linker != "":
+                code_text += f"target_link_options({replay_target} PRIVATE -fuse-ld={self.linker})\n\n"
+
+            code_text += f"target_include_directories({replay_target} PRIVATE\n"
+            code_text += include_dirs_text
+            code_text += ")\n\n"
+
+        self.cmake_lists_txt = code_text
+        cmake_lists_path = os.path.join(self.SIL_folder, "CMakeLists.txt")
+
+        if os.path.exists(cmake_lists_path):
+            with open(cmake_lists_path, "r", encoding="utf-8") as f:
+                if f.read() == code_text:
+                    return False
+
+        with open(cmake_lists_path, "w", encoding="utf-8") as f:
             f.write(code_text)
 
+        return True
+
+    def scope_to_dependencies(
+        self,
+        include_dirs: list,
+        source_file_list: list
+    ) -> tuple:
+        """
+        Narrow the discovered include directories (relative to root_path) and
+        source files down to those reachable from the SIL C++ file and the
+        extra source files.
+        Returns (include_dirs, source_file_list).
+        """
+        from helper.SIL.SIL_include_graph import SIL_IncludeGraph
+
+        root = os.path.abspath(self.root_path)
+        abs_include_dirs = [os.path.join(root, d) for d in include_dirs]
+        graph = SIL_IncludeGraph.for_root(root)
+
+        selected_sources = set()
+        selected_include_dirs = set()
+        entry_files = [os.path.join(self.python_file_dir, self.cpp_file_name)] + \
+            self.extra_source_files
+        for entry_file in entry_files:
+            scoped_source_list, scoped_abs_include_dirs = graph.scope_sources(
+                entry_file, source_file_list, abs_include_dirs)
+            selected_sources.update(scoped_source_list)
+            selected_include_dirs.update(scoped_abs_include_dirs)
+
+        scoped_source_list = [s for s in source_file_list if s in selected_sources]
+        scoped_include_dirs = [
+            os.path.relpath(d, root).replace('\\', '/')
+            for d in abs_include_dirs if d in selected_include_dirs]
+
+        return scoped_include_dirs, scoped_source_list
+
+    def select_precompiled_headers(
+        self,
+        include_dirs: list,
+        source_file_list: list
+    ) -> list:
+        """
+        Pick the headers to precompile automatically.
+        The candidates are headers of the MCAP libraries (under
+        "external_libraries") that are included directly from files outside of
+        those libraries. They are ranked by the number of translation units
+        that reach them.
+        """
+        from helper.SIL.SIL_include_graph import SIL_IncludeGraph
+
+        root = os.path.abspath(self.root_path)
+        abs_include_dirs = [os.path.join(root, d) for d in include_dirs]
+        library_marker = os.sep + CmakeGenerator.AUTO_PCH_LIBRARY_FOLDER + os.sep
+
+        graph = SIL_IncludeGraph.for_root(root)
+        translation_units = [
+            os.path.join(self.python_file_dir, self.cpp_file_name)]
+        translation_units += [s for s in source_file_list
+                              if s not in translation_units]
+
+        frequency = {}
+        for translation_unit in translation_units:
+            includers = graph.collect_reachable_headers(
+                translation_unit, abs_include_dirs)
+            for header_path, including_files in includers.items():
+                if library_marker not in header_path:
+                    continue
+                if all(library_marker in f for f in including_files):
+                    continue
+                frequency[header_path] = frequency.get(header_path, 0) + 1
+        graph.save()
+
+        ranked = sorted(frequency.items(), key=lambda item: (-item[1], item[0]))
+
+        return [h for h, _ in ranked[:CmakeGenerator.AUTO_PCH_MAX_HEADERS]]
+
+    def resolve_precompiled_headers(
+        self,
+        include_dirs: list,
+        source_file_list: list
+    ) -> list:
+        """
+        Return the entries for target_precompile_headers, or an empty list
+        if precompiled headers are disabled.
+        """
+        if not self.precompiled_headers:
+            return []
+
+        if self.precompiled_headers == "auto":
+            return self.select_precompiled_headers(
+                include_dirs, source_file_list)
+
+        root = os.path.abspath(self.root_path)
+        headers = []
+        for header in self.precompiled_headers:
+            if header.startswith("<"):
+                headers.append(header)
+                continue
+
+            resolved = header
+            for d in [self.python_file_dir] + [os.path.join(root, d) for d in include_dirs]:
+                candidate = os.path.join(d, header)
+                if os.path.isfile(candidate):
+                    resolved = os.path.normpath(candidate)
+                    break
+            headers.append(resolved)
+
+        return headers
+
+    def get_dependency_files(self) -> list:
+        """
+        Return the SIL source files and the headers found in the include
+        directories of the last generated CMakeLists.txt.
+        """
+        source_file_list = list(getattr(self, "source_file_list", []))
+        source_file_list.append(
+            os.path.join(self.python_file_dir, self.cpp_file_name))
+        if self.replay_source_file != "":
+            source_file_list.append(self.replay_source_file)
+
+        header_file_list = CmakeGenerator.discover_header_files(
+            self.root_path, getattr(self, "include_dirs", []))
+
+        return source_file_list + header_file_list
+
 
 class PythonAnalyzer:
     """
@@ -313,7 +747,30 @@ class PythonAnalyzer:
         - name: method name
         - lineno: line number where the method is defined
         - decorators: list of decorator names (as strings)
+        - args: list of argument dicts (without "self"), each with
+            - name: argument name
+            - annotation: parsed annotation (see parse_annotation) or None
+            - default: default value if it is a literal (see parse_default),
+              else None
+            - has_default: True if the argument has a default value
+        - returns: parsed return annotation or None
+
+    A parsed annotation is a dict with
+        - type: "ndarray", "float", "int", "bool", "None" or the annotation text
+        - kind: "dense" or "diag" if given in typing.Annotated, else None
+        - shape: tuple from typing.Annotated, else None
+        - dtype: NumPy dtype name (e.g. "float32") if given, else None
+
+    Shapes, kinds and dtypes of arrays are given with typing.Annotated, e.g.
+        A: Annotated[np.ndarray, (3, 3)]
+        B: Annotated[np.ndarray, "diag", (3, 3), np.float32]
     """
+    NDARRAY_NAMES = ("np.ndarray", "numpy.ndarray", "ndarray")
+    ANNOTATED_NAMES = ("Annotated", "typing.Annotated")
+    ARRAY_KINDS = ("dense", "diag")
+    FLOAT_CONSTANT_NAMES = ("math.inf", "math.nan", "np.inf", "np.nan",
+                            "numpy.inf", "numpy.nan")
+
     @staticmethod
     def _get_decorator_name(decorator_node):
         # Try to recover a readable decorator name from AST node
@@ -334,6 +791,134 @@ class PythonAnalyzer:
         else:
             return ast.dump(decorator_node)
 
+    @staticmethod
+    def _get_dotted_name(node) -> str:
+        if isinstance(node, ast.Name):
+            return node.id
+        elif isinstance(node, ast.Attribute):
+            value_name = PythonAnalyzer._get_dotted_name(node.value)
+            if value_name is None:
+                return None
+            return value_name + "." + node.attr
+        return None
+
+    @staticmethod
+    def parse_annotation(node) -> dict:
+        """
+        Convert an annotation AST node into a parsed annotation dict.
+        Returns None if there is no annotation.
+        """
+        if node is None:
+            return None
+
+        annotation = {'type': None, 'kind': None, 'shape': None, 'dtype': None}
+
+        if isinstance(node, ast.Constant):
+            if node.value is None:
+                annotation['type'] = "None"
+                return annotation
+            if isinstance(node.value, str):
+                # string (forward reference) annotation
+                try:
+                    return PythonAnalyzer.parse_annotation(
+                        ast.parse(node.value, mode='eval').body)
+                except SyntaxError:
+                    annotation['type'] = node.value
+                    return annotation
+
+        if isinstance(node, ast.Subscript) and \
+                PythonAnalyzer._get_dotted_name(node.value) in PythonAnalyzer.ANNOTATED_NAMES:
+            elements = node.slice.elts if isinstance(
+                node.slice, ast.Tuple) else [node.slice]
+            annotation = PythonAnalyzer.parse_annotation(elements[0])
+
+            for metadata in elements[1:]:
+                if isinstance(metadata, (ast.Tuple, ast.List)):
+                    shape = []
+                    for element in metadata.elts:
+                        if isinstance(element, ast.Constant) and isinstance(element.value, int):
+                            shape.append(element.value)
+                        else:
+                            shape.append(ast.unparse(element))
+                    annotation['shape'] = tuple(shape)
+                elif isinstance(metadata, ast.Constant) and isinstance(metadata.value, str):
+                    if metadata.value in PythonAnalyzer.ARRAY_KINDS:
+                        annotation['kind'] = metadata.value
+                    else:
+                        annotation['dtype'] = metadata.value
+                else:
+                    dotted_name = PythonAnalyzer._get_dotted_name(metadata)
+                    if dotted_name is not None:
+                        annotation['dtype'] = dotted_name.split('.')[-1]
+
+            return annotation
+
+        dotted_name = PythonAnalyzer._get_dotted_name(node)
+        if dotted_name in PythonAnalyzer.NDARRAY_NAMES:
+            annotation['type'] = "ndarray"
+        elif dotted_name in ("float", "int", "bool"):
+            annotation['type'] = dotted_name
+        else:
+            annotation['type'] = ast.unparse(node)
+
+        return annotation
+
+    @staticmethod
+    def parse_default(node):
+        """
+        Return the value of a default value AST node: a literal, or an
+        infinite or NaN float written as math.inf, np.nan, float("inf"), ...
+        with an optional sign. Raises ValueError for other expressions.
+        """
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value = PythonAnalyzer.parse_default(node.operand)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return -value
+            raise ValueError(f"unsupported default value {ast.unparse(node)}")
+
+        if PythonAnalyzer._get_dotted_name(node) in PythonAnalyzer.FLOAT_CONSTANT_NAMES:
+            return float(node.attr)
+
+        if isinstance(node, ast.Call) and \
+                PythonAnalyzer._get_dotted_name(node.func) == "float" and \
+                len(node.args) == 1 and not node.keywords and \
+                isinstance(node.args[0], ast.Constant) and \
+                isinstance(node.args[0].value, str):
+            return float(node.args[0].value)
+
+        return ast.literal_eval(node)
+
+    @staticmethod
+    def _parse_arguments(function_node, is_static: bool) -> list:
+        arguments = function_node.args
+        positional = list(arguments.posonlyargs) + list(arguments.args)
+        defaults = [None] * (len(positional) - len(arguments.defaults)) + \
+            list(arguments.defaults)
+
+        parameters = list(zip(positional, defaults)) + \
+            list(zip(arguments.kwonlyargs, arguments.kw_defaults))
+        if not is_static and positional:
+            # skip "self" or "cls"
+            parameters = parameters[1:]
+
+        args = []
+        for arg_node, default_node in parameters:
+            default = None
+            if default_node is not None:
+                try:
+                    default = PythonAnalyzer.parse_default(default_node)
+                except ValueError:
+                    default = None
+
+            args.append({
+                'name': arg_node.arg,
+                'annotation': PythonAnalyzer.parse_annotation(arg_node.annotation),
+                'default': default,
+                'has_default': default_node is not None,
+            })
+
+        return args
+
     @staticmethod
     def parse_source(source: str) -> dict:
         """
@@ -355,6 +940,10 @@ class PythonAnalyzer:
                             'name': item.name,
                             'lineno': getattr(item, 'lineno', None),
                             'decorators': decorators,
+                            'args': PythonAnalyzer._parse_arguments(
+                                item, 'staticmethod' in decorators),
+                            'returns': PythonAnalyzer.parse_annotation(
+                                item.returns),
                         })
                 classes[class_name] = methods
 
@@ -375,18 +964,1145 @@ class PythonAnalyzer:
         return PythonAnalyzer.parse_source(src)
 
 
+class CppHeaderAnalyzer:
+    """
+    Extract the type aliases, constants and method declarations of the classes
+    in a C++ header. This is a lightweight parser for the plain class
+    declarations used next to the Python files (e.g. sample_matrix.hpp); it does
+    not handle templates or macros.
+
+    Usage:
+        classes = CppHeaderAnalyzer.parse_file('/path/to/file.hpp')
+        # classes -> {'SampleMatrix': {
+        #     'aliases': {'FLOAT': 'double', 'DenseMatrix_Type': 'PythonNumpy::...'},
+        #     'constants': {'MATRIX_SIZE': '3'},
+        #     'methods': {'add': {'returns': 'DenseMatrix_Type',
+        #                         'args': [('DenseMatrix_Type', 'A'), ...]}}}}
+    """
+    CLASS_PATTERN = re.compile(r'\b(?:class|struct)\s+(\w+)\s*(?::[^{;]*)?\{')
+    ACCESS_PATTERN = re.compile(r'\b(?:public|private|protected)\s*:')
+    ALIAS_PATTERN = re.compile(r'^using\s+(\w+)\s*=\s*(.+)$', re.DOTALL)
+    TYPEDEF_PATTERN = re.compile(r'^typedef\s+(.+?)\s+(\w+)$', re.DOTALL)
+    CONSTANT_PATTERN = re.compile(
+        r'^static\s+(?:constexpr|const)\s+(?:const\s+)?[\w:]+\s+(\w+)\s*=\s*(.+)$', re.DOTALL)
+    METHOD_PATTERN = re.compile(
+        r'^(?:(?:virtual|static|inline|explicit)\s+)*(.+?)\s*\b(\w+)\s*\((.*)\)'
+        r'\s*(?:const)?\s*(?:noexcept)?\s*(?:override)?\s*(?:=\s*\w+)?$', re.DOTALL)
+
+    @staticmethod
+    def _strip_comments(source: str) -> str:
+        source = re.sub(r'/\*.*?\*/', ' ', source, flags=re.DOTALL)
+        source = re.sub(r'//[^\n]*', ' ', source)
+        return re.sub(r'^\s*#[^\n]*', ' ', source, flags=re.MULTILINE)
+
+    @staticmethod
+    def _split_top_level(text: str, separator: str) -> list:
+        parts = []
+        depth = 0
+        current = ""
+        for c in text:
+            if c in "<([":
+                depth += 1
+            elif c in ">)]":
+                depth -= 1
+            if c == separator and depth == 0:
+                parts.append(current)
+                current = ""
+            else:
+                current += c
+        parts.append(current)
+        return [p.strip() for p in parts if p.strip() != ""]
+
+    @staticmethod
+    def normalize_type(type_text: str) -> str:
+        """
+        Remove const, references and redundant white space from a C++ type.
+        """
+        type_text = re.sub(r'\bconst\b', ' ', type_text)
+        type_text = type_text.replace('&', ' ')
+        return re.sub(r'\s+', ' ', type_text).strip()
+
+    @staticmethod
+    def _parse_class_body(body: str) -> dict:
+        # Replace nested bodies by ';', so that only member declarations remain
+        declarations = ""
+        depth = 0
+        for c in body:
+            if c == '{':
+                if depth == 0:
+                    declarations += ';'
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            elif depth == 0:
+                declarations += c
+        declarations = CppHeaderAnalyzer.ACCESS_PATTERN.sub(' ', declarations)
+
+        class_info = {'aliases': {}, 'constants': {}, 'methods': {}}
+        for statement in declarations.split(';'):
+            statement = re.sub(r'\s+', ' ', statement).strip()
+            if statement == "":
+                continue
+
+            match = CppHeaderAnalyzer.ALIAS_PATTERN.match(statement)
+            if match:
+                class_info['aliases'][match.group(1)] = match.group(2).strip()
+                continue
+            match = CppHeaderAnalyzer.TYPEDEF_PATTERN.match(statement)
+            if match:
+                class_info['aliases'][match.group(2)] = match.group(1).strip()
+                continue
+            match = CppHeaderAnalyzer.CONSTANT_PATTERN.match(statement)
+            if match:
+                class_info['constants'][match.group(1)] = match.group(2).strip()
+                continue
+            match = CppHeaderAnalyzer.METHOD_PATTERN.match(statement)
+            if match and match.group(1).strip() not in ("", "~"):
+                args = []
+                for parameter in CppHeaderAnalyzer._split_top_level(match.group(3), ','):
+                    parameter = parameter.split('=')[0].strip()
+                    if parameter == "void":
+                        continue
+                    name_match = re.search(r'(\w+)\s*$', parameter)
+                    name = name_match.group(1) if name_match else ""
+                    args.append((CppHeaderAnalyzer.normalize_type(
+                        parameter[:name_match.start()] if name_match else parameter), name))
+                class_info['methods'][match.group(2)] = {
+                    'returns': CppHeaderAnalyzer.normalize_type(match.group(1)),
+                    'args': args,
+                }
+
+        return class_info
+
+    @staticmethod
+    def parse_source(source: str) -> dict:
+        """
+        Parse header text and return a mapping of class names to class info.
+        """
+        source = CppHeaderAnalyzer._strip_comments(source)
+
+        classes = {}
+        for match in CppHeaderAnalyzer.CLASS_PATTERN.finditer(source):
+            depth = 1
+            position = match.end()
+            while position < len(source) and depth > 0:
+                if source[position] == '{':
+                    depth += 1
+                elif source[position] == '}':
+                    depth -= 1
+                position += 1
+
+            classes[match.group(1)] = CppHeaderAnalyzer._parse_class_body(
+                source[match.end():position - 1])
+
+        return classes
+
+    @staticmethod
+    def parse_file(path: str) -> dict:
+        """
+        Read a C++ header from given path and parse it for classes.
+        Raises FileNotFoundError if the file doesn't exist.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found")
+
+        with open(path, 'r', encoding='utf-8') as f:
+            src = f.read()
+
+        return CppHeaderAnalyzer.parse_source(src)
+
+
 class PybindCppGenerator:
+    """
+    Generate the SIL C++ file (pybind11 module) for a Python class.
+
+    When a C++ header with the same name as the Python file exists next to it
+    (e.g. sample_matrix.hpp for sample_matrix.py), the generated module holds an
+    instance of the C++ class. Methods described in `method_specs` get wrappers
+    that convert their arguments and results with SIL_numpy_conversion.hpp;
+    all other methods are generated as stubs.
+
+    A method spec is a dict:
+        {
+            'args': [
+                {'name': 'A', 'kind': 'dense', 'cpp_type': 'SampleMatrix::DenseMatrix_Type',
+                 'dtype': 'SampleMatrix::FLOAT', 'shape': (3, 3)},
+                {'name': 'B', 'kind': 'diag', 'cpp_type': 'SampleMatrix::DiagMatrix_Type',
+                 'dtype': 'SampleMatrix::FLOAT', 'shape': (3,)},
+                {'name': 'gain', 'kind': 'scalar', 'cpp_type': 'double'},
+            ],
+            'returns': {'kind': 'dense', 'dtype': 'SampleMatrix::FLOAT', 'shape': (3, 3)},
+        }
+    'kind' is one of 'dense', 'diag', 'sparse', 'scalar' (and 'void' for
+    returns). Shapes may be integers or C++ constant expressions. A 'sparse'
+    spec (PythonNumpy::SparseMatrix_Type) also has 'pattern', the column
+    indices of the available elements of each row, e.g. ((0, 1), (1,), (2,)),
+    from which a SparsePattern constant is generated.
+
+    Structured arguments are converted from their compact form as well:
+    a diagonal matrix from its diagonal (M,), a sparse matrix from its values
+    in pattern order (NNZ,), a (data, indices, indptr) tuple or a scipy.sparse
+    matrix (see SIL_numpy_conversion.hpp). Sparse results are returned dense.
+
+    If no method specs are given, they are derived by derive_method_specs from
+    the Python annotations and the method declarations in the C++ header.
+
+    For every wrapped method that takes at least one dense or diagonal array
+    and no sparse one, a "<method>_batch" variant is generated as well. It takes the arrays with a leading batch
+    dimension (N x ...), broadcasts scalar arguments, loops in C++ with the GIL
+    released and returns the stacked results.
+
+    For every wrapped method that takes at least one dense or diagonal array,
+    returns a value and has no sparse argument or result, a "<method>_stream"
+    variant runs the method once per time step over the array arguments as
+    input signals (steps x ...), with the scalar arguments held constant, and
+    streams the results in chunks to an array or a memory mapped ".npy" file
+    (see SIL_stream_runner.hpp).
+
+    Every wrapper is instrumented with the SIL_CALL_STATS_* macros, which
+    record call counts, phase timings and allocations only when the module is
+    built with the SIL_CALL_STATS definition (see SIL_call_stats.hpp).
+    The module level wrappers and initialize are instrumented with the
+    SIL_CALL_TRACE_* macros as well, which record their calls between
+    start_trace() and stop_trace() when the module is built with the
+    SIL_CALL_TRACE definition, for the replay benchmark of ReplayCppGenerator
+    (see SIL_call_trace.hpp).
+    """
+    CONVERSION_HEADER_NAME = "SIL_numpy_conversion.hpp"
+    CONVERSION_NAMESPACE = "SIL_NumpyConversion"
+    STREAM_HEADER_NAME = "SIL_stream_runner.hpp"
+    STREAM_NAMESPACE = "SIL_StreamRunner"
+    DISPATCH_HEADER_NAME = "SIL_dispatch.hpp"
+    SPECIALIZED_CPP_SUFFIX = "_specialized_SIL.cpp"
+
+    PYTHON_NUMPY_TYPE_PATTERN = re.compile(
+        r'^(?:PythonNumpy::)?(DenseMatrix_Type|DiagMatrix_Type|SparseMatrix_Type)\s*<(.*)>$',
+        re.DOTALL)
+    SPARSE_AVAILABLE_PATTERN = re.compile(
+        r'^(?:PythonNumpy::)?SparseAvailable\s*<(.*)>$', re.DOTALL)
+    COLUMN_AVAILABLE_PATTERN = re.compile(
+        r'^(?:PythonNumpy::)?ColumnAvailable\s*<(.*)>$', re.DOTALL)
+    CPP_SCALAR_TYPES = ("double", "float", "int", "bool", "long", "unsigned int",
+                        "std::size_t", "size_t", "std::int32_t", "std::int64_t")
+    PYTHON_SCALAR_TYPES = {"float": "double", "int": "int", "bool": "bool"}
+    NUMPY_DTYPES = {"float64": "double", "double": "double", "float_": "double",
+                    "float32": "float", "single": "float"}
+
     @staticmethod
-    def generate_cpp_code(
+    def find_cpp_header(python_file_path_with_extension: str) -> str:
+        """
+        Return the file name of the C++ header next to the Python file
+        (e.g. "sample_matrix.hpp"), or an empty string if there is none.
+        """
+        stem = os.path.splitext(python_file_path_with_extension)[0]
+        for ext in ('.hpp', '.h'):
+            if os.path.isfile(stem + ext):
+                return os.path.basename(stem + ext)
+
+        return ""
+
+    @staticmethod
+    def _qualify_cpp_name(name: str, class_name: str, class_info: dict) -> str:
+        """
+        Prefix a member type or constant of the C++ class with "ClassName::".
+        """
+        name = name.strip()
+        if (name in class_info['aliases']) or (name in class_info['constants']):
+            return f"{class_name}::{name}"
+        return name
+
+    @staticmethod
+    def _follow_aliases(type_text: str, class_info: dict) -> str:
+        """
+        Follow the type aliases of the class down to the aliased type.
+        """
+        target = CppHeaderAnalyzer.normalize_type(type_text)
+        visited = set()
+        while target in class_info['aliases'] and target not in visited:
+            visited.add(target)
+            target = CppHeaderAnalyzer.normalize_type(
+                class_info['aliases'][target])
+
+        return target
+
+    @staticmethod
+    def _parse_sparse_available(type_text: str, class_info: dict) -> tuple:
+        """
+        Parse a PythonNumpy::SparseAvailable<ColumnAvailable<...>, ...> type
+        into ((rows, cols), pattern), where pattern holds the column indices
+        of the available elements of each row. Returns None if the type is not
+        a SparseAvailable literal with boolean flags.
+        """
+        target = PybindCppGenerator._follow_aliases(type_text, class_info)
+        match = PybindCppGenerator.SPARSE_AVAILABLE_PATTERN.match(target)
+        if not match:
+            return None
+
+        pattern = []
+        cols = None
+        for row_text in CppHeaderAnalyzer._split_top_level(match.group(1), ','):
+            row_match = PybindCppGenerator.COLUMN_AVAILABLE_PATTERN.match(
+                PybindCppGenerator._follow_aliases(row_text, class_info))
+            if not row_match:
+                return None
+
+            flags = [f.strip() for f in row_match.group(1).split(',')]
+            if any(f not in ("true", "false") for f in flags):
+                return None
+            if cols is None:
+                cols = len(flags)
+            elif cols != len(flags):
+                return None
+
+            pattern.append(tuple(j for j, f in enumerate(flags) if f == "true"))
+
+        if not pattern:
+            return None
+
+        return (len(pattern), cols), tuple(pattern)
+
+    @staticmethod
+    def _resolve_cpp_type(type_text: str, class_name: str, class_info: dict) -> dict:
+        """
+        Resolve a C++ argument or return type into a partial arg spec:
+        {'kind', 'cpp_type', 'dtype', 'shape'} (and 'pattern' for sparse
+        matrices). Returns None if the type is not a PythonNumpy
+        dense/diag/sparse matrix or a scalar.
+        """
+        type_text = CppHeaderAnalyzer.normalize_type(type_text)
+        if type_text == "void":
+            return {'kind': 'void'}
+
+        cpp_type = PybindCppGenerator._qualify_cpp_name(
+            type_text, class_name, class_info)
+
+        target = PybindCppGenerator._follow_aliases(type_text, class_info)
+
+        match = PybindCppGenerator.PYTHON_NUMPY_TYPE_PATTERN.match(target)
+        if match:
+            template_args = [
+                PybindCppGenerator._qualify_cpp_name(a, class_name, class_info)
+                for a in CppHeaderAnalyzer._split_top_level(match.group(2), ',')]
+            if match.group(1) == "DenseMatrix_Type" and len(template_args) == 3:
+                return {'kind': 'dense', 'cpp_type': cpp_type,
+                        'dtype': template_args[0], 'shape': tuple(template_args[1:3])}
+            if match.group(1) == "DiagMatrix_Type" and len(template_args) == 2:
+                return {'kind': 'diag', 'cpp_type': cpp_type,
+                        'dtype': template_args[0], 'shape': (template_args[1],)}
+            if match.group(1) == "SparseMatrix_Type" and len(template_args) == 2:
+                sparse_available = PybindCppGenerator._parse_sparse_available(
+                    CppHeaderAnalyzer._split_top_level(match.group(2), ',')[1],
+                    class_info)
+                if sparse_available is None:
+                    return None
+                shape, pattern = sparse_available
+                return {'kind': 'sparse', 'cpp_type': cpp_type,
+                        'dtype': template_args[0], 'shape': shape,
+                        'pattern': pattern}
+            return None
+
+        if target in PybindCppGenerator.CPP_SCALAR_TYPES:
+            return {'kind': 'scalar', 'cpp_type': cpp_type}
+
+        return None
+
+    @staticmethod
+    def _resolve_annotation(annotation: dict) -> dict:
+        """
+        Resolve a parsed Python annotation into a partial arg spec, or None if
+        it does not give enough information (e.g. an array without shape).
+        A 1-D shape (N,) is a column vector, the dense N x 1 matrix type.
+        """
+        if annotation is None:
+            return None
+
+        if annotation['type'] == "None":
+            return {'kind': 'void'}
+
+        if annotation['type'] in PybindCppGenerator.PYTHON_SCALAR_TYPES:
+            return {'kind': 'scalar',
+                    'cpp_type': PybindCppGenerator.PYTHON_SCALAR_TYPES[annotation['type']]}
+
+        if annotation['type'] == "ndarray" and annotation['shape']:
+            dtype = PybindCppGenerator.NUMPY_DTYPES.get(
+                annotation['dtype'] or "float64")
+            if dtype is None:
+                return None
+
+            shape = annotation['shape']
+            kind = annotation['kind'] or 'dense'
+            if kind == 'diag':
+                return {'kind': 'diag', 'dtype': dtype, 'shape': (shape[0],),
+                        'cpp_type': f"PythonNumpy::DiagMatrix_Type<{dtype}, {shape[0]}>"}
+            if len(shape) == 1:
+                shape = (shape[0], 1)
+            if len(shape) == 2:
+                return {'kind': 'dense', 'dtype': dtype, 'shape': tuple(shape),
+                        'cpp_type': f"PythonNumpy::DenseMatrix_Type<{dtype}, {shape[0]}, {shape[1]}>"}
+
+        return None
+
+    @staticmethod
+    def _cpp_default_literal(value, cpp_type: str = "double") -> str:
+        """
+        Convert a Python default value into a C++ literal of cpp_type, or None
+        if it has no C++ equivalent. Infinite and NaN defaults use
+        std::numeric_limits<cpp_type>.
+        """
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, float) and math.isnan(value):
+            return f"std::numeric_limits<{cpp_type}>::quiet_NaN()"
+        if isinstance(value, float) and math.isinf(value):
+            sign = "-" if value < 0 else ""
+            return f"{sign}std::numeric_limits<{cpp_type}>::infinity()"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        return None
+
+    @staticmethod
+    def derive_method_specs(
         python_file_path_with_extension: str,
-        module_name: str,
-        cpp_file_path_to_generate: str
-    ):
+        classes: dict = None
+    ) -> dict:
         """
-        Generate a C++ file that defines a pybind11 module with an initialize function.
+        Derive method specs (see the class docstring) from the Python type
+        annotations and the C++ header next to the Python file.
+
+        Types declared in the C++ header take precedence. Python annotations
+        (float, int, bool, and np.ndarray with shape from typing.Annotated) are
+        used for methods or arguments that the header does not resolve.
+        Scalar literal defaults become pybind11 argument defaults.
+        Methods whose types cannot be resolved are left out, so they are
+        generated as stubs.
         """
+        if classes is None:
+            classes = PythonAnalyzer.parse_file(python_file_path_with_extension)
 
-        # analyze the python file to find classes and methods
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            python_file_path_with_extension)
+        cpp_classes = {}
+        if cpp_header_name != "":
+            cpp_classes = CppHeaderAnalyzer.parse_file(os.path.join(
+                os.path.dirname(python_file_path_with_extension), cpp_header_name))
+
+        method_specs = {}
+        for class_name, methods in classes.items():
+            class_info = cpp_classes.get(
+                class_name, {'aliases': {}, 'constants': {}, 'methods': {}})
+
+            for method in methods:
+                method_name = method['name']
+                if method_name.startswith("_"):
+                    continue
+
+                cpp_method = class_info['methods'].get(method_name)
+                if cpp_method is not None and \
+                        len(cpp_method['args']) != len(method['args']):
+                    cpp_method = None
+
+                args = []
+                for index, arg in enumerate(method['args']):
+                    arg_spec = None
+                    if cpp_method is not None:
+                        arg_spec = PybindCppGenerator._resolve_cpp_type(
+                            cpp_method['args'][index][0], class_name, class_info)
+                    if arg_spec is None:
+                        arg_spec = PybindCppGenerator._resolve_annotation(
+                            arg['annotation'])
+                    if arg_spec is None or arg_spec['kind'] == 'void':
+                        break
+
+                    arg_spec['name'] = arg['name']
+                    if arg_spec['kind'] == 'scalar' and arg['has_default']:
+                        default = PybindCppGenerator._cpp_default_literal(
+                            arg['default'], arg_spec['cpp_type'])
+                        if default is not None:
+                            arg_spec['default'] = default
+                    args.append(arg_spec)
+                else:
+                    return_spec = None
+                    if cpp_method is not None:
+                        return_spec = PybindCppGenerator._resolve_cpp_type(
+                            cpp_method['returns'], class_name, class_info)
+                    if return_spec is None:
+                        return_spec = PybindCppGenerator._resolve_annotation(
+                            method['returns'])
+                    if return_spec is None and method['returns'] is None and \
+                            cpp_method is None:
+                        return_spec = {'kind': 'void'}
+                    if return_spec is None:
+                        continue
+
+                    method_specs[method_name] = {
+                        'args': args, 'returns': return_spec}
+
+        return method_specs
+
+    @staticmethod
+    def _py_arg(arg_spec: dict) -> str:
+        text = f"py::arg(\"{arg_spec['name']}\")"
+        if 'default' in arg_spec:
+            text += f" = {arg_spec['default']}"
+        return text
+
+    @staticmethod
+    def _camel_to_snake(camel_str: str) -> str:
+        snake_str = ""
+        for i, c in enumerate(camel_str):
+            if c.isupper() and i > 0:
+                snake_str += "_"
+            snake_str += c.lower()
+        return snake_str
+
+    @staticmethod
+    def _array_type(dtype: str) -> str:
+        return f"py::array_t<{dtype}>"
+
+    @staticmethod
+    def generate_input_conversion(arg_spec: dict) -> str:
+        """
+        Return the C++ lines that convert one wrapper argument into the C++ type.
+        """
+        name = arg_spec['name']
+        kind = arg_spec['kind']
+        dtype = arg_spec.get('dtype', 'double')
+        shape = arg_spec.get('shape', ())
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        code_text = ""
+        if kind == 'dense':
+            code_text += f"  {arg_spec['cpp_type']} {name};\n"
+            code_text += f"  {ns}::dense_from_numpy<{dtype}, {shape[0]}, {shape[1]}>(\n"
+            code_text += f"      {name}_in, {name}, \"{name}\");\n"
+        elif kind == 'diag':
+            code_text += f"  {arg_spec['cpp_type']} {name};\n"
+            code_text += f"  {ns}::diag_from_numpy<{dtype}, {shape[0]}>(\n"
+            code_text += f"      {name}_in, {name}, \"{name}\");\n"
+        elif kind == 'sparse':
+            code_text += f"  {arg_spec['cpp_type']} {name};\n"
+            code_text += f"  {ns}::sparse_from_numpy<{dtype}>(\n"
+            code_text += f"      {name}_in, {arg_spec['pattern_name']}, {name}, \"{name}\");\n"
+
+        return code_text
+
+    @staticmethod
+    def generate_output_conversion(return_spec: dict) -> str:
+        """
+        Return the C++ lines that convert `result` into the wrapper return value.
+        """
+        kind = return_spec['kind']
+        dtype = return_spec.get('dtype', 'double')
+        shape = return_spec.get('shape', ())
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        if kind == 'dense':
+            return f"  return {ns}::dense_to_numpy<{dtype}, {shape[0]}, {shape[1]}>(result, out);\n"
+        elif kind == 'diag':
+            return f"  return {ns}::diag_to_numpy<{dtype}, {shape[0]}>(result, out);\n"
+        elif kind == 'sparse':
+            return f"  return {ns}::sparse_to_numpy<{dtype}>(result, {return_spec['pattern_name']}, out);\n"
+        elif kind == 'scalar':
+            return "  return result;\n"
+
+        return ""
+
+    @staticmethod
+    def _generate_stats_definition(function_name: str, stats_name: str) -> str:
+        """
+        Return the definition of the call statistics of a wrapper, named
+        stats_name in get_stats() (function_name if empty).
+        """
+        return f"SIL_CALL_STATS_METHOD({function_name}_stats, \"{stats_name or function_name}\");\n"
+
+    @staticmethod
+    def _trace_value(spec: dict, name: str) -> str:
+        """
+        Return the SIL_CallTrace::Encoder (or Decoder) call of an argument or
+        result, e.g. "dense<double, 3, 3>(A)", or an empty string for void.
+        """
+        kind = spec['kind']
+        dtype = spec.get('dtype', 'double')
+        shape = spec.get('shape', ())
+
+        if kind == 'dense':
+            return f"dense<{dtype}, {shape[0]}, {shape[1]}>({name})"
+        elif kind == 'diag':
+            return f"diag<{dtype}, {shape[0]}>({name})"
+        elif kind == 'sparse':
+            return f"sparse<{dtype}>({name}, {spec['pattern_name']})"
+        elif kind == 'scalar':
+            return f"scalar<{spec.get('cpp_type', 'double')}>({name})"
+
+        return ""
+
+    @staticmethod
+    def _generate_trace_result(return_spec: dict, indent: str) -> str:
+        """
+        Return the lines that record the result of a traced call and write
+        the call to the trace (see SIL_call_trace.hpp).
+        """
+        code_text = ""
+        value_text = PybindCppGenerator._trace_value(return_spec, "result")
+        if value_text != "":
+            code_text += f"{indent}SIL_CALL_TRACE_VALUE({value_text});\n"
+        code_text += f"{indent}SIL_CALL_TRACE_COMMIT();\n"
+        return code_text
+
+    @staticmethod
+    def generate_method_wrapper(
+        instance_name: str,
+        method_name: str,
+        method_spec: dict,
+        self_type: str = "",
+        stats_name: str = ""
+    ) -> tuple:
+        """
+        Generate a typed wrapper function for one method.
+        Returns (C++ function code, pybind11 argument list for m.def).
+
+        If self_type is given, the wrapper is generated for the class binding:
+        it is named "instance_<method>", takes "self_type &self" first, and runs
+        the C++ method with the GIL released while holding the instance mutex.
+        Otherwise the method of the shared instance runs with the GIL held and
+        the module mutex "<instance_name>_mutex" locked, as the batched and
+        streamed wrappers run it without the GIL.
+        stats_name is the name of the wrapper in get_stats() (see
+        SIL_call_stats.hpp) and in the call trace, the function name by
+        default. Only the module level wrapper records its calls to the
+        trace (see SIL_call_trace.hpp).
+        """
+        args = method_spec.get('args', [])
+        return_spec = method_spec.get('returns', {'kind': 'void'})
+        return_kind = return_spec['kind']
+        returns_array = return_kind in ('dense', 'diag', 'sparse')
+
+        if returns_array:
+            return_type = PybindCppGenerator._array_type(
+                return_spec.get('dtype', 'double'))
+        elif return_kind == 'scalar':
+            return_type = return_spec.get('cpp_type', 'double')
+        else:
+            return_type = "void"
+
+        parameters = []
+        call_args = []
+        py_args = []
+        for arg_spec in args:
+            name = arg_spec['name']
+            if arg_spec['kind'] == 'scalar':
+                parameters.append(
+                    f"{arg_spec.get('cpp_type', 'double')} {name}")
+            else:
+                parameters.append(f"py::handle {name}_in")
+            call_args.append(name)
+            py_args.append(PybindCppGenerator._py_arg(arg_spec))
+
+        if returns_array:
+            parameters.append("py::object out")
+            py_args.append("py::arg(\"out\") = py::none()")
+
+        function_name = method_name
+        if self_type != "":
+            parameters.insert(0, f"{self_type} &self")
+            function_name = f"instance_{method_name}"
+            instance_name = "self.instance"
+
+        traced = (self_type == "")
+
+        code_text = ""
+        code_text += PybindCppGenerator._generate_stats_definition(
+            function_name, stats_name)
+        if traced:
+            code_text += f"SIL_CALL_TRACE_FUNCTION({function_name}_trace, \"{stats_name or function_name}\");\n"
+        code_text += f"{return_type} {function_name}({', '.join(parameters)}) {{\n"
+        code_text += f"  SIL_CALL_STATS_TIMER({function_name}_stats);\n"
+        if traced:
+            code_text += f"  SIL_CALL_TRACE_RECORD({function_name}_trace);\n"
+        code_text += "\n"
+
+        conversion_text = ""
+        for arg_spec in args:
+            conversion_text += PybindCppGenerator.generate_input_conversion(
+                arg_spec)
+        if conversion_text != "":
+            code_text += "  /* substitute */\n"
+            code_text += conversion_text + "\n"
+
+        if traced and args:
+            for arg_spec in args:
+                code_text += "  SIL_CALL_TRACE_VALUE(" + PybindCppGenerator._trace_value(
+                    arg_spec, arg_spec['name']) + ");\n"
+            code_text += "\n"
+
+        call_text = f"{instance_name}.{method_name}({', '.join(call_args)})"
+
+        if self_type != "":
+            code_text += PybindCppGenerator._generate_released_call(
+                method_name, call_text, return_spec)
+        else:
+            code_text += f"  /* call {method_name} method */\n"
+            code_text += "  SIL_CALL_STATS_PHASE(COMPUTE);\n"
+            code_text += f"  std::lock_guard<std::mutex> lock({instance_name}_mutex);\n"
+            if return_kind == 'void':
+                code_text += f"  {call_text};\n"
+                code_text += PybindCppGenerator._generate_trace_result(
+                    return_spec, "  ")
+            else:
+                code_text += f"  auto result = {call_text};\n"
+                code_text += PybindCppGenerator._generate_trace_result(
+                    return_spec, "  ")
+                code_text += "\n"
+                if returns_array:
+                    code_text += "  /* return numpy array */\n"
+                    code_text += "  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+                code_text += PybindCppGenerator.generate_output_conversion(
+                    return_spec)
+
+        code_text += "}\n\n"
+
+        return code_text, py_args
+
+    @staticmethod
+    def _generate_released_call(
+        method_name: str,
+        call_text: str,
+        return_spec: dict
+    ) -> str:
+        """
+        Generate the call of a class binding wrapper. The output array is
+        allocated while the GIL is held, then the C++ method runs and writes its
+        result into the array buffer with the GIL released and the instance
+        mutex locked.
+        """
+        return_kind = return_spec['kind']
+        dtype = return_spec.get('dtype', 'double')
+        shape = return_spec.get('shape', ())
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        code_text = ""
+        if return_kind in ('dense', 'diag', 'sparse'):
+            code_text += "  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+        if return_kind == 'dense':
+            code_text += f"  py::array_t<{dtype}> output = {ns}::prepare_output<{dtype}, {shape[0]}, {shape[1]}>(\n"
+            code_text += "      out, \"out\");\n"
+            code_text += f"  {dtype} *output_data = output.mutable_data();\n\n"
+        elif return_kind == 'diag':
+            code_text += f"  py::array_t<{dtype}> output = {ns}::prepare_output<{dtype}, {shape[0]}, {shape[0]}>(\n"
+            code_text += "      out, \"out\");\n"
+            code_text += f"  {dtype} *output_data = output.mutable_data();\n\n"
+        elif return_kind == 'sparse':
+            code_text += f"  py::array_t<{dtype}> output = {ns}::prepare_output<{dtype}, {shape[0]}, {shape[1]}>(\n"
+            code_text += "      out, \"out\");\n"
+            code_text += f"  {dtype} *output_data = output.mutable_data();\n\n"
+        elif return_kind == 'scalar':
+            code_text += f"  decltype({call_text}) result;\n\n"
+
+        code_text += f"  /* call {method_name} method without the GIL */\n"
+        code_text += "  {\n"
+        code_text += "    py::gil_scoped_release release;\n"
+        code_text += "    std::lock_guard<std::mutex> lock(self.mutex);\n\n"
+        code_text += "    SIL_CALL_STATS_PHASE(COMPUTE);\n"
+        if return_kind == 'dense':
+            code_text += f"    auto result = {call_text};\n"
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {ns}::dense_to_buffer<{shape[0]}, {shape[1]}>(result, output_data);\n"
+        elif return_kind == 'diag':
+            code_text += f"    auto result = {call_text};\n"
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {ns}::diag_to_buffer<{shape[0]}>(result, output_data);\n"
+        elif return_kind == 'sparse':
+            code_text += f"    auto result = {call_text};\n"
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {ns}::sparse_to_buffer(result, {return_spec['pattern_name']}, output_data);\n"
+        elif return_kind == 'scalar':
+            code_text += f"    result = {call_text};\n"
+        else:
+            code_text += f"    {call_text};\n"
+        code_text += "  }\n"
+
+        if return_kind in ('dense', 'diag', 'sparse'):
+            code_text += "\n  return output;\n"
+        elif return_kind == 'scalar':
+            code_text += "\n  return result;\n"
+
+        return code_text
+
+    @staticmethod
+    def _has_sparse(method_spec: dict) -> bool:
+        specs = method_spec.get('args', []) + \
+            [method_spec.get('returns', {'kind': 'void'})]
+        return any(spec['kind'] == 'sparse' for spec in specs)
+
+    @staticmethod
+    def generate_sparse_patterns(method_specs: dict) -> tuple:
+        """
+        Generate the SparsePattern constants (CSR indptr and indices) of the
+        sparse arguments and results, named "<method>_<arg>_pattern" and
+        "<method>_result_pattern".
+        Returns (C++ code, method specs with 'pattern_name' set on the sparse
+        specs). The given method specs are not modified.
+        """
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        code_text = ""
+        annotated_specs = {}
+        for method_name, method_spec in method_specs.items():
+            annotated_spec = dict(method_spec)
+            annotated_spec['args'] = [dict(a) for a in method_spec.get('args', [])]
+            if 'returns' in method_spec:
+                annotated_spec['returns'] = dict(method_spec['returns'])
+            annotated_specs[method_name] = annotated_spec
+
+            sparse_specs = [(f"{method_name}_{a['name']}", a)
+                            for a in annotated_spec['args']]
+            if 'returns' in annotated_spec:
+                sparse_specs.append(
+                    (f"{method_name}_result", annotated_spec['returns']))
+
+            for prefix, spec in sparse_specs:
+                if spec['kind'] != 'sparse':
+                    continue
+
+                rows, cols = spec['shape']
+                indptr = [0]
+                indices = []
+                for row in spec['pattern']:
+                    indices.extend(row)
+                    indptr.append(len(indices))
+
+                # an empty pattern still needs a valid array
+                indices_text = ", ".join(str(j) for j in indices) or "0"
+                code_text += f"const std::size_t {prefix}_indptr[] = {{{', '.join(str(p) for p in indptr)}}};\n"
+                code_text += f"const std::size_t {prefix}_indices[] = {{{indices_text}}};\n"
+                code_text += f"const {ns}::SparsePattern {prefix}_pattern = {{\n"
+                code_text += f"    {rows}, {cols}, {prefix}_indptr, {prefix}_indices}};\n\n"
+                spec['pattern_name'] = f"{prefix}_pattern"
+
+        return code_text, annotated_specs
+
+    @staticmethod
+    def generate_batch_method_wrapper(
+        instance_name: str,
+        method_name: str,
+        method_spec: dict,
+        self_type: str = "",
+        stats_name: str = ""
+    ) -> tuple:
+        """
+        Generate the "<method>_batch" wrapper for one method.
+        Returns (C++ function code, pybind11 argument list for m.def), or
+        ("", []) if the method takes no array argument or has a sparse
+        argument or result.
+        Diagonal arguments are accepted as (N, M) diagonals or (N, M, M).
+        If self_type and stats_name are given, the wrapper is generated for the
+        class binding (see generate_method_wrapper). The loop runs without the
+        GIL, with the instance mutex or the module mutex of the shared
+        instance locked.
+        """
+        args = method_spec.get('args', [])
+        array_args = [a for a in args if a['kind'] in ('dense', 'diag')]
+        return_spec = method_spec.get('returns', {'kind': 'void'})
+        return_kind = return_spec['kind']
+        if not array_args or PybindCppGenerator._has_sparse(method_spec):
+            return "", []
+
+        return_shape = return_spec.get('shape', ())
+        if return_kind == 'scalar':
+            return_dtype = return_spec.get('cpp_type', 'double')
+        else:
+            return_dtype = return_spec.get('dtype', 'double')
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        if return_kind == 'void':
+            return_type = "void"
+        else:
+            return_type = PybindCppGenerator._array_type(return_dtype)
+
+        parameters = []
+        py_args = []
+        for arg_spec in args:
+            name = arg_spec['name']
+            if arg_spec['kind'] == 'scalar':
+                parameters.append(
+                    f"{arg_spec.get('cpp_type', 'double')} {name}")
+            else:
+                parameters.append(f"py::handle {name}_in")
+            py_args.append(PybindCppGenerator._py_arg(arg_spec))
+        if return_kind != 'void':
+            parameters.append("py::object out")
+            py_args.append("py::arg(\"out\") = py::none()")
+
+        function_name = f"{method_name}_batch"
+        mutex_name = f"{instance_name}_mutex"
+        if self_type != "":
+            parameters.insert(0, f"{self_type} &self")
+            function_name = f"instance_{method_name}_batch"
+            instance_name = "self.instance"
+            mutex_name = "self.mutex"
+
+        code_text = ""
+        code_text += PybindCppGenerator._generate_stats_definition(
+            function_name, stats_name)
+        code_text += f"{return_type} {function_name}({', '.join(parameters)}) {{\n"
+        code_text += f"  SIL_CALL_STATS_TIMER({function_name}_stats);\n\n"
+
+        code_text += "  /* check inputs */\n"
+        for arg_spec in array_args:
+            name = arg_spec['name']
+            dtype = arg_spec.get('dtype', 'double')
+            code_text += f"  auto {name}_array = {ns}::as_c_array<{dtype}>({name}_in, \"{name}\");\n"
+
+        for arg_spec in array_args:
+            if arg_spec['kind'] == 'diag':
+                code_text += f"  bool {arg_spec['name']}_compact = false;\n"
+        for i, arg_spec in enumerate(array_args):
+            name = arg_spec['name']
+            shape = arg_spec.get('shape', ())
+            if arg_spec['kind'] == 'dense':
+                check_text = f"{ns}::check_batch_shape({name}_array, {shape[0]}, {shape[1]}, \"{name}\")"
+            else:
+                check_text = f"{ns}::check_diag_batch_shape({name}_array, {shape[0]}, \"{name}\", {name}_compact)"
+            if i == 0:
+                code_text += "  const std::size_t batch =\n"
+                code_text += f"      {check_text};\n"
+            else:
+                code_text += f"  {ns}::check_batch_size(\n"
+                code_text += f"      batch, {check_text},\n"
+                code_text += f"      \"{name}\");\n"
+
+        if return_kind != 'void':
+            code_text += "  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+        if return_kind == 'dense':
+            code_text += f"  {return_type} output = {ns}::prepare_batch_output<{return_dtype}, {return_shape[0]}, {return_shape[1]}>(\n"
+            code_text += "      out, batch, \"out\");\n"
+            output_stride = f"{return_shape[0]} * {return_shape[1]}"
+        elif return_kind == 'diag':
+            code_text += f"  {return_type} output = {ns}::prepare_batch_output<{return_dtype}, {return_shape[0]}, {return_shape[0]}>(\n"
+            code_text += "      out, batch, \"out\");\n"
+            output_stride = f"{return_shape[0]} * {return_shape[0]}"
+        elif return_kind == 'scalar':
+            code_text += f"  {return_type} output = {ns}::prepare_batch_output_scalar<{return_dtype}>(\n"
+            code_text += "      out, batch, \"out\");\n"
+            output_stride = "1"
+
+        code_text += "\n"
+        for arg_spec in array_args:
+            name = arg_spec['name']
+            dtype = arg_spec.get('dtype', 'double')
+            code_text += f"  const {dtype} *{name}_data = {name}_array.data();\n"
+        if return_kind != 'void':
+            code_text += f"  {return_dtype} *output_data = output.mutable_data();\n"
+
+        code_text += "\n"
+        code_text += "  /* loop over the batch without the GIL */\n"
+        code_text += "  SIL_CALL_STATS_PHASE(COMPUTE);\n"
+        code_text += "  {\n"
+        code_text += "    py::gil_scoped_release release;\n"
+        code_text += f"    std::lock_guard<std::mutex> lock({mutex_name});\n"
+        code_text += "\n"
+
+        for arg_spec in array_args:
+            code_text += f"    {arg_spec['cpp_type']} {arg_spec['name']};\n"
+        code_text += "\n"
+
+        code_text += "    for (std::size_t k = 0; k < batch; ++k) {\n"
+        for arg_spec in array_args:
+            name = arg_spec['name']
+            shape = arg_spec.get('shape', ())
+            if arg_spec['kind'] == 'dense':
+                code_text += f"      {ns}::dense_from_buffer<{shape[0]}, {shape[1]}>(\n"
+                code_text += f"          {name}_data + k * {shape[0]} * {shape[1]}, {name});\n"
+            else:
+                code_text += f"      if ({name}_compact) {{\n"
+                code_text += f"        {ns}::diag_from_compact_buffer<{shape[0]}>(\n"
+                code_text += f"            {name}_data + k * {shape[0]}, {name});\n"
+                code_text += "      } else {\n"
+                code_text += f"        {ns}::diag_from_buffer<{shape[0]}>(\n"
+                code_text += f"            {name}_data + k * {shape[0]} * {shape[0]}, {name});\n"
+                code_text += "      }\n"
+
+        call_args = [a['name'] for a in args]
+        call_text = f"{instance_name}.{method_name}({', '.join(call_args)})"
+        if return_kind == 'void':
+            code_text += f"      {call_text};\n"
+        else:
+            code_text += f"      auto result = {call_text};\n"
+            if return_kind == 'dense':
+                code_text += f"      {ns}::dense_to_buffer<{return_shape[0]}, {return_shape[1]}>(\n"
+                code_text += f"          result, output_data + k * {output_stride});\n"
+            elif return_kind == 'diag':
+                code_text += f"      {ns}::diag_to_buffer<{return_shape[0]}>(\n"
+                code_text += f"          result, output_data + k * {output_stride});\n"
+            else:
+                code_text += "      output_data[k] = result;\n"
+
+        code_text += "    }\n"
+        code_text += "  }\n"
+
+        if return_kind != 'void':
+            code_text += "\n  return output;\n"
+        code_text += "}\n\n"
+
+        return code_text, py_args
+
+    @staticmethod
+    def _step_shape(spec: dict) -> list:
+        """
+        Return the shape of one time step of a signal, as C++ expressions.
+        """
+        shape = spec.get('shape', ())
+        if spec['kind'] == 'dense':
+            return [str(shape[0]), str(shape[1])]
+        elif spec['kind'] == 'diag':
+            return [str(shape[0]), str(shape[0])]
+
+        return []
+
+    @staticmethod
+    def generate_stream_method_wrapper(
+        instance_name: str,
+        method_name: str,
+        method_spec: dict,
+        self_type: str = "",
+        stats_name: str = ""
+    ) -> tuple:
+        """
+        Generate the "<method>_stream" wrapper for one method.
+        Returns (C++ function code, pybind11 argument list for m.def), or
+        ("", []) if the method takes no array argument, returns nothing or has
+        a sparse argument or result.
+        Every array argument is an input signal with a leading time dimension;
+        diagonal arguments are accepted as (steps, M) diagonals or
+        (steps, M, M), column vectors as (steps, M) or (steps, M, 1). Scalar
+        arguments are constant over the horizon, plain scalars with their
+        defaults as in the other wrappers. If self_type and stats_name are
+        given, the wrapper is generated for the class binding (see
+        generate_method_wrapper). The steps of each chunk run without the GIL,
+        with the instance mutex or the module mutex of the shared instance
+        locked.
+        """
+        args = method_spec.get('args', [])
+        signal_args = [a for a in args if a['kind'] != 'scalar']
+        return_spec = method_spec.get('returns', {'kind': 'void'})
+        return_kind = return_spec['kind']
+        if not signal_args or return_kind == 'void' or \
+                PybindCppGenerator._has_sparse(method_spec):
+            return "", []
+
+        ns = PybindCppGenerator.CONVERSION_NAMESPACE
+        stream_ns = PybindCppGenerator.STREAM_NAMESPACE
+        return_shape = return_spec.get('shape', ())
+        if return_kind == 'scalar':
+            return_dtype = return_spec.get('cpp_type', 'double')
+        else:
+            return_dtype = return_spec.get('dtype', 'double')
+
+        parameters = []
+        py_args = []
+        for arg_spec in args:
+            name = arg_spec['name']
+            if arg_spec['kind'] == 'scalar':
+                parameters.append(
+                    f"{arg_spec.get('cpp_type', 'double')} {name}")
+            else:
+                parameters.append(f"py::handle {name}_in")
+            py_args.append(PybindCppGenerator._py_arg(arg_spec))
+        parameters += ["py::object out", "std::size_t chunk_size",
+                       "py::object callback"]
+        py_args += ["py::arg(\"out\") = py::none()",
+                    f"py::arg(\"chunk_size\") = {stream_ns}::DEFAULT_CHUNK_SIZE",
+                    "py::arg(\"callback\") = py::none()"]
+
+        function_name = f"{method_name}_stream"
+        mutex_text = f", &{instance_name}_mutex"
+        if self_type != "":
+            parameters.insert(0, f"{self_type} &self")
+            function_name = f"instance_{method_name}_stream"
+            instance_name = "self.instance"
+            mutex_text = ", &self.mutex"
+
+        code_text = ""
+        code_text += PybindCppGenerator._generate_stats_definition(
+            function_name, stats_name)
+        code_text += f"py::array_t<{return_dtype}> {function_name}({', '.join(parameters)}) {{\n"
+        code_text += f"  SIL_CALL_STATS_TIMER({function_name}_stats);\n\n"
+
+        code_text += "  /* input and output signals */\n"
+        for arg_spec in signal_args:
+            name = arg_spec['name']
+            dtype = arg_spec.get('dtype', 'double')
+            step_shape = ", ".join(PybindCppGenerator._step_shape(arg_spec))
+            code_text += f"  {stream_ns}::InputSignal<{dtype}> {name}_signal(\n"
+            if arg_spec['kind'] == 'diag':
+                compact_shape = arg_spec['shape'][0]
+                code_text += f"      {name}_in, {{{step_shape}}}, {{{compact_shape}}}, \"{name}\");\n"
+            else:
+                code_text += f"      {name}_in, {{{step_shape}}},\n"
+                code_text += f"      {stream_ns}::dense_compact_step_shape({step_shape}), \"{name}\");\n"
+
+        first_name = signal_args[0]['name']
+        code_text += f"  const std::size_t steps = {first_name}_signal.steps();\n"
+        for arg_spec in signal_args[1:]:
+            code_text += f"  {arg_spec['name']}_signal.check_steps(steps);\n"
+
+        step_shape = ", ".join(PybindCppGenerator._step_shape(return_spec))
+        code_text += "  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+        code_text += f"  {stream_ns}::OutputSignal<{return_dtype}> output(\n"
+        code_text += f"      out, steps, {{{step_shape}}}, \"out\");\n\n"
+
+        for arg_spec in signal_args:
+            code_text += f"  {arg_spec['cpp_type']} {arg_spec['name']};\n"
+
+        code_text += "\n"
+        code_text += "  /* run the horizon in chunks, the steps without the GIL */\n"
+        code_text += "  SIL_CALL_STATS_PHASE(COMPUTE);\n"
+        code_text += f"  {stream_ns}::run_in_chunks(\n"
+        code_text += "      steps, chunk_size,\n"
+        code_text += "      [&](std::size_t start, std::size_t count) {\n"
+        for arg_spec in signal_args:
+            code_text += f"        {arg_spec['name']}_signal.load_chunk(start, count);\n"
+        code_text += "      },\n"
+        code_text += "      [&](std::size_t step) {\n"
+
+        for arg_spec in signal_args:
+            name = arg_spec['name']
+            shape = arg_spec.get('shape', ())
+            if arg_spec['kind'] == 'dense':
+                code_text += f"        {ns}::dense_from_buffer<{shape[0]}, {shape[1]}>(\n"
+                code_text += f"            {name}_signal.step_data(step), {name});\n"
+            else:
+                code_text += f"        if ({name}_signal.is_compact()) {{\n"
+                code_text += f"          {ns}::diag_from_compact_buffer<{shape[0]}>(\n"
+                code_text += f"              {name}_signal.step_data(step), {name});\n"
+                code_text += "        } else {\n"
+                code_text += f"          {ns}::diag_from_buffer<{shape[0]}>(\n"
+                code_text += f"              {name}_signal.step_data(step), {name});\n"
+                code_text += "        }\n"
+
+        call_text = f"{instance_name}.{method_name}({', '.join(a['name'] for a in args)})"
+        code_text += f"        auto result = {call_text};\n"
+        if return_kind == 'dense':
+            code_text += f"        {ns}::dense_to_buffer<{return_shape[0]}, {return_shape[1]}>(\n"
+            code_text += "            result, output.step_data(step));\n"
+        elif return_kind == 'diag':
+            code_text += f"        {ns}::diag_to_buffer<{return_shape[0]}>(\n"
+            code_text += "            result, output.step_data(step));\n"
+        else:
+            code_text += "        *output.step_data(step) = result;\n"
+        code_text += "      },\n"
+        code_text += f"      output, callback{mutex_text});\n\n"
+
+        code_text += "  return output.array();\n"
+        code_text += "}\n\n"
+
+        return code_text, py_args
+
+    @staticmethod
+    def _parse_single_class(python_file_path_with_extension: str) -> dict:
+        """
+        Analyze the Python file and check that it defines exactly one class.
+        """
         classes = PythonAnalyzer.parse_file(python_file_path_with_extension)
 
         if not classes:
@@ -396,15 +2112,792 @@ class PybindCppGenerator:
             raise ValueError(
                 f"Multiple classes found in {python_file_path_with_extension}. Only one class is supported.")
 
+        return classes
+
+    @staticmethod
+    def _generate_bindings(
+        classes: dict,
+        method_specs: dict,
+        cpp_header_name: str,
+        use_wrappers: bool,
+        stats_prefix: str = ""
+    ) -> dict:
+        """
+        Generate the part of the SIL C++ file inside its namespace before the
+        module definition: the instance, the initialize function and the
+        method wrappers. The names of the wrappers in get_stats() and in the
+        call trace start with stats_prefix (e.g. "MATRIX_SIZE_6." in a
+        specialization); class binding methods are named "<Class>.<method>".
+        Returns a dict with
+            'code': C++ code,
+            'method_names': names of the module functions,
+            'method_py_args': pybind11 argument lists by function name,
+            'class_method_names': names of the class binding methods,
+            'method_specs': method specs with the sparse pattern names set.
+        """
+        class_name = next(iter(classes))
+        instance_name = PybindCppGenerator._camel_to_snake(
+            class_name) + "_instance"
+        self_type = f"{class_name}_Instance"
+
+        code_text = ""
+        if cpp_header_name != "" and use_wrappers:
+            code_text += f"{class_name} {instance_name};\n"
+            code_text += "/* Serializes the module level calls on the shared instance, as the\n"
+            code_text += "   batched and streamed wrappers run it without the GIL. */\n"
+            code_text += f"std::mutex {instance_name}_mutex;\n\n"
+            code_text += f"SIL_CALL_TRACE_FUNCTION(initialize_trace, \"{stats_prefix}initialize\");\n"
+            code_text += "void initialize(void) {\n"
+            code_text += "  SIL_CALL_TRACE_RECORD(initialize_trace);\n"
+            code_text += f"  std::lock_guard<std::mutex> lock({instance_name}_mutex);\n"
+            code_text += f"  {instance_name} = {class_name}();\n"
+            code_text += "  SIL_CALL_TRACE_COMMIT();\n"
+            code_text += "}\n\n"
+        elif cpp_header_name != "":
+            code_text += f"{class_name} {instance_name};\n\n"
+            code_text += f"void initialize(void) {{ {instance_name} = {class_name}(); }}\n\n"
+        else:
+            code_text += "void initialize(void) {}\n\n"
+
+        if use_wrappers:
+            pattern_text, method_specs = PybindCppGenerator.generate_sparse_patterns(
+                method_specs)
+            if pattern_text != "":
+                code_text += "/* Sparsity patterns of the sparse arguments and results */\n"
+                code_text += pattern_text
+
+        if use_wrappers:
+            code_text += "/* Independent instances for the class binding. The mutex serializes\n"
+            code_text += "   calls on one instance while the GIL is released. */\n"
+            code_text += f"class {self_type} {{\n"
+            code_text += "public:\n"
+            code_text += f"  {class_name} instance;\n"
+            code_text += "  std::mutex mutex;\n"
+            code_text += "};\n\n"
+            code_text += f"void instance_initialize({self_type} &self) {{\n"
+            code_text += "  py::gil_scoped_release release;\n"
+            code_text += "  std::lock_guard<std::mutex> lock(self.mutex);\n"
+            code_text += f"  self.instance = {class_name}();\n"
+            code_text += "}\n\n"
+
+        method_names = []
+        method_py_args = {}
+        class_method_names = []
+        for class_name, methods in classes.items():
+            code_text += f"// Class: {class_name}\n"
+            for method in methods:
+                method_name = method['name']
+
+                if method_name.startswith("__") and method_name.endswith("__"):
+                    # Skip dunder methods
+                    continue
+
+                code_text += f"// Method: {method_name}\n"
+                if use_wrappers and method_name in method_specs:
+                    stats_name = f"{stats_prefix}{method_name}"
+                    class_stats_name = f"{stats_prefix}{class_name}.{method_name}"
+
+                    wrapper_text, py_args = PybindCppGenerator.generate_method_wrapper(
+                        instance_name, method_name, method_specs[method_name],
+                        stats_name=stats_name)
+                    code_text += wrapper_text
+                    method_py_args[method_name] = py_args
+                    method_names.append(method_name)
+
+                    batch_text, batch_py_args = PybindCppGenerator.generate_batch_method_wrapper(
+                        instance_name, method_name, method_specs[method_name],
+                        stats_name=stats_name + "_batch")
+                    if batch_text != "":
+                        code_text += f"// Method: {method_name} (batched)\n"
+                        code_text += batch_text
+                        method_py_args[method_name + "_batch"] = batch_py_args
+                        method_names.append(method_name + "_batch")
+
+                    stream_text, stream_py_args = PybindCppGenerator.generate_stream_method_wrapper(
+                        instance_name, method_name, method_specs[method_name],
+                        stats_name=stats_name + "_stream")
+                    if stream_text != "":
+                        code_text += f"// Method: {method_name} (streamed)\n"
+                        code_text += stream_text
+                        method_py_args[method_name + "_stream"] = stream_py_args
+                        method_names.append(method_name + "_stream")
+
+                    code_text += f"// Method: {method_name} (class binding)\n"
+                    wrapper_text, _ = PybindCppGenerator.generate_method_wrapper(
+                        instance_name, method_name, method_specs[method_name], self_type,
+                        class_stats_name)
+                    code_text += wrapper_text
+                    class_method_names.append(method_name)
+
+                    batch_text, _ = PybindCppGenerator.generate_batch_method_wrapper(
+                        instance_name, method_name, method_specs[method_name], self_type,
+                        class_stats_name + "_batch")
+                    if batch_text != "":
+                        code_text += f"// Method: {method_name} (class binding, batched)\n"
+                        code_text += batch_text
+                        class_method_names.append(method_name + "_batch")
+
+                    stream_text, _ = PybindCppGenerator.generate_stream_method_wrapper(
+                        instance_name, method_name, method_specs[method_name], self_type,
+                        class_stats_name + "_stream")
+                    if stream_text != "":
+                        code_text += f"// Method: {method_name} (class binding, streamed)\n"
+                        code_text += stream_text
+                        class_method_names.append(method_name + "_stream")
+                else:
+                    code_text += f"void {method_name}(void) {{}}\n\n"
+                    method_names.append(method_name)
+
+        return {
+            'code': code_text,
+            'method_names': method_names,
+            'method_py_args': method_py_args,
+            'class_method_names': class_method_names,
+            'method_specs': method_specs,
+        }
+
+    @staticmethod
+    def _generate_definitions(class_name: str, bindings: dict, use_wrappers: bool) -> str:
+        """
+        Generate the m.def lines of the module functions and the class binding.
+        """
+        method_py_args = bindings['method_py_args']
+        self_type = f"{class_name}_Instance"
+
+        code_text = ""
+        code_text += "    m.def(\"initialize\", &initialize, \"Initialize the module\");\n"
+
+        for method_name in bindings['method_names']:
+            py_args = method_py_args.get(method_name, [])
+            arg_text = "".join(", " + a for a in py_args)
+            code_text += f"    m.def(\"{method_name}\", &{method_name}, \"{method_name} method\"{arg_text});\n"
+
+        if use_wrappers:
+            code_text += "\n"
+            code_text += f"    py::class_<{self_type}>(m, \"{class_name}\")\n"
+            code_text += "        .def(py::init<>())\n"
+            code_text += "        .def(\"initialize\", &instance_initialize, \"Initialize the instance\")"
+            for method_name in bindings['class_method_names']:
+                py_args = method_py_args.get(method_name, [])
+                arg_text = "".join(", " + a for a in py_args)
+                code_text += f"\n        .def(\"{method_name}\", &instance_{method_name}, \"{method_name} method\"{arg_text})"
+            code_text += ";\n"
+
+        return code_text
+
+    @staticmethod
+    def generate_cpp_code(
+        python_file_path_with_extension: str,
+        module_name: str,
+        cpp_file_path_to_generate: str,
+        method_specs: dict = None
+    ):
+        """
+        Generate a C++ file that defines a pybind11 module with an initialize function.
+
+        Args:
+            method_specs: Optional mapping of method name to method spec
+                (see the class docstring). Methods with a spec get typed wrappers
+                when the C++ header of the class exists. If None, the specs are
+                derived from the Python annotations and the C++ header.
+        """
+        # analyze the python file to find classes and methods
+        classes = PybindCppGenerator._parse_single_class(
+            python_file_path_with_extension)
+
+        if method_specs is None:
+            method_specs = PybindCppGenerator.derive_method_specs(
+                python_file_path_with_extension, classes)
+
+        python_file_stem = os.path.splitext(
+            os.path.basename(python_file_path_with_extension))[0]
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            python_file_path_with_extension)
+        class_name = next(iter(classes))
+        use_wrappers = (cpp_header_name != "") and bool(method_specs)
+
         code_text = ""
         code_text += "#include <pybind11/numpy.h>\n"
         code_text += "#include <pybind11/pybind11.h>\n\n"
 
+        if use_wrappers:
+            code_text += "#include <limits>\n"
+            code_text += "#include <mutex>\n\n"
+
+        if use_wrappers:
+            code_text += f"#include \"{PybindCppGenerator.CONVERSION_HEADER_NAME}\"\n"
+            code_text += f"#include \"{PybindCppGenerator.STREAM_HEADER_NAME}\"\n"
+        if cpp_header_name != "":
+            code_text += f"#include \"{cpp_header_name}\"\n"
+        if use_wrappers or cpp_header_name != "":
+            code_text += "\n"
+
+        code_text += f"namespace {python_file_stem}_SIL {{\n\n"
+
         code_text += "namespace py = pybind11;\n\n"
 
-        code_text += "void initialize(void) {}\n\n"
+        bindings = PybindCppGenerator._generate_bindings(
+            classes, method_specs, cpp_header_name, use_wrappers)
+        code_text += bindings['code']
+
+        code_text += f"PYBIND11_MODULE({module_name}, m) {{\n"
+        code_text += PybindCppGenerator._generate_definitions(
+            class_name, bindings, use_wrappers)
+        if use_wrappers:
+            code_text += "\n"
+            code_text += f"    {PybindCppGenerator.CONVERSION_NAMESPACE}::define_stats_functions(m);\n"
+            code_text += f"    {PybindCppGenerator.CONVERSION_NAMESPACE}::define_trace_functions(m);\n"
+        code_text += "}\n\n"
+
+        code_text += f"}} // namespace {python_file_stem}_SIL\n"
+
+        with open(cpp_file_path_to_generate, "w", encoding="utf-8") as f:
+            f.write(code_text)
+
+    @staticmethod
+    def specialization_label(specialization: dict) -> str:
+        """
+        Return the name of the submodule and C++ namespace of a specialization,
+        e.g. "MATRIX_SIZE_6" for {"MATRIX_SIZE": 6}, or "FLOAT_float_SIMD" for
+        {"FLOAT": "float", "simd": True}.
+        """
+        label = "_".join(f"{name}_{value}" for name, value in specialization.items()
+                         if name != SPECIALIZATION_SIMD_KEY)
+        if specialization.get(SPECIALIZATION_SIMD_KEY):
+            label += "_SIMD"
+        return re.sub(r'\W', '_', label)
+
+    @staticmethod
+    def _specialize_source(source: str, constants: dict, guard_suffix: str) -> str:
+        """
+        Return the class source with the initializers of the given static
+        constants and the targets of the given type aliases (e.g.
+        {"FLOAT": "float"}) replaced and its include guard renamed, so that it
+        can be compiled next to the original class.
+        """
+        for name, value in constants.items():
+            source = re.sub(
+                r'(\bstatic\s+(?:constexpr|const)\s+(?:const\s+)?[\w:]+\s+'
+                + re.escape(name) + r'\s*=\s*)[^;]+;',
+                lambda match: f"{match.group(1)}{value};", source)
+            source = re.sub(
+                r'(\busing\s+' + re.escape(name) + r'\s*=\s*)[^;]+;',
+                lambda match: f"{match.group(1)}{value};", source)
+            source = re.sub(
+                r'\btypedef\s+[^;{}]+?(\s+' + re.escape(name) + r'\s*;)',
+                lambda match: f"typedef {value}{match.group(1)}", source)
+
+        guard = re.search(r'^\s*#\s*ifndef\s+(\w+)\s*\n\s*#\s*define\s+\1\b',
+                          source, re.MULTILINE)
+        if guard:
+            source = re.sub(r'\b' + guard.group(1) + r'\b',
+                            f"{guard.group(1)}_{guard_suffix}", source)
+
+        return source
+
+    @staticmethod
+    def _collect_includes(source: str, source_dir: str, skip_name: str) -> list:
+        """
+        Return the #include lines of a class source, except the include of
+        skip_name. Quoted includes found next to the source get absolute paths.
+        """
+        include_lines = []
+        for delimiter, name in re.findall(
+                r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', source, re.MULTILINE):
+            if os.path.basename(name) == skip_name:
+                continue
+            if delimiter == "<":
+                include_lines.append(f"#include <{name}>")
+                continue
+
+            candidate = os.path.join(source_dir, name)
+            if os.path.isfile(candidate):
+                name = os.path.normpath(os.path.abspath(candidate))
+            include_lines.append(f"#include \"{name}\"")
+
+        return include_lines
+
+    @staticmethod
+    def _write_if_changed(file_path: str, text: str) -> None:
+        """
+        Write the file only if its content changes, so that an unchanged
+        translation unit is not recompiled.
+        """
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                if f.read() == text:
+                    return
+
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    @staticmethod
+    def _generate_dispatch_shapes(method_spec: dict, leading_dimension: bool) -> str:
+        """
+        Return the SIL_Dispatch::ArgumentShape list of the array arguments.
+        Batched and streamed functions take every argument as an array with a
+        leading dimension; only dense, diagonal and sparse arguments are
+        matched. The element type is the dtype of the argument as declared in
+        the specialization namespace (e.g. SampleMatrix::FLOAT).
+        """
+        shapes = []
+        for position, arg_spec in enumerate(method_spec.get('args', [])):
+            name = arg_spec['name']
+            dtype = arg_spec.get('dtype', 'double')
+            shape = arg_spec.get('shape', ())
+            if arg_spec['kind'] == 'dense':
+                shapes.append(f"SIL_Dispatch::dense_shape<{dtype}>(\"{name}\", {position}, {shape[0]}, {shape[1]})")
+            elif arg_spec['kind'] == 'diag':
+                shapes.append(f"SIL_Dispatch::diag_shape<{dtype}>(\"{name}\", {position}, {shape[0]})")
+            elif arg_spec['kind'] == 'sparse' and not leading_dimension:
+                shapes.append(f"SIL_Dispatch::sparse_shape<{dtype}>(\"{name}\", {position}, {arg_spec['pattern_name']})")
+
+        return "{" + ",\n                  ".join(shapes) + "}"
+
+    @staticmethod
+    def generate_specialized_cpp_code(
+        python_file_path_with_extension: str,
+        module_name: str,
+        output_folder: str,
+        specializations: list
+    ) -> tuple:
+        """
+        Generate a SIL module with one specialization of the C++ class per
+        entry of `specializations`, each a mapping of static constants or type
+        aliases of the class to their values, e.g.
+        [{"MATRIX_SIZE": 3}, {"MATRIX_SIZE": 6}] or
+        [{"FLOAT": "double"}, {"FLOAT": "float"}]. The key "simd" only changes
+        the label (see specialization_label); its compile options are set by
+        SIL_Operator.build_SIL_code.
+
+        For every specialization, a copy of the class header (and of its .cpp
+        file, if any) with the constants replaced is written to
+        "<output_folder>/<label>/", and a translation unit
+        "<stem>_SIL_<label>.cpp" compiles it in the namespace
+        <stem>_SIL::<label> together with its wrappers (as generated by
+        generate_cpp_code). The module "<stem>_specialized_SIL.cpp" holds one
+        submodule per specialization ("<Module>.<label>.<method>", with the
+        class binding), and module level functions that dispatch on the shapes
+        and element types of the array arguments (see SIL_dispatch.hpp).
+        Files are only rewritten when their content changes.
+
+        Returns (path of the module C++ file, paths of the specialization
+        translation units).
+        """
+        classes = PybindCppGenerator._parse_single_class(
+            python_file_path_with_extension)
+        class_name = next(iter(classes))
+
+        python_dir = os.path.dirname(os.path.abspath(python_file_path_with_extension))
+        python_file_name = os.path.basename(python_file_path_with_extension)
+        python_file_stem = os.path.splitext(python_file_name)[0]
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            python_file_path_with_extension)
+        if cpp_header_name == "":
+            raise ValueError(
+                f"Specializations need the C++ header of {python_file_name}.")
+
+        header_path = os.path.join(python_dir, cpp_header_name)
+        source_path = os.path.splitext(header_path)[0] + ".cpp"
+        if not os.path.isfile(source_path):
+            source_path = ""
+
+        class_info = CppHeaderAnalyzer.parse_file(header_path).get(
+            class_name, {'aliases': {}, 'constants': {}})
+
+        labels = []
+        for specialization in specializations:
+            if not isinstance(specialization, dict) or not specialization:
+                raise ValueError(
+                    f"A specialization must be a non-empty mapping of constants to values, got {specialization!r}.")
+            for name in specialization:
+                if name == SPECIALIZATION_SIMD_KEY:
+                    continue
+                if name not in class_info['constants'] and \
+                        name not in class_info['aliases']:
+                    raise ValueError(
+                        f"{name} is not a static constant or type alias of {class_name} in {cpp_header_name}.")
+            labels.append(PybindCppGenerator.specialization_label(specialization))
+        if len(set(labels)) != len(labels):
+            raise ValueError(f"Duplicate specializations: {labels}.")
+
+        with open(header_path, "r", encoding="utf-8") as f:
+            header_source = f.read()
+        class_sources = [(header_path, header_source)]
+        if source_path != "":
+            with open(source_path, "r", encoding="utf-8") as f:
+                class_sources.append((source_path, f.read()))
+
+        # includes of the class, compiled outside of the specialization namespace
+        include_lines = []
+        for path, source in class_sources:
+            for line in PybindCppGenerator._collect_includes(
+                    source, os.path.dirname(path), cpp_header_name):
+                if line not in include_lines:
+                    include_lines.append(line)
+
+        os.makedirs(output_folder, exist_ok=True)
+        specialization_cpp_paths = []
+        for specialization, label in zip(specializations, labels):
+            label_folder = os.path.join(output_folder, label)
+            os.makedirs(label_folder, exist_ok=True)
+
+            constants = {name: str(value) for name, value in specialization.items()
+                         if name != SPECIALIZATION_SIMD_KEY}
+            for path, source in class_sources:
+                PybindCppGenerator._write_if_changed(
+                    os.path.join(label_folder, os.path.basename(path)),
+                    PybindCppGenerator._specialize_source(source, constants, label))
+            with open(python_file_path_with_extension, "r", encoding="utf-8") as f:
+                PybindCppGenerator._write_if_changed(
+                    os.path.join(label_folder, python_file_name), f.read())
+
+            method_specs = PybindCppGenerator.derive_method_specs(
+                os.path.join(label_folder, python_file_name), classes)
+            use_wrappers = bool(method_specs)
+            bindings = PybindCppGenerator._generate_bindings(
+                classes, method_specs, cpp_header_name, use_wrappers,
+                stats_prefix=f"{label}.")
+
+            code_text = ""
+            code_text += "#include <pybind11/numpy.h>\n"
+            code_text += "#include <pybind11/pybind11.h>\n\n"
+            code_text += "#include <limits>\n"
+            code_text += "#include <mutex>\n\n"
+            code_text += f"#include \"{PybindCppGenerator.CONVERSION_HEADER_NAME}\"\n"
+            code_text += f"#include \"{PybindCppGenerator.DISPATCH_HEADER_NAME}\"\n"
+            code_text += f"#include \"{PybindCppGenerator.STREAM_HEADER_NAME}\"\n\n"
+            if include_lines:
+                code_text += "/* includes of the class, outside of the specialization namespace */\n"
+                code_text += "\n".join(include_lines) + "\n\n"
+
+            code_text += f"namespace {python_file_stem}_SIL {{\n"
+            code_text += f"namespace {label} {{\n\n"
+            code_text += f"/* {class_name} with " + ", ".join(
+                f"{name} = {value}" for name, value in constants.items()) + \
+                (", SIMD" if specialization.get(SPECIALIZATION_SIMD_KEY) else "") + " */\n"
+            for path, _ in class_sources:
+                code_text += f"#include \"{label}/{os.path.basename(path)}\"\n"
+            code_text += "\n"
+
+            code_text += "namespace py = pybind11;\n\n"
+            code_text += bindings['code']
+
+            annotated_specs = bindings['method_specs']
+            code_text += "void register_specialization(py::module_ m,\n"
+            code_text += "                             SIL_Dispatch::Registry &registry) {\n"
+            code_text += PybindCppGenerator._generate_definitions(
+                class_name, bindings, use_wrappers)
+            code_text += "\n"
+            code_text += "    registry.add_initializer(m.attr(\"initialize\"));\n"
+            for function_name in bindings['method_names']:
+                method_name = function_name
+                leading_dimension = False
+                for suffix in ("_batch", "_stream"):
+                    if function_name.endswith(suffix) and \
+                            function_name[:-len(suffix)] in annotated_specs and \
+                            function_name not in annotated_specs:
+                        method_name = function_name[:-len(suffix)]
+                        leading_dimension = True
+
+                shapes_text = PybindCppGenerator._generate_dispatch_shapes(
+                    annotated_specs.get(method_name, {}), leading_dimension)
+                code_text += f"    registry.add(\"{function_name}\", \"{label}\",\n"
+                code_text += f"                 {shapes_text},\n"
+                code_text += f"                 {'true' if leading_dimension else 'false'}, m.attr(\"{function_name}\"));\n"
+            code_text += "}\n\n"
+
+            code_text += f"}} // namespace {label}\n"
+            code_text += f"}} // namespace {python_file_stem}_SIL\n"
+
+            cpp_path = os.path.join(
+                output_folder, f"{python_file_stem}_SIL_{label}.cpp")
+            PybindCppGenerator._write_if_changed(cpp_path, code_text)
+            specialization_cpp_paths.append(cpp_path)
+
+        code_text = ""
+        code_text += "#include <pybind11/pybind11.h>\n\n"
+        code_text += f"#include \"{PybindCppGenerator.DISPATCH_HEADER_NAME}\"\n\n"
+        code_text += f"namespace {python_file_stem}_SIL {{\n\n"
+        code_text += "namespace py = pybind11;\n\n"
+        for label in labels:
+            code_text += f"namespace {label} {{\n"
+            code_text += "void register_specialization(py::module_ m,\n"
+            code_text += "                             SIL_Dispatch::Registry &registry);\n"
+            code_text += f"}} // namespace {label}\n\n"
+
+        code_text += f"PYBIND11_MODULE({module_name}, m) {{\n"
+        code_text += "    SIL_Dispatch::Registry registry;\n"
+        for specialization, label in zip(specializations, labels):
+            description = ", ".join(
+                f"{name} = {value}" for name, value in specialization.items())
+            code_text += f"    {label}::register_specialization(\n"
+            code_text += f"        m.def_submodule(\"{label}\", \"{class_name} with {description}\"), registry);\n"
+        code_text += "\n"
+        code_text += "    /* module level functions, dispatched on the argument shapes */\n"
+        code_text += "    registry.define(m);\n"
+        code_text += f"    {PybindCppGenerator.CONVERSION_NAMESPACE}::define_stats_functions(m);\n"
+        code_text += f"    {PybindCppGenerator.CONVERSION_NAMESPACE}::define_trace_functions(m);\n"
+        code_text += "}\n\n"
+        code_text += f"}} // namespace {python_file_stem}_SIL\n"
+
+        module_cpp_path = os.path.join(
+            output_folder, f"{python_file_stem}{PybindCppGenerator.SPECIALIZED_CPP_SUFFIX}")
+        PybindCppGenerator._write_if_changed(module_cpp_path, code_text)
+
+        return module_cpp_path, specialization_cpp_paths
+
+
+class CApiCppGenerator:
+    """
+    Generate the SIL C++ file of the "capi" binding backend: a Python extension
+    module written against the CPython C API and the NumPy C API, without
+    pybind11 (see SIL_capi_conversion.hpp).
+
+    The module has the same module level functions as the one generated by
+    PybindCppGenerator ("initialize" and one function per method, with the same
+    argument names, scalar defaults and "out" argument), each a
+    METH_FASTCALL | METH_KEYWORDS function, get_stats / reset_stats of the
+    call statistics (SIL_CALL_STATS) and start_trace / stop_trace of the call
+    trace (SIL_CALL_TRACE). The method specs are derived in the
+    same way (PybindCppGenerator.derive_method_specs); methods without a spec
+    are generated as stubs. The batched and streamed variants and the class
+    binding are generated by the pybind11 backend only.
+    """
+    CONVERSION_HEADER_NAME = "SIL_capi_conversion.hpp"
+    CONVERSION_NAMESPACE = "SIL_CApiConversion"
+    CPP_SUFFIX = "_capi_SIL.cpp"
+
+    @staticmethod
+    def generate_input_conversion(arg_spec: dict, index: int,
+                                  indent: str = "  ") -> str:
+        """
+        Return the C++ lines that convert the parsed argument `index` into the
+        C++ type, returning nullptr from the wrapper on error.
+        """
+        name = arg_spec['name']
+        kind = arg_spec['kind']
+        dtype = arg_spec.get('dtype', 'double')
+        shape = arg_spec.get('shape', ())
+        ns = CApiCppGenerator.CONVERSION_NAMESPACE
+
+        code_text = ""
+        if kind == 'scalar':
+            cpp_type = arg_spec.get('cpp_type', 'double')
+            if 'default' in arg_spec:
+                code_text += f"{indent}{cpp_type} {name} = {arg_spec['default']};\n"
+                code_text += f"{indent}if ((parsed[{index}] != nullptr) &&\n"
+                code_text += f"{indent}    !{ns}::scalar_from_object(parsed[{index}], {name})) {{\n"
+            else:
+                code_text += f"{indent}{cpp_type} {name};\n"
+                code_text += f"{indent}if (!{ns}::scalar_from_object(parsed[{index}], {name})) {{\n"
+        elif kind == 'dense':
+            code_text += f"{indent}{arg_spec['cpp_type']} {name};\n"
+            code_text += f"{indent}if (!{ns}::dense_from_object<{dtype}, {shape[0]}, {shape[1]}>(\n"
+            code_text += f"{indent}        parsed[{index}], {name}, \"{name}\")) {{\n"
+        elif kind == 'diag':
+            code_text += f"{indent}{arg_spec['cpp_type']} {name};\n"
+            code_text += f"{indent}if (!{ns}::diag_from_object<{dtype}, {shape[0]}>(\n"
+            code_text += f"{indent}        parsed[{index}], {name}, \"{name}\")) {{\n"
+        elif kind == 'sparse':
+            code_text += f"{indent}{arg_spec['cpp_type']} {name};\n"
+            code_text += f"{indent}if (!{ns}::sparse_from_object<{dtype}>(\n"
+            code_text += f"{indent}        parsed[{index}], {arg_spec['pattern_name']}, {name}, \"{name}\")) {{\n"
+        else:
+            return ""
+
+        code_text += f"{indent}  return nullptr;\n"
+        code_text += f"{indent}}}\n"
+
+        return code_text
+
+    @staticmethod
+    def generate_method_wrapper(
+        instance_name: str,
+        method_name: str,
+        method_spec: dict
+    ) -> str:
+        """
+        Generate the METH_FASTCALL | METH_KEYWORDS wrapper of one method.
+        Its whole body is in a try block, so that no C++ exception (of the
+        method, an allocation or the call trace) unwinds into CPython.
+        """
+        args = method_spec.get('args', [])
+        return_spec = method_spec.get('returns', {'kind': 'void'})
+        return_kind = return_spec['kind']
+        returns_array = return_kind in ('dense', 'diag', 'sparse')
+        ns = CApiCppGenerator.CONVERSION_NAMESPACE
+        buffer_ns = PybindCppGenerator.CONVERSION_NAMESPACE
+
+        names = [a['name'] for a in args]
+        initial_values = ["nullptr"] * len(args)
+        if returns_array:
+            names.append("out")
+            initial_values.append("Py_None")
+        required = 0
+        while required < len(args) and 'default' not in args[required]:
+            required += 1
+
+        signature_indent = " " * len(f"PyObject *{method_name}(")
+        parse_indent = " " * len(f"    if (!{ns}::parse_arguments(")
+
+        code_text = ""
+        code_text += PybindCppGenerator._generate_stats_definition(method_name, "")
+        code_text += f"SIL_CALL_TRACE_FUNCTION({method_name}_trace, \"{method_name}\");\n"
+        code_text += f"PyObject *{method_name}(PyObject *, PyObject *const *args,\n"
+        code_text += f"{signature_indent}Py_ssize_t nargs, PyObject *kwnames) {{\n"
+        code_text += f"  SIL_CALL_STATS_TIMER({method_name}_stats);\n"
+        code_text += "  try {\n"
+        code_text += f"    SIL_CALL_TRACE_RECORD({method_name}_trace);\n\n"
+        if names:
+            code_text += "    static const char *const names[] = {" + \
+                ", ".join(f"\"{n}\"" for n in names) + "};\n"
+            code_text += "    PyObject *parsed[] = {" + ", ".join(initial_values) + "};\n"
+            code_text += f"    if (!{ns}::parse_arguments(\"{method_name}\", args, nargs,\n"
+            code_text += f"{parse_indent}kwnames, names, {len(names)}, {required}, parsed)) {{\n"
+        else:
+            code_text += f"    if (!{ns}::parse_arguments(\"{method_name}\", args, nargs,\n"
+            code_text += f"{parse_indent}kwnames, nullptr, 0, 0, nullptr)) {{\n"
+        code_text += "      return nullptr;\n"
+        code_text += "    }\n\n"
+
+        conversion_text = ""
+        for index, arg_spec in enumerate(args):
+            conversion_text += CApiCppGenerator.generate_input_conversion(
+                arg_spec, index, "    ")
+        if conversion_text != "":
+            code_text += "    /* substitute */\n"
+            code_text += conversion_text + "\n"
+
+        if args:
+            for arg_spec in args:
+                code_text += "    SIL_CALL_TRACE_VALUE(" + PybindCppGenerator._trace_value(
+                    arg_spec, arg_spec['name']) + ");\n"
+            code_text += "\n"
+
+        dtype = return_spec.get('dtype', 'double')
+        shape = return_spec.get('shape', ())
+        if returns_array:
+            if return_kind == 'diag':
+                rows, cols = shape[0], shape[0]
+            else:
+                rows, cols = shape[0], shape[1]
+            code_text += "    /* output array */\n"
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {ns}::Reference output({ns}::prepare_output<{dtype}>(\n"
+            code_text += f"        parsed[{len(args)}], {rows}, {cols}, \"out\"));\n"
+            code_text += "    if (!output) {\n"
+            code_text += "      return nullptr;\n"
+            code_text += "    }\n\n"
+
+        call_text = f"{instance_name}.{method_name}({', '.join(a['name'] for a in args)})"
+
+        code_text += f"    /* call {method_name} method */\n"
+        code_text += "    SIL_CALL_STATS_PHASE(COMPUTE);\n"
+        if return_kind == 'void':
+            code_text += f"    {call_text};\n"
+        else:
+            code_text += f"    auto result = {call_text};\n"
+        code_text += PybindCppGenerator._generate_trace_result(
+            return_spec, "    ")
+        if return_kind == 'dense':
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {buffer_ns}::dense_to_buffer<{shape[0]}, {shape[1]}>(\n"
+            code_text += f"        result, {ns}::mutable_data<{dtype}>(output));\n"
+        elif return_kind == 'diag':
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {buffer_ns}::diag_to_buffer<{shape[0]}>(\n"
+            code_text += f"        result, {ns}::mutable_data<{dtype}>(output));\n"
+        elif return_kind == 'sparse':
+            code_text += "    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);\n"
+            code_text += f"    {buffer_ns}::sparse_to_buffer(result, {return_spec['pattern_name']},\n"
+            code_text += f"                                     {ns}::mutable_data<{dtype}>(output));\n"
+
+        if returns_array:
+            code_text += "    return output.release();\n"
+        elif return_kind == 'scalar':
+            code_text += f"    return {ns}::scalar_to_object(result);\n"
+        else:
+            code_text += "    Py_RETURN_NONE;\n"
+        code_text += "  } catch (...) {\n"
+        code_text += f"    return {ns}::set_error_from_exception();\n"
+        code_text += "  }\n"
+        code_text += "}\n\n"
+
+        return code_text
 
-        method_names = set()
+    @staticmethod
+    def generate_cpp_code(
+        python_file_path_with_extension: str,
+        module_name: str,
+        cpp_file_path_to_generate: str,
+        method_specs: dict = None
+    ) -> None:
+        """
+        Generate the C++ file of the CPython C API module of the Python class.
+        The class header is included by its absolute path, so the file can be
+        generated outside of the Python file directory (in the build folder).
+        The file is only rewritten when its content changes.
+
+        Args:
+            method_specs: Optional mapping of method name to method spec
+                (see PybindCppGenerator). If None, the specs are derived from
+                the Python annotations and the C++ header.
+        """
+        classes = PybindCppGenerator._parse_single_class(
+            python_file_path_with_extension)
+
+        if method_specs is None:
+            method_specs = PybindCppGenerator.derive_method_specs(
+                python_file_path_with_extension, classes)
+
+        python_file_stem = os.path.splitext(
+            os.path.basename(python_file_path_with_extension))[0]
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            python_file_path_with_extension)
+        class_name = next(iter(classes))
+        instance_name = PybindCppGenerator._camel_to_snake(
+            class_name) + "_instance"
+        use_wrappers = (cpp_header_name != "") and bool(method_specs)
+        ns = CApiCppGenerator.CONVERSION_NAMESPACE
+
+        code_text = ""
+        code_text += "/* Python.h first */\n"
+        code_text += f"#include \"{CApiCppGenerator.CONVERSION_HEADER_NAME}\"\n\n"
+        if cpp_header_name != "":
+            header_path = os.path.join(os.path.dirname(os.path.abspath(
+                python_file_path_with_extension)), cpp_header_name)
+            code_text += f"#include \"{header_path.replace(os.sep, '/')}\"\n\n"
+
+        code_text += f"namespace {python_file_stem}_SIL {{\n\n"
+
+        if cpp_header_name != "":
+            code_text += f"{class_name} {instance_name};\n\n"
+            if use_wrappers:
+                code_text += "SIL_CALL_TRACE_FUNCTION(initialize_trace, \"initialize\");\n"
+            code_text += "PyObject *initialize(PyObject *, PyObject *) {\n"
+            code_text += "  try {\n"
+            if use_wrappers:
+                code_text += "    SIL_CALL_TRACE_RECORD(initialize_trace);\n"
+            code_text += f"    {instance_name} = {class_name}();\n"
+            if use_wrappers:
+                code_text += "    SIL_CALL_TRACE_COMMIT();\n"
+            code_text += "  } catch (...) {\n"
+            code_text += f"    return {ns}::set_error_from_exception();\n"
+            code_text += "  }\n"
+            code_text += "  Py_RETURN_NONE;\n"
+            code_text += "}\n\n"
+        else:
+            code_text += "PyObject *initialize(PyObject *, PyObject *) { Py_RETURN_NONE; }\n\n"
+
+        if use_wrappers:
+            pattern_text, method_specs = PybindCppGenerator.generate_sparse_patterns(
+                method_specs)
+            if pattern_text != "":
+                code_text += "/* Sparsity patterns of the sparse arguments and results */\n"
+                code_text += pattern_text
+
+        method_entries = []
         for class_name, methods in classes.items():
             code_text += f"// Class: {class_name}\n"
             for method in methods:
@@ -415,24 +2908,246 @@ class PybindCppGenerator:
                     continue
 
                 code_text += f"// Method: {method_name}\n"
-                code_text += f"void {method_name}(void) {{}}\n\n"
+                if use_wrappers and method_name in method_specs:
+                    code_text += CApiCppGenerator.generate_method_wrapper(
+                        instance_name, method_name, method_specs[method_name])
+                    method_entries.append(
+                        f"{{\"{method_name}\", {ns}::fastcall({method_name}), METH_FASTCALL | METH_KEYWORDS,\n"
+                        f"     \"{method_name} method\"}}")
+                else:
+                    code_text += f"PyObject *{method_name}(PyObject *, PyObject *) {{ Py_RETURN_NONE; }}\n\n"
+                    method_entries.append(
+                        f"{{\"{method_name}\", {method_name}, METH_NOARGS, \"{method_name} method\"}}")
+
+        code_text += "PyMethodDef methods[] = {\n"
+        code_text += "    {\"initialize\", initialize, METH_NOARGS, \"Initialize the module\"},\n"
+        for entry in method_entries:
+            code_text += f"    {entry},\n"
+        if use_wrappers:
+            code_text += f"    {{\"get_stats\", {ns}::get_stats, METH_NOARGS,\n"
+            code_text += "     \"Call statistics of the module functions (built with SIL_CALL_STATS)\"},\n"
+            code_text += f"    {{\"reset_stats\", {ns}::reset_stats, METH_NOARGS, \"Reset the call statistics\"}},\n"
+            code_text += f"    {{\"start_trace\", {ns}::start_trace, METH_O,\n"
+            code_text += "     \"Record the calls of the module functions to a trace file (built with SIL_CALL_TRACE)\"},\n"
+            code_text += f"    {{\"stop_trace\", {ns}::stop_trace, METH_NOARGS,\n"
+            code_text += "     \"Close the trace file and return the number of recorded calls\"},\n"
+        code_text += "    {nullptr, nullptr, 0, nullptr}};\n\n"
+
+        code_text += "PyModuleDef module_definition = {\n"
+        code_text += f"    PyModuleDef_HEAD_INIT, \"{module_name}\", \"SIL module of {class_name}\", -1,\n"
+        code_text += "    methods, nullptr, nullptr, nullptr, nullptr};\n\n"
+
+        code_text += f"}} // namespace {python_file_stem}_SIL\n\n"
+
+        code_text += f"PyMODINIT_FUNC PyInit_{module_name}(void) {{\n"
+        code_text += "  import_array();\n"
+        code_text += f"  return PyModule_Create(&{python_file_stem}_SIL::module_definition);\n"
+        code_text += "}\n"
 
-                method_names.add(method_name)
+        os.makedirs(os.path.dirname(cpp_file_path_to_generate), exist_ok=True)
+        PybindCppGenerator._write_if_changed(cpp_file_path_to_generate, code_text)
 
-        code_text += f"PYBIND11_MODULE({module_name}, m) {{\n"
 
-        code_text += "    m.def(\"initialize\", &initialize, \"Initialize the module\");\n"
+class ReplayCppGenerator:
+    """
+    Generate the replay benchmark of a SIL module: a standalone C++ program
+    that replays a trace of module function calls against the C++ class,
+    without Python. The trace is recorded with start_trace() / stop_trace() of
+    a module built with the SIL_CALL_TRACE definition (see SIL_call_trace.hpp).
+
+    For every method with a spec (PybindCppGenerator.derive_method_specs), the
+    program decodes the recorded arguments into the C++ types once, runs the
+    calls in the recorded order on a new instance and compares the results
+    with the recorded ones, then reports the time per call of each method
+    (SIL_CallTrace::replay_main). CmakeGenerator builds it as the executable
+    "<Module>_replay" in the build folder, next to the module:
+
+        SampleMatrixSIL_replay TRACE [--repeat N] [--min-calls N] [--tolerance X]
+
+    It exits with 1 if a result differs from the recorded one by more than the
+    tolerance (exact by default), and with 2 if the trace does not match the
+    methods of the class.
+    """
+    TRACE_HEADER_NAME = "SIL_call_trace.hpp"
+    TRACE_NAMESPACE = "SIL_CallTrace"
+    CPP_SUFFIX = "_SIL_replay.cpp"
+    FOLDER_NAME = "replay"
+    TARGET_SUFFIX = "_replay"
+
+    @staticmethod
+    def _result_element_type(return_spec: dict) -> str:
+        """
+        Return the element type of the recorded result values.
+        """
+        if return_spec['kind'] in ('dense', 'diag', 'sparse'):
+            return return_spec.get('dtype', 'double')
+        elif return_spec['kind'] == 'scalar':
+            return return_spec.get('cpp_type', 'double')
+
+        return "char"
 
-        for method_name in method_names:
-            code_text += f"    m.def(\"{method_name}\", &{method_name}, \"{method_name} method\");\n"
+    @staticmethod
+    def generate_method_replay(
+        instance_name: str,
+        method_name: str,
+        method_spec: dict
+    ) -> str:
+        """
+        Generate the recorded calls of one method and their decode, check and
+        run functions.
+        """
+        args = method_spec.get('args', [])
+        return_spec = method_spec.get('returns', {'kind': 'void'})
+        ns = ReplayCppGenerator.TRACE_NAMESPACE
+        call_type = f"{method_name}_Call"
+
+        call_text = f"{instance_name}.{method_name}(" + \
+            ", ".join(f"call.{a['name']}" for a in args) + ")"
+
+        code_text = ""
+        code_text += f"struct {call_type} {{\n"
+        for arg_spec in args:
+            code_text += f"  {arg_spec.get('cpp_type', 'double')} {arg_spec['name']};\n"
+        code_text += "  std::vector<char> recorded_result;\n"
+        code_text += "};\n\n"
+        code_text += f"std::vector<{call_type}> {method_name}_calls;\n\n"
+
+        code_text += f"bool decode_{method_name}({ns}::Decoder &decoder) {{\n"
+        code_text += f"  {method_name}_calls.emplace_back();\n"
+        code_text += f"  {call_type} &call = {method_name}_calls.back();\n"
+        for arg_spec in args:
+            code_text += "  decoder." + PybindCppGenerator._trace_value(
+                arg_spec, f"call.{arg_spec['name']}") + ";\n"
+        code_text += "  decoder.rest(call.recorded_result);\n"
+        code_text += "  return decoder.finished();\n"
+        code_text += "}\n\n"
+
+        code_text += f"void check_{method_name}(std::size_t index, {ns}::Check &check) {{\n"
+        code_text += f"  {call_type} &call = {method_name}_calls[index];\n"
+        code_text += f"  {ns}::Encoder actual;\n"
+        if return_spec['kind'] == 'void':
+            code_text += f"  {call_text};\n"
+        else:
+            code_text += f"  auto result = {call_text};\n"
+            code_text += "  actual." + PybindCppGenerator._trace_value(
+                return_spec, "result") + ";\n"
+        code_text += f"  check.compare<{ReplayCppGenerator._result_element_type(return_spec)}>(\n"
+        code_text += f"      \"{method_name}\", index, actual.bytes(), call.recorded_result);\n"
+        code_text += "}\n\n"
+
+        code_text += f"void run_{method_name}() {{\n"
+        code_text += f"  for (std::size_t i = 0; i < {method_name}_calls.size(); ++i) {{\n"
+        code_text += f"    {call_type} &call = {method_name}_calls[i];\n"
+        if return_spec['kind'] == 'void':
+            code_text += f"    {call_text};\n"
+            code_text += f"    {ns}::do_not_optimize({instance_name});\n"
+        else:
+            code_text += f"    auto result = {call_text};\n"
+            code_text += f"    {ns}::do_not_optimize(result);\n"
+        code_text += "  }\n"
+        code_text += "}\n\n"
 
+        return code_text
+
+    @staticmethod
+    def generate_cpp_code(
+        python_file_path_with_extension: str,
+        module_name: str,
+        cpp_file_path_to_generate: str,
+        method_specs: dict = None
+    ) -> None:
+        """
+        Generate the C++ file of the replay benchmark of the Python class.
+        The class header is included by its absolute path, so the file is
+        generated in the build folder. The file is only rewritten when its
+        content changes.
+
+        Args:
+            method_specs: Optional mapping of method name to method spec
+                (see PybindCppGenerator). If None, the specs are derived from
+                the Python annotations and the C++ header.
+        """
+        classes = PybindCppGenerator._parse_single_class(
+            python_file_path_with_extension)
+
+        if method_specs is None:
+            method_specs = PybindCppGenerator.derive_method_specs(
+                python_file_path_with_extension, classes)
+
+        python_file_name = os.path.basename(python_file_path_with_extension)
+        python_file_stem = os.path.splitext(python_file_name)[0]
+        cpp_header_name = PybindCppGenerator.find_cpp_header(
+            python_file_path_with_extension)
+        if cpp_header_name == "" or not method_specs:
+            raise ValueError(
+                f"The replay benchmark needs the C++ header of {python_file_name} "
+                f"and methods with typed wrappers.")
+
+        class_name = next(iter(classes))
+        instance_name = PybindCppGenerator._camel_to_snake(
+            class_name) + "_instance"
+        ns = ReplayCppGenerator.TRACE_NAMESPACE
+        namespace = f"{python_file_stem}_SIL_replay"
+
+        header_path = os.path.join(os.path.dirname(os.path.abspath(
+            python_file_path_with_extension)), cpp_header_name)
+
+        code_text = ""
+        code_text += f"/* Replay benchmark of {module_name}: replays a trace recorded with\n"
+        code_text += f"   {module_name}.start_trace() against {class_name}, without Python. */\n"
+        code_text += "#include <cstddef>\n"
+        code_text += "#include <vector>\n\n"
+        code_text += f"#include \"{ReplayCppGenerator.TRACE_HEADER_NAME}\"\n\n"
+        code_text += f"#include \"{header_path.replace(os.sep, '/')}\"\n\n"
+
+        code_text += f"namespace {namespace} {{\n\n"
+
+        code_text += f"{class_name} {instance_name};\n\n"
+        code_text += f"void initialize() {{ {instance_name} = {class_name}(); }}\n\n"
+        code_text += f"bool decode_initialize({ns}::Decoder &decoder) {{\n"
+        code_text += "  return decoder.finished();\n"
+        code_text += "}\n\n"
+        code_text += f"void check_initialize(std::size_t, {ns}::Check &) {{ initialize(); }}\n\n"
+
+        pattern_text, method_specs = PybindCppGenerator.generate_sparse_patterns(
+            method_specs)
+        if pattern_text != "":
+            code_text += "/* Sparsity patterns of the sparse arguments and results */\n"
+            code_text += pattern_text
+
+        entries = ["{\"initialize\", decode_initialize, check_initialize, nullptr}"]
+        for method in classes[class_name]:
+            method_name = method['name']
+            if method_name not in method_specs:
+                continue
+
+            code_text += f"// Method: {method_name}\n"
+            code_text += ReplayCppGenerator.generate_method_replay(
+                instance_name, method_name, method_specs[method_name])
+            entries.append(
+                f"{{\"{method_name}\", decode_{method_name}, check_{method_name}, run_{method_name}}}")
+
+        code_text += f"const {ns}::ReplayFunction functions[] = {{\n"
+        for entry in entries:
+            code_text += f"    {entry},\n"
+        code_text += "};\n\n"
+
+        code_text += f"}} // namespace {namespace}\n\n"
+
+        code_text += "int main(int argc, char **argv) {\n"
+        code_text += f"  return {ns}::replay_main(\n"
+        code_text += f"      argc, argv, \"{module_name}\", {namespace}::functions,\n"
+        code_text += f"      sizeof({namespace}::functions) / sizeof({namespace}::functions[0]),\n"
+        code_text += f"      {namespace}::initialize);\n"
         code_text += "}\n"
 
-        with open(cpp_file_path_to_generate, "w", encoding="utf-8") as f:
-            f.write(code_text)
+        os.makedirs(os.path.dirname(cpp_file_path_to_generate), exist_ok=True)
+        PybindCppGenerator._write_if_changed(cpp_file_path_to_generate, code_text)
 
 
 class SIL_Operator:
+    BUILD_STATE_FILE_NAME = "SIL_build_state.json"
+
     def __init__(
         self,
         target_python_file_name: str,
@@ -455,10 +3170,28 @@ class SIL_Operator:
         self.folder_name = os.path.basename(os.path.normpath(self.SIL_folder))
 
         self.this_file_path = os.path.abspath(__file__)
-        dir_path = os.path.dirname(self.this_file_path)
 
         self.cpp_file_path_to_generate = ""
 
+    @staticmethod
+    def load(
+        target_python_file_name: str,
+        SIL_folder: str,
+        lazy: bool = True,
+        **build_options
+    ):
+        """
+        Return the SIL module of the target Python file without building it
+        when the last incremental build is still current (see SIL_loader.py).
+        With lazy=True (default), building and importing are deferred until
+        the first attribute access of the returned module.
+        build_options are keyword arguments of build_SIL_code.
+        """
+        from helper.SIL.SIL_loader import load_SIL_module
+
+        return load_SIL_module(
+            target_python_file_name, SIL_folder, lazy=lazy, **build_options)
+
     @staticmethod
     def find_file_path(
             file_name: str,
@@ -467,84 +3200,794 @@ class SIL_Operator:
         Recursively search for a file in the given root_path and return its full path.
         Raises FileNotFoundError if the file is not found.
         """
-
-        for dirpath, dirnames, filenames in os.walk(root_path):
-            if file_name in filenames:
-                return os.path.join(dirpath, file_name)
+        file_path = SIL_WorkspaceIndex.for_root(root_path).find_file(file_name)
+        if file_path != "":
+            return file_path
 
         raise FileNotFoundError(f"{file_name} not found in {root_path}")
 
-    def find_c_make_lists_txt(self) -> str:
+    def find_built_module_path(self) -> str:
         """
-        Recursively search for a CMakeLists.txt file in the current directory
-          and return its full path.
-        Raises FileNotFoundError if the file is not found.
+        Return the path of the built module (e.g. MyFuncSIL.cpython-312-x86_64-linux-gnu.so)
+        in SIL_folder, or an empty string if it does not exist yet.
+        """
+        candidates = glob.glob(os.path.join(
+            self.SIL_folder, f"{self.module_file_name}.*so"))
+        if not candidates:
+            return ""
+
+        return max(candidates, key=os.path.getmtime)
+
+    def _read_build_state(self, build_folder: str) -> dict:
+        state_path = os.path.join(build_folder, SIL_Operator.BUILD_STATE_FILE_NAME)
+        if not os.path.exists(state_path):
+            return {}
+
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_build_state(self, build_folder: str, state: dict) -> None:
+        state_path = os.path.join(build_folder, SIL_Operator.BUILD_STATE_FILE_NAME)
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+
+    def compute_source_fingerprint(
+        self,
+        cmake_generator: CmakeGenerator,
+        build_type: str
+    ) -> str:
         """
+        Compute a content hash of the SIL sources, the headers in the include
+        directories, the generated CMakeLists.txt, the compile definitions and
+        the build type.
+        """
+        extra_items = [
+            self.module_file_name,
+            build_type,
+            getattr(cmake_generator, "cmake_lists_txt", ""),
+        ]
+        extra_items.extend(cmake_generator.compile_definitions)
 
-        for dirpath, dirnames, filenames in os.walk(self.root_path):
-            if "CMakeLists.txt" in filenames:
-                return os.path.join(dirpath, "CMakeLists.txt")
+        dependency_files = cmake_generator.get_dependency_files()
+        if build_type == "PGO":
+            # a changed training run changes the optimized module
+            dependency_files = dependency_files + [self.pgo_training_script]
+            extra_items.extend(self.pgo_training_args)
 
-        raise FileNotFoundError(
-            f"CMakeLists.txt not found. Delete {self.cpp_file_path_to_generate} and try again.")
+        return hash_file_contents(dependency_files, extra_items=extra_items)
 
-    def build_pybind11_code(self, build_type: str = "Debug"):
+    def build_pybind11_code(
+        self,
+        build_type: str = "Debug",
+        incremental: bool = False,
+        parallel_jobs: int = None,
+        generator: str = None
+    ):
         """
         Build the pybind11 C++ code using CMake.
 
         Args:
-            build_type: Build configuration, either "Debug" or "Release". Defaults to "Debug".
+            build_type: Build configuration, one of BUILD_TYPE_FLAGS ("Debug",
+                "Release", "RelWithDebInfo", "Native" or "PGO"). Each build type
+                has its own build folder "<SIL_folder>/build/<build_type>", so
+                switching build types does not rebuild the others. Defaults to "Debug".
+            incremental: If True, keep the build folder and the CMake cache,
+                skip the configure step when CMakeLists.txt is unchanged, and
+                skip the build entirely when the source fingerprint matches the
+                last successful build. Defaults to False.
+            parallel_jobs: Number of parallel compile jobs passed to
+                "cmake --build --parallel". Defaults to None (CMake default).
+            generator: CMake generator name (e.g. "Ninja"). Defaults to None
+                (CMake default).
         """
 
-        if build_type not in ("Debug", "Release"):
+        if build_type not in BUILD_TYPE_FLAGS:
             raise ValueError(
-                f"build_type must be 'Debug' or 'Release', got '{build_type}'")
+                f"build_type must be one of {list(BUILD_TYPE_FLAGS)}, got '{build_type}'")
 
-        build_folder = os.path.join(self.SIL_folder, "build")
+        build_folder = os.path.join(self.SIL_folder, "build", build_type)
 
-        subprocess.run(f"rm -rf {build_folder}", shell=True)
-        subprocess.run(f"mkdir -p {build_folder}", shell=True)
-        subprocess.run(
-            f"cmake -S {self.SIL_folder} -B {build_folder} -DCMAKE_BUILD_TYPE={build_type}",
-            shell=True
+        self.build_summary = {
+            "module_file_name": self.module_file_name,
+            "build_type": build_type,
+            "generator": generator or "",
+            "compiler_launcher": getattr(self, "compiler_launcher", ""),
+            "skipped": False,
+            "compiler_cache": None,
+        }
+
+        if incremental:
+            self._build_pybind11_code_incremental(
+                build_folder, build_type, parallel_jobs, generator)
+            return
+
+        profiler = getattr(self, "build_profiler", None)
+
+        with profile_phase(profiler, "clean"):
+            shutil.rmtree(build_folder, ignore_errors=True)
+            os.makedirs(build_folder, exist_ok=True)
+
+        if build_type == "PGO":
+            self._run_pgo_build(build_folder, parallel_jobs, generator)
+            return
+
+        self._configure_cmake(build_folder, build_type, generator)
+        self._run_cmake_build(build_folder, build_type, parallel_jobs)
+        self._install_built_module(build_folder, keep_in_build_folder=False)
+
+    def _build_pybind11_code_incremental(
+        self,
+        build_folder: str,
+        build_type: str,
+        parallel_jobs: int = None,
+        generator: str = None
+    ) -> None:
+        """
+        Incremental variant of build_pybind11_code.
+        The build state (hash of CMakeLists.txt, source fingerprint and build type)
+        is stored in the build folder and updated only after a successful build.
+        """
+        state = self._read_build_state(build_folder)
+        source_fingerprint = getattr(self, "source_fingerprint", "")
+
+        built_module_list = glob.glob(os.path.join(
+            build_folder, f"{self.module_file_name}.*so"))
+
+        if source_fingerprint != "" and \
+                state.get("source_fingerprint") == source_fingerprint and \
+                built_module_list:
+            print(f"{self.module_file_name} ({build_type}) is up to date. Skip build.")
+            self.build_summary["skipped"] = True
+
+            state_changed = False
+
+            # The module of another build type may be installed in SIL_folder.
+            installed_module_path = self.find_built_module_path()
+            if installed_module_path == "" or \
+                    collect_file_stamps([installed_module_path])[installed_module_path] != \
+                    state.get("module_stamp"):
+                print(f"Install the {build_type} build of {self.module_file_name}.")
+                state["module_stamp"] = self._install_built_module(
+                    build_folder, keep_in_build_folder=True)
+                state_changed = True
+
+            # e.g. files touched without a content change, keep the stamps of
+            # the lazy loader current
+            file_stamps = collect_file_stamps(
+                getattr(self, "file_stamp_paths", []))
+            build_options_key = getattr(self, "build_options_key", "")
+            if state.get("file_stamps") != file_stamps or \
+                    state.get("build_options_key") != build_options_key:
+                state["file_stamps"] = file_stamps
+                state["build_options_key"] = build_options_key
+                state_changed = True
+
+            if state_changed:
+                self._write_build_state(build_folder, state)
+            return
+
+        cmake_lists_path = os.path.join(self.SIL_folder, "CMakeLists.txt")
+        cmake_lists_hash = hash_file_contents([cmake_lists_path])
+        cmake_cache_path = os.path.join(build_folder, "CMakeCache.txt")
+
+        # A build tree cannot switch its CMake generator.
+        if os.path.exists(cmake_cache_path) and \
+                state.get("generator", "") != (generator or ""):
+            shutil.rmtree(build_folder)
+
+        os.makedirs(build_folder, exist_ok=True)
+
+        need_configure = (
+            not os.path.exists(cmake_cache_path) or
+            state.get("cmake_lists_hash") != cmake_lists_hash or
+            state.get("build_type") != build_type
         )
-        subprocess.run(
-            f"cmake --build {build_folder} --config {build_type}", shell=True)
 
-        subprocess.run(
-            f"mv {build_folder}/{self.module_file_name}.*so {self.SIL_folder}", shell=True)
+        if build_type == "PGO":
+            module_stamp = self._run_pgo_build(
+                build_folder, parallel_jobs, generator)
+        else:
+            if need_configure:
+                self._configure_cmake(build_folder, build_type, generator)
+
+            self._run_cmake_build(build_folder, build_type, parallel_jobs)
+
+            # Copy instead of move, so that the build tree stays up to date
+            # and the next build does not need to relink.
+            module_stamp = self._install_built_module(
+                build_folder, keep_in_build_folder=True)
+
+        self._write_build_state(build_folder, {
+            "module_file_name": self.module_file_name,
+            "python_file_name": self.target_python_file_name + ".py",
+            "build_type": build_type,
+            "cmake_lists_hash": cmake_lists_hash,
+            "source_fingerprint": source_fingerprint,
+            "generator": generator or "",
+            "build_options_key": getattr(self, "build_options_key", ""),
+            # read by the lazy loader (SIL_loader.py)
+            "file_stamps": collect_file_stamps(
+                getattr(self, "file_stamp_paths", [])),
+            "module_stamp": module_stamp,
+        })
+
+    def _configure_cmake(
+        self,
+        build_folder: str,
+        build_type: str,
+        generator: str = None,
+        cache_definitions: list = None
+    ) -> None:
+        # the module is built for the Python that imports it
+        configure_command = ["cmake", "-S", self.SIL_folder, "-B", build_folder,
+                             f"-DCMAKE_BUILD_TYPE={build_type}",
+                             f"-DPython_EXECUTABLE={sys.executable}"]
+        configure_command += [f"-D{d}" for d in (cache_definitions or [])]
+        if generator:
+            configure_command += ["-G", generator]
+
+        with profile_phase(getattr(self, "build_profiler", None), "configure"):
+            result = subprocess.run(configure_command)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"CMake configure failed for {self.module_file_name}.")
+
+    def _install_built_module(
+        self,
+        build_folder: str,
+        keep_in_build_folder: bool
+    ) -> list:
+        """
+        Move (or copy, if keep_in_build_folder) the built module from the
+        build folder to SIL_folder, where it is imported from.
+        Returns the [mtime_ns, size] stamp of the installed module.
+        """
+        with profile_phase(getattr(self, "build_profiler", None), "module_move"):
+            built_module_list = glob.glob(os.path.join(
+                build_folder, f"{self.module_file_name}.*so"))
+            if not built_module_list:
+                raise FileNotFoundError(
+                    f"{self.module_file_name} module not found in {build_folder}")
+            for built_module in built_module_list:
+                destination = os.path.join(
+                    self.SIL_folder, os.path.basename(built_module))
+                # The module may be a hard link into the build cache.
+                if os.path.lexists(destination):
+                    os.remove(destination)
+                if keep_in_build_folder:
+                    shutil.copy2(built_module, destination)
+                else:
+                    shutil.move(built_module, destination)
+
+        return collect_file_stamps([destination])[destination]
+
+    def _run_pgo_build(
+        self,
+        build_folder: str,
+        parallel_jobs: int = None,
+        generator: str = None
+    ) -> list:
+        """
+        Two-stage profile-guided optimization build:
+        build and install the instrumented module, run the training script,
+        and rebuild with the collected profile.
+        Returns the stamp of the installed module.
+        """
+        profile_dir = os.path.join(build_folder, PGO_PROFILE_FOLDER_NAME)
+        # Profiles of older sources would not match the new code.
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+        print(f"{self.module_file_name} (PGO): build the instrumented module.")
+        self._configure_cmake(build_folder, "PGO", generator,
+                              ["SIL_PGO_STAGE=generate"])
+        self._run_cmake_build(build_folder, "PGO", parallel_jobs)
+        self._install_built_module(build_folder, keep_in_build_folder=True)
+
+        with profile_phase(getattr(self, "build_profiler", None), "pgo_training"):
+            self.run_pgo_training(profile_dir)
+
+        print(f"{self.module_file_name} (PGO): rebuild with the profile.")
+        self._configure_cmake(build_folder, "PGO", generator,
+                              ["SIL_PGO_STAGE=use"])
+        self._run_cmake_build(build_folder, "PGO", parallel_jobs)
+
+        return self._install_built_module(build_folder, keep_in_build_folder=True)
 
-    def build_SIL_code(self, compile_definitions=None, build_type: str = "Debug"):
+    def run_pgo_training(self, profile_dir: str) -> None:
+        """
+        Run the PGO training script with the instrumented module installed.
+        The script runs in a separate process from the workspace root with
+        MCAP_SIL_NO_BUILD set, so that it imports the installed module instead
+        of building another build type.
+        Raises RuntimeError if the script fails or does not use the module.
+        """
+        command = [sys.executable, self.pgo_training_script] + \
+            [str(arg) for arg in self.pgo_training_args]
+        print(f"{self.module_file_name} (PGO): run {' '.join(command[1:])}")
+
+        result = subprocess.run(
+            command, cwd=self.root_path,
+            env=dict(os.environ, **{NO_BUILD_ENV: "1"}))
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"PGO training script {self.pgo_training_script} failed "
+                f"with exit code {result.returncode}.")
+
+        profile_files = glob.glob(os.path.join(profile_dir, "**", "*.gcda"), recursive=True) + \
+            glob.glob(os.path.join(profile_dir, "**", "*.profraw"), recursive=True)
+        if not profile_files:
+            raise RuntimeError(
+                f"PGO training script {self.pgo_training_script} did not "
+                f"write a profile of {self.module_file_name}. "
+                f"Does it call the SIL module?")
+
+    def _run_cmake_build(
+        self,
+        build_folder: str,
+        build_type: str,
+        parallel_jobs: int = None
+    ) -> None:
+        """
+        Run "cmake --build" and record the compiler cache hits and misses
+        of this build in self.build_summary.
+        """
+        build_command = ["cmake", "--build",
+                         build_folder, "--config", build_type]
+        if parallel_jobs is not None:
+            build_command += ["--parallel", str(int(parallel_jobs))]
+
+        compiler_launcher = getattr(self, "compiler_launcher", "")
+        stats_before = read_compiler_cache_stats(compiler_launcher)
+
+        profiler = getattr(self, "build_profiler", None)
+        if profiler is not None:
+            ninja_log_offset = profiler.get_ninja_log_size(build_folder)
+            build_start = profiler.now()
+            build_start_wall_time = time.time()
+
+        with profile_phase(profiler, "build"):
+            result = subprocess.run(build_command)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"CMake build failed for {self.module_file_name}.")
+
+        if profiler is not None:
+            profiler.read_ninja_log(build_folder, ninja_log_offset, build_start,
+                                    getattr(self, "profile_source_files", []))
+            profiler.read_time_traces(build_folder, build_start_wall_time)
+
+        compiler_cache = diff_compiler_cache_stats(
+            stats_before, read_compiler_cache_stats(compiler_launcher))
+        self.build_summary["compiler_cache"] = compiler_cache
+
+        if compiler_cache is not None:
+            print(f"{self.module_file_name}: compiler cache "
+                  f"({os.path.basename(compiler_launcher)}) "
+                  f"hits {compiler_cache['hits']}, misses {compiler_cache['misses']}")
+
+    def build_SIL_code(
+        self,
+        compile_definitions=None,
+        build_type: str = "Debug",
+        incremental: bool = False,
+        use_cache: bool = False,
+        parallel_jobs: int = None,
+        dependency_scoped: bool = False,
+        compiler_launcher: str = "auto",
+        generator: str = "auto",
+        linker: str = None,
+        lto_mode: str = "full",
+        precompiled_headers=None,
+        unity_build_batch_size: int = None,
+        use_daemon: bool = True,
+        profile: bool = False,
+        pgo_training_script: str = None,
+        pgo_training_args: list = None,
+        specializations: list = None,
+        binding_backend: str = "pybind11",
+        replay_benchmark: bool = False
+    ):
         """
         Generate and build the SIL code for the given Python file.
 
         Args:
             compile_definitions: Optional list of compile-time definitions (e.g. ["__TEST__"]).
-            build_type: Build configuration, either "Debug" or "Release". Defaults to "Debug".
+                "SIL_CALL_STATS" records per function call counts, phase
+                timings and allocations, read with get_stats() and cleared with
+                reset_stats() of the module (see SIL_call_stats.hpp).
+                "SIL_CALL_TRACE" records the calls of the module functions
+                between start_trace(path) and stop_trace() to a trace file
+                for the replay benchmark (see SIL_call_trace.hpp).
+            build_type: Build configuration, "Debug" (-g -O0), "Release" (-O2),
+                "RelWithDebInfo" (-O2 -g), "Native" (-O3 -march=native) or "PGO"
+                (-O2 with profile-guided optimization, needs pgo_training_script).
+                Release, Native and PGO are linked with LTO (lto_mode).
+                Defaults to "Debug".
+            incremental: If True, reuse the existing build folder and skip the
+                build when nothing has changed. Defaults to False.
+            use_cache: If True, look the module up in the shared SIL build cache
+                (see SIL_build_cache.py) before building, and store it there
+                after a successful build. Defaults to False.
+            parallel_jobs: Number of parallel compile jobs for "cmake --build".
+                Defaults to None (CMake default).
+            dependency_scoped: If True, compile only the translation units whose
+                headers are reachable from the SIL C++ file. Defaults to False.
+            compiler_launcher: Compiler launcher such as "ccache" or "sccache".
+                "auto" uses one when it is found on PATH, None disables it.
+            generator: CMake generator. "auto" selects Ninja when it is found on
+                PATH, None keeps the CMake default.
+            linker: Linker passed to -fuse-ld (e.g. "lld" or "mold").
+                Defaults to None (compiler default).
+            lto_mode: LTO mode of the Release, Native and PGO build types,
+                "full" (-flto=auto), "thin" (ThinLTO on Clang, parallel LTO on
+                GCC) or "off". Defaults to "full".
+            precompiled_headers: "auto" to precompile the MCAP library headers
+                most included by the module, a list of headers, or None (off).
+            unity_build_batch_size: Enable CMake unity builds with this batch
+                size. Defaults to None (off).
+            use_daemon: If True and a SIL build daemon (see SIL_build_daemon.py)
+                is running for the workspace root, let the daemon build the
+                module. Otherwise the module is built in-process.
+                Defaults to True.
+            profile: If True, build in-process, time the build phases, compile
+                and link steps and headers (see SIL_build_profile.py), write the
+                profile to "<root>/build/SIL_profile" and print a report.
+                The profile is kept in self.build_profile. Defaults to False.
+            pgo_training_script: Python script (path relative to the workspace
+                root) that exercises the SIL module, e.g. "sample/matrix/test.py".
+                Required for build_type "PGO": the instrumented module is built,
+                the script is run, and the module is rebuilt with the profile.
+            pgo_training_args: Command line arguments of pgo_training_script.
+            specializations: List of configurations of the static constants
+                or type aliases of the C++ class, e.g.
+                [{"MATRIX_SIZE": 3}, {"MATRIX_SIZE": 6}] or
+                [{"FLOAT": "double"}, {"FLOAT": "float"}].
+                The module is generated with one specialization per
+                configuration (see PybindCppGenerator.generate_specialized_cpp_code)
+                in "<SIL_folder>/build/specializations", instead of the
+                "*_SIL.cpp" file, and its functions dispatch on the argument
+                shapes and dtypes. If every configuration has "simd": True,
+                e.g. {"FLOAT": "float", "simd": True}, the whole module is
+                compiled with SIMD_COMPILE_OPTIONS ("-O3 -march=native").
+                SIMD and plain configurations cannot be mixed in one module:
+                their translation units share inline and template code, of
+                which the linker keeps one copy, so a plain variant could run
+                SIMD code or the reverse. The compile time and object
+                size of each specialization are printed and kept in
+                self.build_summary["specializations"]. Defaults to None.
+            binding_backend: Binding layer of the module, "pybind11" or "capi".
+                "capi" generates the module functions against the CPython and
+                NumPy C APIs (see CApiCppGenerator) in
+                "<SIL_folder>/build/capi", instead of the "*_SIL.cpp" file,
+                which lowers the per call overhead. It has no batched or
+                streamed variants, class binding or specializations.
+                Defaults to "pybind11".
+            replay_benchmark: If True, also build the replay benchmark of
+                the class (see ReplayCppGenerator), generated in
+                "<SIL_folder>/build/replay": a standalone executable that
+                replays a trace recorded by a module built with
+                "SIL_CALL_TRACE" against the C++ class without Python,
+                checks the results and reports the time per call. Its path
+                is kept in self.build_summary["replay_benchmark"]. Not
+                available with specializations. Defaults to False.
         """
         python_file_name = self.target_python_file_name + ".py"
 
-        python_file_path_with_extension = SIL_Operator.find_file_path(
-            python_file_name, self.root_path)
+        if binding_backend not in BINDING_BACKENDS:
+            raise ValueError(
+                f"binding_backend must be one of {list(BINDING_BACKENDS)}, got '{binding_backend}'")
+        if specializations and binding_backend != "pybind11":
+            raise ValueError(
+                "specializations need the pybind11 binding backend.")
+        if specializations and replay_benchmark:
+            raise ValueError(
+                "replay_benchmark is not available with specializations.")
+        if specializations and len({
+                bool(specialization.get(SPECIALIZATION_SIMD_KEY))
+                for specialization in specializations
+                if isinstance(specialization, dict)}) > 1:
+            raise ValueError(
+                "specializations mix \"simd\": True with plain configurations. "
+                "Their translation units share inline and template code compiled "
+                "with different options, of which the linker keeps one copy. "
+                "Build the SIMD configurations as a separate module, or set "
+                "\"simd\": True for all of them.")
+
+        # e.g. the PGO training run, which must not replace the installed module
+        if os.environ.get(NO_BUILD_ENV, "") != "" and \
+                self.find_built_module_path() != "":
+            print(f"{NO_BUILD_ENV} is set. Use the installed {self.module_file_name}.")
+            return
+
+        if build_type == "PGO":
+            if not pgo_training_script:
+                raise ValueError(
+                    "build_type 'PGO' needs pgo_training_script.")
+            self.pgo_training_script = os.path.abspath(
+                os.path.join(self.root_path, pgo_training_script))
+            if not os.path.exists(self.pgo_training_script):
+                raise FileNotFoundError(
+                    f"PGO training script {self.pgo_training_script} not found.")
+            self.pgo_training_args = list(pgo_training_args or [])
+
+        self.build_options_key = compute_build_options_key({
+            "compile_definitions": compile_definitions,
+            "build_type": build_type,
+            "dependency_scoped": dependency_scoped,
+            "compiler_launcher": compiler_launcher,
+            "generator": generator,
+            "linker": linker,
+            "lto_mode": lto_mode,
+            "precompiled_headers": precompiled_headers,
+            "unity_build_batch_size": unity_build_batch_size,
+            "profile": profile,
+            "pgo_training_script": pgo_training_script,
+            "pgo_training_args": pgo_training_args,
+            "specializations": specializations,
+            "binding_backend": binding_backend,
+            "replay_benchmark": replay_benchmark,
+        })
+
+        self.build_profiler = None
+        if profile:
+            from helper.SIL.SIL_build_profile import SIL_BuildProfiler
+
+            self.build_profiler = SIL_BuildProfiler(self.module_file_name)
+            use_daemon = False
+
+        if use_daemon:
+            from helper.SIL.SIL_build_daemon import request_build
+
+            response = request_build(
+                self.root_path, python_file_name, self.SIL_folder, {
+                    "compile_definitions": compile_definitions,
+                    "build_type": build_type,
+                    "incremental": incremental,
+                    "use_cache": use_cache,
+                    "parallel_jobs": parallel_jobs,
+                    "dependency_scoped": dependency_scoped,
+                    "compiler_launcher": compiler_launcher,
+                    "generator": generator,
+                    "linker": linker,
+                    "lto_mode": lto_mode,
+                    "precompiled_headers": precompiled_headers,
+                    "unity_build_batch_size": unity_build_batch_size,
+                    "pgo_training_script": pgo_training_script,
+                    "pgo_training_args": pgo_training_args,
+                    "specializations": specializations,
+                    "binding_backend": binding_backend,
+                    "replay_benchmark": replay_benchmark,
+                })
+            if response is not None:
+                self.build_summary = response.get("build_summary")
+                return
+
+        with profile_phase(self.build_profiler, "discovery"):
+            # one refresh per build, the later lookups use the index as is
+            SIL_WorkspaceIndex.for_root(self.root_path, refresh=True)
+            python_file_path_with_extension = SIL_Operator.find_file_path(
+                python_file_name, self.root_path)
         python_file_path = python_file_path_with_extension.split('.py')[0]
 
         self.cpp_file_path_to_generate = python_file_path + "_SIL.cpp"
-
-        if not os.path.exists(self.cpp_file_path_to_generate):
-            PybindCppGenerator.generate_cpp_code(
-                python_file_path_with_extension,
-                self.module_file_name,
-                self.cpp_file_path_to_generate
-            )
+        specialization_sources = []
+        compile_options = []
+
+        if specializations:
+            with profile_phase(self.build_profiler, "cpp_generation"):
+                self.cpp_file_path_to_generate, specialization_sources = \
+                    PybindCppGenerator.generate_specialized_cpp_code(
+                        python_file_path_with_extension,
+                        self.module_file_name,
+                        os.path.join(self.SIL_folder, "build",
+                                     SPECIALIZATION_FOLDER_NAME),
+                        specializations)
+            if specializations[0].get(SPECIALIZATION_SIMD_KEY):
+                compile_options = SIMD_COMPILE_OPTIONS
+        elif binding_backend == "capi":
+            self.cpp_file_path_to_generate = os.path.join(
+                self.SIL_folder, "build", binding_backend,
+                os.path.basename(python_file_path) + CApiCppGenerator.CPP_SUFFIX)
+            with profile_phase(self.build_profiler, "cpp_generation"):
+                CApiCppGenerator.generate_cpp_code(
+                    python_file_path_with_extension,
+                    self.module_file_name,
+                    self.cpp_file_path_to_generate)
+        elif not os.path.exists(self.cpp_file_path_to_generate):
+            with profile_phase(self.build_profiler, "cpp_generation"):
+                PybindCppGenerator.generate_cpp_code(
+                    python_file_path_with_extension,
+                    self.module_file_name,
+                    self.cpp_file_path_to_generate
+                )
+
+        replay_source_file = ""
+        if replay_benchmark:
+            replay_source_file = os.path.join(
+                self.SIL_folder, "build", ReplayCppGenerator.FOLDER_NAME,
+                os.path.basename(python_file_path) + ReplayCppGenerator.CPP_SUFFIX)
+            with profile_phase(self.build_profiler, "cpp_generation"):
+                ReplayCppGenerator.generate_cpp_code(
+                    python_file_path_with_extension,
+                    self.module_file_name,
+                    replay_source_file)
 
         cmake_generator = CmakeGenerator(
             self.target_python_file_name,
-            os.path.dirname(python_file_path),
+            os.path.dirname(self.cpp_file_path_to_generate),
             self.cpp_file_path_to_generate.split('/')[-1],
             self.module_file_name,
             self.SIL_folder,
             self.root_path,
-            compile_definitions=compile_definitions)
+            compile_definitions=compile_definitions,
+            dependency_scoped=dependency_scoped,
+            compiler_launcher=compiler_launcher,
+            linker=linker,
+            lto_mode=lto_mode,
+            precompiled_headers=precompiled_headers,
+            unity_build_batch_size=unity_build_batch_size,
+            time_trace=profile,
+            profiler=self.build_profiler,
+            extra_source_files=specialization_sources,
+            binding_backend=binding_backend,
+            compile_options=compile_options,
+            replay_source_file=replay_source_file)
         cmake_generator.generate_cmake_lists_txt()
 
-        self.build_pybind11_code(build_type=build_type)
+        self.compiler_launcher = cmake_generator.compiler_launcher
+        self.profile_source_files = cmake_generator.source_file_list + [
+            os.path.join(cmake_generator.python_file_dir, cmake_generator.cpp_file_name)]
+
+        if use_cache and build_type in ("Native", "PGO"):
+            # The module depends on the host CPU or on the training run.
+            print(f"{self.module_file_name}: build cache is not used for build type {build_type}.")
+            use_cache = False
+        elif use_cache and compile_options:
+            print(f"{self.module_file_name}: build cache is not used for SIMD specializations.")
+            use_cache = False
+        elif use_cache and replay_benchmark:
+            # The cache holds the module only.
+            print(f"{self.module_file_name}: build cache is not used with the replay benchmark.")
+            use_cache = False
+
+        build_cache = None
+        cache_key = ""
+        if use_cache:
+            from helper.SIL.SIL_build_cache import SIL_BuildCache
+
+            build_cache = SIL_BuildCache()
+            cache_key = SIL_BuildCache.compute_key(cmake_generator, build_type)
+            restored_path = build_cache.restore(cache_key, self.SIL_folder)
+            if restored_path != "":
+                print(f"{self.module_file_name} restored from build cache.")
+                self.build_summary = {
+                    "module_file_name": self.module_file_name,
+                    "build_type": build_type,
+                    "generator": "",
+                    "compiler_launcher": self.compiler_launcher,
+                    "skipped": True,
+                    "compiler_cache": None,
+                }
+                self._finish_build_profile(cmake_generator)
+                return
+
+        if incremental:
+            with profile_phase(self.build_profiler, "fingerprint"):
+                self.source_fingerprint = self.compute_source_fingerprint(
+                    cmake_generator, build_type)
+
+                # stamped when the build state is written, after the module
+                # was installed into the SIL folder
+                root = os.path.abspath(self.root_path)
+                self.file_stamp_paths = \
+                    cmake_generator.get_dependency_files() + \
+                    [os.path.join(self.SIL_folder, "CMakeLists.txt"),
+                     os.path.dirname(python_file_path)] + \
+                    [os.path.join(root, d) for d in cmake_generator.include_dirs] + \
+                    ([self.pgo_training_script] if build_type == "PGO" else [])
+
+        self.build_pybind11_code(
+            build_type=build_type,
+            incremental=incremental,
+            parallel_jobs=parallel_jobs,
+            generator=resolve_cmake_generator(generator))
+
+        if build_cache is not None:
+            built_module_path = self.find_built_module_path()
+            if built_module_path != "":
+                build_cache.store(
+                    cache_key, built_module_path, self.module_file_name)
+
+        if replay_benchmark:
+            self.build_summary["replay_benchmark"] = os.path.join(
+                self.SIL_folder, "build", build_type,
+                self.module_file_name + ReplayCppGenerator.TARGET_SUFFIX)
+
+        if specializations:
+            self.report_specializations(
+                os.path.join(self.SIL_folder, "build", build_type),
+                specializations, specialization_sources)
+
+        self._finish_build_profile(cmake_generator)
+
+    def report_specializations(
+        self,
+        build_folder: str,
+        specializations: list,
+        specialization_sources: list
+    ) -> list:
+        """
+        Print and return the compile time (from ".ninja_log", Ninja generator
+        only, else None) and the object file size of the translation unit of
+        each specialization, in self.build_summary["specializations"].
+        With LTO, the object files hold the intermediate representation, so
+        their sizes compare the specializations rather than give their share
+        of the module.
+        """
+        compile_times = {}
+        ninja_log_path = os.path.join(build_folder, ".ninja_log")
+        if os.path.exists(ninja_log_path):
+            with open(ninja_log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if line.startswith("#") or len(fields) < 4:
+                        continue
+                    # later entries of the same output are newer builds
+                    compile_times[fields[3]] = \
+                        (int(fields[1]) - int(fields[0])) / 1000.0
+
+        report = []
+        for specialization, source in zip(specializations, specialization_sources):
+            object_name = os.path.basename(source) + ".o"
+            compile_time = None
+            for output, elapsed in compile_times.items():
+                if os.path.basename(output) == object_name:
+                    compile_time = elapsed
+
+            object_paths = glob.glob(os.path.join(
+                build_folder, "**", object_name), recursive=True)
+            report.append({
+                "label": PybindCppGenerator.specialization_label(specialization),
+                "constants": specialization,
+                "compile_time": compile_time,
+                "object_size": os.path.getsize(object_paths[0]) if object_paths else None,
+            })
+
+        label_width = max([24] + [len(entry["label"]) for entry in report])
+        print(f"{self.module_file_name} specializations:")
+        print(f"  {'specialization':<{label_width}} {'compile [s]':>11} {'object [KiB]':>12}")
+        for entry in report:
+            compile_text = "-" if entry["compile_time"] is None else f"{entry['compile_time']:.2f}"
+            size_text = "-" if entry["object_size"] is None else f"{entry['object_size'] / 1024:.1f}"
+            print(f"  {entry['label']:<{label_width}} {compile_text:>11} {size_text:>12}")
+
+        if getattr(self, "build_summary", None) is not None:
+            self.build_summary["specializations"] = report
+
+        return report
+
+    def _finish_build_profile(self, cmake_generator: CmakeGenerator) -> None:
+        """
+        Complete the header costs of the build profile, export it to
+        "<root>/build/SIL_profile" and print its report.
+        """
+        profiler = getattr(self, "build_profiler", None)
+        if profiler is None:
+            return
+
+        from helper.SIL.SIL_build_profile import PROFILE_FOLDER_NAME
+
+        if not profiler.headers:
+            root = os.path.abspath(self.root_path)
+            profiler.estimate_header_costs(
+                root, [os.path.join(root, d) for d in cmake_generator.include_dirs])
+
+        json_path, trace_path = profiler.export(
+            os.path.join(self.root_path, PROFILE_FOLDER_NAME))
+        self.build_profile = profiler
+
+        print(profiler.format_report())
+        print(f"Build profile written to {json_path} and {trace_path}")
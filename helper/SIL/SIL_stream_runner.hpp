@@ -0,0 +1,298 @@
+/********************************************************************************
+@file SIL_stream_runner.hpp
+@brief Streaming time-series runner for SIL (pybind11) wrappers.
+
+A "<method>_stream" wrapper calls one C++ method once per time step over a
+whole horizon, e.g. a closed-loop controller update. Each argument is an input
+signal with a leading time dimension, shape (steps, *argument shape), given as
+a NumPy array, a np.memmap, or the path of a ".npy" file (opened memory
+mapped). The results are written to an output signal of shape
+(steps, *result shape): a new array, a preallocated array or np.memmap, or the
+path of a ".npy" file that is created memory mapped.
+
+The horizon is processed in chunks of chunk_size steps. For each chunk, the
+input chunks are converted to the C++ element type (inputs that already have
+that dtype and are C-contiguous are read in place), the steps run in C++ with
+the GIL released, and then the optional callback(start, output_chunk) is
+called and a memory mapped output is flushed. Apart from the signals
+themselves, the memory used is constant in the number of steps.
+
+An input signal can also accept a compact step shape, e.g. (steps, M) for a
+diagonal matrix argument or a column vector (M, 1); is_compact() tells which
+form was given.
+
+Example:
+  py::array stream(py::handle A_in, py::object out, std::size_t chunk_size,
+                   py::object callback) {
+    SIL_StreamRunner::InputSignal<double> A_signal(A_in, {3, 3}, "A");
+    SIL_StreamRunner::OutputSignal<double> output(out, A_signal.steps(),
+                                                  {3, 3}, "out");
+    SampleMatrix::DenseMatrix_Type A;
+
+    SIL_StreamRunner::run_in_chunks(
+        A_signal.steps(), chunk_size,
+        [&](std::size_t start, std::size_t count) {
+          A_signal.load_chunk(start, count);
+        },
+        [&](std::size_t step) {
+          SIL_NumpyConversion::dense_from_buffer<3, 3>(A_signal.step_data(step),
+                                                       A);
+          auto result = sm.step(A);
+          SIL_NumpyConversion::dense_to_buffer<3, 3>(result,
+                                                     output.step_data(step));
+        },
+        output, callback);
+    return output.array();
+  }
+********************************************************************************/
+#ifndef SIL_STREAM_RUNNER_HPP_
+#define SIL_STREAM_RUNNER_HPP_
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+#include <algorithm>
+#include <cstddef>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "SIL_numpy_conversion.hpp"
+
+namespace SIL_StreamRunner {
+
+namespace py = pybind11;
+
+constexpr std::size_t DEFAULT_CHUNK_SIZE = 4096;
+
+/* A str or os.PathLike object names a ".npy" file */
+inline bool is_path(const py::handle &object) {
+  return py::isinstance<py::str>(object) || py::hasattr(object, "__fspath__");
+}
+
+inline std::size_t step_size_of(const std::vector<std::size_t> &step_shape) {
+  std::size_t size = 1;
+  for (std::size_t i = 0; i < step_shape.size(); ++i) {
+    size *= step_shape[i];
+  }
+  return size;
+}
+
+/* Compact step shape of a dense argument: column vectors (rows, 1) can also
+   be given as (rows,), with the same layout */
+inline std::vector<std::size_t> dense_compact_step_shape(std::size_t rows,
+                                                         std::size_t cols) {
+  if (cols == 1) {
+    return std::vector<std::size_t>{rows};
+  }
+  return std::vector<std::size_t>{rows, cols};
+}
+
+inline std::string step_shape_to_string(
+    const std::vector<std::size_t> &step_shape) {
+  std::string text = "(steps";
+  for (std::size_t i = 0; i < step_shape.size(); ++i) {
+    text += ", " + std::to_string(step_shape[i]);
+  }
+  text += ")";
+  return text;
+}
+
+/* Input signal, read chunk by chunk */
+template <typename T> class InputSignal {
+public:
+  InputSignal(const py::handle &object,
+              const std::vector<std::size_t> &step_shape, const char *name)
+      : InputSignal(object, step_shape, step_shape, name) {}
+
+  InputSignal(const py::handle &object,
+              const std::vector<std::size_t> &step_shape,
+              const std::vector<std::size_t> &compact_step_shape,
+              const char *name)
+      : _name(name), _step_size(step_size_of(step_shape)), _chunk_start(0),
+        _chunk_data(nullptr), _in_place(false), _compact(false) {
+
+    if (is_path(object)) {
+      _array = py::module_::import("numpy").attr("load")(
+          object, py::arg("mmap_mode") = "r");
+    } else {
+      _array = py::array::ensure(object);
+    }
+    if (!_array) {
+      throw std::runtime_error(std::string(name) +
+                               " cannot be converted to a numeric array.");
+    }
+
+    if (!_shape_matches(step_shape)) {
+      _compact = (compact_step_shape != step_shape) &&
+                 _shape_matches(compact_step_shape);
+      if (!_compact) {
+        std::string expected = step_shape_to_string(step_shape);
+        if (compact_step_shape != step_shape) {
+          expected += " or " + step_shape_to_string(compact_step_shape);
+        }
+        throw std::runtime_error(
+            std::string(name) + " must have shape " + expected + ", got " +
+            SIL_NumpyConversion::shape_to_string(_array) + ".");
+      }
+      _step_size = step_size_of(compact_step_shape);
+    }
+    _steps = static_cast<std::size_t>(_array.shape(0));
+
+    /* Read in place when dtype and memory layout already match */
+    _in_place = py::isinstance<py::array_t<T>>(_array) &&
+                (_array.flags() & py::array::c_style);
+    if (_in_place) {
+      _in_place_array = py::reinterpret_borrow<py::array_t<T>>(_array);
+    }
+  }
+
+  std::size_t steps() const { return _steps; }
+
+  /* True if the signal was given in the compact step shape */
+  bool is_compact() const { return _compact; }
+
+  void check_steps(std::size_t steps) const {
+    if (_steps != steps) {
+      throw std::runtime_error(std::string(_name) + " has " +
+                               std::to_string(_steps) + " steps, expected " +
+                               std::to_string(steps) + ".");
+    }
+  }
+
+  /* Requires the GIL */
+  void load_chunk(std::size_t start, std::size_t count) {
+    _chunk_start = start;
+    if (_in_place) {
+      _chunk_data = _in_place_array.data() + start * _step_size;
+      return;
+    }
+
+    py::object chunk = _array[py::slice(static_cast<py::ssize_t>(start),
+                                        static_cast<py::ssize_t>(start + count),
+                                        1)];
+    _chunk = SIL_NumpyConversion::as_c_array<T>(chunk, _name);
+    _chunk_data = _chunk.data();
+  }
+
+  /* step must be in the loaded chunk, GIL not required */
+  const T *step_data(std::size_t step) const {
+    return _chunk_data + (step - _chunk_start) * _step_size;
+  }
+
+private:
+  bool _shape_matches(const std::vector<std::size_t> &step_shape) const {
+    bool shape_matches =
+        (static_cast<std::size_t>(_array.ndim()) == step_shape.size() + 1);
+    for (std::size_t i = 0; shape_matches && (i < step_shape.size()); ++i) {
+      shape_matches =
+          (static_cast<std::size_t>(_array.shape(i + 1)) == step_shape[i]);
+    }
+    return shape_matches;
+  }
+
+  const char *_name;
+  std::size_t _step_size;
+  std::size_t _steps;
+  std::size_t _chunk_start;
+  const T *_chunk_data;
+  bool _in_place;
+  bool _compact;
+  py::array _array;
+  py::array_t<T> _in_place_array;
+  SIL_NumpyConversion::CArray_Type<T> _chunk;
+};
+
+/* Output signal, written step by step */
+template <typename T> class OutputSignal {
+public:
+  OutputSignal(const py::object &out, std::size_t steps,
+               const std::vector<std::size_t> &step_shape, const char *name)
+      : _step_size(step_size_of(step_shape)), _memory_mapped(false) {
+
+    std::vector<py::ssize_t> shape;
+    shape.push_back(static_cast<py::ssize_t>(steps));
+    for (std::size_t i = 0; i < step_shape.size(); ++i) {
+      shape.push_back(static_cast<py::ssize_t>(step_shape[i]));
+    }
+
+    py::object target = out;
+    if (is_path(out)) {
+      py::tuple shape_tuple(shape.size());
+      for (std::size_t i = 0; i < shape.size(); ++i) {
+        shape_tuple[i] = py::int_(shape[i]);
+      }
+      target = py::module_::import("numpy").attr("lib").attr("format").attr(
+          "open_memmap")(out, py::arg("mode") = "w+",
+                         py::arg("dtype") = py::dtype::of<T>(),
+                         py::arg("shape") = shape_tuple);
+    }
+    _memory_mapped = py::hasattr(target, "flush");
+
+    _array = SIL_NumpyConversion::prepare_output_shape<T>(target, shape, name);
+    _data = _array.mutable_data();
+  }
+
+  /* GIL not required */
+  T *step_data(std::size_t step) { return _data + step * _step_size; }
+
+  py::array_t<T> array() const { return _array; }
+
+  /* Requires the GIL */
+  void finish_chunk(std::size_t start, std::size_t stop,
+                    const py::object &callback) {
+    if (_memory_mapped) {
+      _array.attr("flush")();
+    }
+    if (!callback.is_none()) {
+      callback(start, _array[py::slice(static_cast<py::ssize_t>(start),
+                                       static_cast<py::ssize_t>(stop), 1)]);
+    }
+  }
+
+private:
+  std::size_t _step_size;
+  bool _memory_mapped;
+  py::array_t<T> _array;
+  T *_data;
+};
+
+/* Chunk loop. load_chunk(start, count) runs with the GIL held,
+   compute_step(step) runs without the GIL (and with mutex locked if given). */
+template <typename Load_Function, typename Compute_Function,
+          typename Output_Signal_Type>
+inline void run_in_chunks(std::size_t steps, std::size_t chunk_size,
+                          Load_Function load_chunk,
+                          Compute_Function compute_step,
+                          Output_Signal_Type &output,
+                          const py::object &callback,
+                          std::mutex *mutex = nullptr) {
+  if (chunk_size == 0) {
+    throw std::runtime_error("chunk_size must be positive.");
+  }
+
+  for (std::size_t start = 0; start < steps; start += chunk_size) {
+    const std::size_t stop = std::min(start + chunk_size, steps);
+
+    load_chunk(start, stop - start);
+
+    {
+      py::gil_scoped_release release;
+      std::unique_lock<std::mutex> lock;
+      if (mutex != nullptr) {
+        lock = std::unique_lock<std::mutex>(*mutex);
+      }
+
+      for (std::size_t step = start; step < stop; ++step) {
+        compute_step(step);
+      }
+    }
+
+    output.finish_chunk(start, stop, callback);
+  }
+}
+
+} // namespace SIL_StreamRunner
+
+#endif // SIL_STREAM_RUNNER_HPP_
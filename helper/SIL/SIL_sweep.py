@@ -0,0 +1,384 @@
+"""
+File: SIL_sweep.py
+
+Description: This file contains the process-pool parameter sweep (Monte Carlo)
+executor for SIL modules.
+SIL modules hold one global C++ instance, so cases of a sweep cannot run on
+threads of one process. SIL_SweepExecutor spreads the cases over a process
+pool instead. Each worker imports the built SIL module once and calls
+initialize() before every case, then calls the case function.
+
+The input columns (one row per case) are copied once into shared memory, and
+the case function writes its outputs into shared memory output columns, so no
+arrays are pickled between the processes; only (start, stop) case ranges and
+error messages are. The results are collected in a SIL_ColumnStore, which holds
+the input, output, "status" and "elapsed" columns and is saved as one ".npy"
+file per column (loadable memory mapped).
+
+The case function is called as case_function(module, **inputs_of_the_case) and
+returns a dict of outputs, or the output itself when there is only one. It must
+be a module level function, so that it can be sent to the workers.
+
+Example code to compare the Python model and the SIL module over a sweep:
+```
+from helper.SIL.SIL_sweep import SIL_SweepExecutor
+
+def compare_add(module, A, B):
+    C_sil = module.add(A, B)
+    return {"C": C_sil, "error": np.max(np.abs(C_sil - SampleMatrix().add(A, B)))}
+
+executor = SIL_SweepExecutor(
+    "sample_matrix.py", "sample/matrix", compare_add,
+    outputs={"C": ((3, 3), np.float64), "error": ((), np.float64)},
+    max_workers=8)
+store = executor.run({"A": A, "B": B})     # A, B: (cases, 3, 3)
+print(store["error"].max())
+store.save("build/sweep_add")
+```
+"""
+import os
+import sys
+import json
+import time
+import importlib
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator, snake_to_camel
+
+COLUMN_MANIFEST_FILE_NAME = "columns.json"
+STATUS_OK = 0
+STATUS_ERROR = 1
+TASKS_PER_WORKER = 4
+
+
+class SIL_ColumnStore:
+    """
+    Columns of equal length (rows), each a NumPy array with the row index as
+    its first dimension, plus JSON serializable metadata.
+    """
+
+    def __init__(self, columns: dict = None, metadata: dict = None):
+        self._columns = {}
+        self.metadata = dict(metadata or {})
+        for name, array in (columns or {}).items():
+            self.add_column(name, array)
+
+    def add_column(self, name: str, array) -> None:
+        array = np.asarray(array)
+        if array.ndim == 0:
+            raise ValueError(f"Column '{name}' must have a row dimension.")
+        if self._columns and len(array) != len(self):
+            raise ValueError(
+                f"Column '{name}' has {len(array)} rows, expected {len(self)}.")
+        self._columns[name] = array
+
+    @property
+    def names(self) -> list:
+        return list(self._columns)
+
+    def __len__(self) -> int:
+        if not self._columns:
+            return 0
+        return len(next(iter(self._columns.values())))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    def select(self, rows) -> "SIL_ColumnStore":
+        """
+        Return a store with the given rows (boolean mask or indices) of every column.
+        """
+        return SIL_ColumnStore(
+            {name: array[rows] for name, array in self._columns.items()},
+            self.metadata)
+
+    def save(self, folder: str) -> str:
+        """
+        Write each column to "<folder>/<name>.npy" and the manifest to
+        "<folder>/columns.json". Returns the manifest path.
+        """
+        os.makedirs(folder, exist_ok=True)
+        for name, array in self._columns.items():
+            np.save(os.path.join(folder, f"{name}.npy"), array)
+
+        manifest = {
+            "rows": len(self),
+            "columns": {name: {"shape": list(array.shape[1:]), "dtype": str(array.dtype)}
+                        for name, array in self._columns.items()},
+            "metadata": self.metadata,
+        }
+        manifest_path = os.path.join(folder, COLUMN_MANIFEST_FILE_NAME)
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, manifest_path)
+
+        return manifest_path
+
+    @staticmethod
+    def load(folder: str, mmap_mode: str = "r") -> "SIL_ColumnStore":
+        """
+        Load a store written by save(). Columns are memory mapped by default.
+        """
+        manifest_path = os.path.join(folder, COLUMN_MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"{manifest_path} not found.")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        columns = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode)
+                   for name in manifest["columns"]}
+        return SIL_ColumnStore(columns, manifest.get("metadata", {}))
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        # the parent process owns (and unlinks) the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+class _SharedColumns:
+    """
+    Columns in shared memory blocks, described by picklable specs
+    {name: (block name, shape, dtype)}.
+    """
+
+    def __init__(self):
+        self.blocks = {}
+        self.arrays = {}
+
+    def create(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+    def attach(self, specs: dict) -> None:
+        for name, (block_name, shape, dtype) in specs.items():
+            block = _attach_shared_memory(block_name)
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(
+                shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    def specs(self) -> dict:
+        return {name: (self.blocks[name].name, array.shape, array.dtype.str)
+                for name, array in self.arrays.items()}
+
+    def close(self, unlink: bool = False) -> None:
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = {}
+
+
+# State of a worker process, set by _initialize_worker
+_worker = {}
+
+
+def _initialize_worker(
+    SIL_folder: str,
+    module_file_name: str,
+    case_function,
+    input_specs: dict,
+    output_specs: dict
+) -> None:
+    if SIL_folder not in sys.path:
+        sys.path.append(SIL_folder)
+
+    inputs = _SharedColumns()
+    inputs.attach(input_specs)
+    outputs = _SharedColumns()
+    outputs.attach(output_specs)
+
+    _worker.update({
+        "module": importlib.import_module(module_file_name),
+        "case_function": case_function,
+        "inputs": inputs,
+        "outputs": outputs,
+    })
+
+
+def _run_cases(start: int, stop: int) -> dict:
+    """
+    Run the cases [start, stop) in a worker. Outputs, status and elapsed time
+    are written to shared memory; returns {case index: error message}.
+    """
+    module = _worker["module"]
+    case_function = _worker["case_function"]
+    inputs = _worker["inputs"].arrays
+    outputs = _worker["outputs"].arrays
+    output_names = [n for n in outputs if n not in ("status", "elapsed")]
+    has_initialize = hasattr(module, "initialize")
+
+    errors = {}
+    for index in range(start, stop):
+        start_time = time.perf_counter()
+        try:
+            if has_initialize:
+                module.initialize()
+
+            result = case_function(
+                module, **{name: array[index] for name, array in inputs.items()})
+            if not isinstance(result, dict):
+                if len(output_names) != 1:
+                    raise ValueError(
+                        f"case function must return a dict of {output_names}.")
+                result = {output_names[0]: result}
+
+            for name in output_names:
+                outputs[name][index] = result[name]
+            outputs["status"][index] = STATUS_OK
+        except Exception as e:
+            outputs["status"][index] = STATUS_ERROR
+            errors[index] = f"{type(e).__name__}: {e}"
+
+        outputs["elapsed"][index] = time.perf_counter() - start_time
+
+    return errors
+
+
+class SIL_SweepExecutor:
+    def __init__(
+        self,
+        python_file_name: str,
+        SIL_folder: str,
+        case_function,
+        outputs: dict,
+        max_workers: int = None,
+        build_options: dict = None,
+        mp_context: str = None
+    ):
+        """
+        Args:
+            python_file_name: Target Python file name, e.g. "sample_matrix.py".
+            SIL_folder: Folder of the target Python file.
+            case_function: Module level function
+                case_function(module, **inputs_of_the_case) -> dict or output.
+            outputs: {name: (shape of one case, dtype)} of the outputs.
+            max_workers: Number of worker processes. Defaults to os.cpu_count().
+            build_options: Keyword arguments of SIL_Operator.build_SIL_code.
+                The module is built incrementally before the sweep. If None,
+                the already built module is used.
+            mp_context: multiprocessing start method ("fork", "spawn",
+                "forkserver"). Defaults to the platform default.
+        """
+        self.python_file_name = python_file_name
+        self.SIL_folder = os.path.abspath(SIL_folder)
+        self.case_function = case_function
+        self.outputs = {name: (tuple(shape), np.dtype(dtype))
+                        for name, (shape, dtype) in outputs.items()}
+        for name in ("status", "elapsed"):
+            if name in self.outputs:
+                raise ValueError(f"Output name '{name}' is reserved.")
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.build_options = build_options
+        self.mp_context = mp_context
+
+        self.module_file_name = snake_to_camel(
+            os.path.splitext(python_file_name)[0]) + "SIL"
+
+    def build(self) -> None:
+        operator = SIL_Operator(self.python_file_name, self.SIL_folder)
+        operator.build_SIL_code(**dict(self.build_options, incremental=True))
+        self.module_file_name = operator.module_file_name
+
+    def run(self, inputs: dict, tasks_per_worker: int = TASKS_PER_WORKER) -> SIL_ColumnStore:
+        """
+        Run one case per row of the input columns.
+
+        Args:
+            inputs: {name: array} with the case index as the first dimension.
+                Row i of each column is passed to the case function as the
+                keyword argument of that name.
+            tasks_per_worker: Number of case ranges per worker, for load balancing.
+        Returns:
+            SIL_ColumnStore with the input and output columns, "status"
+            (0: ok, 1: error) and "elapsed" (seconds per case). Error messages
+            are in metadata["errors"] ({case index: message}).
+        """
+        if self.build_options is not None:
+            self.build()
+
+        inputs = {name: np.asarray(array) for name, array in inputs.items()}
+        if not inputs:
+            raise ValueError("inputs must have at least one column.")
+        case_count = len(next(iter(inputs.values())))
+        for name, array in inputs.items():
+            if array.ndim == 0 or len(array) != case_count:
+                raise ValueError(
+                    f"Input '{name}' must have {case_count} rows.")
+            if name in self.outputs or name in ("status", "elapsed"):
+                raise ValueError(
+                    f"Input '{name}' has the name of an output column.")
+
+        shared_inputs = _SharedColumns()
+        shared_outputs = _SharedColumns()
+        try:
+            for name, array in inputs.items():
+                shared_inputs.create(name, array.shape, array.dtype)[...] = array
+            for name, (shape, dtype) in self.outputs.items():
+                shared_outputs.create(name, (case_count,) + shape, dtype)
+            shared_outputs.create("status", (case_count,), np.int8)
+            shared_outputs.create("elapsed", (case_count,), np.float64)
+
+            worker_count = max(1, min(self.max_workers, case_count))
+            task_size = max(1, -(-case_count // (worker_count * tasks_per_worker)))
+            ranges = [(start, min(start + task_size, case_count))
+                      for start in range(0, case_count, task_size)]
+
+            context = None
+            if self.mp_context is not None:
+                context = multiprocessing.get_context(self.mp_context)
+
+            errors = {}
+            start_time = time.perf_counter()
+            with ProcessPoolExecutor(
+                    max_workers=worker_count,
+                    mp_context=context,
+                    initializer=_initialize_worker,
+                    initargs=(self.SIL_folder, self.module_file_name,
+                              self.case_function, shared_inputs.specs(),
+                              shared_outputs.specs())) as executor:
+                futures = [executor.submit(_run_cases, start, stop)
+                           for start, stop in ranges]
+                for future in futures:
+                    errors.update(future.result())
+            elapsed = time.perf_counter() - start_time
+
+            store = SIL_ColumnStore(metadata={
+                "module_file_name": self.module_file_name,
+                "cases": case_count,
+                "workers": worker_count,
+                "elapsed": elapsed,
+                "errors": {str(k): v for k, v in sorted(errors.items())},
+            })
+            for name, array in inputs.items():
+                store.add_column(name, array)
+            # copies, the shared memory blocks are released below
+            for name in list(shared_outputs.arrays):
+                store.add_column(name, shared_outputs.arrays[name].copy())
+        finally:
+            shared_inputs.close(unlink=True)
+            shared_outputs.close(unlink=True)
+
+        if errors:
+            first_index = min(errors)
+            print(f"{len(errors)} of {case_count} cases failed, "
+                  f"e.g. case {first_index}: {errors[first_index]}")
+
+        return store
@@ -0,0 +1,153 @@
+"""
+File: SIL_toolchain.py
+
+Description: This file contains helper functions to detect optional build tools
+used for SIL builds: a compiler launcher (ccache or sccache), the Ninja
+generator and fast linkers (lld, mold). It also reads the hit and miss
+statistics of the compiler cache, so that a build can report how many
+translation units were served from the cache.
+
+Example code to detect the tools:
+```
+launcher = resolve_compiler_launcher("auto")   # e.g. "/usr/bin/ccache" or ""
+generator = resolve_cmake_generator("auto")    # "Ninja" or ""
+stats_before = read_compiler_cache_stats(launcher)
+...
+stats_after = read_compiler_cache_stats(launcher)
+print(diff_compiler_cache_stats(stats_before, stats_after))
+```
+"""
+import json
+import shutil
+import subprocess
+
+COMPILER_LAUNCHER_CANDIDATES = ("ccache", "sccache")
+SUPPORTED_LINKERS = ("lld", "mold", "gold", "bfd")
+SUPPORTED_LTO_MODES = ("full", "thin", "off")
+
+
+def resolve_compiler_launcher(compiler_launcher: str = "auto") -> str:
+    """
+    Resolve a compiler launcher setting to an executable path.
+
+    Args:
+        compiler_launcher: "auto" to use the first of ccache/sccache found on
+            PATH, a command name or path to use that launcher, or None/"" to
+            disable the launcher.
+
+    Returns:
+        The launcher path, or an empty string if no launcher is used.
+    """
+    if not compiler_launcher:
+        return ""
+
+    if compiler_launcher == "auto":
+        for candidate in COMPILER_LAUNCHER_CANDIDATES:
+            path = shutil.which(candidate)
+            if path is not None:
+                return path
+        return ""
+
+    path = shutil.which(compiler_launcher)
+    if path is None:
+        raise FileNotFoundError(
+            f"Compiler launcher '{compiler_launcher}' not found.")
+
+    return path
+
+
+def resolve_cmake_generator(generator: str = "auto") -> str:
+    """
+    Resolve a CMake generator setting.
+    "auto" selects "Ninja" when ninja is on PATH. None/"" keeps the CMake default.
+    Any other value is returned as is (e.g. "Unix Makefiles").
+    """
+    if not generator:
+        return ""
+
+    if generator == "auto":
+        return "Ninja" if shutil.which("ninja") is not None else ""
+
+    return generator
+
+
+def check_linker(linker: str) -> None:
+    if linker and linker not in SUPPORTED_LINKERS:
+        raise ValueError(
+            f"linker must be one of {SUPPORTED_LINKERS}, got '{linker}'")
+
+
+def check_lto_mode(lto_mode: str) -> None:
+    if lto_mode not in SUPPORTED_LTO_MODES:
+        raise ValueError(
+            f"lto_mode must be one of {SUPPORTED_LTO_MODES}, got '{lto_mode}'")
+
+
+def _read_ccache_stats(launcher: str) -> dict:
+    result = subprocess.run(
+        [launcher, "--print-stats"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    values = {}
+    for line in result.stdout.splitlines():
+        parts = line.split("\t")
+        if len(parts) == 2 and parts[1].strip().isdigit():
+            values[parts[0].strip()] = int(parts[1])
+
+    hits = values.get("direct_cache_hit", 0) + \
+        values.get("preprocessed_cache_hit", 0)
+    misses = values.get("cache_miss", 0)
+
+    return {"hits": hits, "misses": misses}
+
+
+def _read_sccache_stats(launcher: str) -> dict:
+    result = subprocess.run(
+        [launcher, "--show-stats", "--stats-format=json"],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    try:
+        stats = json.loads(result.stdout)["stats"]
+    except (ValueError, KeyError):
+        return None
+
+    hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+    misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+
+    return {"hits": hits, "misses": misses}
+
+
+def read_compiler_cache_stats(launcher: str) -> dict:
+    """
+    Return the cumulative {"hits": int, "misses": int} of the compiler cache,
+    or None if there is no launcher or its statistics cannot be read.
+    """
+    if not launcher:
+        return None
+
+    try:
+        if "sccache" in launcher:
+            return _read_sccache_stats(launcher)
+        if "ccache" in launcher:
+            return _read_ccache_stats(launcher)
+    except OSError:
+        return None
+
+    return None
+
+
+def diff_compiler_cache_stats(before: dict, after: dict) -> dict:
+    """
+    Return the hits and misses that happened between two statistics snapshots,
+    or None if either snapshot is unavailable.
+    """
+    if before is None or after is None:
+        return None
+
+    return {
+        "hits": after["hits"] - before["hits"],
+        "misses": after["misses"] - before["misses"],
+    }
@@ -0,0 +1,247 @@
+"""
+File: SIL_workspace_index.py
+
+Description: This file contains the SIL_WorkspaceIndex class, a persistent index
+of the directories and files under a workspace root. It is built in a single
+directory walk which prunes ".git", "build" and other ignored directories, and
+records the extension and mtime of every file.
+
+When it is loaded and on every explicit refresh the index is updated
+incrementally: every indexed directory is stat'ed and only directories whose
+mtime changed are listed again. File mtimes are therefore as of the last
+listing of their directory. SIL_Operator.build_SIL_code refreshes the index
+once per build; all later lookups of the build use it as is.
+The index is stored in "<root_path>/build/SIL_workspace_index.json" and shared
+in-process per root path, so that all source discovery of the SIL helper
+(CmakeGenerator and SIL_Operator) uses one walk.
+
+Example code to use the index:
+```
+index = SIL_WorkspaceIndex.for_root(root_path)
+for dir_path, file_name in index.iter_files({'.cpp'}):
+    print(os.path.join(dir_path, file_name))
+```
+"""
+import os
+import json
+
+INDEX_FOLDER_NAME = "build"
+INDEX_FILE_NAME = "SIL_workspace_index.json"
+INDEX_VERSION = 1
+
+IGNORED_DIR_NAMES = {
+    ".git", "build", "__pycache__", ".venv", "venv", ".tox", ".nox",
+    ".pytest_cache", ".mypy_cache", ".ruff_cache", "node_modules",
+}
+
+
+class SIL_WorkspaceIndex:
+    _instances = {}
+
+    def __init__(self, root_path: str, index_file_path: str = None):
+        self.root_path = os.path.abspath(root_path)
+
+        if index_file_path is None:
+            index_file_path = os.path.join(
+                self.root_path, INDEX_FOLDER_NAME, INDEX_FILE_NAME)
+        self.index_file_path = index_file_path
+
+        # relative dir ('' for root, forward slashes) ->
+        #   {"mtime_ns": int, "subdirs": [names], "files": {name: [ext, mtime_ns]}}
+        self.dirs = {}
+
+    @classmethod
+    def for_root(cls, root_path: str, refresh: bool = False) -> "SIL_WorkspaceIndex":
+        """
+        Return the shared index of root_path, loading and refreshing it on
+        first use in this process. Later calls refresh it only if refresh is True.
+        """
+        root = os.path.abspath(root_path)
+        index = cls._instances.get(root)
+        if index is None:
+            index = cls(root)
+            index.load()
+            cls._instances[root] = index
+            refresh = True
+
+        if refresh:
+            index.refresh()
+
+        return index
+
+    @staticmethod
+    def is_ignored_dir(dir_name: str) -> bool:
+        """
+        Return True if a directory with this name is pruned during traversal.
+        """
+        name = dir_name.lower()
+        return (name in IGNORED_DIR_NAMES) or name.endswith(".egg-info")
+
+    def load(self) -> bool:
+        """
+        Load the persistent index. Returns False if there is no usable index file.
+        """
+        try:
+            with open(self.index_file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != INDEX_VERSION or \
+                data.get("root_path") != self.root_path:
+            return False
+
+        self.dirs = data.get("dirs", {})
+        return True
+
+    def save(self) -> None:
+        """
+        Write the index to disk. Errors (e.g. read-only workspace) are ignored.
+        """
+        data = {
+            "version": INDEX_VERSION,
+            "root_path": self.root_path,
+            "dirs": self.dirs,
+        }
+        tmp_path = self.index_file_path + f".tmp{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(self.index_file_path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_file_path)
+        except OSError:
+            pass
+
+    def _abs_dir(self, rel_dir: str) -> str:
+        if rel_dir == "":
+            return self.root_path
+        return os.path.join(self.root_path, rel_dir)
+
+    def _remove_subtree(self, rel_dir: str) -> None:
+        prefix = rel_dir + "/"
+        for key in [k for k in self.dirs if k == rel_dir or k.startswith(prefix)]:
+            del self.dirs[key]
+
+    def _scan_dir(self, rel_dir: str, mtime_ns: int) -> None:
+        subdirs = []
+        files = {}
+
+        with os.scandir(self._abs_dir(rel_dir)) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not SIL_WorkspaceIndex.is_ignored_dir(entry.name):
+                            subdirs.append(entry.name)
+                    elif entry.is_file():
+                        _, ext = os.path.splitext(entry.name)
+                        files[entry.name] = [
+                            ext.lower(), entry.stat().st_mtime_ns]
+                except OSError:
+                    continue
+
+        self.dirs[rel_dir] = {
+            "mtime_ns": mtime_ns,
+            "subdirs": sorted(subdirs),
+            "files": dict(sorted(files.items())),
+        }
+
+    def _refresh_tree(self, rel_dir: str) -> bool:
+        try:
+            mtime_ns = os.stat(self._abs_dir(rel_dir)).st_mtime_ns
+        except OSError:
+            self._remove_subtree(rel_dir)
+            return True
+
+        changed = False
+        entry = self.dirs.get(rel_dir)
+
+        if entry is None or entry["mtime_ns"] != mtime_ns:
+            old_subdirs = set(entry["subdirs"]) if entry is not None else set()
+            try:
+                self._scan_dir(rel_dir, mtime_ns)
+            except OSError:
+                self._remove_subtree(rel_dir)
+                return True
+
+            for removed in old_subdirs - set(self.dirs[rel_dir]["subdirs"]):
+                self._remove_subtree(self._join(rel_dir, removed))
+            changed = True
+
+        for sub in self.dirs[rel_dir]["subdirs"]:
+            if self._refresh_tree(self._join(rel_dir, sub)):
+                changed = True
+
+        return changed
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return name if rel_dir == "" else rel_dir + "/" + name
+
+    def refresh(self) -> bool:
+        """
+        Bring the index up to date by comparing directory mtimes.
+        Only changed directories are listed again. Returns True if anything changed.
+        """
+        changed = self._refresh_tree("")
+        if changed:
+            self.save()
+
+        return changed
+
+    def iter_dirs(self):
+        """
+        Yield (absolute dir path, relative dir path) in top-down order,
+        the root first and subdirectories sorted by name.
+        """
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            entry = self.dirs.get(rel_dir)
+            if entry is None:
+                continue
+            yield self._abs_dir(rel_dir), rel_dir
+            for sub in reversed(entry["subdirs"]):
+                stack.append(self._join(rel_dir, sub))
+
+    def files_in_dir(self, rel_dir: str, extensions: set = None) -> list:
+        """
+        Return the file names in one indexed directory, optionally filtered
+        by (lower case) extension.
+        """
+        entry = self.dirs.get(rel_dir)
+        if entry is None:
+            return []
+
+        return [name for name, (ext, _) in entry["files"].items()
+                if extensions is None or ext in extensions]
+
+    def iter_files(self, extensions: set = None):
+        """
+        Yield (absolute dir path, file name) for all indexed files,
+        optionally filtered by (lower case) extension.
+        """
+        for dir_path, rel_dir in self.iter_dirs():
+            for name in self.files_in_dir(rel_dir, extensions):
+                yield dir_path, name
+
+    def find_file(self, file_name: str) -> str:
+        """
+        Return the full path of the first file named file_name, or an empty string.
+        """
+        for dir_path, rel_dir in self.iter_dirs():
+            if file_name in self.dirs[rel_dir]["files"]:
+                return os.path.join(dir_path, file_name)
+
+        return ""
+
+    def get_file_mtime_ns(self, file_path: str) -> int:
+        """
+        Return the recorded mtime of a file, or -1 if it is not indexed.
+        """
+        rel = os.path.relpath(os.path.abspath(file_path), self.root_path)
+        rel_dir, name = os.path.split(rel.replace('\\', '/'))
+        entry = self.dirs.get(rel_dir)
+        if entry is None or name not in entry["files"]:
+            return -1
+
+        return entry["files"][name][1]
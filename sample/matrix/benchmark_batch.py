@@ -0,0 +1,86 @@
+"""
+Throughput benchmark for the batched SampleMatrix SIL entry point.
+
+This script compares, for N stacked 3x3 matrices:
+  - SIL per-call:    SampleMatrixSIL.add called once per matrix
+  - SIL batched:     SampleMatrixSIL.add_batch called once on (N, 3, 3) arrays
+  - NumPy per-call:  SampleMatrix.add called once per matrix
+  - NumPy stacked:   SampleMatrix.add called once on (N, 3, 3) arrays
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+from sample_matrix import SampleMatrix
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+current_dir = os.path.dirname(__file__)
+generator = SIL_Operator("sample_matrix.py", current_dir)
+generator.build_SIL_code(build_type="Release", incremental=True)
+
+import SampleMatrixSIL
+SampleMatrixSIL.initialize()
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+MATRIX_SIZE = 3
+
+
+def measure(function, repeat: int) -> float:
+    """
+    Return the best elapsed time of `repeat` calls of function().
+    """
+    best_time = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def main():
+    rng = np.random.default_rng(0)
+    sm = SampleMatrix()
+
+    print(f"{'N':>9}  {'SIL per-call':>14}  {'SIL batched':>14}  "
+          f"{'NumPy per-call':>14}  {'NumPy stacked':>14}   [matrices/s]")
+
+    for batch in BATCH_SIZES:
+        A = rng.standard_normal((batch, MATRIX_SIZE, MATRIX_SIZE))
+        B = np.zeros((batch, MATRIX_SIZE, MATRIX_SIZE))
+        B[:, np.arange(MATRIX_SIZE), np.arange(MATRIX_SIZE)] = \
+            rng.standard_normal((batch, MATRIX_SIZE))
+
+        repeat = max(1, min(20, 100_000 // batch))
+
+        def sil_per_call():
+            for k in range(batch):
+                SampleMatrixSIL.add(A[k], B[k])
+
+        def sil_batched():
+            SampleMatrixSIL.add_batch(A, B)
+
+        def numpy_per_call():
+            for k in range(batch):
+                sm.add(A[k], B[k])
+
+        def numpy_stacked():
+            sm.add(A, B)
+
+        np.testing.assert_allclose(
+            SampleMatrixSIL.add_batch(A, B), sm.add(A, B))
+
+        times = [measure(f, repeat) for f in
+                 (sil_per_call, sil_batched, numpy_per_call, numpy_stacked)]
+
+        print(f"{batch:>9}  " +
+              "  ".join(f"{batch / t:14.3e}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
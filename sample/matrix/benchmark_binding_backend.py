@@ -0,0 +1,122 @@
+"""
+Micro-benchmark of the binding backends of SampleMatrixSIL.
+
+The SIL module of SampleMatrix is built (Release, incremental) with each
+binding backend: "pybind11" and "capi" (CPython and NumPy C APIs, see
+CApiCppGenerator). For each backend, this script prints the build time
+("skipped" when the module was up to date), the module size, and for
+SampleMatrixSIL.add(A, B) on 3 x 3 matrices:
+  - latency: median time per call over REPEAT_COUNT runs of CALL_COUNT calls,
+    with a new result array and with a preallocated out= array
+  - throughput: calls per second over CASE_COUNT distinct (A, B) pairs
+Each backend is measured in a new Python process, because the module of one
+backend replaces the module of the other. At the end, the pybind11 module is
+installed again.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator, BINDING_BACKENDS
+
+MATRIX_SIZE = 3
+CALL_COUNT = 20_000
+REPEAT_COUNT = 15
+CASE_COUNT = 200_000
+
+
+def median_time_per_call(function, *args) -> float:
+    times = []
+    for _ in range(REPEAT_COUNT):
+        start_time = time.perf_counter()
+        for _ in range(CALL_COUNT):
+            function(*args)
+        times.append((time.perf_counter() - start_time) / CALL_COUNT)
+    return float(np.median(times))
+
+
+def measure(current_dir: str) -> dict:
+    """
+    Measure the installed module. Runs in the process started by main.
+    """
+    sys.path.append(current_dir)
+    import SampleMatrixSIL
+    SampleMatrixSIL.initialize()
+
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((MATRIX_SIZE, MATRIX_SIZE))
+    B = rng.standard_normal(MATRIX_SIZE)
+    out = np.empty((MATRIX_SIZE, MATRIX_SIZE))
+    np.testing.assert_allclose(SampleMatrixSIL.add(A, B), A + np.diag(B))
+
+    A_cases = rng.standard_normal((CASE_COUNT, MATRIX_SIZE, MATRIX_SIZE))
+    B_cases = rng.standard_normal((CASE_COUNT, MATRIX_SIZE))
+    add = SampleMatrixSIL.add
+    start_time = time.perf_counter()
+    for i in range(CASE_COUNT):
+        add(A_cases[i], B_cases[i])
+    throughput = CASE_COUNT / (time.perf_counter() - start_time)
+
+    return {
+        "latency": median_time_per_call(add, A, B),
+        "latency_out": median_time_per_call(add, A, B, out),
+        "throughput": throughput,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the call latency of the SIL binding backends.")
+    parser.add_argument("--measure", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.measure:
+        print(json.dumps(measure(current_dir)))
+        return 0
+
+    generator = SIL_Operator("sample_matrix.py", current_dir)
+
+    results = {}
+    for backend in BINDING_BACKENDS:
+        start_time = time.perf_counter()
+        generator.build_SIL_code(build_type="Release", incremental=True,
+                                 binding_backend=backend)
+        build_time = time.perf_counter() - start_time
+        module_size = os.path.getsize(generator.find_built_module_path())
+
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure"],
+            capture_output=True, text=True, check=True)
+        results[backend] = json.loads(result.stdout.strip().splitlines()[-1])
+        results[backend]["build_time"] = build_time
+        results[backend]["skipped"] = bool(
+            (generator.build_summary or {}).get("skipped"))
+        results[backend]["module_size"] = module_size
+
+    print()
+    print(f"{'backend':<9} {'build [s]':>9} {'module [KiB]':>12}"
+          f" {'latency [ns]':>12} {'with out [ns]':>13} {'calls/s':>11}")
+    for backend, result in results.items():
+        build_text = "skipped" if result["skipped"] else f"{result['build_time']:.2f}"
+        print(f"{backend:<9} {build_text:>9} {result['module_size'] / 1024:12.1f}"
+              f" {result['latency'] * 1e9:12.0f} {result['latency_out'] * 1e9:13.0f}"
+              f" {result['throughput']:11.3e}")
+
+    generator.build_SIL_code(build_type="Release", incremental=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
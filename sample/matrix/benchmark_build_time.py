@@ -0,0 +1,54 @@
+"""
+Benchmark script for clean-build times of the SampleMatrix SIL module.
+
+This script builds the SIL module from scratch with and without precompiled
+headers and unity builds, and prints the clean-build time of each configuration.
+The compiler cache is disabled, so that every translation unit is compiled.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+BUILD_CONFIGURATIONS = [
+    ("baseline", {}),
+    ("pch", {"precompiled_headers": "auto"}),
+    ("unity", {"unity_build_batch_size": 8}),
+    ("pch + unity", {"precompiled_headers": "auto",
+                     "unity_build_batch_size": 8}),
+]
+
+REPEAT = 3
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    generator = SIL_Operator("sample_matrix.py", current_dir)
+
+    results = []
+    for name, options in BUILD_CONFIGURATIONS:
+        elapsed_list = []
+        for _ in range(REPEAT):
+            start_time = time.perf_counter()
+            generator.build_SIL_code(
+                build_type="Debug",
+                compiler_launcher=None,
+                **options)
+            elapsed_list.append(time.perf_counter() - start_time)
+
+        results.append((name, min(elapsed_list), sum(elapsed_list) / REPEAT))
+
+    baseline_time = results[0][1]
+    print(f"\nClean build of SampleMatrixSIL (best / mean of {REPEAT} runs):")
+    for name, best_time, mean_time in results:
+        print(f"  {name:<12} {best_time:7.2f} s / {mean_time:7.2f} s"
+              f"  speedup x{baseline_time / best_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
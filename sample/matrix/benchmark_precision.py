@@ -0,0 +1,182 @@
+"""
+Accuracy and throughput of the single-precision and SIMD variants of
+SampleMatrixSIL against the Python SampleMatrix.
+
+The SIL module of SampleMatrix is built (Release, incremental) with
+MATRIX_SIZE specialized and FLOAT overridden (see SIL_Operator.build_SIL_code):
+  - "double" and "float"
+  - "double" and "float" compiled with "simd" (-O3 -march=native)
+The SIMD variants are built as a separate module, because SIMD and plain
+specializations cannot be mixed in one module (their shared inline and
+template code is merged by the linker).
+For each variant, this script prints, against SampleMatrix.add on float64:
+  - the maximum absolute and relative error over CASE_COUNT random (A, B) pairs
+  - latency: median time per call of add over REPEAT_COUNT runs of CALL_COUNT
+    calls, on arrays of the dtype of the variant
+  - throughput: cases per second of add_batch over the CASE_COUNT pairs
+and the time per call of the dispatched SampleMatrixSIL.add on float32 arrays,
+which calls the float variant without a conversion, against the double variant
+converting the same arrays. Each module is measured in a new Python process.
+At the end, the module is rebuilt without specializations.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator, PybindCppGenerator
+
+MATRIX_SIZE = 8
+CALL_COUNT = 20_000
+REPEAT_COUNT = 15
+CASE_COUNT = 100_000
+
+VARIANT_BUILDS = [
+    [{"MATRIX_SIZE": MATRIX_SIZE, "FLOAT": "double"},
+     {"MATRIX_SIZE": MATRIX_SIZE, "FLOAT": "float"}],
+    [{"MATRIX_SIZE": MATRIX_SIZE, "FLOAT": "double", "simd": True},
+     {"MATRIX_SIZE": MATRIX_SIZE, "FLOAT": "float", "simd": True}],
+]
+
+
+def median_time_per_call(function, *args) -> float:
+    times = []
+    for _ in range(REPEAT_COUNT):
+        start_time = time.perf_counter()
+        for _ in range(CALL_COUNT):
+            function(*args)
+        times.append((time.perf_counter() - start_time) / CALL_COUNT)
+    return float(np.median(times))
+
+
+def max_errors(result: np.ndarray, reference: np.ndarray) -> tuple:
+    """
+    Return the maximum absolute error, and the maximum absolute error relative
+    to the largest reference element of its case (elementwise relative errors
+    blow up where the diagonal of A + B cancels).
+    """
+    error = np.abs(result.astype(np.float64) - reference)
+    case_axes = tuple(range(1, reference.ndim))
+    relative_error = error.max(axis=case_axes) / np.abs(reference).max(axis=case_axes)
+    return float(error.max()), float(relative_error.max())
+
+
+def measure(current_dir: str, labels: list) -> dict:
+    """
+    Measure the installed module. Runs in the process started by main.
+    """
+    sys.path.append(current_dir)
+    import SampleMatrixSIL
+    from sample_matrix import SampleMatrix
+    SampleMatrixSIL.initialize()
+
+    rng = np.random.default_rng(0)
+    A_cases = rng.standard_normal((CASE_COUNT, MATRIX_SIZE, MATRIX_SIZE))
+    B_cases = rng.standard_normal((CASE_COUNT, MATRIX_SIZE))
+
+    reference_matrix = SampleMatrix()
+    B_dense_cases = [np.diag(B) for B in B_cases]
+    start_time = time.perf_counter()
+    reference = np.stack([reference_matrix.add(A_cases[i], B_dense_cases[i])
+                          for i in range(CASE_COUNT)])
+    reference_throughput = CASE_COUNT / (time.perf_counter() - start_time)
+    results = {"python": {
+        "dtype": "float64",
+        "max_abs_error": 0.0,
+        "max_rel_error": 0.0,
+        "latency": median_time_per_call(
+            reference_matrix.add, A_cases[0], B_dense_cases[0]),
+        "throughput": reference_throughput,
+    }}
+
+    for label in labels:
+        variant = getattr(SampleMatrixSIL, label)
+        dtype = variant.add(A_cases[0], B_cases[0]).dtype
+        A_variant = A_cases.astype(dtype)
+        B_variant = B_cases.astype(dtype)
+
+        start_time = time.perf_counter()
+        batch_result = variant.add_batch(A_variant, B_variant)
+        throughput = CASE_COUNT / (time.perf_counter() - start_time)
+        max_abs_error, max_rel_error = max_errors(batch_result, reference)
+
+        results[label] = {
+            "dtype": str(dtype),
+            "max_abs_error": max_abs_error,
+            "max_rel_error": max_rel_error,
+            "latency": median_time_per_call(variant.add, A_variant[0], B_variant[0]),
+            "throughput": throughput,
+        }
+
+    # float32 arrays: dispatched without a conversion, or converted to double
+    A_single = A_cases[0].astype(np.float32)
+    B_single = B_cases[0].astype(np.float32)
+    double_variant = next(getattr(SampleMatrixSIL, label) for label in labels
+                          if results[label]["dtype"] == "float64")
+    results["float32_input"] = {
+        "dispatched_dtype": str(SampleMatrixSIL.add(A_single, B_single).dtype),
+        "dispatched": median_time_per_call(SampleMatrixSIL.add, A_single, B_single),
+        "converted": median_time_per_call(double_variant.add, A_single, B_single),
+    }
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the single-precision and SIMD SIL variants "
+                    "with the Python class.")
+    parser.add_argument("--measure", nargs="+", metavar="LABEL",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.measure:
+        print(json.dumps(measure(current_dir, args.measure)))
+        return 0
+
+    generator = SIL_Operator("sample_matrix.py", current_dir)
+
+    results = {}
+    for specializations in VARIANT_BUILDS:
+        generator.build_SIL_code(build_type="Release", incremental=True,
+                                 specializations=specializations)
+        labels = [PybindCppGenerator.specialization_label(specialization)
+                  for specialization in specializations]
+
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure"] + labels,
+            capture_output=True, text=True, check=True)
+        build_results = json.loads(result.stdout.strip().splitlines()[-1])
+        float32_input = build_results.pop("float32_input")
+        results.update(build_results)
+
+    print()
+    print(f"{'variant':<30} {'dtype':>7} {'max abs err':>11} {'max rel err':>11}"
+          f" {'add [ns]':>9} {'add_batch [cases/s]':>19}")
+    for label, result in results.items():
+        print(f"{label:<30} {result['dtype']:>7} {result['max_abs_error']:11.2e}"
+              f" {result['max_rel_error']:11.2e} {result['latency'] * 1e9:9.0f}"
+              f" {result['throughput']:19.3e}")
+    print("(python: SampleMatrix.add called in a loop)")
+
+    print()
+    print(f"float32 arrays: SampleMatrixSIL.add dispatched to {float32_input['dispatched_dtype']}"
+          f" in {float32_input['dispatched'] * 1e9:.0f} ns,"
+          f" converted by the double variant in {float32_input['converted'] * 1e9:.0f} ns")
+
+    generator.build_SIL_code(build_type="Release", incremental=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
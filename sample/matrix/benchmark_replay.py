@@ -0,0 +1,123 @@
+"""
+Split the time of SampleMatrixSIL.add into the C++ method and the Python
+boundary with a recorded trace and its native replay.
+
+The SIL module of SampleMatrix is built (Release, incremental) with the
+SIL_CALL_TRACE definition and the replay benchmark (replay_benchmark=True,
+see ReplayCppGenerator). In a new Python process, this script records
+CASE_COUNT calls of SampleMatrixSIL.add on random (A, B) pairs to a trace
+(start_trace / stop_trace), and measures the median time per call of the same
+calls from Python over REPEAT_COUNT runs. The replay benchmark then runs the
+recorded calls against SampleMatrix without Python, checks that the results
+match the recorded ones, and reports its time per call. The difference is the
+cost of the Python boundary: argument parsing, array conversions and the
+result array.
+At the end, the module is rebuilt without the definition.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+MATRIX_SIZE = 3
+CASE_COUNT = 20_000
+REPEAT_COUNT = 15
+
+
+def measure(current_dir: str, trace_path: str) -> dict:
+    """
+    Record the trace and measure the installed module. Runs in the process
+    started by main.
+    """
+    sys.path.append(current_dir)
+    import SampleMatrixSIL
+    SampleMatrixSIL.initialize()
+
+    rng = np.random.default_rng(0)
+    A_cases = list(rng.standard_normal((CASE_COUNT, MATRIX_SIZE, MATRIX_SIZE)))
+    B_cases = list(rng.standard_normal((CASE_COUNT, MATRIX_SIZE)))
+    add = SampleMatrixSIL.add
+
+    SampleMatrixSIL.start_trace(trace_path)
+    for A, B in zip(A_cases, B_cases):
+        add(A, B)
+    recorded_calls = SampleMatrixSIL.stop_trace()
+
+    times = []
+    for _ in range(REPEAT_COUNT):
+        start_time = time.perf_counter()
+        for A, B in zip(A_cases, B_cases):
+            add(A, B)
+        times.append((time.perf_counter() - start_time) / CASE_COUNT)
+
+    return {
+        "recorded_calls": recorded_calls,
+        "trace_size": os.path.getsize(trace_path),
+        "python": float(np.median(times)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the time per call of SampleMatrixSIL.add from "
+                    "Python with its native replay.")
+    parser.add_argument("--measure", metavar="TRACE",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.measure:
+        print(json.dumps(measure(current_dir, args.measure)))
+        return 0
+
+    generator = SIL_Operator("sample_matrix.py", current_dir)
+    generator.build_SIL_code(build_type="Release", incremental=True,
+                             compile_definitions=["SIL_CALL_TRACE"],
+                             replay_benchmark=True)
+    replay_path = generator.build_summary["replay_benchmark"]
+    trace_path = os.path.join(os.path.dirname(replay_path), "sample_matrix_add.trace")
+
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", trace_path],
+        capture_output=True, text=True, check=True)
+    python_result = json.loads(result.stdout.strip().splitlines()[-1])
+
+    replay = subprocess.run([replay_path, trace_path],
+                            capture_output=True, text=True)
+    print()
+    print(replay.stdout, end="")
+    if replay.returncode != 0:
+        print(replay.stderr, end="")
+        generator.build_SIL_code(build_type="Release", incremental=True)
+        return replay.returncode
+
+    native = next(float(line.split()[2]) * 1e-9
+                  for line in replay.stdout.splitlines()
+                  if line.split()[:1] == ["add"])
+    python = python_result["python"]
+
+    print()
+    print(f"trace: {python_result['recorded_calls']} calls, "
+          f"{python_result['trace_size'] / 1024:.1f} KiB")
+    print(f"{'SampleMatrixSIL.add from Python':<34} {python * 1e9:8.1f} ns/call")
+    print(f"{'SampleMatrix::add replayed':<34} {native * 1e9:8.1f} ns/call")
+    print(f"{'Python boundary':<34} {(python - native) * 1e9:8.1f} ns/call"
+          f" ({(python - native) / python * 100:.0f} %)")
+
+    generator.build_SIL_code(build_type="Release", incremental=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
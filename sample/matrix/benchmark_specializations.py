@@ -0,0 +1,84 @@
+"""
+Benchmark of SampleMatrixSIL built with several MATRIX_SIZE specializations.
+
+The SIL module of SampleMatrix is built (Release, incremental) with one more
+specialization at a time: MATRIX_SIZE 3, then 3 and 6, then 3, 6 and 9, ...
+For each added specialization, this script prints the compile time of its
+translation unit, its object file size and the size of the module, and then
+the time per call of SampleMatrixSIL.add, which dispatches on the argument
+shapes, against the direct call of the specialization
+(SampleMatrixSIL.MATRIX_SIZE_<n>.add).
+At the end, the module is rebuilt without specializations.
+"""
+import os
+import sys
+import time
+import importlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+MATRIX_SIZES = [3, 6, 9, 12]
+CALL_COUNT = 100_000
+
+
+def time_per_call(function, *args) -> float:
+    start_time = time.perf_counter()
+    for _ in range(CALL_COUNT):
+        function(*args)
+    return (time.perf_counter() - start_time) / CALL_COUNT
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    generator = SIL_Operator("sample_matrix.py", current_dir)
+
+    print(f"{'added':>6}  {'compile [s]':>11}  {'object [KiB]':>12}"
+          f"  {'module [KiB]':>12}  {'module delta':>12}")
+
+    module_size = None
+    specializations = []
+    for size in MATRIX_SIZES:
+        specializations.append({"MATRIX_SIZE": size})
+        generator.build_SIL_code(build_type="Release", incremental=True,
+                                 specializations=specializations)
+
+        report = generator.build_summary["specializations"][-1]
+        previous_size = module_size
+        module_size = os.path.getsize(generator.find_built_module_path())
+        delta_text = "-" if previous_size is None else \
+            f"{(module_size - previous_size) / 1024:+.1f}"
+        compile_text = "-" if report["compile_time"] is None else \
+            f"{report['compile_time']:.2f}"
+
+        print(f"{size:>6}  {compile_text:>11}  {report['object_size'] / 1024:12.1f}"
+              f"  {module_size / 1024:12.1f}  {delta_text:>12}")
+
+    # the module of the last build has all specializations
+    sys.path.append(current_dir)
+    SampleMatrixSIL = importlib.import_module("SampleMatrixSIL")
+    SampleMatrixSIL.initialize()
+
+    print()
+    print(f"{'size':>6}  {'dispatched [ns]':>15}  {'direct [ns]':>11}")
+    rng = np.random.default_rng(0)
+    for size in MATRIX_SIZES:
+        A = rng.standard_normal((size, size))
+        B = rng.standard_normal(size)
+        specialization = getattr(SampleMatrixSIL, f"MATRIX_SIZE_{size}")
+        np.testing.assert_allclose(SampleMatrixSIL.add(A, B), A + np.diag(B))
+
+        dispatched_time = time_per_call(SampleMatrixSIL.add, A, B)
+        direct_time = time_per_call(specialization.add, A, B)
+        print(f"{size:>6}  {dispatched_time * 1e9:15.0f}  {direct_time * 1e9:11.0f}")
+
+    generator.build_SIL_code(build_type="Release", incremental=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of the streaming SampleMatrix SIL entry point.
+
+This script runs SampleMatrix.add over input signals of N time steps, which
+are stored in memory mapped ".npy" files, and compares:
+  - SIL per-step loop: SampleMatrixSIL.add called once per step from Python,
+                       the results collected in a list
+  - SIL streamed:      SampleMatrixSIL.add_stream called once, the results
+                       streamed in chunks to a memory mapped ".npy" file
+It prints the steps per second and the peak Python heap (tracemalloc) of each.
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+current_dir = os.path.dirname(__file__)
+generator = SIL_Operator("sample_matrix.py", current_dir)
+generator.build_SIL_code(build_type="Release", incremental=True)
+
+import SampleMatrixSIL
+SampleMatrixSIL.initialize()
+
+STEP_COUNTS = [10_000, 100_000, 1_000_000]
+MATRIX_SIZE = 3
+WRITE_CHUNK_SIZE = 100_000
+
+
+def write_input_signals(folder: str, steps: int, rng) -> tuple:
+    """
+    Write the input signals A and B (steps, 3, 3) chunk by chunk to ".npy" files.
+    """
+    A_path = os.path.join(folder, "A.npy")
+    B_path = os.path.join(folder, "B.npy")
+    shape = (steps, MATRIX_SIZE, MATRIX_SIZE)
+
+    A = np.lib.format.open_memmap(A_path, mode="w+", dtype=np.float64, shape=shape)
+    B = np.lib.format.open_memmap(B_path, mode="w+", dtype=np.float64, shape=shape)
+    for start in range(0, steps, WRITE_CHUNK_SIZE):
+        stop = min(start + WRITE_CHUNK_SIZE, steps)
+        A[start:stop] = rng.standard_normal((stop - start, MATRIX_SIZE, MATRIX_SIZE))
+        B[start:stop, np.arange(MATRIX_SIZE), np.arange(MATRIX_SIZE)] = \
+            rng.standard_normal((stop - start, MATRIX_SIZE))
+    A.flush()
+    B.flush()
+
+    return A_path, B_path
+
+
+def measure(function) -> tuple:
+    """
+    Return (elapsed time, peak traced Python heap in bytes) of function().
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    print(f"{'steps':>9}  {'per-step loop':>14}  {'streamed':>14}   [steps/s]"
+          f"  {'loop peak':>10}  {'stream peak':>11}   [MiB]")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for steps in STEP_COUNTS:
+            A_path, B_path = write_input_signals(folder, steps, rng)
+            output_path = os.path.join(folder, "C.npy")
+
+            def sil_per_step():
+                A = np.load(A_path, mmap_mode="r")
+                B = np.load(B_path, mmap_mode="r")
+                results = []
+                for k in range(steps):
+                    results.append(SampleMatrixSIL.add(A[k], B[k]))
+
+            def sil_streamed():
+                SampleMatrixSIL.add_stream(A_path, B_path, out=output_path)
+
+            loop_time, loop_peak = measure(sil_per_step)
+            stream_time, stream_peak = measure(sil_streamed)
+
+            C = np.load(output_path, mmap_mode="r")
+            np.testing.assert_allclose(
+                C[-1], np.load(A_path)[-1] + np.load(B_path)[-1])
+            del C
+
+            print(f"{steps:>9}  {steps / loop_time:14.3e}  {steps / stream_time:14.3e}"
+                  f"              {loop_peak / 2**20:10.1f}  {stream_peak / 2**20:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark of the structure-aware transfer of diagonal and sparse matrices.
+
+This script generates a small header-only C++ class with methods that take a
+PythonNumpy::DiagMatrix_Type or a tridiagonal PythonNumpy::SparseMatrix_Type of
+size 4, 16 and 64, builds its SIL module with the generated wrappers, and
+compares per call latency and the bytes passed from Python for:
+  - diagonal: dense (M, M) array vs compact diagonal (M,)
+  - sparse:   dense (M, M) array vs values in pattern order (NNZ,) vs
+              (data, indices, indptr) CSR tuple vs scipy.sparse CSR matrix
+              (if scipy is installed)
+The generated files are written to "sample/structured_benchmark" and removed
+at the end, unless --keep is given.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+MATRIX_SIZES = [4, 16, 64]
+CALL_COUNT = 20_000
+BENCHMARK_FOLDER_NAME = "structured_benchmark"
+
+
+def tridiagonal_pattern(size: int) -> list:
+    """
+    Return the column indices of the available elements of each row of a
+    tridiagonal matrix.
+    """
+    return [[j for j in (i - 1, i, i + 1) if 0 <= j < size]
+            for i in range(size)]
+
+
+def generate_header(sizes: list) -> str:
+    declarations = ""
+    definitions = ""
+    for size in sizes:
+        pattern = tridiagonal_pattern(size)
+        nnz = sum(len(row) for row in pattern)
+        rows = ",\n      ".join(
+            "PythonNumpy::ColumnAvailable<" +
+            ", ".join("true" if j in row else "false" for j in range(size)) + ">"
+            for row in pattern)
+
+        declarations += f"  static constexpr std::size_t SIZE_{size} = {size};\n"
+        declarations += f"  static constexpr std::size_t NNZ_{size} = {nnz};\n"
+        declarations += f"  using Diag{size}_Type = PythonNumpy::DiagMatrix_Type<FLOAT, SIZE_{size}>;\n"
+        declarations += f"  using SparseAvailable{size} = PythonNumpy::SparseAvailable<\n      {rows}>;\n"
+        declarations += f"  using Sparse{size}_Type =\n"
+        declarations += f"      PythonNumpy::SparseMatrix_Type<FLOAT, SparseAvailable{size}>;\n\n"
+
+        definitions += "inline StructuredBenchmark::FLOAT\n"
+        definitions += f"StructuredBenchmark::diag_sum_{size}(const Diag{size}_Type &D) {{\n"
+        definitions += "  FLOAT sum = static_cast<FLOAT>(0);\n"
+        definitions += f"  for (std::size_t i = 0; i < SIZE_{size}; ++i) {{\n"
+        definitions += "    sum += D(i);\n"
+        definitions += "  }\n"
+        definitions += "  return sum;\n"
+        definitions += "}\n\n"
+        definitions += "inline StructuredBenchmark::FLOAT\n"
+        definitions += f"StructuredBenchmark::sparse_sum_{size}(const Sparse{size}_Type &S) {{\n"
+        definitions += "  FLOAT sum = static_cast<FLOAT>(0);\n"
+        definitions += f"  for (std::size_t k = 0; k < NNZ_{size}; ++k) {{\n"
+        definitions += "    sum += S(k);\n"
+        definitions += "  }\n"
+        definitions += "  return sum;\n"
+        definitions += "}\n\n"
+
+    methods = ""
+    for size in sizes:
+        methods += f"  FLOAT diag_sum_{size}(const Diag{size}_Type &D);\n"
+        methods += f"  FLOAT sparse_sum_{size}(const Sparse{size}_Type &S);\n"
+
+    header_text = ""
+    header_text += "#ifndef STRUCTURED_BENCHMARK_HPP_\n"
+    header_text += "#define STRUCTURED_BENCHMARK_HPP_\n\n"
+    header_text += "#include \"python_numpy.hpp\"\n\n"
+    header_text += "class StructuredBenchmark {\n"
+    header_text += "public:\n"
+    header_text += "  using FLOAT = double;\n\n"
+    header_text += declarations
+    header_text += "public:\n"
+    header_text += methods
+    header_text += "};\n\n"
+    header_text += definitions
+    header_text += "#endif // STRUCTURED_BENCHMARK_HPP_\n"
+
+    return header_text
+
+
+def generate_python_class(sizes: list) -> str:
+    python_text = "import numpy as np\n\n\n"
+    python_text += "class StructuredBenchmark:\n"
+    for size in sizes:
+        python_text += f"    def diag_sum_{size}(self, D: np.ndarray) -> float:\n"
+        python_text += "        return float(np.trace(D))\n\n"
+        python_text += f"    def sparse_sum_{size}(self, S: np.ndarray) -> float:\n"
+        python_text += "        return float(np.sum(S))\n\n"
+
+    return python_text.rstrip("\n") + "\n"
+
+
+def build_module(folder: str, sizes: list):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "structured_benchmark.hpp"), "w",
+              encoding="utf-8") as f:
+        f.write(generate_header(sizes))
+    with open(os.path.join(folder, "structured_benchmark.py"), "w",
+              encoding="utf-8") as f:
+        f.write(generate_python_class(sizes))
+
+    generator = SIL_Operator("structured_benchmark.py", folder)
+    generator.build_SIL_code(build_type="Release", incremental=True)
+
+    sys.path.append(folder)
+    import StructuredBenchmarkSIL
+    StructuredBenchmarkSIL.initialize()
+
+    return StructuredBenchmarkSIL
+
+
+def time_per_call(function, argument) -> float:
+    start_time = time.perf_counter()
+    for _ in range(CALL_COUNT):
+        function(argument)
+    return (time.perf_counter() - start_time) / CALL_COUNT
+
+
+def payload_bytes(argument) -> int:
+    if isinstance(argument, tuple):
+        return sum(a.nbytes for a in argument)
+    if hasattr(argument, "tocsr"):
+        return argument.data.nbytes + argument.indices.nbytes + \
+            argument.indptr.nbytes
+    return argument.nbytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare dense and compact transfer of structured matrices.")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated benchmark module")
+    args = parser.parse_args(argv)
+
+    try:
+        import scipy.sparse
+    except ImportError:
+        scipy = None
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    folder = os.path.join(os.path.dirname(current_dir), BENCHMARK_FOLDER_NAME)
+
+    try:
+        module = build_module(folder, MATRIX_SIZES)
+        rng = np.random.default_rng(0)
+
+        print(f"{'size':>4}  {'matrix':<7} {'form':<14} {'bytes':>8}"
+              f"  {'time [us]':>9}  {'vs dense':>8}")
+
+        for size in MATRIX_SIZES:
+            # diagonal
+            diagonal = rng.standard_normal(size)
+            forms = [("dense", np.diag(diagonal)),
+                     ("compact", diagonal)]
+            diag_sum = getattr(module, f"diag_sum_{size}")
+            dense_time = None
+            for form_name, argument in forms:
+                assert np.isclose(diag_sum(argument), diagonal.sum())
+                elapsed = time_per_call(diag_sum, argument)
+                if dense_time is None:
+                    dense_time = elapsed
+                print(f"{size:>4}  {'diag':<7} {form_name:<14} {payload_bytes(argument):>8}"
+                      f"  {elapsed * 1e6:9.3f}  x{dense_time / elapsed:7.2f}")
+
+            # tridiagonal sparse
+            pattern = tridiagonal_pattern(size)
+            indptr = np.cumsum([0] + [len(row) for row in pattern])
+            indices = np.concatenate([np.array(row) for row in pattern])
+            values = rng.standard_normal(indices.size)
+            dense = np.zeros((size, size))
+            dense[np.repeat(np.arange(size), np.diff(indptr)), indices] = values
+
+            forms = [("dense", dense),
+                     ("values", values),
+                     ("csr tuple", (values, indices, indptr))]
+            if scipy is not None:
+                forms.append(("scipy csr", scipy.sparse.csr_matrix(dense)))
+
+            sparse_sum = getattr(module, f"sparse_sum_{size}")
+            dense_time = None
+            for form_name, argument in forms:
+                assert np.isclose(sparse_sum(argument), values.sum())
+                elapsed = time_per_call(sparse_sum, argument)
+                if dense_time is None:
+                    dense_time = elapsed
+                print(f"{size:>4}  {'sparse':<7} {form_name:<14} {payload_bytes(argument):>8}"
+                      f"  {elapsed * 1e6:9.3f}  x{dense_time / elapsed:7.2f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
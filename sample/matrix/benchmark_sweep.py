@@ -0,0 +1,75 @@
+"""
+Process scaling benchmark for a SampleMatrix parameter sweep.
+
+Each case of the sweep calls SampleMatrixSIL.add and the Python model
+SampleMatrix.add on one (A, B) pair and records the SIL result and the largest
+difference between both. The cases are run with SIL_SweepExecutor on 1, 2, 4
+and 8 worker processes (capped at the number of cores), and this script prints
+the throughput and the speedup over a single worker.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+from sample_matrix import SampleMatrix
+
+from helper.SIL.SIL_sweep import SIL_SweepExecutor
+
+WORKER_COUNTS = [1, 2, 4, 8]
+CASE_COUNT = 200_000
+MATRIX_SIZE = 3
+
+
+def compare_add(module, A: np.ndarray, B: np.ndarray) -> dict:
+    C_sil = module.add(A, B)
+    C_py = SampleMatrix().add(A, B)
+    return {"C": C_sil, "error": np.max(np.abs(C_sil - C_py))}
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((CASE_COUNT, MATRIX_SIZE, MATRIX_SIZE))
+    B = np.zeros((CASE_COUNT, MATRIX_SIZE, MATRIX_SIZE))
+    B[:, np.arange(MATRIX_SIZE), np.arange(MATRIX_SIZE)] = \
+        rng.standard_normal((CASE_COUNT, MATRIX_SIZE))
+
+    outputs = {"C": ((MATRIX_SIZE, MATRIX_SIZE), np.float64),
+               "error": ((), np.float64)}
+    cpu_count = os.cpu_count() or 1
+
+    print(f"{'workers':>7}  {'time [s]':>9}  {'cases/s':>11}  {'speedup':>7}")
+
+    base_throughput = None
+    build_options = {"build_type": "Release"}
+    for worker_count in WORKER_COUNTS:
+        if worker_count > cpu_count and worker_count > 1:
+            break
+
+        executor = SIL_SweepExecutor(
+            "sample_matrix.py", current_dir, compare_add, outputs,
+            max_workers=worker_count, build_options=build_options)
+        # built once, by the first run
+        build_options = None
+
+        store = executor.run({"A": A, "B": B})
+        assert store["status"].max() == 0
+        np.testing.assert_allclose(store["C"], A + B)
+        assert store["error"].max() == 0.0
+
+        elapsed_time = store.metadata["elapsed"]
+        throughput = CASE_COUNT / elapsed_time
+        if base_throughput is None:
+            base_throughput = throughput
+
+        print(f"{worker_count:>7}  {elapsed_time:9.3f}  {throughput:11.3e}"
+              f"  x{throughput / base_throughput:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Thread scaling benchmark for the SampleMatrix SIL class binding.
+
+Each thread owns its own SampleMatrixSIL.SampleMatrix instance and calls
+add_batch on it. The C++ computation runs with the GIL released, so
+independent instances scale with the number of threads.
+This script prints the throughput and the speedup over a single thread.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+from sample_matrix import SampleMatrix
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+current_dir = os.path.dirname(__file__)
+generator = SIL_Operator("sample_matrix.py", current_dir)
+generator.build_SIL_code(build_type="Release", incremental=True)
+
+import SampleMatrixSIL
+
+THREAD_COUNTS = [1, 2, 4, 8]
+BATCH_SIZE = 100_000
+CALLS_PER_THREAD = 20
+MATRIX_SIZE = 3
+
+
+def run_worker(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """
+    Call add_batch repeatedly on an instance owned by this worker.
+    """
+    instance = SampleMatrixSIL.SampleMatrix()
+    out = np.empty_like(A)
+    for _ in range(CALLS_PER_THREAD):
+        instance.add_batch(A, B, out=out)
+    return out
+
+
+def main():
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((BATCH_SIZE, MATRIX_SIZE, MATRIX_SIZE))
+    B = np.zeros((BATCH_SIZE, MATRIX_SIZE, MATRIX_SIZE))
+    B[:, np.arange(MATRIX_SIZE), np.arange(MATRIX_SIZE)] = \
+        rng.standard_normal((BATCH_SIZE, MATRIX_SIZE))
+
+    np.testing.assert_allclose(run_worker(A, B), SampleMatrix().add(A, B))
+
+    print(f"{'threads':>7}  {'time [s]':>9}  {'matrices/s':>11}  {'speedup':>7}")
+
+    base_throughput = None
+    for thread_count in THREAD_COUNTS:
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            start_time = time.perf_counter()
+            futures = [executor.submit(run_worker, A, B)
+                       for _ in range(thread_count)]
+            for future in futures:
+                future.result()
+            elapsed_time = time.perf_counter() - start_time
+
+        throughput = thread_count * CALLS_PER_THREAD * BATCH_SIZE / elapsed_time
+        if base_throughput is None:
+            base_throughput = throughput
+
+        print(f"{thread_count:>7}  {elapsed_time:9.3f}  {throughput:11.3e}"
+              f"  x{throughput / base_throughput:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
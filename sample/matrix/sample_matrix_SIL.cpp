@@ -1,6 +1,10 @@
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 
+#include <mutex>
+
+#include "SIL_numpy_conversion.hpp"
+#include "SIL_stream_runner.hpp"
 #include "sample_matrix.hpp"
 
 namespace sample_matrix_SIL {
@@ -8,69 +12,393 @@ namespace sample_matrix_SIL {
 namespace py = pybind11;
 
 SampleMatrix sm;
+/* Serializes the module level calls on the shared instance, as the
+   batched and streamed wrappers run it without the GIL. */
+std::mutex sm_mutex;
+
+SIL_CALL_TRACE_FUNCTION(initialize_trace, "initialize");
+void initialize(void) {
+  SIL_CALL_TRACE_RECORD(initialize_trace);
+  std::lock_guard<std::mutex> lock(sm_mutex);
+  sm = SampleMatrix();
+  SIL_CALL_TRACE_COMMIT();
+}
 
-void initialize(void) { sm = SampleMatrix(); }
+/* Independent instances for the class binding. The mutex serializes
+   calls on one instance while the GIL is released. */
+class SampleMatrix_Instance {
+public:
+  SampleMatrix instance;
+  std::mutex mutex;
+};
+
+void instance_initialize(SampleMatrix_Instance &self) {
+  py::gil_scoped_release release;
+  std::lock_guard<std::mutex> lock(self.mutex);
+  self.instance = SampleMatrix();
+}
 
 // Class: SampleMatrix
 // Method: add
-py::array_t<SampleMatrix::FLOAT> add(py::array_t<SampleMatrix::FLOAT> A_in,
-                                     py::array_t<SampleMatrix::FLOAT> B_in) {
+SIL_CALL_STATS_METHOD(add_stats, "add");
+SIL_CALL_TRACE_FUNCTION(add_trace, "add");
+py::array_t<SampleMatrix::FLOAT> add(py::handle A_in, py::handle B_in,
+                                     py::object out) {
+  SIL_CALL_STATS_TIMER(add_stats);
+  SIL_CALL_TRACE_RECORD(add_trace);
 
-  py::buffer_info A_info = A_in.request();
-  py::buffer_info B_info = B_in.request();
+  /* substitute */
+  SampleMatrix::DenseMatrix_Type A;
+  SampleMatrix::DiagMatrix_Type B;
 
-  /* check compatibility */
-  if (SampleMatrix::MATRIX_SIZE != A_info.shape[0]) {
-    throw std::runtime_error("ref must have " +
-                             std::to_string(SampleMatrix::MATRIX_SIZE) +
-                             " columns.");
-  }
+  SIL_NumpyConversion::dense_from_numpy<SampleMatrix::FLOAT,
+                                        SampleMatrix::MATRIX_SIZE,
+                                        SampleMatrix::MATRIX_SIZE>(A_in, A,
+                                                                   "A");
+  SIL_NumpyConversion::diag_from_numpy<SampleMatrix::FLOAT,
+                                       SampleMatrix::MATRIX_SIZE>(B_in, B,
+                                                                  "B");
+
+  SIL_CALL_TRACE_VALUE(dense<SampleMatrix::FLOAT, SampleMatrix::MATRIX_SIZE,
+                             SampleMatrix::MATRIX_SIZE>(A));
+  SIL_CALL_TRACE_VALUE(diag<SampleMatrix::FLOAT, SampleMatrix::MATRIX_SIZE>(B));
+
+  /* call add method */
+  SIL_CALL_STATS_PHASE(COMPUTE);
+  std::lock_guard<std::mutex> lock(sm_mutex);
+  auto result = sm.add(A, B);
+  SIL_CALL_TRACE_VALUE(dense<SampleMatrix::FLOAT, SampleMatrix::MATRIX_SIZE,
+                             SampleMatrix::MATRIX_SIZE>(result));
+  SIL_CALL_TRACE_COMMIT();
+
+  /* return numpy array */
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  return SIL_NumpyConversion::dense_to_numpy<SampleMatrix::FLOAT,
+                                             SampleMatrix::MATRIX_SIZE,
+                                             SampleMatrix::MATRIX_SIZE>(result,
+                                                                        out);
+}
+
+// Method: add (batched)
+SIL_CALL_STATS_METHOD(add_batch_stats, "add_batch");
+py::array_t<SampleMatrix::FLOAT> add_batch(py::handle A_in, py::handle B_in,
+                                           py::object out) {
+  SIL_CALL_STATS_TIMER(add_batch_stats);
+
+  /* check inputs */
+  auto A_array =
+      SIL_NumpyConversion::as_c_array<SampleMatrix::FLOAT>(A_in, "A");
+  auto B_array =
+      SIL_NumpyConversion::as_c_array<SampleMatrix::FLOAT>(B_in, "B");
 
-  if (SampleMatrix::MATRIX_SIZE != B_info.shape[0]) {
-    throw std::runtime_error("ref must have " +
-                             std::to_string(SampleMatrix::MATRIX_SIZE) +
-                             " columns.");
+  /* B is (N, 3) diagonals or (N, 3, 3) */
+  bool B_compact = false;
+  const std::size_t batch = SIL_NumpyConversion::check_batch_shape(
+      A_array, SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE, "A");
+  SIL_NumpyConversion::check_batch_size(
+      batch,
+      SIL_NumpyConversion::check_diag_batch_shape(
+          B_array, SampleMatrix::MATRIX_SIZE, "B", B_compact),
+      "B");
+
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  py::array_t<SampleMatrix::FLOAT> output =
+      SIL_NumpyConversion::prepare_batch_output<SampleMatrix::FLOAT,
+                                                SampleMatrix::MATRIX_SIZE,
+                                                SampleMatrix::MATRIX_SIZE>(
+          out, batch, "out");
+
+  const SampleMatrix::FLOAT *A_data = A_array.data();
+  const SampleMatrix::FLOAT *B_data = B_array.data();
+  SampleMatrix::FLOAT *output_data = output.mutable_data();
+
+  constexpr std::size_t STRIDE =
+      SampleMatrix::MATRIX_SIZE * SampleMatrix::MATRIX_SIZE;
+
+  /* loop over the batch without the GIL */
+  SIL_CALL_STATS_PHASE(COMPUTE);
+  {
+    py::gil_scoped_release release;
+    std::lock_guard<std::mutex> lock(sm_mutex);
+
+    SampleMatrix::DenseMatrix_Type A;
+    SampleMatrix::DiagMatrix_Type B;
+
+    for (std::size_t k = 0; k < batch; ++k) {
+      SIL_NumpyConversion::dense_from_buffer<SampleMatrix::MATRIX_SIZE,
+                                             SampleMatrix::MATRIX_SIZE>(
+          A_data + k * STRIDE, A);
+      if (B_compact) {
+        SIL_NumpyConversion::diag_from_compact_buffer<
+            SampleMatrix::MATRIX_SIZE>(B_data + k * SampleMatrix::MATRIX_SIZE,
+                                       B);
+      } else {
+        SIL_NumpyConversion::diag_from_buffer<SampleMatrix::MATRIX_SIZE>(
+            B_data + k * STRIDE, B);
+      }
+
+      auto result = sm.add(A, B);
+
+      SIL_NumpyConversion::dense_to_buffer<SampleMatrix::MATRIX_SIZE,
+                                           SampleMatrix::MATRIX_SIZE>(
+          result, output_data + k * STRIDE);
+    }
   }
 
+  return output;
+}
+
+// Method: add (streamed)
+SIL_CALL_STATS_METHOD(add_stream_stats, "add_stream");
+py::array_t<SampleMatrix::FLOAT> add_stream(py::handle A_in, py::handle B_in,
+                                            py::object out,
+                                            std::size_t chunk_size,
+                                            py::object callback) {
+  SIL_CALL_STATS_TIMER(add_stream_stats);
+
+  /* input and output signals */
+  SIL_StreamRunner::InputSignal<SampleMatrix::FLOAT> A_signal(
+      A_in, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE}, "A");
+  SIL_StreamRunner::InputSignal<SampleMatrix::FLOAT> B_signal(
+      B_in, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE},
+      {SampleMatrix::MATRIX_SIZE}, "B");
+  const std::size_t steps = A_signal.steps();
+  B_signal.check_steps(steps);
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  SIL_StreamRunner::OutputSignal<SampleMatrix::FLOAT> output(
+      out, steps, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE},
+      "out");
+
+  SampleMatrix::DenseMatrix_Type A;
+  SampleMatrix::DiagMatrix_Type B;
+
+  /* run the horizon in chunks, the steps without the GIL */
+  SIL_CALL_STATS_PHASE(COMPUTE);
+  SIL_StreamRunner::run_in_chunks(
+      steps, chunk_size,
+      [&](std::size_t start, std::size_t count) {
+        A_signal.load_chunk(start, count);
+        B_signal.load_chunk(start, count);
+      },
+      [&](std::size_t step) {
+        SIL_NumpyConversion::dense_from_buffer<SampleMatrix::MATRIX_SIZE,
+                                               SampleMatrix::MATRIX_SIZE>(
+            A_signal.step_data(step), A);
+        if (B_signal.is_compact()) {
+          SIL_NumpyConversion::diag_from_compact_buffer<
+              SampleMatrix::MATRIX_SIZE>(B_signal.step_data(step), B);
+        } else {
+          SIL_NumpyConversion::diag_from_buffer<SampleMatrix::MATRIX_SIZE>(
+              B_signal.step_data(step), B);
+        }
+
+        auto result = sm.add(A, B);
+
+        SIL_NumpyConversion::dense_to_buffer<SampleMatrix::MATRIX_SIZE,
+                                             SampleMatrix::MATRIX_SIZE>(
+            result, output.step_data(step));
+      },
+      output, callback, &sm_mutex);
+
+  return output.array();
+}
+
+// Method: add (class binding)
+SIL_CALL_STATS_METHOD(instance_add_stats, "SampleMatrix.add");
+py::array_t<SampleMatrix::FLOAT> instance_add(SampleMatrix_Instance &self,
+                                              py::handle A_in, py::handle B_in,
+                                              py::object out) {
+  SIL_CALL_STATS_TIMER(instance_add_stats);
+
   /* substitute */
   SampleMatrix::DenseMatrix_Type A;
   SampleMatrix::DiagMatrix_Type B;
 
-  SampleMatrix::FLOAT *A_data_ptr =
-      static_cast<SampleMatrix::FLOAT *>(A_info.ptr);
-  for (std::size_t i = 0; i < SampleMatrix::MATRIX_SIZE; i++) {
-    for (std::size_t j = 0; j < SampleMatrix::MATRIX_SIZE; j++) {
+  SIL_NumpyConversion::dense_from_numpy<SampleMatrix::FLOAT,
+                                        SampleMatrix::MATRIX_SIZE,
+                                        SampleMatrix::MATRIX_SIZE>(A_in, A,
+                                                                   "A");
+  SIL_NumpyConversion::diag_from_numpy<SampleMatrix::FLOAT,
+                                       SampleMatrix::MATRIX_SIZE>(B_in, B,
+                                                                  "B");
 
-      A(i, j) = A_data_ptr[i * SampleMatrix::MATRIX_SIZE + j];
-    }
-  }
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  py::array_t<SampleMatrix::FLOAT> output =
+      SIL_NumpyConversion::prepare_output<SampleMatrix::FLOAT,
+                                          SampleMatrix::MATRIX_SIZE,
+                                          SampleMatrix::MATRIX_SIZE>(out,
+                                                                     "out");
+  SampleMatrix::FLOAT *output_data = output.mutable_data();
+
+  /* call add method without the GIL */
+  {
+    py::gil_scoped_release release;
+    std::lock_guard<std::mutex> lock(self.mutex);
 
-  SampleMatrix::FLOAT *B_data_ptr =
-      static_cast<SampleMatrix::FLOAT *>(B_info.ptr);
-  for (std::size_t i = 0; i < SampleMatrix::MATRIX_SIZE; i++) {
-    B(i) = B_data_ptr[i * SampleMatrix::MATRIX_SIZE + i];
+    SIL_CALL_STATS_PHASE(COMPUTE);
+    auto result = self.instance.add(A, B);
+    SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+    SIL_NumpyConversion::dense_to_buffer<SampleMatrix::MATRIX_SIZE,
+                                         SampleMatrix::MATRIX_SIZE>(
+        result, output_data);
   }
 
-  /* call add method */
-  auto result = sm.add(A, B);
+  return output;
+}
 
-  /* return numpy array */
-  py::array_t<SampleMatrix::FLOAT> output;
-  output.resize({static_cast<int>(SampleMatrix::MATRIX_SIZE),
-                 static_cast<int>(SampleMatrix::MATRIX_SIZE)});
+// Method: add (class binding, batched)
+SIL_CALL_STATS_METHOD(instance_add_batch_stats, "SampleMatrix.add_batch");
+py::array_t<SampleMatrix::FLOAT>
+instance_add_batch(SampleMatrix_Instance &self, py::handle A_in,
+                   py::handle B_in, py::object out) {
+  SIL_CALL_STATS_TIMER(instance_add_batch_stats);
+
+  /* check inputs */
+  auto A_array =
+      SIL_NumpyConversion::as_c_array<SampleMatrix::FLOAT>(A_in, "A");
+  auto B_array =
+      SIL_NumpyConversion::as_c_array<SampleMatrix::FLOAT>(B_in, "B");
+
+  /* B is (N, 3) diagonals or (N, 3, 3) */
+  bool B_compact = false;
+  const std::size_t batch = SIL_NumpyConversion::check_batch_shape(
+      A_array, SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE, "A");
+  SIL_NumpyConversion::check_batch_size(
+      batch,
+      SIL_NumpyConversion::check_diag_batch_shape(
+          B_array, SampleMatrix::MATRIX_SIZE, "B", B_compact),
+      "B");
+
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  py::array_t<SampleMatrix::FLOAT> output =
+      SIL_NumpyConversion::prepare_batch_output<SampleMatrix::FLOAT,
+                                                SampleMatrix::MATRIX_SIZE,
+                                                SampleMatrix::MATRIX_SIZE>(
+          out, batch, "out");
+
+  const SampleMatrix::FLOAT *A_data = A_array.data();
+  const SampleMatrix::FLOAT *B_data = B_array.data();
+  SampleMatrix::FLOAT *output_data = output.mutable_data();
 
-  for (std::size_t i = 0; i < SampleMatrix::MATRIX_SIZE; ++i) {
-    for (std::size_t j = 0; j < SampleMatrix::MATRIX_SIZE; ++j) {
-      output.mutable_at(i, j) = result(i, j);
+  constexpr std::size_t STRIDE =
+      SampleMatrix::MATRIX_SIZE * SampleMatrix::MATRIX_SIZE;
+
+  /* loop over the batch without the GIL */
+  SIL_CALL_STATS_PHASE(COMPUTE);
+  {
+    py::gil_scoped_release release;
+    std::lock_guard<std::mutex> lock(self.mutex);
+
+    SampleMatrix::DenseMatrix_Type A;
+    SampleMatrix::DiagMatrix_Type B;
+
+    for (std::size_t k = 0; k < batch; ++k) {
+      SIL_NumpyConversion::dense_from_buffer<SampleMatrix::MATRIX_SIZE,
+                                             SampleMatrix::MATRIX_SIZE>(
+          A_data + k * STRIDE, A);
+      if (B_compact) {
+        SIL_NumpyConversion::diag_from_compact_buffer<
+            SampleMatrix::MATRIX_SIZE>(B_data + k * SampleMatrix::MATRIX_SIZE,
+                                       B);
+      } else {
+        SIL_NumpyConversion::diag_from_buffer<SampleMatrix::MATRIX_SIZE>(
+            B_data + k * STRIDE, B);
+      }
+
+      auto result = self.instance.add(A, B);
+
+      SIL_NumpyConversion::dense_to_buffer<SampleMatrix::MATRIX_SIZE,
+                                           SampleMatrix::MATRIX_SIZE>(
+          result, output_data + k * STRIDE);
     }
   }
 
   return output;
 }
 
+// Method: add (class binding, streamed)
+SIL_CALL_STATS_METHOD(instance_add_stream_stats, "SampleMatrix.add_stream");
+py::array_t<SampleMatrix::FLOAT>
+instance_add_stream(SampleMatrix_Instance &self, py::handle A_in,
+                    py::handle B_in, py::object out, std::size_t chunk_size,
+                    py::object callback) {
+  SIL_CALL_STATS_TIMER(instance_add_stream_stats);
+
+  /* input and output signals */
+  SIL_StreamRunner::InputSignal<SampleMatrix::FLOAT> A_signal(
+      A_in, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE}, "A");
+  SIL_StreamRunner::InputSignal<SampleMatrix::FLOAT> B_signal(
+      B_in, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE},
+      {SampleMatrix::MATRIX_SIZE}, "B");
+  const std::size_t steps = A_signal.steps();
+  B_signal.check_steps(steps);
+  SIL_CALL_STATS_PHASE(OUTPUT_CONVERSION);
+  SIL_StreamRunner::OutputSignal<SampleMatrix::FLOAT> output(
+      out, steps, {SampleMatrix::MATRIX_SIZE, SampleMatrix::MATRIX_SIZE},
+      "out");
+
+  SampleMatrix::DenseMatrix_Type A;
+  SampleMatrix::DiagMatrix_Type B;
+
+  /* run the horizon in chunks, the steps without the GIL and with the
+     instance mutex locked */
+  SIL_CALL_STATS_PHASE(COMPUTE);
+  SIL_StreamRunner::run_in_chunks(
+      steps, chunk_size,
+      [&](std::size_t start, std::size_t count) {
+        A_signal.load_chunk(start, count);
+        B_signal.load_chunk(start, count);
+      },
+      [&](std::size_t step) {
+        SIL_NumpyConversion::dense_from_buffer<SampleMatrix::MATRIX_SIZE,
+                                               SampleMatrix::MATRIX_SIZE>(
+            A_signal.step_data(step), A);
+        if (B_signal.is_compact()) {
+          SIL_NumpyConversion::diag_from_compact_buffer<
+              SampleMatrix::MATRIX_SIZE>(B_signal.step_data(step), B);
+        } else {
+          SIL_NumpyConversion::diag_from_buffer<SampleMatrix::MATRIX_SIZE>(
+              B_signal.step_data(step), B);
+        }
+
+        auto result = self.instance.add(A, B);
+
+        SIL_NumpyConversion::dense_to_buffer<SampleMatrix::MATRIX_SIZE,
+                                             SampleMatrix::MATRIX_SIZE>(
+            result, output.step_data(step));
+      },
+      output, callback, &self.mutex);
+
+  return output.array();
+}
+
 PYBIND11_MODULE(SampleMatrixSIL, m) {
   m.def("initialize", &initialize, "Initialize the module");
-  m.def("add", &add, "add method");
+  m.def("add", &add, "add method", py::arg("A"), py::arg("B"),
+        py::arg("out") = py::none());
+  m.def("add_batch", &add_batch, "add method over a batch of matrices",
+        py::arg("A"), py::arg("B"), py::arg("out") = py::none());
+  m.def("add_stream", &add_stream, "add method over input signals",
+        py::arg("A"), py::arg("B"), py::arg("out") = py::none(),
+        py::arg("chunk_size") = SIL_StreamRunner::DEFAULT_CHUNK_SIZE,
+        py::arg("callback") = py::none());
+
+  py::class_<SampleMatrix_Instance>(m, "SampleMatrix")
+      .def(py::init<>())
+      .def("initialize", &instance_initialize, "Initialize the instance")
+      .def("add", &instance_add, "add method", py::arg("A"), py::arg("B"),
+           py::arg("out") = py::none())
+      .def("add_batch", &instance_add_batch,
+           "add method over a batch of matrices", py::arg("A"), py::arg("B"),
+           py::arg("out") = py::none())
+      .def("add_stream", &instance_add_stream,
+           "add method over input signals", py::arg("A"), py::arg("B"),
+           py::arg("out") = py::none(),
+           py::arg("chunk_size") = SIL_StreamRunner::DEFAULT_CHUNK_SIZE,
+           py::arg("callback") = py::none());
+
+  SIL_NumpyConversion::define_stats_functions(m);
+  SIL_NumpyConversion::define_trace_functions(m);
 }
 
 } // namespace sample_matrix_SIL
@@ -17,14 +17,14 @@ from sample_matrix import SampleMatrix
 from helper.SIL.SIL_operator import SIL_Operator
 
 current_dir = os.path.dirname(__file__)
-generator = SIL_Operator("sample_matrix.py", current_dir)
-generator.build_SIL_code(build_type="Debug")
-
-import SampleMatrixSIL
-SampleMatrixSIL.initialize()
+# Built (only if the sources changed) and imported on first use
+SampleMatrixSIL = SIL_Operator.load(
+    "sample_matrix.py", current_dir, build_type="Debug")
 
 
 def main():
+    SampleMatrixSIL.initialize()
+
     # Create a 3x3 matrix
     A = np.array([[1, 2, 3],
                   [4, 5, 6],
@@ -42,6 +42,12 @@ def main():
     C_sil = SampleMatrixSIL.add(A, B)
     print("Matrix Addition, C++ SIL result:\n", C_sil)
 
+    np.testing.assert_allclose(C_sil, C)
+    print("SIL result matches NumPy result.")
+    # For all methods, latency and a baseline comparison, run
+    # "python -m helper.SIL.SIL_equivalence sample_matrix.py sample/matrix"
+    # from the workspace root.
+
 
 if __name__ == "__main__":
     main()
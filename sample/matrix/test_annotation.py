@@ -0,0 +1,184 @@
+"""
+Test script for the type-aware wrapper generation of the SIL operator.
+
+This script checks how PythonAnalyzer.parse_annotation reads Python type
+annotations, how PybindCppGenerator._resolve_annotation turns them into arg
+specs, and which method specs PybindCppGenerator.derive_method_specs derives
+from the C++ header of SampleMatrix and from annotations only.
+Nothing is built.
+"""
+import os
+import ast
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_operator import PythonAnalyzer, PybindCppGenerator
+
+ANNOTATED_PYTHON_TEXT = '''import math
+import numpy as np
+from typing import Annotated
+
+
+class AnnotatedOnly:
+    def scale(self, x: Annotated[np.ndarray, (4,)], gain: float = 2.0,
+              count: int = 3, enabled: bool = True) -> Annotated[np.ndarray, (4,)]:
+        return x * gain
+
+    def weight(self, D: Annotated[np.ndarray, "diag", (3, 3), np.float32]) -> float:
+        return float(np.trace(D))
+
+    def clip(self, x: float, upper: float = np.inf, lower: float = -math.inf,
+             fill: float = float("nan")) -> float:
+        return x
+
+    def reset(self):
+        pass
+
+    def unknown_shape(self, x: np.ndarray) -> np.ndarray:
+        return x
+
+    def _private(self, x: float) -> float:
+        return x
+'''
+
+
+def parse(annotation_text: str) -> dict:
+    return PythonAnalyzer.parse_annotation(
+        ast.parse(annotation_text, mode='eval').body)
+
+
+def test_parse_annotation():
+    assert PythonAnalyzer.parse_annotation(None) is None
+
+    assert parse("float")['type'] == "float"
+    assert parse("None")['type'] == "None"
+    assert parse("np.ndarray")['type'] == "ndarray"
+    assert parse("numpy.ndarray")['type'] == "ndarray"
+    assert parse("'np.ndarray'")['type'] == "ndarray"
+
+    annotation = parse("Annotated[np.ndarray, (3, 3)]")
+    assert annotation == {'type': "ndarray", 'kind': None,
+                          'shape': (3, 3), 'dtype': None}
+
+    annotation = parse("typing.Annotated[np.ndarray, 'diag', (3, 3), np.float32]")
+    assert annotation == {'type': "ndarray", 'kind': "diag",
+                          'shape': (3, 3), 'dtype': "float32"}
+
+    # symbolic sizes are kept as text
+    assert parse("Annotated[np.ndarray, (N, 2)]")['shape'] == ("N", 2)
+    assert parse("Annotated[np.ndarray, [5]]")['shape'] == (5,)
+    assert parse("Annotated[np.ndarray, (2, 2), 'float32']")['dtype'] == "float32"
+
+    print("parse_annotation: OK")
+
+
+def test_resolve_annotation():
+    resolve = PybindCppGenerator._resolve_annotation
+
+    assert resolve(None) is None
+    assert resolve(parse("None")) == {'kind': 'void'}
+    assert resolve(parse("float")) == {'kind': 'scalar', 'cpp_type': "double"}
+    assert resolve(parse("int")) == {'kind': 'scalar', 'cpp_type': "int"}
+
+    # arrays need a shape
+    assert resolve(parse("np.ndarray")) is None
+    # unsupported dtypes are not resolved
+    assert resolve(parse("Annotated[np.ndarray, (3, 3), np.int32]")) is None
+
+    spec = resolve(parse("Annotated[np.ndarray, (2, 3)]"))
+    assert spec == {'kind': 'dense', 'dtype': "double", 'shape': (2, 3),
+                    'cpp_type': "PythonNumpy::DenseMatrix_Type<double, 2, 3>"}
+
+    # a 1-D shape is a column vector
+    spec = resolve(parse("Annotated[np.ndarray, (4,)]"))
+    assert spec['kind'] == 'dense' and spec['shape'] == (4, 1)
+    assert spec['cpp_type'] == "PythonNumpy::DenseMatrix_Type<double, 4, 1>"
+
+    spec = resolve(parse("Annotated[np.ndarray, 'diag', (3, 3), np.float32]"))
+    assert spec == {'kind': 'diag', 'dtype': "float", 'shape': (3,),
+                    'cpp_type': "PythonNumpy::DiagMatrix_Type<float, 3>"}
+
+    print("_resolve_annotation: OK")
+
+
+def test_derive_method_specs_from_header():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    method_specs = PybindCppGenerator.derive_method_specs(
+        os.path.join(current_dir, "sample_matrix.py"))
+
+    # the types of sample_matrix.hpp are used, the Python side has no shapes
+    assert list(method_specs) == ["add"]
+    A_spec, B_spec = method_specs["add"]['args']
+    assert (A_spec['name'], A_spec['kind']) == ("A", 'dense')
+    assert A_spec['cpp_type'] == "SampleMatrix::DenseMatrix_Type"
+    assert (B_spec['name'], B_spec['kind']) == ("B", 'diag')
+    assert method_specs["add"]['returns']['kind'] == 'dense'
+
+    print("derive_method_specs (C++ header): OK")
+
+
+def test_derive_method_specs_from_annotations():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        python_file_path = os.path.join(temp_dir, "annotated_only.py")
+        with open(python_file_path, "w", encoding="utf-8") as f:
+            f.write(ANNOTATED_PYTHON_TEXT)
+
+        method_specs = PybindCppGenerator.derive_method_specs(python_file_path)
+
+    # methods with unresolved types are left to the stub, private ones are skipped
+    assert sorted(method_specs) == ["clip", "reset", "scale", "weight"]
+
+    scale_args = method_specs["scale"]['args']
+    assert [a['name'] for a in scale_args] == ["x", "gain", "count", "enabled"]
+    assert scale_args[0]['shape'] == (4, 1)
+    assert [a.get('default') for a in scale_args] == [None, "2.0", "3", "true"]
+    assert method_specs["scale"]['returns']['shape'] == (4, 1)
+
+    weight_spec = method_specs["weight"]
+    assert weight_spec['args'][0]['cpp_type'] == \
+        "PythonNumpy::DiagMatrix_Type<float, 3>"
+    assert weight_spec['returns'] == {'kind': 'scalar', 'cpp_type': "double"}
+
+    # infinite and NaN defaults are C++ expressions of the argument type
+    assert [a.get('default') for a in method_specs["clip"]['args']] == [
+        None,
+        "std::numeric_limits<double>::infinity()",
+        "-std::numeric_limits<double>::infinity()",
+        "std::numeric_limits<double>::quiet_NaN()"]
+
+    assert method_specs["reset"] == {'args': [], 'returns': {'kind': 'void'}}
+
+    print("derive_method_specs (annotations): OK")
+
+
+def test_batch_scalar_return_type():
+    method_spec = {
+        'args': [{'name': "D", 'kind': 'diag', 'dtype': "float", 'shape': (3,),
+                  'cpp_type': "PythonNumpy::DiagMatrix_Type<float, 3>"}],
+        'returns': {'kind': 'scalar', 'cpp_type': "float"},
+    }
+    code_text, _ = PybindCppGenerator.generate_batch_method_wrapper(
+        "weighted_instance", "weight", method_spec)
+
+    # the batch of scalar results has the C++ return type of the method
+    assert "py::array_t<float" in code_text
+    assert "prepare_batch_output_scalar<float>" in code_text
+    assert "double" not in code_text
+
+    print("batch wrapper scalar return type: OK")
+
+
+def main():
+    test_parse_annotation()
+    test_resolve_annotation()
+    test_derive_method_specs_from_header()
+    test_derive_method_specs_from_annotations()
+    test_batch_scalar_return_type()
+
+
+if __name__ == "__main__":
+    main()
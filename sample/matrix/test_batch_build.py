@@ -0,0 +1,85 @@
+"""
+Test script for the batch build of SIL modules.
+
+This script checks how SIL_batch_build groups the target Python files by their
+SIL folder and splits the CPU budget between the folders, and that a worker
+build that fails writes its output to the module log and restores stdout and
+stderr afterwards. Nothing is built.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_batch_build import (
+    _build_one_module, group_by_SIL_folder, split_cpu_budget)
+
+
+def test_group_by_SIL_folder():
+    python_file_paths = [
+        "/ws/sample/matrix/sample_matrix.py",
+        "/ws/sample/motor/motor.py",
+        "/ws/sample/matrix/other_matrix.py",
+        "/ws/sample/vector/vector.py",
+        "/ws/sample/motor/motor_controller.py",
+    ]
+
+    # in the order of the first module of each folder
+    assert group_by_SIL_folder(python_file_paths) == [[0, 2], [1, 4], [3]]
+    assert group_by_SIL_folder([]) == []
+
+    print("group by SIL folder: OK")
+
+
+def test_split_cpu_budget():
+    assert split_cpu_budget(3, 8) == (3, 2)
+    assert split_cpu_budget(1, 8) == (1, 8)
+    # more folders than cores
+    assert split_cpu_budget(10, 4) == (4, 1)
+    assert split_cpu_budget(10, 8, max_parallel_modules=2) == (2, 4)
+    assert split_cpu_budget(2, 0) == (1, 1)
+
+    print("split CPU budget: OK")
+
+
+def test_failed_build_restores_output():
+    stdout_stat = os.fstat(1)
+    stderr_stat = os.fstat(2)
+    current_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as root_path:
+        log_path = os.path.join(root_path, "missing_func.log")
+        try:
+            result = _build_one_module(
+                os.path.join(root_path, "missing_func.py"), root_path,
+                log_path, {"use_daemon": False})
+        finally:
+            os.chdir(current_dir)
+
+        assert result["status"] == "failed"
+        assert result["module_name"] == "MissingFuncSIL"
+        assert result["error"].startswith("FileNotFoundError")
+
+        # the traceback went to the log, not to the terminal
+        with open(log_path, encoding="utf-8") as f:
+            assert "FileNotFoundError" in f.read()
+
+    for fd, stat in [(1, stdout_stat), (2, stderr_stat)]:
+        restored_stat = os.fstat(fd)
+        assert (restored_stat.st_dev, restored_stat.st_ino) == \
+            (stat.st_dev, stat.st_ino), fd
+
+    print("failed build restores stdout and stderr: OK")
+
+
+def main():
+    test_group_by_SIL_folder()
+    test_split_cpu_budget()
+    test_failed_build_restores_output()
+
+
+if __name__ == "__main__":
+    main()
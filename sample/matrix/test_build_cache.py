@@ -0,0 +1,123 @@
+"""
+Test script for the content-addressed SIL build cache.
+
+This script checks that the key of SIL_BuildCache.compute_key is the same for
+two checkouts of the same sources in different folders, and changes with the
+source contents, the compile definitions, the build type and the module name.
+It also stores and restores a module file in a temporary cache folder.
+Nothing is built.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_build_cache import SIL_BuildCache
+
+SOURCE_FILES = {
+    "sample/my_func/my_func.hpp": "double twice(double x);\n",
+    "sample/my_func/my_func.cpp": "double twice(double x) { return 2.0 * x; }\n",
+    "sample/my_func/my_func_SIL.cpp": '#include "my_func.hpp"\n',
+}
+
+
+class CmakeGeneratorStandIn:
+    """
+    The attributes of a CmakeGenerator that compute_key reads, after
+    generate_cmake_lists_txt() was called.
+    """
+
+    def __init__(self, root_path: str, compile_definitions: list = None,
+                 module_name: str = "MyFuncSIL"):
+        self.root_path = root_path
+        self.pybind11_module_name = module_name
+        self.compile_definitions = list(compile_definitions or [])
+        self.cmake_lists_txt = \
+            f"include_directories({root_path}/sample/my_func)\n"
+
+    def get_dependency_files(self) -> list:
+        return [os.path.join(self.root_path, p) for p in SOURCE_FILES]
+
+
+def write_checkout(root_path: str) -> None:
+    for relative_path, text in SOURCE_FILES.items():
+        file_path = os.path.join(root_path, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def test_compute_key():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        first_root = os.path.join(temp_dir, "first_checkout")
+        second_root = os.path.join(temp_dir, "second_checkout")
+        write_checkout(first_root)
+        write_checkout(second_root)
+
+        check_compute_key(first_root, second_root)
+
+    print("compute_key: OK")
+
+
+def check_compute_key(first_root: str, second_root: str) -> None:
+    key = SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(first_root), "Release")
+
+    # paths are hashed relative to the workspace root
+    assert SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(second_root), "Release") == key
+
+    assert SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(first_root), "Debug") != key
+    assert SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(first_root, ["USE_FLOAT"]), "Release") != key
+    assert SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(first_root, module_name="OtherSIL"), "Release") != key
+
+    with open(os.path.join(second_root, "sample/my_func/my_func.hpp"), "a",
+              encoding="utf-8") as f:
+        f.write("double half(double x);\n")
+    assert SIL_BuildCache.compute_key(
+        CmakeGeneratorStandIn(second_root), "Release") != key
+
+
+def test_store_and_restore():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        check_store_and_restore(temp_dir)
+
+    print("store and restore: OK")
+
+
+def check_store_and_restore(temp_dir: str) -> None:
+    cache = SIL_BuildCache(cache_dir=os.path.join(temp_dir, "cache"))
+    key = "ab" * 32
+
+    destination_dir = os.path.join(temp_dir, "destination")
+    os.makedirs(destination_dir)
+    assert cache.restore(key, destination_dir) == ""
+
+    module_path = os.path.join(temp_dir, "MyFuncSIL.so")
+    with open(module_path, "wb") as f:
+        f.write(b"module")
+    cache.store(key, module_path, "MyFuncSIL")
+
+    restored_path = cache.restore(key, destination_dir)
+    assert restored_path == os.path.join(destination_dir, "MyFuncSIL.so")
+    with open(restored_path, "rb") as f:
+        assert f.read() == b"module"
+
+    entries = cache.list_entries()
+    assert [e["key"] for e in entries] == [key]
+    assert entries[0]["hit_count"] == 1
+
+
+def main():
+    test_compute_key()
+    test_store_and_restore()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Test script for the build state check of the lazy SIL module loader.
+
+This script writes a SIL folder with a placeholder module file and the build
+state that an incremental build records, and checks when
+is_build_state_current accepts it: only for the recorded build options, and
+only while the recorded files and the installed module are unchanged.
+Nothing is built or imported.
+"""
+import os
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_loader import (
+    BUILD_FOLDER_NAME, BUILD_STATE_FILE_NAME,
+    collect_file_stamps, compute_build_options_key,
+    is_build_state_current, load_SIL_module)
+
+PYTHON_FILE_NAME = "my_func.py"
+MODULE_FILE_NAME = "MyFuncSIL"
+
+
+def write_file(file_path: str, text: str) -> None:
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_SIL_folder(SIL_folder: str, build_options: dict) -> None:
+    """
+    Write the sources, a placeholder module and the build state of an
+    incremental build with build_options.
+    """
+    write_file(os.path.join(SIL_folder, PYTHON_FILE_NAME), "class MyFunc:\n    pass\n")
+    write_file(os.path.join(SIL_folder, "my_func.hpp"), "class MyFunc {};\n")
+    write_file(os.path.join(SIL_folder, "CMakeLists.txt"), "project(MyFuncSIL)\n")
+    module_path = os.path.join(SIL_folder, MODULE_FILE_NAME + ".cpython-test.so")
+    write_file(module_path, "module")
+
+    dependency_files = [
+        os.path.join(SIL_folder, "my_func.hpp"),
+        os.path.join(SIL_folder, "CMakeLists.txt"),
+        SIL_folder,
+    ]
+
+    build_folder = os.path.join(
+        SIL_folder, BUILD_FOLDER_NAME, build_options["build_type"])
+    os.makedirs(build_folder)
+    write_file(os.path.join(build_folder, BUILD_STATE_FILE_NAME), json.dumps({
+        "module_file_name": MODULE_FILE_NAME,
+        "python_file_name": PYTHON_FILE_NAME,
+        "build_type": build_options["build_type"],
+        "build_options_key": compute_build_options_key(build_options),
+        "file_stamps": collect_file_stamps(dependency_files),
+        "module_stamp": collect_file_stamps([module_path])[module_path],
+    }))
+
+
+def touch_later(file_path: str) -> None:
+    st = os.stat(file_path)
+    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def main():
+    build_options = {"build_type": "Release"}
+
+    with tempfile.TemporaryDirectory() as SIL_folder:
+        write_SIL_folder(SIL_folder, build_options)
+
+        assert is_build_state_current(SIL_folder, PYTHON_FILE_NAME, build_options)
+        # options that are not given take the defaults of build_SIL_code
+        assert is_build_state_current(
+            SIL_folder, PYTHON_FILE_NAME, dict(build_options, linker=None))
+        assert is_build_state_current(
+            SIL_folder, PYTHON_FILE_NAME,
+            dict(build_options, compile_definitions=[]))
+        print("build state is current: OK")
+
+        assert not is_build_state_current(
+            SIL_folder, "other_func.py", build_options)
+        assert not is_build_state_current(
+            SIL_folder, PYTHON_FILE_NAME, {"build_type": "Debug"})
+        assert not is_build_state_current(
+            SIL_folder, PYTHON_FILE_NAME,
+            dict(build_options, compile_definitions=["USE_FLOAT"]))
+        print("other file or build options: OK")
+
+        module_path = os.path.join(
+            SIL_folder, MODULE_FILE_NAME + ".cpython-test.so")
+        touch_later(module_path)
+        assert not is_build_state_current(SIL_folder, PYTHON_FILE_NAME, build_options)
+        print("other installed module: OK")
+
+    with tempfile.TemporaryDirectory() as SIL_folder:
+        write_SIL_folder(SIL_folder, build_options)
+
+        touch_later(os.path.join(SIL_folder, "my_func.hpp"))
+        assert not is_build_state_current(SIL_folder, PYTHON_FILE_NAME, build_options)
+        print("changed dependency file: OK")
+
+        # the lazy proxy neither builds nor imports before the first attribute access
+        module = load_SIL_module(PYTHON_FILE_NAME, SIL_folder, **build_options)
+        assert "(not loaded)" in repr(module)
+        print("lazy module is not loaded: OK")
+
+
+if __name__ == "__main__":
+    main()
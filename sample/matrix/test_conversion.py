@@ -0,0 +1,107 @@
+"""
+Test script for the NumPy argument and result conversion of SIL modules.
+
+This script builds SampleMatrixSIL with call statistics (SIL_CALL_STATS) and
+checks with the counters of get_stats() that a float64 C-contiguous argument
+is used in place, that other dtypes and memory layouts are copied exactly once,
+and that a caller supplied "out" array receives the result without a new
+allocation. Arguments and "out" arrays of the wrong shape, dtype or layout
+must raise an error.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+current_dir = os.path.dirname(__file__)
+SampleMatrixSIL = SIL_Operator.load(
+    "sample_matrix.py", current_dir, build_type="Release",
+    compile_definitions=["SIL_CALL_STATS"])
+
+A = np.array([[1.0, 2.0, 3.0],
+              [4.0, 5.0, 6.0],
+              [7.0, 8.0, 9.0]])
+B = np.array([1.0, 2.0, 3.0])
+EXPECTED = A + np.diag(B)
+
+
+def add_counters(*args, **kwargs) -> tuple:
+    """
+    Call SampleMatrixSIL.add once and return its result with the number of
+    input copies and output allocations of that call.
+    """
+    SampleMatrixSIL.reset_stats()
+    result = SampleMatrixSIL.add(*args, **kwargs)
+    stats = SampleMatrixSIL.get_stats()["add"]
+    assert stats["calls"] == 1
+
+    return result, stats["input_copies"], stats["output_allocations"]
+
+
+def assert_raises(function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+    except RuntimeError as e:
+        return str(e)
+    raise AssertionError(f"{function.__name__} did not raise.")
+
+
+def test_inputs():
+    SampleMatrixSIL.initialize()
+
+    C, copies, allocations = add_counters(A, B)
+    np.testing.assert_allclose(C, EXPECTED)
+    assert (copies, allocations) == (0, 1)
+
+    # dense and compact diagonal
+    C, copies, _ = add_counters(A, np.diag(B))
+    np.testing.assert_allclose(C, EXPECTED)
+    assert copies == 0
+
+    for name, A_other in [("Fortran order", np.asfortranarray(A)),
+                          ("strided view", np.repeat(A, 2, axis=1)[:, ::2]),
+                          ("int64", A.astype(np.int64)),
+                          ("float32", A.astype(np.float32))]:
+        C, copies, _ = add_counters(A_other, B)
+        np.testing.assert_allclose(C, A_other + np.diag(B), rtol=1e-6)
+        assert copies == 1, name
+
+    assert_raises(SampleMatrixSIL.add, A[:2], B)
+    assert_raises(SampleMatrixSIL.add, A, B[:2])
+    assert_raises(SampleMatrixSIL.add, A.ravel(), B)
+
+    print("input conversion: OK")
+
+
+def test_output():
+    SampleMatrixSIL.initialize()
+
+    out = np.empty((3, 3))
+    C, _, allocations = add_counters(A, B, out=out)
+    np.testing.assert_allclose(out, EXPECTED)
+    assert np.shares_memory(C, out)
+    assert allocations == 0
+
+    assert_raises(SampleMatrixSIL.add, A, B, out=np.empty((3, 3), dtype=np.float32))
+    assert_raises(SampleMatrixSIL.add, A, B, out=np.empty((3, 4)))
+    assert_raises(SampleMatrixSIL.add, A, B, out=np.empty((3, 3), order="F"))
+    read_only = np.empty((3, 3))
+    read_only.flags.writeable = False
+    assert_raises(SampleMatrixSIL.add, A, B, out=read_only)
+
+    print("output conversion: OK")
+
+
+def main():
+    test_inputs()
+    test_output()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Test script for the dependency-scoped source list of the SIL operator.
+
+This script writes a small workspace of C++ files to a temporary folder and
+checks which sources and include directories SIL_IncludeGraph.scope_sources
+selects for a SIL C++ file, also after an include is added.
+Nothing is built.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_include_graph import SIL_IncludeGraph
+
+WORKSPACE_FILES = {
+    "app/app_SIL.cpp": '#include <vector>\n#include "app.hpp"\n',
+    "app/app.hpp": '#include "lib_b.hpp"\n',
+    "app/app.cpp": '#include "app.hpp"\n',
+    "lib/lib_b.hpp": "",
+    "lib/lib_b.cpp": '#include "lib_b.hpp"\n#include <lib_c.hpp>\n',
+    "lib/lib_c.hpp": "",
+    "lib/lib_c.cpp": '#include "lib_c.hpp"\n',
+    "unused/unused.hpp": "",
+    "unused/unused.cpp": '#include "unused.hpp"\n',
+}
+
+
+def write_workspace(root_path: str) -> None:
+    for relative_path, text in WORKSPACE_FILES.items():
+        file_path = os.path.join(root_path, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def scope(root_path: str) -> tuple:
+    """
+    Return the scoped sources and include dirs, relative to root_path.
+    """
+    source_file_list = [os.path.join(root_path, p) for p in WORKSPACE_FILES
+                        if p.endswith(".cpp") and not p.endswith("_SIL.cpp")]
+    include_dirs = [os.path.join(root_path, d)
+                    for d in ("app", "lib", "unused")]
+
+    graph = SIL_IncludeGraph(
+        root_path, cache_file_path=os.path.join(root_path, "build", "graph.json"))
+    source_files, used_include_dirs = graph.scope_sources(
+        os.path.join(root_path, "app", "app_SIL.cpp"),
+        source_file_list, include_dirs)
+
+    return ([os.path.relpath(p, root_path).replace(os.sep, "/") for p in source_files],
+            [os.path.relpath(d, root_path) for d in used_include_dirs])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root_path:
+        write_workspace(root_path)
+
+        # lib_c.cpp is selected through the includes of the selected lib_b.cpp
+        source_files, include_dirs = scope(root_path)
+        assert source_files == ["app/app.cpp", "lib/lib_b.cpp", "lib/lib_c.cpp"]
+        assert include_dirs == ["app", "lib"]
+        print("scope_sources:", source_files, include_dirs)
+
+        # the cached includes of a changed file are parsed again
+        with open(os.path.join(root_path, "app", "app.hpp"), "a",
+                  encoding="utf-8") as f:
+            f.write('#include "unused.hpp"\n')
+
+        source_files, include_dirs = scope(root_path)
+        assert source_files == ["app/app.cpp", "lib/lib_b.cpp", "lib/lib_c.cpp",
+                                "unused/unused.cpp"]
+        assert include_dirs == ["app", "lib", "unused"]
+        print("scope_sources after a new include:", source_files, include_dirs)
+
+
+if __name__ == "__main__":
+    main()
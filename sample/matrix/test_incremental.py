@@ -0,0 +1,208 @@
+"""
+Test script for the incremental build of SIL modules.
+
+This script generates a small header-only C++ class, builds its SIL module
+with incremental=True and checks when the build is skipped and when the module
+is installed into the SIL folder:
+  - an unchanged build is skipped and keeps the installed module
+  - a change of the sources rebuilds the module
+  - switching the build type installs the module of that build type, without
+    a rebuild if it is up to date
+  - a deleted installed module is installed again without a rebuild
+After every build the lazy loader must accept the build state of that build
+type. The built module is called in a subprocess, as a module cannot be
+imported again in the same process after a rebuild.
+The generated files are written to "sample/incremental_test" and removed at
+exit, unless --keep is given.
+"""
+import os
+import sys
+import atexit
+import shutil
+import filecmp
+import argparse
+import functools
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from helper.SIL.SIL_operator import SIL_Operator
+from helper.SIL.SIL_loader import is_build_state_current
+
+TEST_FOLDER_NAME = "incremental_test"
+PYTHON_FILE_NAME = "incremental_scale.py"
+
+PYTHON_TEXT = '''class IncrementalScale:
+    def scale(self, x: float) -> float:
+        return 2.0 * x
+'''
+
+keep_folder = False
+
+
+def header_text(factor: float) -> str:
+    text = ""
+    text += "#ifndef INCREMENTAL_SCALE_HPP_\n"
+    text += "#define INCREMENTAL_SCALE_HPP_\n\n"
+    text += "class IncrementalScale {\n"
+    text += "public:\n"
+    text += f"  double scale(double x) {{ return {factor!r} * x; }}\n"
+    text += "};\n\n"
+    text += "#endif // INCREMENTAL_SCALE_HPP_\n"
+
+    return text
+
+
+@functools.lru_cache(maxsize=None)
+def prepare_folder() -> str:
+    """
+    Write the IncrementalScale sources once per process and return the
+    SIL folder.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    folder = os.path.join(os.path.dirname(current_dir), TEST_FOLDER_NAME)
+    os.makedirs(folder, exist_ok=True)
+    atexit.register(
+        lambda: keep_folder or shutil.rmtree(folder, ignore_errors=True))
+
+    write_header(folder, 2.0)
+    with open(os.path.join(folder, PYTHON_FILE_NAME), "w",
+              encoding="utf-8") as f:
+        f.write(PYTHON_TEXT)
+
+    return folder
+
+
+def write_header(folder: str, factor: float) -> None:
+    with open(os.path.join(folder, "incremental_scale.hpp"), "w",
+              encoding="utf-8") as f:
+        f.write(header_text(factor))
+
+
+def build(folder: str, build_type: str) -> SIL_Operator:
+    """
+    Run an incremental build as the lazy loader does, and check that the
+    loader accepts its build state afterwards.
+    """
+    operator = SIL_Operator(PYTHON_FILE_NAME, folder)
+    operator.build_SIL_code(
+        build_type=build_type, incremental=True, use_daemon=False)
+
+    assert operator.find_built_module_path() != ""
+    assert is_build_state_current(
+        folder, PYTHON_FILE_NAME, {"build_type": build_type})
+
+    return operator
+
+
+def built_module_path(folder: str, build_type: str) -> str:
+    module_path = SIL_Operator(PYTHON_FILE_NAME, folder).find_built_module_path()
+    return os.path.join(folder, "build", build_type,
+                        os.path.basename(module_path))
+
+
+def call_scale(folder: str, x: float) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c",
+         f"import sys; sys.path.insert(0, {folder!r}); "
+         f"import IncrementalScaleSIL; print(IncrementalScaleSIL.scale({x!r}))"],
+        capture_output=True, text=True, check=True)
+
+    return float(result.stdout.strip())
+
+
+def test_unchanged_build_is_skipped():
+    folder = prepare_folder()
+    build(folder, "Release")
+
+    operator = build(folder, "Release")
+    module_stamp = os.stat(operator.find_built_module_path()).st_mtime_ns
+    assert operator.build_summary["skipped"]
+
+    operator = build(folder, "Release")
+    assert operator.build_summary["skipped"]
+    # not installed again
+    assert os.stat(operator.find_built_module_path()).st_mtime_ns == module_stamp
+
+    print("unchanged build is skipped: OK")
+
+
+def test_source_change_rebuilds():
+    folder = prepare_folder()
+    build(folder, "Release")
+
+    write_header(folder, 3.0)
+    try:
+        operator = build(folder, "Release")
+        assert not operator.build_summary["skipped"]
+        assert call_scale(folder, 2.0) == 6.0
+    finally:
+        write_header(folder, 2.0)
+
+    operator = build(folder, "Release")
+    assert not operator.build_summary["skipped"]
+    assert call_scale(folder, 2.0) == 4.0
+
+    print("source change rebuilds: OK")
+
+
+def test_build_type_switch_installs():
+    folder = prepare_folder()
+    build(folder, "Release")
+    build(folder, "Debug")
+    assert not is_build_state_current(
+        folder, PYTHON_FILE_NAME, {"build_type": "Release"})
+
+    operator = build(folder, "Release")
+    assert operator.build_summary["skipped"]
+    assert filecmp.cmp(operator.find_built_module_path(),
+                       built_module_path(folder, "Release"), shallow=False)
+    assert not is_build_state_current(
+        folder, PYTHON_FILE_NAME, {"build_type": "Debug"})
+
+    operator = build(folder, "Debug")
+    assert operator.build_summary["skipped"]
+    assert filecmp.cmp(operator.find_built_module_path(),
+                       built_module_path(folder, "Debug"), shallow=False)
+    assert call_scale(folder, 2.0) == 4.0
+
+    print("build type switch installs: OK")
+
+
+def test_deleted_module_is_installed():
+    folder = prepare_folder()
+    operator = build(folder, "Release")
+
+    os.remove(operator.find_built_module_path())
+    assert not is_build_state_current(
+        folder, PYTHON_FILE_NAME, {"build_type": "Release"})
+
+    operator = build(folder, "Release")
+    assert operator.build_summary["skipped"]
+    assert call_scale(folder, 2.0) == 4.0
+
+    print("deleted module is installed: OK")
+
+
+def main(argv=None):
+    global keep_folder
+
+    parser = argparse.ArgumentParser(
+        description="Test the incremental build of SIL modules.")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated test module")
+    args = parser.parse_args(argv)
+    keep_folder = args.keep
+
+    test_unchanged_build_is_skipped()
+    test_source_change_rebuilds()
+    test_build_type_switch_installs()
+    test_deleted_module_is_installed()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
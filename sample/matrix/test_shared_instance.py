@@ -0,0 +1,239 @@
+"""
+Test script for concurrent calls on SIL instances.
+
+This script generates a small header-only C++ class with a running total as
+its state. Its accumulate method reads the total, yields the thread and then
+writes the new total, so that two unserialized calls lose an update. The SIL
+module is built, and several Python threads call accumulate,
+accumulate_batch and accumulate_stream at the same time on the shared module
+level instance, and on instances of the class binding.
+The final total must count every value exactly once. Calls on independent
+instances of the class binding must not wait for each other.
+The generated files are written to "sample/shared_instance_test" and removed
+at exit, unless --keep is given.
+"""
+import os
+import sys
+import atexit
+import shutil
+import argparse
+import functools
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+TEST_FOLDER_NAME = "shared_instance_test"
+THREAD_COUNT = 4
+BATCH_SIZE = 2000
+CALL_COUNT = 200
+STEP_COUNT = 2000
+CHUNK_SIZE = 256
+LONG_BATCH_SIZE = 5_000_000
+
+HEADER_TEXT = '''#ifndef RUNNING_TOTAL_HPP_
+#define RUNNING_TOTAL_HPP_
+
+#include <thread>
+
+#include "python_numpy.hpp"
+
+class RunningTotal {
+public:
+  using FLOAT = double;
+  using Value_Type = PythonNumpy::DenseMatrix_Type<FLOAT, 1, 1>;
+
+public:
+  /* read, yield and write, so that unserialized calls lose updates */
+  FLOAT accumulate(const Value_Type &x) {
+    const FLOAT total = this->_total;
+    std::this_thread::yield();
+    this->_total = total + x(0, 0);
+    return this->_total;
+  }
+
+private:
+  FLOAT _total = static_cast<FLOAT>(0);
+};
+
+#endif // RUNNING_TOTAL_HPP_
+'''
+
+PYTHON_TEXT = '''import numpy as np
+
+
+class RunningTotal:
+    def __init__(self):
+        self._total = 0.0
+
+    def accumulate(self, x: np.ndarray) -> float:
+        self._total += float(np.ravel(x)[0])
+        return self._total
+'''
+
+keep_folder = False
+
+
+@functools.lru_cache(maxsize=None)
+def load_module():
+    """
+    Generate and build the RunningTotal SIL module once per process.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    folder = os.path.join(os.path.dirname(current_dir), TEST_FOLDER_NAME)
+    os.makedirs(folder, exist_ok=True)
+    atexit.register(
+        lambda: keep_folder or shutil.rmtree(folder, ignore_errors=True))
+
+    with open(os.path.join(folder, "running_total.hpp"), "w",
+              encoding="utf-8") as f:
+        f.write(HEADER_TEXT)
+    with open(os.path.join(folder, "running_total.py"), "w",
+              encoding="utf-8") as f:
+        f.write(PYTHON_TEXT)
+
+    module = SIL_Operator.load(
+        "running_total.py", folder, build_type="Release", lazy=False)
+    return module
+
+
+def run_threads(targets: list) -> None:
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def test_concurrent_batch_calls():
+    module = load_module()
+    module.initialize()
+
+    ones = np.ones((BATCH_SIZE, 1))
+    targets = [functools.partial(module.accumulate_batch, ones)
+               for _ in range(THREAD_COUNT)]
+    # single calls hold the GIL, but run on the same instance
+    targets.append(lambda: [module.accumulate(np.ones(1))
+                            for _ in range(CALL_COUNT)])
+    run_threads(targets)
+
+    total = module.accumulate(np.zeros(1))
+    expected = THREAD_COUNT * BATCH_SIZE + CALL_COUNT
+    assert total == expected, f"total {total}, expected {expected}"
+
+    print("concurrent batch and single calls: OK")
+
+
+def test_concurrent_stream_calls():
+    module = load_module()
+    module.initialize()
+
+    ones = np.ones((STEP_COUNT, 1))
+    targets = [functools.partial(module.accumulate_stream, ones,
+                                 chunk_size=CHUNK_SIZE)
+               for _ in range(THREAD_COUNT)]
+    targets.append(functools.partial(module.accumulate_batch, ones))
+    run_threads(targets)
+
+    total = module.accumulate(np.zeros(1))
+    expected = (THREAD_COUNT + 1) * STEP_COUNT
+    assert total == expected, f"total {total}, expected {expected}"
+
+    # a single stream steps the instance in order
+    module.initialize()
+    np.testing.assert_array_equal(
+        module.accumulate_stream(ones, chunk_size=CHUNK_SIZE).ravel(),
+        np.arange(1, STEP_COUNT + 1))
+
+    print("concurrent stream and batch calls: OK")
+
+
+def test_independent_class_instances():
+    module = load_module()
+    module.initialize()
+
+    instances = [module.RunningTotal() for _ in range(THREAD_COUNT)]
+    ones = np.ones((BATCH_SIZE, 1))
+    targets = [functools.partial(instance.accumulate_batch, ones * (i + 1))
+               for i, instance in enumerate(instances)]
+    run_threads(targets)
+
+    for i, instance in enumerate(instances):
+        total = instance.accumulate(np.zeros(1))
+        expected = (i + 1) * BATCH_SIZE
+        assert total == expected, f"instance {i}: total {total}, expected {expected}"
+    # the shared module level instance is another instance
+    assert module.accumulate(np.zeros(1)) == 0.0
+
+    # a call on one instance does not wait for a long call on another one
+    long_call = threading.Thread(
+        target=instances[0].accumulate_batch,
+        args=(np.ones((LONG_BATCH_SIZE, 1)),))
+    long_call.start()
+    time.sleep(0.05)
+    instances[1].accumulate_batch(ones)
+    assert long_call.is_alive(), \
+        "the call on another instance waited for the long call"
+    long_call.join()
+
+    print("concurrent calls on independent instances: OK")
+
+
+def test_shared_class_instance():
+    module = load_module()
+
+    instance = module.RunningTotal()
+    ones = np.ones((STEP_COUNT, 1))
+    targets = [functools.partial(instance.accumulate_batch, ones)
+               for _ in range(THREAD_COUNT)]
+    targets += [functools.partial(instance.accumulate_stream, ones,
+                                  chunk_size=CHUNK_SIZE)
+                for _ in range(THREAD_COUNT)]
+    targets.append(lambda: [instance.accumulate(np.ones(1))
+                            for _ in range(CALL_COUNT)])
+    run_threads(targets)
+
+    total = instance.accumulate(np.zeros(1))
+    expected = 2 * THREAD_COUNT * STEP_COUNT + CALL_COUNT
+    assert total == expected, f"total {total}, expected {expected}"
+
+    print("concurrent calls on one class instance: OK")
+
+
+def main(argv=None):
+    global keep_folder
+
+    parser = argparse.ArgumentParser(
+        description="Test concurrent calls on the shared SIL instance.")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated test module")
+    args = parser.parse_args(argv)
+    keep_folder = args.keep
+
+    test_concurrent_batch_calls()
+    test_concurrent_stream_calls()
+    test_independent_class_instances()
+    test_shared_class_instance()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Test script for the runtime shape dispatch of specialized SIL modules.
+
+This script builds SampleMatrixSIL with the specializations MATRIX_SIZE 3
+(FLOAT double and float) and MATRIX_SIZE 5 (FLOAT double), and checks that
+SampleMatrixSIL.add and add_batch call the specialization that matches the
+argument shapes, preferring the one whose dtype matches without a conversion.
+Arguments that match no specialization must raise an error.
+Under pytest, the script runs in its own process, as the other scripts of this
+folder import other builds of SampleMatrixSIL under the same module name.
+"""
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+SPECIALIZATIONS = [
+    {"MATRIX_SIZE": 3, "FLOAT": "double"},
+    {"MATRIX_SIZE": 3, "FLOAT": "float"},
+    {"MATRIX_SIZE": 5, "FLOAT": "double"},
+]
+
+current_dir = os.path.dirname(__file__)
+SampleMatrixSIL = SIL_Operator.load(
+    "sample_matrix.py", current_dir, build_type="Release",
+    specializations=SPECIALIZATIONS)
+
+
+def check_dispatch(rng):
+    for size, dtype in [(3, np.float64), (3, np.float32), (5, np.float64)]:
+        A = rng.standard_normal((size, size)).astype(dtype)
+        B = rng.standard_normal(size).astype(dtype)
+
+        C = SampleMatrixSIL.add(A, B)
+        assert C.dtype == dtype, (size, dtype, C.dtype)
+        np.testing.assert_allclose(C, A + np.diag(B), rtol=1e-6)
+
+        A_batch = rng.standard_normal((4, size, size)).astype(dtype)
+        B_batch = rng.standard_normal((4, size)).astype(dtype)
+        C_batch = SampleMatrixSIL.add_batch(A_batch, B_batch)
+        np.testing.assert_allclose(
+            C_batch, A_batch + B_batch[:, :, np.newaxis] * np.eye(size), rtol=1e-6)
+
+    # without an exact dtype match, the first specialization of the size converts
+    C = SampleMatrixSIL.add(np.ones((3, 3), dtype=np.int64), np.ones(3))
+    assert C.dtype == np.float64
+    np.testing.assert_allclose(C, np.ones((3, 3)) + np.eye(3))
+
+    print("dispatch: OK")
+
+
+def check_direct_call(rng):
+    A = rng.standard_normal((5, 5))
+    B = rng.standard_normal(5)
+    np.testing.assert_allclose(
+        SampleMatrixSIL.MATRIX_SIZE_5_FLOAT_double.add(A, B), A + np.diag(B))
+
+    try:
+        SampleMatrixSIL.MATRIX_SIZE_3_FLOAT_double.add(A, B)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("MATRIX_SIZE_3_FLOAT_double.add accepted 5 x 5 arguments.")
+
+    print("direct call: OK")
+
+
+def check_no_match():
+    for A, B in [(np.zeros((4, 4)), np.zeros(4)),
+                 (np.zeros((3, 3)), np.zeros(5))]:
+        try:
+            SampleMatrixSIL.add(A, B)
+        except RuntimeError as e:
+            assert "no specialization matches" in str(e)
+            print(f"  {A.shape}, {B.shape}: {e}")
+        else:
+            raise AssertionError(f"add accepted {A.shape} and {B.shape}.")
+
+    print("no matching specialization: OK")
+
+
+def main():
+    SampleMatrixSIL.initialize()
+    rng = np.random.default_rng(0)
+
+    check_dispatch(rng)
+    check_direct_call(rng)
+    check_no_match()
+
+
+def test_specializations():
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)])
+    assert result.returncode == 0
+
+
+if __name__ == "__main__":
+    main()
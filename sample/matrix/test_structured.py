@@ -0,0 +1,258 @@
+"""
+Test script for the structure-aware transfer of diagonal and sparse matrices.
+
+This script generates a small header-only C++ class with methods that take a
+PythonNumpy::DiagMatrix_Type or a tridiagonal PythonNumpy::SparseMatrix_Type of
+size 4, builds its SIL module, and compares the results of all accepted forms
+of the arguments with NumPy:
+  - diagonal: dense (M, M) array and compact diagonal (M,)
+  - sparse:   dense (M, M) array, values in pattern order (NNZ,),
+              (data, indices, indptr) CSR tuple and scipy.sparse CSR matrix
+              (if scipy is installed)
+Malformed CSR tuples and arguments with nonzeros outside the sparsity pattern
+must raise an error.
+The generated files are written to "sample/structured_test" and removed at
+exit, unless --keep is given.
+"""
+import os
+import sys
+import atexit
+import shutil
+import argparse
+import functools
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+
+from helper.SIL.SIL_operator import SIL_Operator
+
+MATRIX_SIZE = 4
+TEST_FOLDER_NAME = "structured_test"
+SEED = 0
+
+PYTHON_TEXT = '''import numpy as np
+
+
+class StructuredTest:
+    def diag_weighted(self, D: np.ndarray) -> float:
+        return float(np.diag(D) @ np.arange(1, D.shape[0] + 1))
+
+    def sparse_weighted(self, S: np.ndarray) -> float:
+        return float(S[S != 0] @ np.arange(1, np.count_nonzero(S) + 1))
+'''
+
+
+def tridiagonal_pattern(size: int) -> list:
+    """
+    Return the column indices of the available elements of each row of a
+    tridiagonal matrix.
+    """
+    return [[j for j in (i - 1, i, i + 1) if 0 <= j < size]
+            for i in range(size)]
+
+
+def generate_header(size: int) -> str:
+    pattern = tridiagonal_pattern(size)
+    nnz = sum(len(row) for row in pattern)
+    rows = ",\n      ".join(
+        "PythonNumpy::ColumnAvailable<" +
+        ", ".join("true" if j in row else "false" for j in range(size)) + ">"
+        for row in pattern)
+
+    header_text = ""
+    header_text += "#ifndef STRUCTURED_TEST_HPP_\n"
+    header_text += "#define STRUCTURED_TEST_HPP_\n\n"
+    header_text += "#include \"python_numpy.hpp\"\n\n"
+    header_text += "class StructuredTest {\n"
+    header_text += "public:\n"
+    header_text += "  using FLOAT = double;\n\n"
+    header_text += f"  static constexpr std::size_t SIZE = {size};\n"
+    header_text += f"  static constexpr std::size_t NNZ = {nnz};\n"
+    header_text += "  using Diag_Type = PythonNumpy::DiagMatrix_Type<FLOAT, SIZE>;\n"
+    header_text += f"  using SparseAvailable_Type = PythonNumpy::SparseAvailable<\n      {rows}>;\n"
+    header_text += "  using Sparse_Type =\n"
+    header_text += "      PythonNumpy::SparseMatrix_Type<FLOAT, SparseAvailable_Type>;\n\n"
+    header_text += "public:\n"
+    header_text += "  FLOAT diag_weighted(const Diag_Type &D);\n"
+    header_text += "  FLOAT sparse_weighted(const Sparse_Type &S);\n"
+    header_text += "};\n\n"
+    # weight each element with its position, so that misplaced values show up
+    header_text += "inline StructuredTest::FLOAT\n"
+    header_text += "StructuredTest::diag_weighted(const Diag_Type &D) {\n"
+    header_text += "  FLOAT sum = static_cast<FLOAT>(0);\n"
+    header_text += "  for (std::size_t i = 0; i < SIZE; ++i) {\n"
+    header_text += "    sum += D(i) * static_cast<FLOAT>(i + 1);\n"
+    header_text += "  }\n"
+    header_text += "  return sum;\n"
+    header_text += "}\n\n"
+    header_text += "inline StructuredTest::FLOAT\n"
+    header_text += "StructuredTest::sparse_weighted(const Sparse_Type &S) {\n"
+    header_text += "  FLOAT sum = static_cast<FLOAT>(0);\n"
+    header_text += "  for (std::size_t k = 0; k < NNZ; ++k) {\n"
+    header_text += "    sum += S(k) * static_cast<FLOAT>(k + 1);\n"
+    header_text += "  }\n"
+    header_text += "  return sum;\n"
+    header_text += "}\n\n"
+    header_text += "#endif // STRUCTURED_TEST_HPP_\n"
+
+    return header_text
+
+
+keep_folder = False
+
+
+@functools.lru_cache(maxsize=None)
+def load_module():
+    """
+    Generate and build the StructuredTest SIL module once per process.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    folder = os.path.join(os.path.dirname(current_dir), TEST_FOLDER_NAME)
+    os.makedirs(folder, exist_ok=True)
+    atexit.register(
+        lambda: keep_folder or shutil.rmtree(folder, ignore_errors=True))
+
+    with open(os.path.join(folder, "structured_test.hpp"), "w",
+              encoding="utf-8") as f:
+        f.write(generate_header(MATRIX_SIZE))
+    with open(os.path.join(folder, "structured_test.py"), "w",
+              encoding="utf-8") as f:
+        f.write(PYTHON_TEXT)
+
+    generator = SIL_Operator("structured_test.py", folder)
+    generator.build_SIL_code(build_type="Debug", incremental=True)
+
+    sys.path.append(folder)
+    import StructuredTestSIL
+    StructuredTestSIL.initialize()
+
+    return StructuredTestSIL
+
+
+def assert_raises(function, *args):
+    try:
+        function(*args)
+    except RuntimeError as e:
+        return str(e)
+    raise AssertionError(f"{function.__name__}{args} did not raise.")
+
+
+def sparse_arguments() -> tuple:
+    """
+    Return the values, column indices and row pointers of a random
+    tridiagonal matrix in CSR form, and the matrix as a dense array.
+    """
+    pattern = tridiagonal_pattern(MATRIX_SIZE)
+    indptr = np.cumsum([0] + [len(row) for row in pattern])
+    indices = np.concatenate([np.array(row) for row in pattern])
+    values = np.random.default_rng(SEED).standard_normal(indices.size)
+    dense = np.zeros((MATRIX_SIZE, MATRIX_SIZE))
+    dense[np.repeat(np.arange(MATRIX_SIZE), np.diff(indptr)), indices] = values
+
+    return values, indices, indptr, dense
+
+
+def test_diag():
+    module = load_module()
+    diagonal = np.random.default_rng(SEED).standard_normal(MATRIX_SIZE)
+    expected = diagonal @ np.arange(1, MATRIX_SIZE + 1)
+
+    np.testing.assert_allclose(module.diag_weighted(np.diag(diagonal)), expected)
+    np.testing.assert_allclose(module.diag_weighted(diagonal), expected)
+    np.testing.assert_allclose(
+        module.diag_weighted(diagonal.astype(np.float32)), expected, rtol=1e-6)
+    # a non-contiguous view is copied once
+    np.testing.assert_allclose(
+        module.diag_weighted(np.repeat(diagonal, 2)[::2]), expected)
+
+    assert_raises(module.diag_weighted, diagonal[:-1])
+    assert_raises(module.diag_weighted, np.eye(MATRIX_SIZE + 1))
+
+    print("diagonal forms: OK")
+
+
+def test_sparse():
+    module = load_module()
+    values, indices, indptr, dense = sparse_arguments()
+    expected = values @ np.arange(1, values.size + 1)
+
+    forms = [dense, values, (values, indices, indptr),
+             (values, indices.astype(np.int32), indptr.astype(np.int32))]
+    try:
+        import scipy.sparse
+        forms.append(scipy.sparse.csr_matrix(dense))
+    except ImportError:
+        print("scipy is not installed, scipy.sparse input is not tested.")
+
+    for argument in forms:
+        np.testing.assert_allclose(module.sparse_weighted(argument), expected)
+
+    # duplicate entries are summed, explicit zeros outside the pattern are allowed
+    # (row 0 has the elements 0 and 1 of the pattern)
+    duplicated = (np.concatenate([values[:2], [1.0, 0.0], values[2:]]),
+                  np.concatenate([indices[:2], [0, MATRIX_SIZE - 1], indices[2:]]),
+                  np.concatenate([[0], indptr[1:] + 2]))
+    np.testing.assert_allclose(module.sparse_weighted(duplicated), expected + 1.0)
+
+    print("sparse forms: OK")
+
+
+def test_malformed_sparse():
+    module = load_module()
+    values, indices, indptr, dense = sparse_arguments()
+
+    outside = dense.copy()
+    outside[0, MATRIX_SIZE - 1] = 1.0
+    decreasing = indptr.copy()
+    decreasing[1], decreasing[2] = decreasing[2], decreasing[1]
+    out_of_range = indices.copy()
+    out_of_range[-1] = MATRIX_SIZE
+
+    malformed = {
+        "values of wrong length": values[:-1],
+        "nonzero outside the pattern (dense)": outside,
+        "indptr of wrong length": (values, indices, indptr[:-1]),
+        "indptr not starting at 0": (values, indices, indptr + 1),
+        "indptr beyond data": (values[:-1], indices, indptr),
+        "indptr beyond indices": (values, indices[:-1], indptr),
+        "indptr far beyond data": (values, indices,
+                                   np.concatenate([indptr[:-1], [1 << 40]])),
+        "decreasing indptr": (values, indices, decreasing),
+        "column index out of range": (values, out_of_range, indptr),
+        "negative column index": (values, -indices - 1, indptr),
+        "nonzero outside the pattern (CSR)": (
+            np.concatenate([[1.0], values]),
+            np.concatenate([[MATRIX_SIZE - 1], indices]),
+            np.concatenate([[0], indptr[1:] + 1])),
+        "2-D data": (values[:, np.newaxis], indices, indptr),
+    }
+
+    for case, argument in malformed.items():
+        message = assert_raises(module.sparse_weighted, argument)
+        print(f"  {case}: {message}")
+
+    print("malformed sparse arguments: OK")
+
+
+def main(argv=None):
+    global keep_folder
+
+    parser = argparse.ArgumentParser(
+        description="Test the transfer of diagonal and sparse matrices.")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the generated test module")
+    args = parser.parse_args(argv)
+    keep_folder = args.keep
+
+    test_diag()
+    test_sparse()
+    test_malformed_sparse()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())